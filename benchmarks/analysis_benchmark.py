@@ -0,0 +1,143 @@
+# (C) Copyright IBM Corp. 2018. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+# This benchmark measures the analysis time of LMS on the synthetic
+# training graphs of `synthetic_graphs`, from a thousand to half a million
+# operations. No session is created, so that it runs on CPU.
+#
+# For every model and size, it times:
+#   - the building of the graph index of the graph,
+#   - `TOPOS.build` from the input placeholder,
+#   - `LMS.run`, by phase, as reported in `LMS.stats`.
+# The results are written to a JSON file, with the time per operation of
+# every phase, so that the scaling can be compared across commits.
+#
+# Invocation examples:
+#   python analysis_benchmark.py
+#   python analysis_benchmark.py --models resnet transformer \
+#       --sizes 1000 10000 --output results.json
+
+from __future__ import print_function
+
+import argparse
+import json
+import platform
+import time
+
+import tensorflow as tf
+
+from tensorflow_large_model_support import LMS
+from tensorflow_large_model_support import graph_index
+from tensorflow_large_model_support import topos
+import synthetic_graphs
+
+
+def time_topos(graph):
+    start = time.time()
+    index = graph_index.GraphIndex(graph)
+    index_seconds = time.time() - start
+    grad_ops = set(index.ops(index.scope_index().prefix_ops(
+        synthetic_graphs.OPTIMIZER_SCOPE)))
+    start = time.time()
+    topo_sort = topos.TOPOS([graph.get_operation_by_name('input')],
+                            grad_ops, index=index)
+    topo_sort.build()
+    return index_seconds, time.time() - start, topo_sort.size
+
+
+def time_lms(graph, args):
+    lms_obj = LMS({synthetic_graphs.OPTIMIZER_SCOPE}, graph=graph,
+                  excl_scopes={'loss'}, lb=args.lb,
+                  dim_bindings=args.batch)
+    with graph.as_default():
+        lms_obj.run()
+    return lms_obj.stats
+
+
+def run_benchmark(model, num_ops, args):
+    start = time.time()
+    graph, depth = synthetic_graphs.build_for_ops(model, num_ops,
+                                                  args.width, args.batch)
+    build_seconds = time.time() - start
+    n = len(graph.get_operations())
+    index_seconds, topos_seconds, orders = time_topos(graph)
+    run_stats = time_lms(graph, args)
+    result = {'model': model,
+              'target_ops': num_ops,
+              'depth': depth,
+              'ops': n,
+              'orders': orders,
+              'build_seconds': build_seconds,
+              'graph_index_seconds': index_seconds,
+              'topos_build_seconds': topos_seconds,
+              'lms': run_stats.to_dict()}
+    result['ns_per_op'] = {
+        phase: seconds / n * 1e9
+        for phase, seconds in run_stats.phase_seconds.items()}
+    result['ns_per_op']['graph_index'] = index_seconds / n * 1e9
+    result['ns_per_op']['topos_build_only'] = topos_seconds / n * 1e9
+    result['ns_per_op']['lms_run'] = run_stats.total_seconds / n * 1e9
+    return result
+
+
+def main(args):
+    tf.logging.set_verbosity(tf.logging.WARN)
+    results = []
+    print('{:>12} {:>8} {:>8} {:>10} {:>10} {:>10} {:>10}'.format(
+        'model', 'ops', 'depth', 'index (s)', 'topos (s)', 'run (s)',
+        'ns/op'))
+    for model in args.models:
+        for num_ops in args.sizes:
+            result = run_benchmark(model, num_ops, args)
+            results.append(result)
+            print('{:>12} {:>8} {:>8} {:>10.3f} {:>10.3f} {:>10.3f} '
+                  '{:>10.1f}'.format(
+                      model, result['ops'], result['depth'],
+                      result['graph_index_seconds'],
+                      result['topos_build_seconds'],
+                      result['lms']['total_seconds'],
+                      result['ns_per_op']['lms_run']))
+    report = {'benchmark': 'analysis',
+              'tensorflow': tf.__version__,
+              'python': platform.python_version(),
+              'width': args.width,
+              'batch': args.batch,
+              'lb': args.lb,
+              'results': results}
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print('Results written to {}'.format(args.output))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--models', nargs='+',
+                        default=list(synthetic_graphs.MODELS),
+                        choices=list(synthetic_graphs.MODELS),
+                        help='Synthetic models to benchmark.')
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[1000, 10000, 100000, 500000],
+                        help='Approximate numbers of ops of the graphs.')
+    parser.add_argument('--width', type=int, default=64,
+                        help='Width of the layers.')
+    parser.add_argument('--batch', type=int, default=32,
+                        help='Rows of the input, a multiple of {} for the '
+                             'transformer.'.format(
+                                 synthetic_graphs.SEQUENCE_LENGTH))
+    parser.add_argument('--lb', type=int, default=1,
+                        help='The lb parameter of LMS.')
+    parser.add_argument('--output', default='analysis_benchmark.json',
+                        help='The JSON file of the results.')
+    main(parser.parse_args())
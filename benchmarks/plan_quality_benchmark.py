@@ -0,0 +1,271 @@
+# (C) Copyright IBM Corp. 2018. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+# This benchmark measures the quality of the plans of LMS on the models of
+# `tf.keras.applications`, built on CPU at several input sizes like in
+# `examples/Keras_ResNet50.py`.
+#
+# Every model is planned with several configurations of LMS by `LMS.plan`,
+# which predicts the effect of a plan without editing the graph, so that no
+# GPU and no session are needed. For every plan it records the numbers of
+# swaps, swap-ins, recomputations and kept tensors, the bytes swapped and
+# moved per step, the simulated peak memory with and without the plan, and a
+# summary of the trigger distances, i.e. the distances in the topological
+# order between the control dependency operation of a swap-in and its first
+# consumer.
+#
+# The plans are deterministic, so that the results can be compared across
+# commits with a stored baseline: `--update_baseline` writes the results to
+# the baseline file, and every other run compares its results with it and
+# exits with status 1 if a plan got worse, i.e. its peak memory or its
+# transferred bytes grew by more than `--tolerance`.
+#
+# Invocation examples:
+#   python plan_quality_benchmark.py --update_baseline
+#   python plan_quality_benchmark.py
+#   python plan_quality_benchmark.py --models ResNet50 MobileNet \
+#       --image_sizes 224 --output results.json
+
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import sys
+import time
+from collections import OrderedDict
+
+import numpy as np
+import tensorflow as tf
+
+from tensorflow_large_model_support import LMS
+
+# the constructors of the models and their smallest input size
+MODELS = OrderedDict([
+    ('ResNet50', (lambda: tf.keras.applications.ResNet50, 32)),
+    ('VGG16', (lambda: tf.keras.applications.VGG16, 32)),
+    ('DenseNet121', (lambda: tf.keras.applications.DenseNet121, 32)),
+    ('InceptionV3', (lambda: tf.keras.applications.InceptionV3, 75)),
+    ('MobileNet', (lambda: tf.keras.applications.MobileNet, 32)),
+])
+
+# the LMS parameters of the planned configurations. A `budget_fraction`
+# sets `memory_budget_bytes` to a fraction of the peak memory predicted
+# without swapping.
+CONFIGS = OrderedDict([
+    ('default', {}),
+    ('lb4', {'lb': 4}),
+    ('fuse_swapins', {'fuse_swapins': True}),
+    ('time_model', {'ctrld_strategy': 'time_model'}),
+    ('memory_pressure', {'ctrld_strategy': 'memory_pressure'}),
+    ('recompute', {'recompute': True}),
+    ('budget_50', {'budget_fraction': 0.5}),
+])
+
+# the metrics where smaller is better, compared with the baseline
+COMPARED_METRICS = ('peak_bytes', 'transfer_bytes')
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                'plan_quality_baseline.json')
+
+
+def build_model(name, image_size, num_classes):
+    """Build the training graph of a Keras application model and return the
+    graph and the optimizer scopes, as found by `LMSKerasCallback`.
+    """
+    tf.keras.backend.clear_session()
+    constructor = MODELS[name][0]()
+    model = constructor(weights=None, include_top=True,
+                        input_shape=(image_size, image_size, 3),
+                        classes=num_classes)
+    model.compile(optimizer='rmsprop', loss='categorical_crossentropy')
+    model._make_train_function()
+    optimizer_name = model.optimizer.__class__.__name__
+    optimizer_scopes = {'training/' + optimizer_name + '/gradients',
+                        optimizer_name + '/gradients'}
+    return tf.get_default_graph(), optimizer_scopes
+
+
+def summarize_distances(trigger_distances):
+    distances = [d for ds in trigger_distances.values() for d in ds
+                 if d is not None]
+    missing = sum(1 for ds in trigger_distances.values() for d in ds
+                  if d is None)
+    if not distances:
+        return {'count': 0, 'missing': missing}
+    return {'count': len(distances),
+            'missing': missing,
+            'min': int(np.min(distances)),
+            'median': float(np.median(distances)),
+            'mean': float(np.mean(distances)),
+            'max': int(np.max(distances))}
+
+
+def plan_model(graph, optimizer_scopes, params, batch_size):
+    lms_obj = LMS(optimizer_scopes, graph=graph,
+                  dim_bindings={0: batch_size}, **params)
+    prediction = lms_obj.plan()
+    if prediction is None:
+        return None
+    swap_plan = prediction.swap_plan
+    return {'swaps': len(swap_plan.swaps),
+            'swapins': sum(len(swap.swapins) for swap in swap_plan.swaps),
+            'recomputes': len(swap_plan.recomputes),
+            'kept': len(swap_plan.kept),
+            'swapped_bytes': swap_plan.total_bytes,
+            'transfer_bytes': prediction.transfer_bytes,
+            'peak_bytes': int(prediction.peak_bytes),
+            'baseline_peak_bytes': int(prediction.baseline_peak_bytes),
+            'saved_bytes': int(prediction.saved_bytes),
+            'trigger_distances': summarize_distances(
+                prediction.trigger_distances),
+            'planning_seconds': lms_obj.stats.total_seconds}
+
+
+def run_benchmark(args):
+    results = OrderedDict()
+    for name in args.models:
+        min_size = MODELS[name][1]
+        for image_size in args.image_sizes:
+            if image_size < min_size:
+                print('{} needs an input of at least {} pixels, skipping '
+                      'size {}'.format(name, min_size, image_size))
+                continue
+            start = time.time()
+            graph, optimizer_scopes = build_model(name, image_size,
+                                                  args.num_classes)
+            build_seconds = time.time() - start
+            baseline_peak = None
+            for config in args.configs:
+                params = dict(CONFIGS[config])
+                fraction = params.pop('budget_fraction', None)
+                if fraction is not None:
+                    if baseline_peak is None:
+                        baseline_peak = plan_model(
+                            graph, optimizer_scopes, {'n_tensors': -1},
+                            args.batch_size)['baseline_peak_bytes']
+                    params['memory_budget_bytes'] = int(baseline_peak *
+                                                        fraction)
+                result = plan_model(graph, optimizer_scopes, params,
+                                    args.batch_size)
+                if result is None:
+                    continue
+                baseline_peak = result['baseline_peak_bytes']
+                result.update({'model': name, 'image_size': image_size,
+                               'config': config, 'params': params,
+                               'ops': len(graph.get_operations()),
+                               'build_seconds': build_seconds})
+                key = '{}/{}/{}'.format(name, image_size, config)
+                results[key] = result
+                print('{:<36} {:>6} swaps {:>14} bytes moved, peak {:>14} '
+                      '/ {:>14} bytes'.format(
+                          key, result['swaps'], result['transfer_bytes'],
+                          result['peak_bytes'],
+                          result['baseline_peak_bytes']))
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Print the differences with the baseline and return the keys of the
+    plans that got worse.
+    """
+    regressions = []
+    for key, result in results.items():
+        if key not in baseline:
+            print('{}: not in the baseline'.format(key))
+            continue
+        base = baseline[key]
+        for metric in ('swaps', 'swapins', 'recomputes', 'swapped_bytes') + \
+                COMPARED_METRICS:
+            if result[metric] == base[metric]:
+                continue
+            print('{}: {} {} -> {}'.format(key, metric, base[metric],
+                                           result[metric]))
+            if (metric in COMPARED_METRICS and
+                    result[metric] > base[metric] * (1 + tolerance)):
+                regressions.append(key)
+    return sorted(set(regressions))
+
+
+def main(args):
+    tf.logging.set_verbosity(tf.logging.WARN)
+    results = run_benchmark(args)
+    report = {'benchmark': 'plan_quality',
+              'tensorflow': tf.__version__,
+              'batch_size': args.batch_size,
+              'num_classes': args.num_classes,
+              'results': results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print('Results written to {}'.format(args.output))
+    if args.update_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)['results']
+        baseline.update(results)
+        report['results'] = baseline
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print('Baseline written to {}'.format(args.baseline))
+        return 0
+    if not os.path.exists(args.baseline):
+        print('No baseline in {}, run with --update_baseline to create '
+              'it'.format(args.baseline))
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if (baseline['batch_size'] != args.batch_size or
+            baseline['num_classes'] != args.num_classes):
+        print('The baseline was made with another batch size or number of '
+              'classes, the plans are not compared')
+        return 0
+    regressions = compare(results, baseline['results'], args.tolerance)
+    if regressions:
+        print('Plans worse than the baseline: {}'.format(
+            ', '.join(regressions)))
+        return 1
+    print('No plan is worse than the baseline')
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--models', nargs='+', default=list(MODELS),
+                        choices=list(MODELS),
+                        help='Keras application models to plan.')
+    parser.add_argument('--image_sizes', type=int, nargs='+',
+                        default=[224, 500],
+                        help='Sides of the square input images.')
+    parser.add_argument('--configs', nargs='+', default=list(CONFIGS),
+                        choices=list(CONFIGS),
+                        help='LMS configurations to plan.')
+    parser.add_argument('--batch_size', type=int, default=1,
+                        help='Batch size bound to the unknown batch '
+                             'dimension.')
+    parser.add_argument('--num_classes', type=int, default=15,
+                        help='Number of classes of the models.')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE,
+                        help='The JSON file of the baseline.')
+    parser.add_argument('--update_baseline', action='store_true',
+                        help='Write the results to the baseline file '
+                             'instead of comparing them.')
+    parser.add_argument('--tolerance', type=float, default=0.0,
+                        help='Relative growth of the peak memory or of the '
+                             'transferred bytes allowed before a plan is '
+                             'reported worse than the baseline.')
+    parser.add_argument('--output', help='The JSON file of the results.')
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,286 @@
+# (C) Copyright IBM Corp. 2018. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+# This benchmark measures the runtime overhead of the graphs edited by LMS
+# without a GPU. The session is configured with two logical CPU devices:
+# `/cpu:0` stands for the accelerator and runs the model, and `/cpu:1`
+# stands for the host and receives the swapped tensors, i.e. it is the
+# `cpu_device` of LMS.
+#
+# Both devices share the memory and the thread pools of the machine, so the
+# transfers between them cost nothing and the PCIe timings are not
+# reproduced. What is measured is the overhead of executing the edited
+# graph: the added identity operations and the control dependencies of the
+# swap-ins. A plan whose control dependencies serialize the execution shows
+# up as a longer step and as a lower concurrency, the sum of the execution
+# times of the operations of a traced step divided by its duration.
+#
+# The models are the one of `examples/mnist_deep_lms.py`, ResNet50 from
+# `tf.keras.applications` as in `examples/Keras_ResNet50.py`, and the
+# models of `synthetic_graphs`. Inputs are random and fed from memory.
+#
+# Invocation examples:
+#   python runtime_benchmark.py
+#   python runtime_benchmark.py --models resnet50 --image_size 128 \
+#       --steps 10 --lb 3 --output results.json
+
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import tensorflow as tf
+from tensorflow.core.protobuf import rewriter_config_pb2
+
+from tensorflow_large_model_support import LMS
+import synthetic_graphs
+
+ACCELERATOR = '/cpu:0'
+HOST = '/cpu:1'
+
+EXAMPLES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            os.pardir, 'examples')
+
+MODELS = (['mnist_deep', 'resnet50'] +
+          ['synthetic_' + model for model in synthetic_graphs.MODELS])
+
+
+class Model(object):
+    """A training graph and the LMS parameters it needs."""
+
+    def __init__(self, graph, train_op, feed_dict, optimizer_scopes,
+                 excl_scopes=()):
+        self.graph = graph
+        self.train_op = train_op
+        self.feed_dict = feed_dict
+        self.optimizer_scopes = set(optimizer_scopes)
+        self.excl_scopes = set(excl_scopes)
+
+
+def build_mnist_deep(args):
+    sys.path.insert(0, EXAMPLES_DIR)
+    from mnist_deep_lms import deepnn
+    graph = tf.Graph()
+    with graph.as_default(), graph.device(ACCELERATOR):
+        x = tf.placeholder(tf.float32, [None, 784])
+        y_ = tf.placeholder(tf.int64, [None])
+        y_conv, keep_prob = deepnn(x)
+        with tf.name_scope('loss'):
+            cross_entropy = tf.losses.sparse_softmax_cross_entropy(
+                labels=y_, logits=y_conv)
+        cross_entropy = tf.reduce_mean(cross_entropy)
+        with tf.name_scope('adam_optimizer'):
+            train_op = tf.train.AdamOptimizer(1e-4).minimize(cross_entropy)
+    feed_dict = {x: np.random.random((args.batch_size, 784)),
+                 y_: np.random.randint(0, 10, size=(args.batch_size,)),
+                 keep_prob: 0.5}
+    return Model(graph, train_op, feed_dict, {'adam_optimizer'},
+                 {'loss', 'dropout'})
+
+
+def build_resnet50(args):
+    num_classes = 15
+    input_shape = (args.image_size, args.image_size, 3)
+    graph = tf.Graph()
+    with graph.as_default(), graph.device(ACCELERATOR):
+        x = tf.placeholder(tf.float32, (None,) + input_shape)
+        labels = tf.placeholder(tf.float32, (None, num_classes))
+        model = tf.keras.applications.ResNet50(weights=None,
+                                               include_top=True,
+                                               input_tensor=x,
+                                               classes=num_classes)
+        with tf.name_scope('loss'):
+            loss = tf.losses.softmax_cross_entropy(labels, model.output)
+        with tf.name_scope('optimizer'):
+            train_op = tf.train.RMSPropOptimizer(1e-3).minimize(loss)
+        learning_phase = tf.keras.backend.learning_phase()
+    y = np.random.randint(0, num_classes, size=(args.batch_size,))
+    feed_dict = {x: np.random.random((args.batch_size,) + input_shape),
+                 labels: np.eye(num_classes)[y],
+                 learning_phase: 1}
+    return Model(graph, train_op, feed_dict, {'optimizer'}, {'loss'})
+
+
+def build_synthetic(args, model):
+    graph, _ = synthetic_graphs.build_for_ops(model, args.synthetic_ops,
+                                              args.width, args.batch_size,
+                                              device=ACCELERATOR)
+    train_op = graph.get_collection(tf.GraphKeys.TRAIN_OP)[0]
+    x = graph.get_tensor_by_name('input:0')
+    feed_dict = {x: np.random.random((args.batch_size, args.width))}
+    return Model(graph, train_op, feed_dict,
+                 {synthetic_graphs.OPTIMIZER_SCOPE}, {'loss'})
+
+
+def build_model(name, args):
+    if name == 'mnist_deep':
+        return build_mnist_deep(args)
+    if name == 'resnet50':
+        return build_resnet50(args)
+    return build_synthetic(args, name[len('synthetic_'):])
+
+
+def session_config(args):
+    config = tf.ConfigProto(device_count={'CPU': 2},
+                            allow_soft_placement=False,
+                            inter_op_parallelism_threads=args.inter_op_threads,
+                            intra_op_parallelism_threads=args.intra_op_threads)
+    # as in the examples, the dependency optimizer would remove the control
+    # dependencies of LMS
+    config.graph_options.rewrite_options.dependency_optimization = (
+        rewriter_config_pb2.RewriterConfig.OFF)
+    return config
+
+
+def concurrency(run_metadata, device):
+    """Return the sum of the execution times of the operations of a device
+    divided by the duration of the step on that device, or None if no
+    operation ran on it.
+    """
+    for dev_stats in run_metadata.step_stats.dev_stats:
+        if not dev_stats.device.lower().endswith(device[1:]):
+            continue
+        nodes = [(n.all_start_micros, n.all_end_rel_micros)
+                 for n in dev_stats.node_stats]
+        if not nodes:
+            return None
+        busy = sum(end for _, end in nodes)
+        span = (max(start + end for start, end in nodes) -
+                min(start for start, _ in nodes))
+        return float(busy) / max(span, 1)
+    return None
+
+
+def time_steps(model, args):
+    with tf.Session(graph=model.graph, config=session_config(args)) as sess:
+        with model.graph.as_default():
+            sess.run(tf.global_variables_initializer())
+        for _ in range(args.warmup):
+            sess.run(model.train_op, feed_dict=model.feed_dict)
+        step_seconds = []
+        for _ in range(args.steps):
+            start = time.time()
+            sess.run(model.train_op, feed_dict=model.feed_dict)
+            step_seconds.append(time.time() - start)
+        run_metadata = tf.RunMetadata()
+        sess.run(model.train_op, feed_dict=model.feed_dict,
+                 options=tf.RunOptions(
+                     trace_level=tf.RunOptions.FULL_TRACE),
+                 run_metadata=run_metadata)
+    return {'median_seconds': float(np.median(step_seconds)),
+            'mean_seconds': float(np.mean(step_seconds)),
+            'p90_seconds': float(np.percentile(step_seconds, 90)),
+            'step_seconds': step_seconds,
+            'accelerator_concurrency': concurrency(run_metadata,
+                                                   ACCELERATOR),
+            'host_concurrency': concurrency(run_metadata, HOST)}
+
+
+def run_benchmark(name, args):
+    baseline = build_model(name, args)
+    without_lms = time_steps(baseline, args)
+
+    model = build_model(name, args)
+    lms_obj = LMS(model.optimizer_scopes, graph=model.graph,
+                  excl_scopes=model.excl_scopes, lb=args.lb,
+                  n_tensors=args.n_tensors, cpu_device=HOST)
+    with model.graph.as_default():
+        lms_obj.run()
+    with_lms = time_steps(model, args)
+    return {'model': name,
+            'ops': len(baseline.graph.get_operations()),
+            'lms_ops': len(model.graph.get_operations()),
+            'lms_stats': lms_obj.stats.to_dict(),
+            'without_lms': without_lms,
+            'with_lms': with_lms,
+            'overhead': (with_lms['median_seconds'] /
+                         without_lms['median_seconds'] - 1.0)}
+
+
+def main(args):
+    tf.logging.set_verbosity(tf.logging.WARN)
+    results = []
+    print('{:>22} {:>8} {:>8} {:>12} {:>12} {:>9} {:>11}'.format(
+        'model', 'ops', 'swaps', 'base (ms)', 'LMS (ms)', 'overhead',
+        'concurrency'))
+    for name in args.models:
+        result = run_benchmark(name, args)
+        results.append(result)
+        without_lms = result['without_lms']
+        with_lms = result['with_lms']
+        print('{:>22} {:>8} {:>8} {:>12.2f} {:>12.2f} {:>8.1f}% '
+              '{:>5} {:>5}'.format(
+                  name, result['ops'], result['lms_stats']['swapouts'],
+                  without_lms['median_seconds'] * 1000,
+                  with_lms['median_seconds'] * 1000,
+                  result['overhead'] * 100,
+                  _format_ratio(without_lms['accelerator_concurrency']),
+                  _format_ratio(with_lms['accelerator_concurrency'])))
+    report = {'benchmark': 'runtime',
+              'tensorflow': tf.__version__,
+              'accelerator': ACCELERATOR,
+              'host': HOST,
+              'batch_size': args.batch_size,
+              'lb': args.lb,
+              'n_tensors': args.n_tensors,
+              'steps': args.steps,
+              'results': results}
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print('Results written to {}'.format(args.output))
+
+
+def _format_ratio(value):
+    return '-' if value is None else '{:.2f}'.format(value)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--models', nargs='+',
+                        default=['mnist_deep', 'resnet50',
+                                 'synthetic_resnet'],
+                        choices=MODELS, help='Models to train.')
+    parser.add_argument('--batch_size', type=int, default=16,
+                        help='Batch size, a multiple of {} for the synthetic '
+                             'transformer.'.format(
+                                 synthetic_graphs.SEQUENCE_LENGTH))
+    parser.add_argument('--image_size', type=int, default=64,
+                        help='Side of the square images of ResNet50.')
+    parser.add_argument('--synthetic_ops', type=int, default=5000,
+                        help='Approximate number of ops of the synthetic '
+                             'models.')
+    parser.add_argument('--width', type=int, default=256,
+                        help='Width of the layers of the synthetic models.')
+    parser.add_argument('--lb', type=int, default=1,
+                        help='The lb parameter of LMS.')
+    parser.add_argument('--n_tensors', type=int, default=-1,
+                        help='The n_tensors parameter of LMS.')
+    parser.add_argument('--warmup', type=int, default=3,
+                        help='Steps run before the timed steps.')
+    parser.add_argument('--steps', type=int, default=20,
+                        help='Timed steps.')
+    parser.add_argument('--inter_op_threads', type=int, default=0,
+                        help='Inter-op threads of the session, 0 for the '
+                             'TensorFlow default.')
+    parser.add_argument('--intra_op_threads', type=int, default=0,
+                        help='Intra-op threads of the session, 0 for the '
+                             'TensorFlow default.')
+    parser.add_argument('--output', default='runtime_benchmark.json',
+                        help='The JSON file of the results.')
+    main(parser.parse_args())
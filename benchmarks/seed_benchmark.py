@@ -0,0 +1,115 @@
+# (C) Copyright IBM Corp. 2018. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+# This benchmark measures the automatic discovery of the seed operations,
+# i.e. the candidates reaching the most other candidates, and compares the
+# topological sweep of `ReachabilityIndex.source_coverage` with the search
+# of the ancestors of every candidate LMS used before.
+#
+# Graphs are given directly in the CSR format so that no TensorFlow graph
+# is built. The forward phase is a layered graph: layers of `width` ops,
+# every op of a layer feeds two ops of the next layer. Every op is a
+# candidate, as if it were read by the backward phase, and the ops of the
+# first layer are the seeds.
+#
+# Invocation examples:
+#   python seed_benchmark.py
+#   python seed_benchmark.py --sizes 10000 100000 1000000 --width 64
+
+from __future__ import print_function
+
+import argparse
+import time
+
+import numpy as np
+
+from tensorflow_large_model_support import levelsort
+from tensorflow_large_model_support import reachability
+from traversal_benchmark import layered_csr
+
+
+class CSRGraph(object):
+    """The part of `GraphIndex` used by `ReachabilityIndex`."""
+
+    def __init__(self, n, width):
+        self.size = n
+        self.succ_ptr, self.succ = layered_csr(n, width)
+        rows = np.repeat(np.arange(n), np.diff(self.succ_ptr))
+        self.pred_ptr, self.pred = levelsort.csr_from_edges(
+            n, self.succ, rows)
+
+
+def cone_coverage(graph, candidates):
+    """The seed discovery of LMS before the topological sweep."""
+    reach = reachability.ReachabilityIndex(graph)
+    is_candidate = np.zeros(graph.size, dtype=bool)
+    is_candidate[candidates] = True
+    coverage = np.zeros(graph.size, dtype=np.int64)
+    for op_id in candidates:
+        ancestors = reach.ancestors(op_id)
+        coverage[ancestors[is_candidate[ancestors]]] += 1
+    return _seeds({i: int(coverage[i]) for i in candidates})
+
+
+def sweep_coverage(graph, candidates):
+    reach = reachability.ReachabilityIndex(graph)
+    return _seeds(reach.source_coverage(candidates))
+
+
+def _seeds(coverage):
+    max_nelems = max(coverage.values())
+    return sorted(i for i, n in coverage.items() if n == max_nelems)
+
+
+def timed(func, *args):
+    start = time.time()
+    result = func(*args)
+    return result, time.time() - start
+
+
+def main(args):
+    print('{:>10} {:>10} {:>12} {:>10}'.format(
+        'ops', 'sweep (s)', 'ns/op', 'cones (s)'))
+    prev = None
+    for n in args.sizes:
+        graph = CSRGraph(n, args.width)
+        candidates = list(range(n))
+        seeds, elapsed = timed(sweep_coverage, graph, candidates)
+        assert seeds == list(range(min(args.width, n)))
+        cone_time = '-'
+        if n <= args.cone_limit:
+            cone_seeds, cone_elapsed = timed(cone_coverage, graph,
+                                             candidates)
+            assert cone_seeds == seeds
+            cone_time = '{:.3f}'.format(cone_elapsed)
+        print('{:>10} {:>10.3f} {:>12.1f} {:>10}'.format(
+            n, elapsed, elapsed / n * 1e9, cone_time))
+        if prev is not None:
+            print('{:>10} scaling x{:.1f} ops -> x{:.1f} time'.format(
+                '', float(n) / prev[0], elapsed / max(prev[1], 1e-9)))
+        prev = (n, elapsed)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[10000, 100000, 1000000],
+                        help='Numbers of ops of the synthetic graphs.')
+    parser.add_argument('--width', type=int, default=64,
+                        help='Width of the layers.')
+    parser.add_argument('--cone_limit', type=int, default=10000,
+                        help='Largest graph on which the search of the '
+                             'ancestors of every candidate is timed.')
+    main(parser.parse_args())
@@ -0,0 +1,171 @@
+# (C) Copyright IBM Corp. 2018. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+# Synthetic training graphs for the LMS benchmarks.
+#
+# Every model reads a placeholder named `input` of shape [batch, width],
+# is followed by a loss in the `loss` scope, and is trained by a gradient
+# descent optimizer in the `OPTIMIZER_SCOPE` scope, so that LMS is run with
+# `LMS({OPTIMIZER_SCOPE}, excl_scopes={'loss'})`. Layers are dense layers on
+# 2-D tensors, which keeps the graphs cheap to build while giving them the
+# connectivity of the models they stand for:
+#   - chain: a linear chain of layers.
+#   - resnet: residual blocks of two layers and a shortcut.
+#   - densenet: dense blocks, every layer of a block reads the concatenation
+#     of the outputs of the previous layers of the block.
+#   - unet: an encoder and a decoder, every level of the decoder reads the
+#     output of the same level of the encoder.
+#   - transformer: self-attention and feed-forward layers with layer
+#     normalization.
+# The depth is the number of layers or blocks. `build_for_ops` chooses the
+# depth giving a number of operations.
+
+import math
+from collections import OrderedDict
+
+import tensorflow as tf
+
+# the name scope of the optimizer
+OPTIMIZER_SCOPE = 'optimizer'
+# the layers of a dense block
+DENSE_BLOCK_SIZE = 8
+# the sequence length of the transformer
+SEQUENCE_LENGTH = 16
+
+
+def _dense(x, width, name):
+    with tf.name_scope(name):
+        w = tf.Variable(tf.zeros([int(x.shape[-1]), width]), name='w')
+        return tf.matmul(x, w)
+
+
+def _layer_norm(x):
+    mean, variance = tf.nn.moments(x, axes=[1], keep_dims=True)
+    return (x - mean) * tf.rsqrt(variance + 1e-6)
+
+
+def chain(x, depth, width):
+    for i in range(depth):
+        x = tf.nn.relu(_dense(x, width, 'layer{}'.format(i)))
+    return x
+
+
+def resnet(x, depth, width):
+    for i in range(depth):
+        with tf.name_scope('block{}'.format(i)):
+            y = tf.nn.relu(_dense(x, width, 'conv1'))
+            y = _dense(y, width, 'conv2')
+            x = tf.nn.relu(x + y)
+    return x
+
+
+def densenet(x, depth, width):
+    growth = max(width // 4, 1)
+    for i in range(depth):
+        with tf.name_scope('block{}'.format(i)):
+            features = [x]
+            for j in range(DENSE_BLOCK_SIZE):
+                y = tf.concat(features, axis=1) if j else x
+                features.append(tf.nn.relu(
+                    _dense(y, growth, 'layer{}'.format(j))))
+            x = _dense(tf.concat(features, axis=1), width, 'transition')
+    return x
+
+
+def unet(x, depth, width):
+    skips = []
+    for i in range(depth):
+        with tf.name_scope('down{}'.format(i)):
+            x = tf.nn.relu(_dense(x, width, 'conv'))
+            skips.append(x)
+            x = _dense(x, width, 'pool')
+    for i in reversed(range(depth)):
+        with tf.name_scope('up{}'.format(i)):
+            x = tf.nn.relu(_dense(x, width, 'upconv'))
+            x = tf.nn.relu(_dense(tf.concat([x, skips[i]], axis=1), width,
+                                  'conv'))
+    return x
+
+
+def transformer(x, depth, width):
+    scale = 1.0 / math.sqrt(width)
+    for i in range(depth):
+        with tf.name_scope('layer{}'.format(i)):
+            q, k, v = [tf.reshape(_dense(x, width, name),
+                                  [-1, SEQUENCE_LENGTH, width])
+                       for name in ('query', 'key', 'value')]
+            scores = tf.nn.softmax(tf.matmul(q, k, transpose_b=True) * scale)
+            attention = tf.reshape(tf.matmul(scores, v), [-1, width])
+            x = _layer_norm(x + _dense(attention, width, 'projection'))
+            y = tf.nn.relu(_dense(x, 4 * width, 'ffn1'))
+            x = _layer_norm(x + _dense(y, width, 'ffn2'))
+    return x
+
+
+MODELS = OrderedDict([('chain', chain),
+                      ('resnet', resnet),
+                      ('densenet', densenet),
+                      ('unet', unet),
+                      ('transformer', transformer)])
+
+
+def build(model, depth, width=64, batch=32, device=None):
+    """Build the training graph of a synthetic model.
+
+    Args:
+      model: a key of `MODELS`.
+      depth: the number of layers or blocks.
+      width: the width of the layers.
+      batch: the number of rows of the input, a multiple of
+        `SEQUENCE_LENGTH` for the transformer.
+      device: the device of the operations. Default `None`, i.e. the
+        default device.
+
+    Return:
+      A `tf.Graph`. Its train op is in the `tf.GraphKeys.TRAIN_OP`
+      collection.
+    """
+    graph = tf.Graph()
+    with graph.as_default(), graph.device(device):
+        x = tf.placeholder(tf.float32, [batch, width], name='input')
+        y = MODELS[model](x, depth, width)
+        with tf.name_scope('loss'):
+            loss = tf.reduce_mean(tf.square(y))
+        with tf.name_scope(OPTIMIZER_SCOPE):
+            train_op = tf.train.GradientDescentOptimizer(0.01).minimize(loss)
+        tf.add_to_collection(tf.GraphKeys.TRAIN_OP, train_op)
+    return graph
+
+
+def build_for_ops(model, num_ops, width=64, batch=32, device=None):
+    """Build the training graph of a synthetic model with about `num_ops`
+    operations. The operations per layer are counted on the graphs of
+    depth 1 and 2.
+
+    Args:
+      model: a key of `MODELS`.
+      num_ops: the number of operations.
+      width: the width of the layers.
+      batch: the number of rows of the input.
+      device: the device of the operations.
+
+    Return:
+      A tuple of (a `tf.Graph`, its depth).
+    """
+    ops1 = len(build(model, 1, width, batch).get_operations())
+    ops2 = len(build(model, 2, width, batch).get_operations())
+    per_layer = max(ops2 - ops1, 1)
+    depth = max(int(round(float(num_ops - ops1) / per_layer)) + 1, 1)
+    return build(model, depth, width, batch, device), depth
@@ -0,0 +1,136 @@
+# (C) Copyright IBM Corp. 2018. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+# This benchmark measures the breadth-first traversal engine used by the
+# LMS analysis passes on synthetic graphs, and compares it with the
+# Queue-based traversal LMS used before, whose membership check
+# `op not in open_set.queue` scans the whole queue.
+#
+# Graphs are given directly in the CSR format so that no TensorFlow graph
+# is built. Two shapes are used:
+#   - chain: op i feeds op i+1.
+#   - layered: layers of `width` ops, every op of a layer feeds two ops of
+#     the next layer. The frontier is as wide as a layer.
+#
+# Invocation examples:
+#   python traversal_benchmark.py
+#   python traversal_benchmark.py --sizes 10000 100000 1000000 --width 512
+
+from __future__ import print_function
+
+import argparse
+import time
+
+import numpy as np
+from six.moves import queue as Queue
+
+from tensorflow_large_model_support import traversal
+
+
+def chain_csr(n):
+    ptr = np.minimum(np.arange(n + 1), n - 1)
+    idx = np.arange(1, n)
+    return ptr, idx
+
+
+def layered_csr(n, width):
+    ids = np.arange(n)
+    layer_start = (ids // width + 1) * width
+    first = layer_start + ids % width
+    second = layer_start + (ids + 1) % width
+    has_next = first < n
+    rows = np.concatenate([ids[has_next], ids[second < n]])
+    cols = np.concatenate([first[has_next], second[second < n]])
+    order = np.argsort(rows, kind='stable')
+    ptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=n), out=ptr[1:])
+    return ptr, cols[order]
+
+
+def queue_walk(ptr, idx, sources):
+    """The traversal of LMS before the traversal engine was introduced."""
+    ptr = ptr.tolist()
+    idx = idx.tolist()
+    open_set = Queue.Queue()
+    closed_set = set()
+    for i in sources:
+        open_set.put(i)
+    count = 0
+    while not open_set.empty():
+        i = open_set.get()
+        count += 1
+        for j in idx[ptr[i]:ptr[i + 1]]:
+            if j in closed_set:
+                continue
+            if j not in open_set.queue:
+                open_set.put(j)
+        closed_set.add(i)
+    return count
+
+
+def engine_walk(ptr, idx, sources):
+    walker = traversal.Traversal(ptr, idx)
+    count = 0
+    for _ in walker.walk(sources):
+        count += 1
+    return count
+
+
+def timed(func, *args):
+    start = time.time()
+    count = func(*args)
+    return count, time.time() - start
+
+
+def main(args):
+    print('{:>8} {:>10} {:>12} {:>12} {:>10}'.format(
+        'graph', 'ops', 'engine (s)', 'ns/op', 'queue (s)'))
+    for shape in ('chain', 'layered'):
+        prev = None
+        for n in args.sizes:
+            if shape == 'chain':
+                ptr, idx = chain_csr(n)
+                sources = [0]
+            else:
+                ptr, idx = layered_csr(n, args.width)
+                sources = list(range(min(args.width, n)))
+            count, elapsed = timed(engine_walk, ptr, idx, sources)
+            assert count == n
+            queue_time = '-'
+            if n <= args.queue_limit:
+                queue_count, queue_elapsed = timed(queue_walk, ptr, idx,
+                                                   sources)
+                assert queue_count == n
+                queue_time = '{:.3f}'.format(queue_elapsed)
+            print('{:>8} {:>10} {:>12.3f} {:>12.1f} {:>10}'.format(
+                shape, n, elapsed, elapsed / n * 1e9, queue_time))
+            if prev is not None:
+                # near-linear scaling keeps the time per op constant
+                print('{:>8} scaling x{:.1f} ops -> x{:.1f} time'.format(
+                    '', float(n) / prev[0], elapsed / max(prev[1], 1e-9)))
+            prev = (n, elapsed)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[10000, 100000, 1000000],
+                        help='Numbers of ops of the synthetic graphs.')
+    parser.add_argument('--width', type=int, default=256,
+                        help='Width of the layered graphs.')
+    parser.add_argument('--queue_limit', type=int, default=100000,
+                        help='Largest graph on which the Queue-based '
+                             'traversal is timed.')
+    main(parser.parse_args())
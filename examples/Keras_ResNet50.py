@@ -49,6 +49,9 @@
 #   python Keras_ResNet50.py --image_size 3900 --lms
 # Swap some, but not all tensors:
 #  python Keras_ResNet50.py --image_size 2400 --lms --n_tensors 20 --lb 30
+# Let LMS choose the tensors to swap for a 14 GB memory budget, instead of
+# searching n_tensors and lb by hand:
+#  python Keras_ResNet50.py --image_size 3900 --lms --memory_budget_gb 14
 
 
 import argparse
@@ -101,7 +104,7 @@ def random_image_generator(batch_size, num_classes, input_shape):
         y_array = tf.keras.utils.to_categorical(y, num_classes)
         yield(x_array, y_array)
 
-def get_callbacks(args):
+def get_callbacks(args, batch_size):
     callbacks = []
 
     if args.tensorboard:
@@ -119,8 +122,16 @@ def get_callbacks(args):
         # Specifying this starting name, from previous runs of LMS,
         # speeds up graph analysis time.
         starting_names = ['conv1_bn/cond/pred_id']
+        lms_args = {}
+        if args.memory_budget_gb:
+            # The batch dimension of the Keras model is unknown in the
+            # graph, bind it so that LMS can compute the tensor sizes.
+            lms_args['memory_budget_bytes'] = int(args.memory_budget_gb *
+                                                  (1 << 30))
+            lms_args['dim_bindings'] = {0: batch_size}
         lms = LMSKerasCallback(n_tensors=args.n_tensors, lb=args.lb,
-                               starting_op_names=starting_names)
+                               starting_op_names=starting_names,
+                               **lms_args)
         callbacks.append(lms)
 
     return callbacks
@@ -148,7 +159,8 @@ def run_model(args):
         ans = resnet50.predict(random_generator, steps=1)
     else:
         resnet50.fit_generator(random_generator, steps_per_epoch=args.steps,
-                           epochs=args.epochs, callbacks=get_callbacks(args))
+                           epochs=args.epochs,
+                           callbacks=get_callbacks(args, batch_size))
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
@@ -177,6 +189,12 @@ if __name__ == "__main__":
                         help='Lowerbound value for LMS. A tensor will be '
                              'swapped in during the backward phase at least lb '
                              'nodes before it in the graph. Default 1.')
+    parser.add_argument("--memory_budget_gb", type=float,
+                        default=None,
+                        help='The GPU memory budget in GB for the tensors of '
+                             'the model. LMS swaps only the tensors needed '
+                             'to fit in the budget. Default None (swapping '
+                             'is controlled by n_tensors).')
 
     # nvprof parameters
     nvprof_group = parser.add_mutually_exclusive_group(required=False)
@@ -3,7 +3,7 @@ from setuptools import setup
 
 install_requires = [
     'tensorflow-gpu >= 1.5',
-    'toposort >= 1.5',
+    'numpy',
 ]
 
 setup(
@@ -13,5 +13,10 @@ setup(
     author='Tung D. Le',
     author_email='tung@jp.ibm.com',
     packages=find_packages(),
-    install_requires=install_requires
+    install_requires=install_requires,
+    entry_points={
+        'console_scripts': [
+            'tflms-rewrite=tensorflow_large_model_support.rewrite:main',
+        ],
+    }
 )
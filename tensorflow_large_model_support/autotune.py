@@ -0,0 +1,134 @@
+# (C) Copyright IBM Corp. 2018. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Auto-tuning
+"""
+import multiprocessing
+
+# the simulator of a worker process, set once by the pool initializer so
+# that it is not sent with every task
+_worker_simulator = None
+
+
+class TuningResult(object):
+    """TuningResult class holds the prediction for one configuration of
+    LMS.
+    """
+    def __init__(self, config, peak, stall, n_swapped):
+        """Create a TuningResult object.
+
+        Args:
+          config: a dict of LMS keyword arguments.
+          peak: the predicted peak device memory in bytes.
+          stall: the predicted swap stall in seconds.
+          n_swapped: the number of swapped tensors.
+        """
+        self.config = config
+        self.peak = peak
+        self.stall = stall
+        self.n_swapped = n_swapped
+
+    def __repr__(self):
+        return 'TuningResult({}, peak={}, stall={:.6f}, n_swapped={})'.format(
+            self.config, self.peak, self.stall, self.n_swapped)
+
+
+def pareto_front(results):
+    """Return the results that are not dominated in peak memory and stall,
+    sorted by increasing peak memory.
+
+    A result dominates another one if neither its peak nor its stall is
+    greater, and one of them is smaller.
+
+    Args:
+      results: a list of `TuningResult`.
+
+    Return:
+      A list of `TuningResult`.
+    """
+    front = []
+    for result in sorted(results, key=lambda r: (r.peak, r.stall)):
+        if not front or result.stall < front[-1].stall:
+            front.append(result)
+    return front
+
+
+def choose(front, budget=None):
+    """Choose a configuration on the Pareto front.
+
+    If a budget is given, the result with the smallest stall fitting in the
+    budget is chosen. Otherwise, or if no result fits, the result with the
+    smallest peak is chosen.
+
+    Args:
+      front: a list of `TuningResult` returned by `pareto_front`.
+      budget: the device memory budget in bytes, or None.
+
+    Return:
+      A `TuningResult`, or None if `front` is empty.
+    """
+    if not front:
+        return None
+    if budget is not None:
+        fitting = [r for r in front if r.peak <= budget]
+        if fitting:
+            return min(fitting, key=lambda r: (r.stall, r.peak))
+    return front[0]
+
+
+def _init_worker(sim):
+    global _worker_simulator
+    _worker_simulator = sim
+
+
+def _evaluate(task):
+    """Simulate one configuration in a worker process.
+    """
+    config, plan, bandwidth, time_per_order = task
+    profile = _worker_simulator.simulate(plan)
+    stall = _worker_simulator.swap_stall(plan, bandwidth, time_per_order)
+    return TuningResult(config, profile.peak, stall, len(plan))
+
+
+def evaluate(sim, tasks, bandwidth, time_per_order, processes=None):
+    """Simulate configurations, in a process pool if `processes` is not 0.
+
+    Args:
+      sim: a `MemorySimulator`.
+      tasks: a list of (config, plan) tuples, where a plan maps the
+        swapped tensor ids to their swap-in orders.
+      bandwidth: the host-device bandwidth in bytes per second.
+      time_per_order: the computation time of one order in seconds.
+      processes: the number of worker processes. `None` uses the number of
+        CPUs, `0` evaluates in the calling process.
+
+    Return:
+      A list of `TuningResult`, one for each task.
+    """
+    tasks = [(config, plan, bandwidth, time_per_order)
+             for config, plan in tasks]
+    if processes == 0:
+        _init_worker(sim)
+        try:
+            return [_evaluate(task) for task in tasks]
+        finally:
+            # do not keep the arrays of the simulator alive
+            _init_worker(None)
+    pool = multiprocessing.Pool(processes, initializer=_init_worker,
+                                initargs=(sim,))
+    try:
+        return pool.map(_evaluate, tasks)
+    finally:
+        pool.close()
+        pool.join()
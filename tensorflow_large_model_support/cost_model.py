@@ -0,0 +1,179 @@
+# (C) Copyright IBM Corp. 2018. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Cost model
+"""
+import numpy as np
+
+from tensorflow_large_model_support import traversal
+
+# Types of the operations whose running time is dominated by reading their
+# input tensors and writing their output tensors, so that they are cheap to
+# recompute on the device.
+ELEMENTWISE_TYPES = {'Relu', 'Relu6', 'Elu', 'Selu', 'LeakyRelu',
+                     'Sigmoid', 'Tanh', 'Softplus', 'Softsign',
+                     'BiasAdd', 'Add', 'AddV2', 'Sub', 'Mul', 'Neg',
+                     'Maximum', 'Minimum', 'Square', 'Sqrt', 'Rsqrt',
+                     'Cast', 'Identity', 'FusedBatchNorm',
+                     'FusedBatchNormV2', 'FusedBatchNormV3'}
+
+
+class CostModel(object):
+    """CostModel class computes the byte size of the tensors of a
+    `GraphIndex` from their static shapes and dtypes.
+
+    Static shapes often have unknown dimensions, e.g. the batch size. They
+    are resolved by `dim_bindings`, which is either an integer used for
+    every unknown dimension, or a dict mapping an axis to the size used for
+    the unknown dimensions on this axis, e.g. `{0: batch_size}`. A tensor
+    with an unbound dimension or an unknown rank has an unknown size, -1.
+    """
+    def __init__(self, index, dim_bindings=None):
+        """Create a CostModel object.
+
+        Args:
+          index: a `GraphIndex`.
+          dim_bindings: an integer or a dict of (axis, size). Default `None`.
+        """
+        if dim_bindings is not None and not isinstance(dim_bindings, dict):
+            dim_bindings = {None: dim_bindings}
+        for size in (dim_bindings or {}).values():
+            if int(size) < 0:
+                raise ValueError('Dimension bindings must be non-negative, '
+                                 'got {}.'.format(size))
+        self._index = index
+        self._dim_bindings = dim_bindings or {}
+        self._sizes = self._compute_sizes()
+        self._size_list = traversal.as_list(self._sizes)
+
+    def _compute_sizes(self):
+        """Return a NumPy array of the byte size of every tensor.
+        """
+        index = self._index
+        ranks = np.maximum(index.ts_rank, 0)
+        dims = index.ts_shape_dims.copy()
+        axes = (np.arange(dims.size) -
+                np.repeat(index.ts_shape_ptr[:-1], ranks))
+
+        unknown = dims < 0
+        if None in self._dim_bindings:
+            dims[unknown] = self._dim_bindings[None]
+        for axis, size in self._dim_bindings.items():
+            if axis is not None:
+                dims[unknown & (axes == axis)] = size
+
+        # a scalar has no dimension, so it has one element
+        nelems = np.ones(index.num_tensors, dtype=np.int64)
+        has_dims = np.flatnonzero(ranks > 0)
+        if has_dims.size:
+            starts = index.ts_shape_ptr[has_dims]
+            nelems[has_dims] = np.multiply.reduceat(dims, starts)
+            unbound = np.logical_or.reduceat(dims < 0, starts)
+            nelems[has_dims[unbound]] = -1
+        nelems[index.ts_rank < 0] = -1
+
+        return np.where(nelems < 0, -1, nelems * index.ts_dtype_size)
+
+    @property
+    def sizes(self):
+        """A NumPy array of the byte size of every tensor, indexed by tensor
+        id. Unknown sizes are -1.
+        """
+        return self._sizes
+
+    def tensor_bytes(self, ts_id):
+        """Return the byte size of a tensor, or -1 if it is unknown.
+
+        Args:
+          ts_id: an integer.
+        """
+        return self._size_list[ts_id]
+
+    def bytes_of(self, ts):
+        """Return the byte size of a `tf.Tensor`, or -1 if it is unknown.
+
+        Args:
+          ts: a `tf.Tensor`.
+        """
+        return self._size_list[self._index.ts_id(ts)]
+
+    def op_bytes(self, op_id):
+        """Return the total byte size of the output tensors of an operation
+        whose sizes are known.
+
+        Args:
+          op_id: an integer.
+        """
+        sizes = self._sizes[self._index.outputs(op_id)]
+        return int(sizes[sizes > 0].sum())
+
+    def io_bytes(self):
+        """Return the bytes every operation reads and writes, i.e. the total
+        size of its input and output tensors whose sizes are known.
+
+        Return:
+          A NumPy array of integers, indexed by op id.
+        """
+        index = self._index
+        sizes = np.maximum(self._sizes, 0)
+        readers = np.repeat(np.arange(index.size, dtype=np.int64),
+                            np.diff(index.op_in_ptr))
+        read = np.bincount(readers, weights=sizes[index.op_in_ts],
+                           minlength=index.size)
+        written = np.bincount(index.ts_producer, weights=sizes,
+                              minlength=index.size)
+        return (read + written).astype(np.int64)
+
+    def total_bytes(self, ts_ids):
+        """Return the total byte size of tensors whose sizes are known.
+
+        Args:
+          ts_ids: a sequence of integers.
+        """
+        sizes = self._sizes[np.asarray(ts_ids, dtype=np.int64)]
+        return int(sizes[sizes > 0].sum())
+
+    def rank(self, ts_ids):
+        """Rank tensors by decreasing byte size. Tensors of unknown size are
+        ranked last, and ties keep the given order.
+
+        Args:
+          ts_ids: a sequence of integers.
+
+        Return:
+          A NumPy array of tensor ids.
+        """
+        ts_ids = np.asarray(ts_ids, dtype=np.int64)
+        return ts_ids[np.argsort(-self._sizes[ts_ids], kind='stable')]
+
+    def op_time(self, op_id, bandwidth):
+        """Return the time an elementwise operation takes to read its input
+        tensors and write its output tensors at `bandwidth`.
+
+        Args:
+          op_id: an integer.
+          bandwidth: the device memory bandwidth in bytes per second.
+
+        Return:
+          A float in seconds, or None if the operation is not elementwise,
+          see `ELEMENTWISE_TYPES`, or the size of one of its tensors is
+          unknown.
+        """
+        if self._index.op(op_id).type not in ELEMENTWISE_TYPES:
+            return None
+        sizes = self._sizes[np.concatenate((self._index.inputs(op_id),
+                                            self._index.outputs(op_id)))]
+        if (sizes < 0).any():
+            return None
+        return int(sizes.sum()) / float(bandwidth)
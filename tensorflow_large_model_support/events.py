@@ -0,0 +1,252 @@
+# (C) Copyright IBM Corp. 2018. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Structured event log
+"""
+import json
+import numbers
+import time
+
+import tensorflow as tf
+
+try:
+    _STRING_TYPES = (str, unicode)  # Python 2
+except NameError:
+    _STRING_TYPES = (str,)
+
+
+class Event(object):
+    """Event class is a structured log record: a name, a level and fields.
+
+    The message of an event is formatted from its template and its fields
+    only when it is requested, so that events keep references to the
+    operations and tensors instead of their string forms.
+    """
+    __slots__ = ('name', 'level', 'template', 'fields', 'time')
+
+    def __init__(self, name, level, template, fields, timestamp=None):
+        """Create an Event object.
+
+        Args:
+          name: the name of the event, e.g. `swapin_added`.
+          level: the debug level, 0 for the events always logged.
+          template: a format string of the message, referring to the fields
+            by name.
+          fields: a dict of the values of the event.
+          timestamp: the time of the event in seconds since the epoch.
+            Default the current time.
+        """
+        self.name = name
+        self.level = level
+        self.template = template
+        self.fields = fields
+        self.time = time.time() if timestamp is None else timestamp
+
+    def message(self):
+        """Return the formatted message.
+        """
+        return self.template.format(**self.fields)
+
+    def to_dict(self):
+        """Return the event as a dict of JSON values. Operations and tensors
+        are given by name, and objects with a `to_dict` method by its
+        result.
+        """
+        value = {'event': self.name, 'level': self.level, 'time': self.time}
+        for key, field in self.fields.items():
+            value[key] = _to_json(field)
+        return value
+
+    def __repr__(self):
+        return 'Event({}, {})'.format(self.name, self.fields)
+
+
+def _to_json(value):
+    """Convert a field of an event to a JSON value.
+    """
+    if value is None or isinstance(value, (bool,) + _STRING_TYPES):
+        return value
+    # NumPy scalars too
+    if isinstance(value, numbers.Integral):
+        return int(value)
+    if isinstance(value, numbers.Real):
+        return float(value)
+    name = getattr(value, 'name', None)
+    if isinstance(name, _STRING_TYPES):
+        return name
+    if isinstance(value, dict):
+        return {str(k): _to_json(v) for k, v in value.items()}
+    # e.g. `RunStats` and `PlanPrediction`
+    to_dict = getattr(value, 'to_dict', None)
+    if callable(to_dict):
+        value_dict = to_dict()
+        if isinstance(value_dict, dict):
+            return _to_json(value_dict)
+    if isinstance(value, (set, frozenset)):
+        return sorted((_to_json(v) for v in value), key=str)
+    if isinstance(value, (list, tuple)):
+        return [_to_json(v) for v in value]
+    return str(value)
+
+
+class EventSink(object):
+    """EventSink class is the base class of the destinations of events.
+    """
+    def __init__(self, level=0):
+        """Create an EventSink object.
+
+        Args:
+          level: the highest debug level of the events written.
+        """
+        self.level = level
+
+    def write(self, event):
+        """Write an event.
+
+        Args:
+          event: an `Event`.
+        """
+        raise NotImplementedError()
+
+
+class LoggingSink(EventSink):
+    """LoggingSink class writes the messages of events with
+    `tf.logging.info`.
+    """
+    def write(self, event):
+        # Use tf.logging.info instead of print, since print
+        # is not thread safe, which can break tests.
+        tf.logging.info("[LMS][{}] {}".format(event.level, event.message()))
+
+
+class JSONLinesSink(EventSink):
+    """JSONLinesSink class appends events to a file, one JSON object per
+    line.
+    """
+    def __init__(self, path, level=2):
+        """Create a JSONLinesSink object.
+
+        Args:
+          path: the path of the file, or a file object.
+          level: the highest debug level of the events written. Default 2,
+            i.e. all events.
+        """
+        super(JSONLinesSink, self).__init__(level)
+        if hasattr(path, 'write'):
+            self._file = path
+            self._owned = False
+        else:
+            self._file = open(path, 'a')
+            self._owned = True
+
+    def write(self, event):
+        self._file.write(json.dumps(event.to_dict(), sort_keys=True) + '\n')
+        self._file.flush()
+
+    def close(self):
+        """Close the file if it was opened by the sink.
+        """
+        if self._owned:
+            self._file.close()
+
+
+class MemorySink(EventSink):
+    """MemorySink class keeps events in a list, e.g. for tests.
+    """
+    def __init__(self, level=2):
+        """Create a MemorySink object.
+
+        Args:
+          level: the highest debug level of the events kept. Default 2,
+            i.e. all events.
+        """
+        super(MemorySink, self).__init__(level)
+        self.events = []
+
+    def write(self, event):
+        self.events.append(event)
+
+    def names(self):
+        """Return the list of the names of the kept events.
+        """
+        return [event.name for event in self.events]
+
+
+class EventLog(object):
+    """EventLog class dispatches events to sinks.
+
+    An event is only created if a sink takes its level, so that an event
+    that is not written costs a comparison. Callers pass the values of the
+    event as they are, and leave the formatting to the sinks.
+    """
+    def __init__(self, sinks=()):
+        """Create an EventLog object.
+
+        Args:
+          sinks: a list of `EventSink`.
+        """
+        self._sinks = []
+        self._max_level = -1
+        for sink in sinks:
+            self.add_sink(sink)
+
+    @property
+    def sinks(self):
+        """A tuple of the `EventSink` of the log.
+        """
+        return tuple(self._sinks)
+
+    def add_sink(self, sink):
+        """Add a sink.
+
+        Args:
+          sink: an `EventSink`.
+        """
+        self._sinks.append(sink)
+        self._max_level = max(self._max_level, sink.level)
+
+    def remove_sink(self, sink):
+        """Remove a sink.
+
+        Args:
+          sink: an `EventSink`.
+        """
+        self._sinks.remove(sink)
+        self._max_level = max([s.level for s in self._sinks] or [-1])
+
+    def enabled(self, level):
+        """Return True if a sink takes the events of a level, e.g. to skip
+        computing the fields of an event nobody writes.
+
+        Args:
+          level: the debug level.
+        """
+        return level <= self._max_level
+
+    def emit(self, name, level, template, **fields):
+        """Write an event to the sinks taking its level.
+
+        Args:
+          name: the name of the event.
+          level: the debug level, 0 for the events always logged.
+          template: a format string of the message, referring to the fields
+            by name.
+          fields: the values of the event.
+        """
+        if level > self._max_level:
+            return
+        event = Event(name, level, template, fields)
+        for sink in self._sinks:
+            if level <= sink.level:
+                sink.write(event)
@@ -0,0 +1,237 @@
+# (C) Copyright IBM Corp. 2018. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Structural fingerprints of graphs
+"""
+import hashlib
+import re
+
+import numpy as np
+
+from tensorflow_large_model_support import graph_index
+from tensorflow_large_model_support import levelsort
+
+# Operations with these types are not part of a fingerprint
+SUMMARY_TYPES = {'ScalarSummary', 'HistogramSummary', 'ImageSummary',
+                 'AudioSummary', 'AudioSummaryV2', 'TensorSummary',
+                 'TensorSummaryV2', 'MergeSummary', 'WriteSummary',
+                 'WriteScalarSummary', 'WriteHistogramSummary',
+                 'WriteImageSummary', 'WriteAudioSummary'}
+
+
+def graph_fingerprint(graph, seed_ops=None, optimizer_scopes=None,
+                      shapes=True):
+    """Return a structural fingerprint of a graph.
+
+    The fingerprint is a Merkle hash: every operation is hashed with its
+    type, its device, the dtypes and, optionally, the static shapes of its
+    outputs, and the hashes of the operations producing its inputs. The
+    fingerprint hashes the multiset of the hashes of the operations, so that
+    it depends neither on the names of the operations nor on the order they
+    were created in. Summary operations are ignored.
+
+    If `seed_ops` is given, only the subgraph LMS works on is hashed: the
+    operations reachable from `seed_ops` and the operations in
+    `optimizer_scopes`. The inputs coming from outside of the subgraph,
+    e.g. variables, are hashed by their own types, dtypes and shapes.
+
+    Args:
+      graph: a `tf.Graph`, a list of `tf.Operation` or a `GraphIndex`.
+      seed_ops: a list of `tf.Operation`, or None to hash the whole graph.
+      optimizer_scopes: a set of scopes for the optimizers/solvers.
+      shapes: if False, the static shapes are not hashed, so that the
+        fingerprint of a model does not depend on its batch size.
+
+    Return:
+      A hexadecimal string.
+    """
+    if isinstance(graph, graph_index.GraphIndex):
+        index = graph
+    else:
+        index = graph_index.GraphIndex(graph)
+    ops = index.ops(range(index.size))
+    producers = index.ts_producer.tolist()
+    out_ptr = index.op_out_ptr.tolist()
+    in_ptr = index.op_in_ptr.tolist()
+    in_ts = index.op_in_ts.tolist()
+    ctrl_ptr = index.ctrl_in_ptr.tolist()
+    ctrl_in = index.ctrl_in.tolist()
+
+    labels = []
+    inputs = []
+    control_inputs = []
+    for i, op in enumerate(ops):
+        outputs = []
+        for ts_id in range(out_ptr[i], out_ptr[i + 1]):
+            outputs.append(index.dtype(ts_id).name)
+            if shapes:
+                outputs.append(repr(index.shape(ts_id)))
+        labels.append(_label(op.type, op.device, outputs))
+        inputs.append([(producers[t], t - out_ptr[producers[t]])
+                       for t in in_ts[in_ptr[i]:in_ptr[i + 1]]])
+        control_inputs.append(ctrl_in[ctrl_ptr[i]:ctrl_ptr[i + 1]])
+    seed_ids = None
+    if seed_ops is not None:
+        seed_ids = index.op_ids(seed_ops).tolist()
+    return _fingerprint([op.name for op in ops], [op.type for op in ops],
+                        labels, inputs, control_inputs, seed_ids,
+                        optimizer_scopes)
+
+
+def graph_def_fingerprint(graph_def, seed_names=None, optimizer_scopes=None,
+                          shapes=True):
+    """Return a structural fingerprint of a `GraphDef`, without importing
+    it into a graph. See `graph_fingerprint`.
+
+    A `GraphDef` has no dtypes and no shapes of the outputs of its nodes,
+    except the `_output_shapes` attributes written by
+    `tf.Graph.as_graph_def(add_shapes=True)`. Only these shapes are hashed,
+    so that the fingerprints of a `GraphDef` can only be compared with the
+    fingerprints of other `GraphDef` objects.
+
+    Args:
+      graph_def: a `GraphDef`.
+      seed_names: a list of the names of the seed nodes, or None to hash the
+        whole graph.
+      optimizer_scopes: a set of scopes for the optimizers/solvers.
+      shapes: if False, the shapes are not hashed.
+
+    Return:
+      A hexadecimal string.
+    """
+    nodes = list(graph_def.node)
+    node_ids = {node.name: i for i, node in enumerate(nodes)}
+    labels = []
+    inputs = []
+    control_inputs = []
+    for node in nodes:
+        outputs = []
+        if shapes and '_output_shapes' in node.attr:
+            for shape in node.attr['_output_shapes'].list.shape:
+                outputs.append('None' if shape.unknown_rank else
+                               repr(tuple(d.size for d in shape.dim)))
+        labels.append(_label(node.op, node.device, outputs))
+        node_inputs = []
+        node_control_inputs = []
+        for name in node.input:
+            if name.startswith('^'):
+                node_control_inputs.append(node_ids[name[1:]])
+                continue
+            op_name, _, idx = name.partition(':')
+            node_inputs.append((node_ids[op_name], int(idx) if idx else 0))
+        inputs.append(node_inputs)
+        control_inputs.append(node_control_inputs)
+    seed_ids = None
+    if seed_names is not None:
+        seed_ids = [node_ids[name] for name in seed_names]
+    return _fingerprint([node.name for node in nodes],
+                        [node.op for node in nodes], labels, inputs,
+                        control_inputs, seed_ids, optimizer_scopes)
+
+
+def _label(op_type, device, outputs):
+    """Return the bytes hashed for an operation on its own.
+    """
+    return '\0'.join([op_type, device] + outputs).encode('utf-8')
+
+
+def _fingerprint(names, types, labels, inputs, control_inputs, seed_ids,
+                 optimizer_scopes):
+    """Return the Merkle hash of the selected nodes of a graph given as
+    lists indexed by node ids. See `graph_fingerprint`.
+
+    Args:
+      names: a list of node names.
+      types: a list of node types.
+      labels: a list of bytes, hashed for every node on its own.
+      inputs: a list of lists of (producer id, output index) tuples.
+      control_inputs: a list of lists of node ids.
+      seed_ids: a list of node ids, or None to select every node.
+      optimizer_scopes: a set of scopes.
+    """
+    size = len(names)
+    members = [t not in SUMMARY_TYPES for t in types]
+    if seed_ids is not None:
+        members = _select(names, inputs, members, seed_ids,
+                          optimizer_scopes or ())
+
+    # edges among the selected nodes, for a topological order
+    src = []
+    dst = []
+    for i in range(size):
+        if not members[i]:
+            continue
+        for p in set([p for p, _ in inputs[i]] + control_inputs[i]):
+            if members[p]:
+                src.append(p)
+                dst.append(i)
+    ptr, idx = levelsort.csr_from_edges(size, src, dst)
+    levels = levelsort.kahn_levels(ptr, idx)
+    member_ids = np.flatnonzero(members)
+    acyclic = member_ids[levels[member_ids] >= 0]
+    order, _ = levelsort.group_by_level(levels, acyclic)
+    # nodes on cycles, e.g. in while loops, are hashed last, and see the
+    # inputs from their cycles as unselected nodes
+    order = order.tolist() + member_ids[levels[member_ids] < 0].tolist()
+
+    hashes = [None] * size
+
+    def input_hash(p):
+        if hashes[p] is not None:
+            return hashes[p]
+        return hashlib.sha1(b'\2' + labels[p]).digest()
+
+    for i in order:
+        h = hashlib.sha1(labels[i])
+        for p, k in inputs[i]:
+            h.update(input_hash(p))
+            h.update(str(k).encode('ascii'))
+        h.update(b'\1')
+        for digest in sorted(input_hash(p) for p in control_inputs[i]):
+            h.update(digest)
+        hashes[i] = h.digest()
+
+    digest = hashlib.sha256()
+    for node_hash in sorted(hashes[i] for i in order):
+        digest.update(node_hash)
+    return digest.hexdigest()
+
+
+def _select(names, inputs, members, seed_ids, optimizer_scopes):
+    """Return the flags of the nodes reachable from `seed_ids` through data
+    edges, and of the nodes in `optimizer_scopes`, among `members`.
+    """
+    size = len(names)
+    successors = [[] for _ in range(size)]
+    for i in range(size):
+        for p, _ in inputs[i]:
+            successors[p].append(i)
+    selected = [False] * size
+    frontier = [i for i in seed_ids if members[i]]
+    for i in frontier:
+        selected[i] = True
+    while frontier:
+        next_frontier = []
+        for i in frontier:
+            for j in successors[i]:
+                if members[j] and not selected[j]:
+                    selected[j] = True
+                    next_frontier.append(j)
+        frontier = next_frontier
+    patterns = [re.compile('^{}'.format(scope)) for scope in optimizer_scopes]
+    for i in range(size):
+        if (members[i] and not selected[i] and
+                any(p.match(names[i]) for p in patterns)):
+            selected[i] = True
+    return selected
@@ -0,0 +1,402 @@
+# (C) Copyright IBM Corp. 2018. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""GraphIndex
+"""
+import numpy as np
+
+from tensorflow_large_model_support import scope_index
+from tensorflow_large_model_support import traversal
+
+
+def _build_csr(n_rows, rows, cols):
+    """Build a compressed sparse row adjacency from (row, col) pairs.
+
+    The relative order of the pairs of a row is preserved.
+
+    Args:
+      n_rows: the number of rows.
+      rows: a list of row ids.
+      cols: a list of column ids, one for each item in `rows`.
+
+    Return:
+      A tuple of (ptr, idx) NumPy arrays. The columns of row `i` are
+      `idx[ptr[i]:ptr[i+1]]`.
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    cols = np.asarray(cols, dtype=np.int64)
+    ptr = np.zeros(n_rows + 1, dtype=np.int64)
+    if rows.size:
+        np.cumsum(np.bincount(rows, minlength=n_rows), out=ptr[1:])
+    idx = cols[np.argsort(rows, kind='stable')]
+    return ptr, idx
+
+
+def _unique_pairs(rows, cols):
+    """Remove duplicated (row, col) pairs, keeping the first occurrence.
+    """
+    seen = set()
+    urows = []
+    ucols = []
+    for pair in zip(rows, cols):
+        if pair not in seen:
+            seen.add(pair)
+            urows.append(pair[0])
+            ucols.append(pair[1])
+    return urows, ucols
+
+
+class GraphIndex(object):
+    """GraphIndex class is an immutable snapshot of a computational graph.
+
+    Every operation and every tensor is mapped to a dense integer id. The
+    producer/consumer relations among them are stored as NumPy arrays in
+    the compressed sparse row (CSR) format, so that the analysis passes of
+    LMS can walk the graph without touching `tf.Operation` and `tf.Tensor`
+    objects again.
+
+    The snapshot is not updated when the graph is modified. Operations
+    added to the graph after the snapshot was taken are unknown to it.
+    """
+    def __init__(self, graph):
+        """Create a GraphIndex object.
+
+        Args:
+          graph: a `tf.Graph`, or a list of `tf.Operation`.
+        """
+        if hasattr(graph, 'get_operations'):
+            ops = graph.get_operations()
+        else:
+            ops = graph
+        self._ops = list(ops)
+        self._op_ids = {op: i for i, op in enumerate(self._ops)}
+
+        # tensors are numbered op by op, so that the outputs of an op
+        # have contiguous ids
+        self._tensors = []
+        out_ptr = [0]
+        for op in self._ops:
+            self._tensors.extend(op.outputs)
+            out_ptr.append(len(self._tensors))
+        self._ts_ids = {t: i for i, t in enumerate(self._tensors)}
+        self.op_out_ptr = np.asarray(out_ptr, dtype=np.int64)
+        self.ts_producer = np.repeat(
+            np.arange(len(self._ops), dtype=np.int64),
+            np.diff(self.op_out_ptr))
+
+        # data inputs and control inputs
+        in_rows, in_cols = [], []
+        ctrl_rows, ctrl_cols = [], []
+        for i, op in enumerate(self._ops):
+            for t in op.inputs:
+                in_rows.append(i)
+                in_cols.append(self._ts_ids[t])
+            for ctrl_op in op.control_inputs:
+                ctrl_rows.append(i)
+                ctrl_cols.append(self._op_ids[ctrl_op])
+        self.op_in_ptr, self.op_in_ts = _build_csr(
+            len(self._ops), in_rows, in_cols)
+        self.ctrl_in_ptr, self.ctrl_in = _build_csr(
+            len(self._ops), ctrl_rows, ctrl_cols)
+
+        # consumers of tensors
+        cons_ts, cons_ops = _unique_pairs(in_cols, in_rows)
+        self.ts_cons_ptr, self.ts_cons_ops = _build_csr(
+            len(self._tensors), cons_ts, cons_ops)
+
+        # op-level adjacency through data edges
+        producers = self.ts_producer[np.asarray(cons_ts, dtype=np.int64)]
+        succ_rows, succ_cols = _unique_pairs(producers.tolist(), cons_ops)
+        self.succ_ptr, self.succ = _build_csr(
+            len(self._ops), succ_rows, succ_cols)
+        self.pred_ptr, self.pred = _build_csr(
+            len(self._ops), succ_cols, succ_rows)
+
+        # dtype and static shape records
+        self._dtypes = []
+        dtype_sizes = []
+        ranks = []
+        dims = []
+        for t in self._tensors:
+            self._dtypes.append(t.dtype)
+            dtype_sizes.append(t.dtype.size)
+            shape = t.get_shape()
+            if shape.ndims is None:
+                ranks.append(-1)
+            else:
+                shape_dims = [-1 if d is None else d
+                              for d in shape.as_list()]
+                ranks.append(len(shape_dims))
+                dims.extend(shape_dims)
+        self.ts_dtype_size = np.asarray(dtype_sizes, dtype=np.int64)
+        self.ts_rank = np.asarray(ranks, dtype=np.int64)
+        self.ts_shape_ptr = np.zeros(len(self._tensors) + 1, dtype=np.int64)
+        np.cumsum(np.maximum(self.ts_rank, 0), out=self.ts_shape_ptr[1:])
+        self.ts_shape_dims = np.asarray(dims, dtype=np.int64)
+
+        self._fw_traversal = None
+        self._bw_traversal = None
+        self._scope_index = None
+
+    @property
+    def size(self):
+        """The number of operations in the snapshot.
+        """
+        return len(self._ops)
+
+    @property
+    def num_tensors(self):
+        """The number of tensors in the snapshot.
+        """
+        return len(self._tensors)
+
+    def contains(self, op):
+        """Return True if `op` is in the snapshot.
+        """
+        return op in self._op_ids
+
+    def op_id(self, op):
+        """Return the id of an operation.
+
+        Args:
+          op: a `tf.Operation`.
+
+        Return:
+          An integer.
+        """
+        return self._op_ids[op]
+
+    def op_ids(self, ops):
+        """Return the ids of operations as a NumPy array.
+
+        Operations unknown to the snapshot are ignored.
+
+        Args:
+          ops: an iterable of `tf.Operation`.
+        """
+        return np.asarray([self._op_ids[op] for op in ops
+                           if op in self._op_ids], dtype=np.int64)
+
+    def op(self, op_id):
+        """Return the operation with the given id.
+        """
+        return self._ops[op_id]
+
+    def ops(self, op_ids):
+        """Return a list of operations with the given ids.
+        """
+        return [self._ops[i] for i in op_ids]
+
+    def ts_id(self, ts):
+        """Return the id of a tensor.
+
+        Args:
+          ts: a `tf.Tensor`.
+
+        Return:
+          An integer.
+        """
+        return self._ts_ids[ts]
+
+    def tensor(self, ts_id):
+        """Return the tensor with the given id.
+        """
+        return self._tensors[ts_id]
+
+    def outputs(self, op_id):
+        """Return the ids of the output tensors of an operation.
+        """
+        return np.arange(self.op_out_ptr[op_id], self.op_out_ptr[op_id + 1])
+
+    def inputs(self, op_id):
+        """Return the ids of the input tensors of an operation.
+        """
+        return self.op_in_ts[self.op_in_ptr[op_id]:self.op_in_ptr[op_id + 1]]
+
+    def control_inputs(self, op_id):
+        """Return the ids of the control inputs of an operation.
+        """
+        return self.ctrl_in[self.ctrl_in_ptr[op_id]:self.ctrl_in_ptr[op_id + 1]]
+
+    def producer(self, ts_id):
+        """Return the id of the operation producing a tensor.
+        """
+        return int(self.ts_producer[ts_id])
+
+    def consumers(self, ts_id):
+        """Return the ids of the operations consuming a tensor.
+        """
+        return self.ts_cons_ops[
+            self.ts_cons_ptr[ts_id]:self.ts_cons_ptr[ts_id + 1]]
+
+    def successors(self, op_id):
+        """Return the ids of the operations consuming an output tensor of
+        an operation.
+        """
+        return self.succ[self.succ_ptr[op_id]:self.succ_ptr[op_id + 1]]
+
+    def predecessors(self, op_id):
+        """Return the ids of the operations producing an input tensor of
+        an operation.
+        """
+        return self.pred[self.pred_ptr[op_id]:self.pred_ptr[op_id + 1]]
+
+    def dtype(self, ts_id):
+        """Return the `tf.DType` of a tensor.
+        """
+        return self._dtypes[ts_id]
+
+    def shape(self, ts_id):
+        """Return the static shape of a tensor.
+
+        Return:
+          A tuple of integers where unknown dimensions are `None`, or `None`
+          if the rank is unknown.
+        """
+        if self.ts_rank[ts_id] < 0:
+            return None
+        dims = self.ts_shape_dims[
+            self.ts_shape_ptr[ts_id]:self.ts_shape_ptr[ts_id + 1]]
+        return tuple(None if d < 0 else int(d) for d in dims)
+
+    def forward_traversal(self):
+        """Return a `Traversal` over the data edges from producers to
+        consumers.
+        """
+        if self._fw_traversal is None:
+            self._fw_traversal = traversal.Traversal(self.succ_ptr, self.succ)
+        return self._fw_traversal
+
+    def backward_traversal(self):
+        """Return a `Traversal` over the data edges from consumers to
+        producers.
+        """
+        if self._bw_traversal is None:
+            self._bw_traversal = traversal.Traversal(self.pred_ptr, self.pred)
+        return self._bw_traversal
+
+    def traversal_visits(self):
+        """Return the number of operations visited by the traversals of the
+        snapshot so far.
+        """
+        return sum(walker.visits for walker in (self._fw_traversal,
+                                                self._bw_traversal)
+                   if walker is not None)
+
+    def scope_index(self):
+        """Return a `ScopeIndex` looking up the operations by name scope and
+        type.
+        """
+        if self._scope_index is None:
+            self._scope_index = scope_index.ScopeIndex(self._ops)
+        return self._scope_index
+
+    def mask(self, ops):
+        """Return a boolean NumPy array marking the given operations.
+
+        Args:
+          ops: an iterable of `tf.Operation`.
+        """
+        mask = np.zeros(len(self._ops), dtype=bool)
+        mask[self.op_ids(ops)] = True
+        return mask
+
+    def consuming_ops(self, ts):
+        """Return the list of operations consuming a tensor.
+
+        Args:
+          ts: a `tf.Tensor`.
+        """
+        return self.ops(self.consumers(self._ts_ids[ts]))
+
+    def forward_walk(self, op_ids, within=None, inclusive=True):
+        """Return the ids of the operations reachable from `op_ids` in
+        breadth-first order.
+
+        Args:
+          op_ids: an iterable of operation ids.
+          within: a boolean NumPy array or a list of booleans. If given, only
+            operations marked in it are visited.
+          inclusive: if False, the starting operations are removed from
+            the result.
+
+        Return:
+          A list of integers.
+        """
+        return self._walk(self.forward_traversal(), op_ids, within, inclusive)
+
+    def backward_walk(self, op_ids, within=None, inclusive=True):
+        """Return the ids of the operations that can reach `op_ids` in
+        breadth-first order.
+
+        Args:
+          op_ids: an iterable of operation ids.
+          within: a boolean NumPy array or a list of booleans. If given, only
+            operations marked in it are visited.
+          inclusive: if False, the starting operations are removed from
+            the result.
+
+        Return:
+          A list of integers.
+        """
+        return self._walk(self.backward_traversal(), op_ids, within,
+                          inclusive)
+
+    def forward_walk_ops(self, ops, within=None, inclusive=True):
+        """A replacement of `tensorflow.contrib.graph_editor.get_forward_walk_ops`
+        reading the snapshot.
+
+        Args:
+          ops: a `tf.Operation` or a list of `tf.Operation`.
+          within: a boolean NumPy array, see `forward_walk`.
+          inclusive: include the given operations or not.
+
+        Return:
+          A list of `tf.Operation`.
+        """
+        if not isinstance(ops, (list, tuple, set, frozenset)):
+            ops = [ops]
+        return self.ops(self.forward_walk(self.op_ids(ops), within, inclusive))
+
+    def walks_intersection_ops(self, forward_seed_ops, backward_seed_ops):
+        """A replacement of
+        `tensorflow.contrib.graph_editor.get_walks_intersection_ops`
+        reading the snapshot.
+
+        Args:
+          forward_seed_ops: a list of `tf.Operation`.
+          backward_seed_ops: a list of `tf.Operation`.
+
+        Return:
+          A list of `tf.Operation` that are reachable from `forward_seed_ops`
+          and can reach `backward_seed_ops`.
+        """
+        fw_ids = self.forward_walk(self.op_ids(forward_seed_ops))
+        bw_ids = set(self.backward_walk(self.op_ids(backward_seed_ops)))
+        return self.ops([i for i in fw_ids if i in bw_ids])
+
+    def _walk(self, walker, op_ids, within, inclusive):
+        """Breadth-first walk with the semantics of graph_editor walks.
+        """
+        if hasattr(within, 'tolist'):
+            within = within.tolist()
+        if within is not None:
+            starts = [int(i) for i in op_ids if within[i]]
+        else:
+            starts = [int(i) for i in op_ids]
+        result = list(walker.walk(starts, within))
+        if not inclusive:
+            starts = set(starts)
+            result = [i for i in result if i not in starts]
+        return result
@@ -0,0 +1,164 @@
+# (C) Copyright IBM Corp. 2018. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Level sort
+"""
+import numpy as np
+
+from tensorflow_large_model_support import traversal
+
+
+def csr_from_edges(size, src, dst):
+    """Build a compressed sparse row adjacency from an edge list.
+
+    Args:
+      size: the number of nodes.
+      src: a NumPy array of node ids.
+      dst: a NumPy array of node ids, one for each item in `src`.
+
+    Return:
+      A tuple of (ptr, idx) NumPy arrays. The successors of node `i` are
+      `idx[ptr[i]:ptr[i+1]]`.
+    """
+    src = np.asarray(src, dtype=np.int64)
+    dst = np.asarray(dst, dtype=np.int64)
+    ptr = np.zeros(size + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=size), out=ptr[1:])
+    return ptr, dst[np.argsort(src, kind='stable')]
+
+
+def kahn_levels(ptr, idx):
+    """Return the Kahn level of every node of a CSR adjacency.
+
+    Level 0 holds the nodes without predecessors, and level `k` holds the
+    nodes whose predecessors are all in levels below `k`, i.e. the level is
+    the length of the longest path reaching the node. Nodes that are on a
+    cycle, or are reachable from a cycle, get the level -1.
+
+    Args:
+      ptr: a NumPy array of integers.
+      idx: a NumPy array of integers.
+
+    Return:
+      A NumPy array of integers.
+    """
+    size = len(ptr) - 1
+    indegree = traversal.as_list(np.bincount(idx, minlength=size))
+    ptr = traversal.as_list(ptr)
+    idx = traversal.as_list(idx)
+    levels = [-1] * size
+    frontier = [i for i in range(size) if indegree[i] == 0]
+    level = 0
+    while frontier:
+        next_frontier = []
+        for i in frontier:
+            levels[i] = level
+            for j in idx[ptr[i]:ptr[i + 1]]:
+                indegree[j] -= 1
+                if indegree[j] == 0:
+                    next_frontier.append(j)
+        frontier = next_frontier
+        level += 1
+    return np.asarray(levels, dtype=np.int64)
+
+
+def group_by_level(levels, nodes):
+    """Group nodes by level.
+
+    Args:
+      levels: a NumPy array of non-negative integers, indexed by node id.
+      nodes: a NumPy array of node ids to group.
+
+    Return:
+      A tuple of (order, level_ptr) NumPy arrays. The nodes of level `k`
+      are `order[level_ptr[k]:level_ptr[k+1]]`, in increasing id order.
+    """
+    nodes = np.sort(np.asarray(nodes, dtype=np.int64))
+    node_levels = levels[nodes]
+    order = nodes[np.argsort(node_levels, kind='stable')]
+    n_levels = int(node_levels.max()) + 1 if nodes.size else 0
+    level_ptr = np.zeros(n_levels + 1, dtype=np.int64)
+    np.cumsum(np.bincount(node_levels, minlength=n_levels),
+              out=level_ptr[1:])
+    return order, level_ptr
+
+
+def strongly_connected_components(ptr, idx, nodes):
+    """Return the strongly connected components of the subgraph induced by
+    `nodes` of a CSR adjacency, with Tarjan's algorithm.
+
+    A component is returned after all of the components its nodes have
+    edges to, e.g. in topological order of the graph if `ptr` and `idx`
+    give the predecessors of the nodes.
+
+    Args:
+      ptr: a NumPy array of integers.
+      idx: a NumPy array of integers.
+      nodes: a NumPy array of node ids.
+
+    Return:
+      A list of lists of node ids.
+    """
+    size = len(ptr) - 1
+    ptr = ptr.tolist()
+    idx = idx.tolist()
+    member = [False] * size
+    for i in nodes.tolist():
+        member[i] = True
+    number = [-1] * size
+    lowlink = [0] * size
+    on_stack = [False] * size
+    stack = []
+    components = []
+    counter = 0
+    for root in nodes.tolist():
+        if number[root] >= 0:
+            continue
+        number[root] = lowlink[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack[root] = True
+        # depth-first search with an explicit stack of (node, next edge)
+        work = [(root, ptr[root])]
+        while work:
+            i, e = work[-1]
+            if e < ptr[i + 1]:
+                work[-1] = (i, e + 1)
+                j = idx[e]
+                if not member[j]:
+                    continue
+                if number[j] < 0:
+                    number[j] = lowlink[j] = counter
+                    counter += 1
+                    stack.append(j)
+                    on_stack[j] = True
+                    work.append((j, ptr[j]))
+                elif on_stack[j] and number[j] < lowlink[i]:
+                    lowlink[i] = number[j]
+                continue
+            work.pop()
+            if work:
+                parent = work[-1][0]
+                if lowlink[i] < lowlink[parent]:
+                    lowlink[parent] = lowlink[i]
+            if lowlink[i] == number[i]:
+                component = []
+                while True:
+                    j = stack.pop()
+                    on_stack[j] = False
+                    component.append(j)
+                    if j == i:
+                        break
+                components.append(component)
+    return components
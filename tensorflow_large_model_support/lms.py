@@ -16,10 +16,21 @@
 """
 import tensorflow as tf
 import tensorflow.contrib.graph_editor as ge
-from tensorflow.contrib.graph_editor import util
 
+import itertools
 import time
-from six.moves import queue as Queue
+import numpy as np
+from tensorflow_large_model_support import autotune
+from tensorflow_large_model_support import cost_model
+from tensorflow_large_model_support import events
+from tensorflow_large_model_support import graph_index
+from tensorflow_large_model_support import plan
+from tensorflow_large_model_support import plan_cache
+from tensorflow_large_model_support import reachability
+from tensorflow_large_model_support import remat
+from tensorflow_large_model_support import rewire
+from tensorflow_large_model_support import simulator
+from tensorflow_large_model_support import stats
 from tensorflow_large_model_support import topos
 from enum import Enum
 
@@ -27,6 +38,14 @@ from enum import Enum
 class CTRLD_Strategy(Enum):
     CHAIN_RULE = 1
     DIRECT_ORDER = 2
+    TIME_MODEL = 3
+    MEMORY_PRESSURE = 4
+
+# names of the strategies accepted by the `ctrld_strategy` argument
+CTRLD_STRATEGIES = {"chain_rule": CTRLD_Strategy.CHAIN_RULE,
+                    "direct_order": CTRLD_Strategy.DIRECT_ORDER,
+                    "time_model": CTRLD_Strategy.TIME_MODEL,
+                    "memory_pressure": CTRLD_Strategy.MEMORY_PRESSURE}
 
 # Operations with these types will be excluded from swapping
 ATOMIC_TYPES = {'Const', 'Mul', 'Add',
@@ -34,6 +53,9 @@ ATOMIC_TYPES = {'Const', 'Mul', 'Add',
                 'Reshape', 'Shape', 'ShapeN',
                 'Placeholder'}
 
+# Graph collection of the operations disconnected by `LMS.revert`
+REVERTED_OPS = 'lms_reverted_ops'
+
 
 class LMS(object):
     """LMS class for Large Model Support (LMS).
@@ -66,7 +88,16 @@ class LMS(object):
                  branch_threshold=0,
                  debug=False,
                  debug_level=1,
-                 cpu_device="/cpu:0"):
+                 cpu_device="/cpu:0",
+                 dim_bindings=None,
+                 memory_budget_bytes=None,
+                 recompute=False,
+                 host_bandwidth=12e9,
+                 device_bandwidth=900e9,
+                 plan_cache_dir=None,
+                 plan_cache_max_bytes=64 * 1024 * 1024,
+                 trace_memory=False,
+                 event_sinks=None):
         """Create an LMS object to edit the graph for supporting large model.
 
         Args:
@@ -104,6 +135,16 @@ class LMS(object):
             to choose a control dependency operation. While the `direct_order` is
             more exact than `chain_rule` in relation to `lb` and `ub`, it experimentally
             often results in smaller maximum batch size than `chain_rule`.
+            A third strategy, `time_model`, estimates the transfer time of
+            the swapped tensor at `host_bandwidth` and the computation time
+            of the backward operations at `device_bandwidth`, and chooses
+            the latest operation between `lb` and `ub` whose following
+            operations hide the transfer. A fourth strategy,
+            `memory_pressure`, predicts the device memory over the
+            topological order with every tensor swapped in as late as
+            possible, and moves a swap-in earlier within `lb` and `ub` only
+            over orders where the memory stays under `memory_budget_bytes`,
+            or under the predicted peak if there is no budget.
             Default `chain_rule`.
           swap_branches: If True, LMS will swap tensors in branches in the
             forward phase. Default `False`.
@@ -114,6 +155,42 @@ class LMS(object):
           debug: debug mode for LMS. Default `False`.
           debug_level: Debug level for LMS (1 or 2). Default `1`.
           cpu_device: the device we would like swap tensors to.
+          dim_bindings: sizes used for the unknown dimensions of the static
+            shapes when computing the byte sizes of tensors. Either an
+            integer used for every unknown dimension, or a dict mapping an
+            axis to a size, e.g. `{0: batch_size}`. Default `None`.
+          memory_budget_bytes: the device memory budget for the tensors of
+            the model. If it is set, LMS simulates the peak memory over the
+            topological order and only swaps the tensors needed to bring the
+            predicted peak under the budget, moving as few bytes as
+            possible. Nothing is swapped if the model already fits.
+            Default `None`.
+          recompute: If True, LMS decides for every tensor whether it is
+            swapped, recomputed in the backward phase from its swapped or
+            retained inputs, or kept on the device, depending on the byte
+            sizes of the tensors and on the cost of the recomputation.
+            Only tensors produced by cheap elementwise operations, such as
+            ReLU, bias-add and batch normalization, are recomputed.
+            Default `False`.
+          host_bandwidth: the host-device bandwidth in bytes per second,
+            used to estimate the transfer time of tensors. Default `12e9`.
+          device_bandwidth: the device memory bandwidth in bytes per second,
+            used to estimate the computation time of operations from the
+            bytes they read and write. Default `900e9`.
+          plan_cache_dir: a local directory caching the plans of LMS. The
+            plan of a graph is stored under a hash of the structure of the
+            graph and of the parameters of LMS. If a plan is found for the
+            graph and all of its operations and tensors exist, it is applied
+            without analyzing the graph again. Default `None` (no cache).
+          plan_cache_max_bytes: the maximum total size of the plan files in
+            `plan_cache_dir`. The least recently used plans are evicted.
+            Default 64 MiB.
+          trace_memory: If True, the peak memory allocated by Python while
+            LMS runs is traced with `tracemalloc` and reported in `stats`.
+            Tracing slows LMS down. Default `False`.
+          event_sinks: a list of `events.EventSink` receiving the events of
+            LMS in addition to the `tf.logging` messages, e.g. a
+            `JSONLinesSink` or a `MemorySink`. Default `None`.
         """
         if not optimizer_scopes:
             raise ValueError('A least one optimizer scope is required.')
@@ -130,12 +207,8 @@ class LMS(object):
         self._ub = ub  # upperbound
         self._n_tensors = n_tensors
         self._fuse_swapins = fuse_swapins
-        if ctrld_strategy == "chain_rule":
-            self._ctrld_strategy = CTRLD_Strategy.CHAIN_RULE
-        elif ctrld_strategy == "direct_order":
-            self._ctrld_strategy = CTRLD_Strategy.DIRECT_ORDER
-        else:
-            self._ctrld_strategy = CTRLD_Strategy.CHAIN_RULE
+        self._ctrld_strategy = CTRLD_STRATEGIES.get(
+            ctrld_strategy, CTRLD_Strategy.CHAIN_RULE)
 
         self._swap_branches = swap_branches
         self._branch_threshold = branch_threshold
@@ -145,28 +218,143 @@ class LMS(object):
         self._excl_ops = set()
         self._incl_ops = set()
         self._grad_ops = set()
+        # flags of ops by their ids in the graph index
+        self._grad_flags = None
+        self._non_grad_flags = None
+        self._bw_order_flags = None
+        self._no_bw_order_flags = None
+        self._index = None
+        self._reach = None
+        self._cost_model = None
+        self._dim_bindings = dim_bindings
+        self._memory_budget_bytes = memory_budget_bytes
+        # ids of the tensors selected for the memory budget
+        self._budget_ts = None
+        self._recompute = recompute
+        self._remat = None
+        self._host_bandwidth = host_bandwidth
+        self._device_bandwidth = device_bandwidth
+        # cumulative computation time of the orders
+        self._order_times = None
+        # predicted device memory at every order and the memory cap of the
+        # memory_pressure strategy
+        self._pressure = None
         self._topo_sort = None
         self._cpu_device = cpu_device
         self._debug = debug
         self._debug_level = debug_level
+        # events are written to tf.logging up to the debug level, and to the
+        # given sinks
+        self._events = events.EventLog(
+            [events.LoggingSink(debug_level if debug else 0)] +
+            list(event_sinks or []))
 
         # keep log of tensors on host
         self._incpu_count = 0
+        self._incpu_bytes = 0
+        self._recompute_count = 0
+
+        # tensors that have been planned to be swapped out. The graph index
+        # is a snapshot that does not see swap ops, so it is used to avoid
+        # swapping a tensor twice.
+        self._swapped_ts = set()
+        # swapout ops of the swapped tensors, read again by the recomputed
+        # operations
+        self._swapout_ops = {}
+        # entries of the plan being built
+        self._planned_swaps = []
+        self._planned_recomputes = []
+        self._planned_kept = []
+        self._swap_plan = None
+        # edits of the inputs of existing operations, applied at once and
+        # journaled for `revert`
+        self._rewirer = rewire.Rewirer()
+        self._plan_cache = None
+        if plan_cache_dir is not None:
+            self._plan_cache = plan_cache.PlanCache(plan_cache_dir,
+                                                    plan_cache_max_bytes)
+        self._trace_memory = trace_memory
+        self._stats = stats.RunStats()
+
+    @property
+    def cost_model(self):
+        """The `CostModel` giving the byte sizes of the tensors of the graph,
+        or None before `run` is called.
+        """
+        return self._cost_model
+
+    @property
+    def events(self):
+        """The `EventLog` of LMS, e.g. to add or remove sinks.
+        """
+        return self._events
+
+    @property
+    def stats(self):
+        """The `RunStats` of the last call of `run` or `plan`.
+        """
+        return self._stats
+
+    @property
+    def swap_plan(self):
+        """The `SwapPlan` applied by `run`, empty if the model fits in the
+        memory budget, or None before `run` is called or if `run` did not
+        edit the model.
+        """
+        return self._swap_plan
+
+    def simulate(self):
+        """Simulate the memory of the model edited by `run`.
 
-        # store a dictionary of visited ops to avoid multiple visits
-        self._ops_dict = {}
+        The simulation runs on the snapshot of the original graph, over its
+        topological order, with the tensors swapped by `run`. It needs no
+        device, so that a plan can be checked before it is run on GPUs.
+
+        A plan applied from the plan cache is not analyzed by `run`, so that
+        the first call builds the topological order of the snapshot.
+
+        Return:
+          A `MemoryProfile`.
+        """
+        if self._topo_sort is None:
+            if self._swap_plan is None:
+                raise ValueError('The model has not been edited by LMS, call '
+                                 'run() first.')
+            self._order_snapshot()
+        return self._get_simulator().simulate(
+            sorted(self._index.ts_id(t) for t in self._swapped_ts))
+
+    def _order_snapshot(self):
+        """Build the topological order of the snapshot of a graph edited
+        from a cached plan, from its gradient and seed ops.
+        """
+        self._grad_flags = None
+        self._bw_order_flags = None
+        self._no_bw_order_flags = None
+        self._build_gradient_ops()
+        self._topo_sort = topos.TOPOS(self._get_seed_ops(), self._grad_ops,
+                                      index=self._index)
+        self._topo_sort.build()
+
+    def _get_simulator(self):
+        """Return a `MemorySimulator` over the topological order.
+        """
+        return simulator.MemorySimulator(
+            self._index, self._topo_sort.orders, self._cost_model.sizes,
+            self._get_grad_flags(), lb=self._lb)
 
     def _build_gradient_ops(self):
         """Return a set of operations in the backward phase.
 
         Operations in the backward phase are determined by its scope.
         """
+        scopes = self._index.scope_index()
         for scope in self._optimizer_scopes:
-            ops_for_scope = set(ge.filter_ops_from_regex(
-                ge.make_list_of_op(self._graph), "^{}".format(scope)))
+            ops_for_scope = set(self._index.ops(scopes.prefix_ops(scope)))
             if not ops_for_scope:
-                self._log_info('No operations were found with optimizer '
-                               'scope {}.'.format(scope))
+                self._log_event('no_optimizer_ops', 0,
+                                'No operations were found with optimizer '
+                                'scope {scope}.', scope=scope)
             self._grad_ops.update(ops_for_scope)
         if not self._grad_ops:
             raise ValueError('No operations were found with optimizer '
@@ -182,10 +370,10 @@ class LMS(object):
         """
         # seep ops for search
         seed_ops = set()
-        ops = ge.make_list_of_op(self._graph)
+        scopes = self._index.scope_index()
         if self._starting_scope:
-            scope_ops = set(ge.filter_ops_from_regex(ops,
-                                                     "^{}".format(self._starting_scope)))
+            scope_ops = set(self._index.ops(
+                scopes.prefix_ops(self._starting_scope)))
             if not scope_ops:
                 raise ValueError('No operations were found in starting '
                                  'scope {}.'.format(self._starting_scope))
@@ -193,8 +381,7 @@ class LMS(object):
 
         if self._starting_op_names:
             for name in self._starting_op_names:
-                name_ops = set(ge.filter_ops_from_regex(ops,
-                                                        "^{}$".format(name)))
+                name_ops = set(self._index.ops(scopes.name_ops(name)))
                 if not name_ops:
                     raise ValueError('No starting operation was found with '
                                      'name {}.'.format(name))
@@ -204,24 +391,28 @@ class LMS(object):
         if not seed_ops:
             candidates = set()
             non_grad_ops = [op
-                            for op in self._graph.get_operations()
+                            for op in self._index.ops(range(self._index.size))
                             if not (op in self._grad_ops)]
             for op in non_grad_ops:
                 for t in op.outputs:
-                    frontier_ops = set(util.get_consuming_ops(t))
+                    frontier_ops = set(self._index.consuming_ops(t))
                     if (frontier_ops & self._grad_ops):
                         candidates.add(op)
                         break
 
-            # ordering an operation by how much it covers the other ops
+            # ordering an operation by how much it covers the other ops.
+            # An op covers a candidate if the candidate is reachable from
+            # it through non-gradient ops. The ops covering the most
+            # candidates are not covered by another candidate.
+            reach = reachability.ReachabilityIndex(
+                self._index, within=self._index.mask(non_grad_ops))
+            coverage = reach.source_coverage(
+                self._index.op_ids(candidates).tolist())
             tmp_dict = {}
             max_nelems = -1
-            for op in candidates:
-                nelems = len(set(ge.get_forward_walk_ops(op, within_ops=non_grad_ops,
-                                                         inclusive=False)) &
-                             candidates)
+            for op_id, nelems in coverage.items():
                 if nelems > 0:
-                    tmp_dict[op] = nelems
+                    tmp_dict[self._index.op(op_id)] = nelems
                     max_nelems = nelems if (nelems > max_nelems) else max_nelems
 
             # seed ops will cover most of the forward ops
@@ -232,16 +423,22 @@ class LMS(object):
         """Return ops in within_ops that are in `scopes` or have a type
         in `types`.
 
+        The ops are looked up in the scope index of the graph, so that the
+        cost depends on the number of ops found rather than on the size of
+        `within_ops`.
+
         Args:
-          within_ops: an object convertible to a list of `tf.Operation`.
+          within_ops: a set of `tf.Operation`.
           scopes: a list of scope path.
           types: a list of tf.DataType.
         Return:
           A set of `tf.Operation`.
         """
+        index = self._index.scope_index()
         ret_ops = set()
         for scope in scopes:
-            ops = set(ge.get_name_scope_ops(within_ops, scope))
+            ops = {op for op in self._index.ops(index.scope_ops(scope))
+                   if op in within_ops}
             if not ops:
                 raise ValueError('No operations were found with scope'
                                  ' {}.'.format(scope))
@@ -249,10 +446,12 @@ class LMS(object):
 
         found_types = set()
         type_ops = set()
-        for op in within_ops:
-            if op.type in types:
-                found_types.add(op.type)
-                type_ops.add(op)
+        for op_type in types:
+            ops = {op for op in self._index.ops(index.type_ops(op_type))
+                   if op in within_ops}
+            if ops:
+                found_types.add(op_type)
+                type_ops |= ops
 
         # We remove ATOMIC_TYPES from the input list of types because
         # it is a constant and not user input. We only want to error if a
@@ -265,28 +464,13 @@ class LMS(object):
         ret_ops |= type_ops
         return ret_ops
 
-    def _get_forward_walk_ops(self, op, inclusive=True):
-        """ A wrapper of `tensorflow.contrib.graph_editor.get_forward_walk_ops`
-        """
-        if op in self._ops_dict:
-            if inclusive:
-                return self._ops_dict[op]
-            else:
-                return list(set(self._ops_dict[op]) - {op})
-        else:
-            ret = ge.get_forward_walk_ops(op)
-            self._ops_dict[op] = ret
-            if inclusive:
-                return ret
-            else:
-                return list(set(ret) - {op})
-
     def run(self, graph=None):
         """Edit the graph by adding swapin and swapout ops.
 
         Swapin and swapout ops are in the host.
 
-        The graph is modified in-place.
+        The graph is modified in-place. The statistics of the run are kept
+        in `stats`.
 
         Return:
           a set of added ops.
@@ -295,146 +479,586 @@ class LMS(object):
             self._graph = graph
 
         if self._n_tensors == 0:
-            self._log_info("LMS is disabled and will not modify the model.")
+            self._log_event('disabled', 0, "LMS is disabled and will not "
+                            "modify the model.")
             return  # turn off LMS
-        elif self._n_tensors < 0:
-            self._n_tensors = 0  # swap all tensors (default)
 
         if not self._graph:
             raise ValueError('The dataflow graph is required but has not been'
                              ' provided.')
 
-        self._log_info("Editing model for LMS")
-        self._print_configuration()
-        start_time = time.time()
-
-        self._build_gradient_ops()
-        seed_ops = self._get_seed_ops()
+        # the statistics only record the plan of this run
+        self._swap_plan = None
+        self._stats = stats.RunStats(self._trace_memory)
+        self._stats.start()
+        try:
+            return self._edit()
+        finally:
+            self._finish_stats(self._swap_plan)
 
-        self._log_info(
-            "Starting ops: {}".format(
-                [(op.name, op.type) for op in seed_ops]), 1)
+    def _edit(self):
+        """Edit the graph, see `run`.
 
-        reachable_ops = set()
-        for seed_op in seed_ops:
-            reachable_ops |= set(self._get_forward_walk_ops(seed_op))
-
-        for op in reachable_ops:
-            if 'lms/swap' in op.name:
-                self._log_info('This model has already been updated with LMS '
-                               'swap operations. LMS will not re-process it.')
-                return
-        # exclusive ops
-        self._excl_ops = self._filter_scopes_and_types(reachable_ops,
-                                                       self._excl_scopes,
-                                                       self._excl_types)
-        # inclusive ops
-        self._incl_ops = self._filter_scopes_and_types(reachable_ops,
-                                                       self._incl_scopes,
-                                                       self._incl_types)
+        Return:
+          a set of added ops.
+        """
+        self._log_event('editing', 0, "Editing model for LMS")
+        self._print_configuration()
+        start_time = time.time()
 
-        reachable_ops -= self._grad_ops
+        cache_key = None
+        if self._plan_cache is not None:
+            with self._stats.phase('plan_cache'):
+                self._index = self._snapshot()
+                cache_key = plan_cache.graph_key(self._index,
+                                                 self._get_cache_params())
+                added_ops = self._apply_cached_plan(cache_key)
+            if added_ops is not None:
+                self._log_event('edited_from_cache', 0,
+                                "Editing model for LMS from the plan cache, "
+                                "took: {ms} ms",
+                                ms=(time.time()-start_time)*1000)
+                return added_ops
+
+        analysis = self._analyze(self._index if cache_key else None)
+        if analysis is None:
+            self._swap_plan = None
+            return
+        seed_ops, reachable_ops = analysis
 
-        # build a topological sort
-        self._topo_sort = topos.TOPOS(seed_ops, self._grad_ops)
-        self._topo_sort.build()
-        for i in range(0, self._topo_sort.size):
-            self._log_info("[{}]: {}".format(
-                i, [op.name for op in self._topo_sort.get_ops(i)]), 1)
+        with self._stats.phase('planning'):
+            needs_swaps = self._prepare_planning(reachable_ops)
+            if needs_swaps:
+                self._swap_plan = self._build_plan(seed_ops)
+            else:
+                self._swap_plan = plan.SwapPlan()
+        if not needs_swaps:
+            if cache_key is not None:
+                with self._stats.phase('plan_cache'):
+                    self._plan_cache.put(cache_key, self._swap_plan)
+            return
 
-        self._do_action(seed_ops)
+        with self._stats.phase('applying'):
+            self._apply_plan(self._swap_plan)
+        if cache_key is not None:
+            with self._stats.phase('plan_cache'):
+                self._plan_cache.put(cache_key, self._swap_plan)
 
         # check the validation of the new model
-        new_reachable_ops = set()
-        for seed_op in seed_ops:
-            new_reachable_ops |= set(ge.get_forward_walk_ops(seed_op))
-        new_reachable_ops -= self._grad_ops
+        with self._stats.phase('validation'):
+            new_reachable_ops = set()
+            for seed_op in seed_ops:
+                new_reachable_ops |= set(ge.get_forward_walk_ops(seed_op))
+                self._stats.graph_editor_calls += 1
+            new_reachable_ops -= self._grad_ops
+            new_reachable_ops -= set(
+                self._graph.get_collection(REVERTED_OPS))
         if (new_reachable_ops >= reachable_ops):
-            self._log_info("Edited model is valid and logically equivalent to the original one")
-            self._log_info("Added {} ops into the model".format(len(new_reachable_ops - reachable_ops)))
+            self._log_event('valid', 0, "Edited model is valid and logically "
+                            "equivalent to the original one")
+            self._log_event('added_ops', 0, "Added {count} ops into the model",
+                            count=len(new_reachable_ops - reachable_ops))
         else:
-            self._log_info("Edited model is invalid. Running this may produce unexpected result")
+            self._log_event('invalid', 0, "Edited model is invalid. Running "
+                            "this may produce unexpected result")
+
+        self._log_event('edited', 0, "Editing model for LMS, took: {ms} ms",
+                        ms=(time.time()-start_time)*1000)
+        self._log_event('swapped', 0, "{count} tensors will be swapped "
+                        "out(in) to(from) the host", count=self._incpu_count)
+        self._log_event('swapped_bytes', 0, "{nbytes} bytes of tensors with a "
+                        "known size will be swapped",
+                        nbytes=self._incpu_bytes)
+        if self._recompute:
+            self._log_event('recomputed', 0, "{count} tensors will be "
+                            "recomputed in the backward phase",
+                            count=self._recompute_count)
+            self._log_event('kept_on_device', 0, "{count} tensors will be "
+                            "kept on the device",
+                            count=len(self._swap_plan.kept))
 
-        self._log_info("Editing model for LMS, took: {} ms".format(
-            (time.time()-start_time)*1000))
-        self._log_info(
-            "{} tensors will be swapped out(in) to(from) the host".format(
-                self._incpu_count))
         return (new_reachable_ops - reachable_ops)
 
-    def _do_action(self, src_ops):
-        """Add swapin and swapout ops for ops that are reachable from `src_ops`.
+    def _finish_stats(self, swap_plan):
+        """Complete the statistics of a run or a plan with the traversals
+        of the snapshot and the size of the plan.
 
         Args:
-          src_ops: a list of `tf.Operation`
+          swap_plan: the `SwapPlan` that was built, or None.
+        """
+        self._stats.stop()
+        if self._index is not None:
+            self._stats.traversal_visits = self._index.traversal_visits()
+        if swap_plan is not None:
+            self._stats.record_plan(swap_plan)
+        self._log_event('stats', 1, "LMS statistics: {stats}",
+                        stats=self._stats)
+
+    def revert(self):
+        """Undo the edits of `run`: restore the original inputs and control
+        inputs of the operations, and disconnect the swap and recompute
+        operations.
+
+        TensorFlow cannot remove operations from a graph, so the added
+        operations stay in it. Nothing reads their outputs any more, so that
+        they are not run unless they are fetched, and the next `run` ignores
+        them: they are kept in the `REVERTED_OPS` collection of the graph.
+        Another plan can then be applied to the same graph, e.g. by an `LMS`
+        object with other parameters.
+
+        This method does an in-place modification to the graph.
+
+        Return:
+          A set of the disconnected ops.
+        """
+        removed_ops = self._rewirer.revert()
+        for op in removed_ops:
+            self._graph.add_to_collection(REVERTED_OPS, op)
+        self._swap_plan = None
+        self._topo_sort = None
+        self._swapped_ts = set()
+        self._swapout_ops = {}
+        self._incpu_count = 0
+        self._incpu_bytes = 0
+        self._recompute_count = 0
+        self._log_event('reverted', 0, "Reverted the edits of LMS, "
+                        "disconnected {count} ops", count=len(removed_ops))
+        return set(removed_ops)
+
+    def _snapshot(self):
+        """Return a `GraphIndex` of the graph without the operations
+        disconnected by `revert`.
+        """
+        reverted_ops = set(self._graph.get_collection(REVERTED_OPS))
+        if not reverted_ops:
+            return graph_index.GraphIndex(self._graph)
+        return graph_index.GraphIndex(
+            [op for op in self._graph.get_operations()
+             if op not in reverted_ops])
+
+    def plan(self, graph=None):
+        """Plan the edits of LMS and predict their effect, without modifying
+        the graph.
+
+        The plan is the one `run` would apply with the same parameters. The
+        memory is predicted by simulating the topological order, with
+        recomputed tensors freed and reallocated like swapped tensors, see
+        `MemorySimulator`. Since the graph is not modified, `plan` can be
+        called again with other parameters, e.g. after changing them with
+        `autotune`, before calling `run`.
+
+        Args:
+          graph: the graph to plan LMS for. If given, it replaces the graph
+            passed to the constructor.
+
+        Return:
+          A `PlanPrediction`, or None if LMS is disabled or the model has
+          already been updated with LMS.
+        """
+        if graph:
+            self._graph = graph
+        if not self._graph:
+            raise ValueError('The dataflow graph is required but has not been'
+                             ' provided.')
+        if self._n_tensors == 0:
+            self._log_event('disabled', 0, "LMS is disabled and will not "
+                            "plan the model.")
+            return None
+
+        start_time = time.time()
+        self._stats = stats.RunStats(self._trace_memory)
+        self._stats.start()
+        swap_plan = None
+        try:
+            analysis = self._analyze()
+            if analysis is None:
+                return None
+            seed_ops, reachable_ops = analysis
+            with self._stats.phase('planning'):
+                if self._prepare_planning(reachable_ops):
+                    swap_plan = self._build_plan(seed_ops)
+                else:
+                    swap_plan = plan.SwapPlan()
+            prediction = self._predict(swap_plan)
+        finally:
+            self._finish_stats(swap_plan)
+        self._log_event('planned', 0, "Planning model for LMS, took: {ms} ms",
+                        ms=(time.time() - start_time) * 1000)
+        self._log_event('prediction', 0, "Plan prediction: {prediction}",
+                        prediction=prediction)
+        return prediction
+
+    def _prepare_planning(self, reachable_ops):
+        """Select the tensors swapped for the memory budget, and create the
+        planner of the recomputations.
+
+        Args:
+          reachable_ops: a set of forward `tf.Operation`.
+
+        Return:
+          False if the model fits in the memory budget, so that no tensor
+          needs to be swapped, and True otherwise.
+        """
+        if self._memory_budget_bytes is not None:
+            self._budget_ts = self._select_swaps_for_budget(reachable_ops)
+            if not self._budget_ts:
+                self._log_event('fits_budget', 0, "The model fits in the "
+                                "memory budget, no tensor will be swapped")
+                return False
+
+        self._remat = None
+        if self._recompute:
+            self._remat = remat.RematPlanner(
+                self._index, self._cost_model, self._topo_sort.orders,
+                self._get_grad_flags(), host_bandwidth=self._host_bandwidth,
+                device_bandwidth=self._device_bandwidth)
+        return True
+
+    def _predict(self, swap_plan):
+        """Predict the effect of a plan on the analyzed graph.
+
+        Args:
+          swap_plan: a `SwapPlan` of the analyzed graph.
+
+        Return:
+          A `PlanPrediction`.
+        """
+        get_ts_id = lambda name: self._index.ts_id(
+            self._graph.get_tensor_by_name(name))
+        get_order = lambda name: self._topo_sort.get_order(
+            self._graph.get_operation_by_name(name))
+        swapin_orders = {}
+        trigger_distances = {}
+        for swap in swap_plan.swaps:
+            orders = []
+            distances = []
+            for swapin in swap.swapins:
+                if swapin.trigger:
+                    orders.append(swapin.trigger_order + 1)
+                    distances.append(
+                        min(get_order(name) for name in swapin.consumers) -
+                        swapin.trigger_order)
+                else:
+                    orders.append(-1)
+                    distances.append(None)
+            swapin_orders[get_ts_id(swap.tensor)] = min(orders or [-1])
+            trigger_distances[swap.tensor] = distances
+        for recompute in swap_plan.recomputes:
+            ts_id = get_ts_id(recompute.tensor)
+            order = (recompute.trigger_order + 1 if recompute.trigger
+                     else -1)
+            swapin_orders[ts_id] = min(swapin_orders.get(ts_id, order),
+                                       order)
+            trigger_distances.setdefault(recompute.tensor, []).append(
+                get_order(recompute.consumer) - recompute.trigger_order
+                if recompute.trigger else None)
+
+        sim = self._get_simulator()
+        return plan.PlanPrediction(
+            swap_plan, sim.simulate(swapin_orders).peak,
+            sim.simulate([]).peak, swap_plan.transfer_bytes,
+            trigger_distances)
+
+    def autotune(self, graph=None, lb_values=(1, 2, 4, 8, 16, 32),
+                 ub_values=None, n_tensors_values=None,
+                 fuse_swapins_values=(False, True),
+                 ctrld_strategies=("chain_rule", "direct_order"),
+                 bandwidth=12e9, time_per_order=1e-4, processes=None,
+                 apply=True):
+        """Search the parameters of LMS on a simulated model of the memory
+        and of the transfers, without modifying the graph.
+
+        Every combination of the given parameter values is planned on the
+        topological order and simulated. A configuration is predicted by
+        its peak device memory and by its swap stall, the time the
+        computation waits for swap-ins that do not overlap with the
+        computation. See `MemorySimulator.swap_stall`.
+
+        Args:
+          graph: the graph to tune LMS for. If given, it replaces the graph
+            passed to the constructor.
+          lb_values: the values of `lb` to search.
+          ub_values: the values of `ub` to search. Default the `ub` of this
+            object.
+          n_tensors_values: the values of `n_tensors` to search. Default a
+            quarter, a half, three quarters and all of the tensors that
+            can be swapped.
+          fuse_swapins_values: the values of `fuse_swapins` to search.
+          ctrld_strategies: the values of `ctrld_strategy` to search.
+          bandwidth: the host-device bandwidth in bytes per second.
+          time_per_order: the computation time of one order of the
+            topological order in seconds.
+          processes: the number of worker processes simulating the
+            configurations. `None` uses the number of CPUs, `0` simulates
+            in the calling process. The configurations are always planned
+            one after the other in the calling process, since planning
+            reads the graph, which is not sent to the workers, so that
+            the pool does not speed up the planning.
+          apply: if True, the chosen configuration is set on this object,
+            so that the next `run` uses it. The configuration with the
+            smallest stall fitting in `memory_budget_bytes` is chosen, or
+            the one with the smallest peak if there is no budget or nothing
+            fits.
+
+        Return:
+          A list of `TuningResult` on the Pareto front of peak memory versus
+          stall, sorted by increasing peak memory.
+        """
+        if graph:
+            self._graph = graph
+        if not self._graph:
+            raise ValueError('The dataflow graph is required but has not been'
+                             ' provided.')
+        for strategy in ctrld_strategies:
+            if strategy not in CTRLD_STRATEGIES:
+                raise ValueError('Unknown control dependency strategy '
+                                 '{}.'.format(strategy))
+
+        start_time = time.time()
+        analysis = self._analyze()
+        if analysis is None:
+            return []
+        seed_ops, reachable_ops = analysis
+
+        swap_order = self._get_swap_order(seed_ops, reachable_ops)
+        if n_tensors_values is None:
+            n = len(swap_order)
+            n_tensors_values = sorted({max(1, n * k // 4)
+                                       for k in (1, 2, 3)}) + [-1]
+        if ub_values is None:
+            ub_values = (self._ub,)
+
+        tasks = []
+        for lb, ub, fuse_swapins, strategy in itertools.product(
+                lb_values, ub_values, fuse_swapins_values, ctrld_strategies):
+            swapins = self._plan_swapins(swap_order, lb, ub, fuse_swapins,
+                                         CTRLD_STRATEGIES[strategy])
+            for n_tensors in n_tensors_values:
+                config = {'lb': lb, 'ub': ub, 'n_tensors': n_tensors,
+                          'fuse_swapins': fuse_swapins,
+                          'ctrld_strategy': strategy}
+                candidate = (swapins if n_tensors < 0
+                             else swapins[:n_tensors])
+                tasks.append((config, dict(candidate)))
+
+        results = autotune.evaluate(self._get_simulator(), tasks, bandwidth,
+                                    time_per_order, processes=processes)
+        front = autotune.pareto_front(results)
+        self._log_event('autotuned', 0, "Evaluated {count} configurations, "
+                        "took: {ms} ms", count=len(results),
+                        ms=(time.time() - start_time) * 1000)
+        for result in front:
+            self._log_event('pareto_front', 1, "Pareto front: {result}",
+                            result=result)
+
+        if apply:
+            chosen = autotune.choose(front, self._memory_budget_bytes)
+            if chosen is not None:
+                self._lb = chosen.config['lb']
+                self._ub = chosen.config['ub']
+                self._n_tensors = chosen.config['n_tensors']
+                self._fuse_swapins = chosen.config['fuse_swapins']
+                self._ctrld_strategy = CTRLD_STRATEGIES[
+                    chosen.config['ctrld_strategy']]
+                self._log_event('chosen_configuration', 0,
+                                "Chosen configuration: {chosen}",
+                                chosen=chosen)
+        return front
+
+    def _get_swap_order(self, seed_ops, fw_ops):
+        """Return the ids of the tensors that can be swapped, in the order
+        they are visited by `_do_action`.
+
+        Args:
+          seed_ops: a list of `tf.Operation`.
+          fw_ops: a set of `tf.Operation` in the forward phase.
+
+        Return:
+          A list of integers.
         """
-        open_set = Queue.Queue()
-        closed_set = set()
+        candidates = set(self._get_swap_candidates(fw_ops))
+        walker = self._index.forward_traversal().walk(
+            self._index.op_ids(seed_ops), allowed=self._get_non_grad_flags())
+        return [ts_id
+                for op_id in walker
+                for ts_id in self._index.outputs(op_id).tolist()
+                if ts_id in candidates]
 
-        for op in src_ops:
-            open_set.put(op)
+    def _plan_swapins(self, ts_ids, lb, ub, fuse_swapins, ctrld_strategy):
+        """Predict the order at which swapped tensors would be swapped in,
+        i.e. the order after their control dependency operations.
 
-        while not open_set.empty():
-            src_op = open_set.get()
+        The graph is not modified.
+
+        Args:
+          ts_ids: a list of tensor ids.
+          lb: lower-bound value.
+          ub: upper-bound value.
+          fuse_swapins: whether swapin ops are fused.
+          ctrld_strategy: a `CTRLD_Strategy`.
+
+        Return:
+          A list of (tensor id, swap-in order) tuples. The swap-in order is
+          -1 if a swap-in has no control dependency operation, since it may
+          then run right after the swap-out.
+        """
+        orders = self._topo_sort.orders
+        grad_flags = self._get_grad_flags()
+        swapins = []
+        for ts_id in ts_ids:
+            src_op = self._index.op(self._index.producer(ts_id))
+            bw_ids = [i for i in self._index.consumers(ts_id).tolist()
+                      if grad_flags[i] and orders[i] >= 0 and
+                      self._reach.has_descendants(i)]
+            if fuse_swapins and len([i for i in bw_ids if orders[i] > 0]) >= 2:
+                bw_ids = [min(bw_ids, key=lambda i: orders[i])]
+            swapin_order = -1 if not bw_ids else None
+            for bw_id in bw_ids:
+                ctrld_op, ctrld_order = self._find_control_dependency(
+                    src_op, self._index.op(bw_id), lb, ub, ctrld_strategy)
+                order = ctrld_order + 1 if ctrld_op else -1
+                if swapin_order is None or order < swapin_order:
+                    swapin_order = order
+            swapins.append((ts_id, swapin_order))
+        return swapins
+
+    def _analyze(self, index=None):
+        """Run the analysis passes on a snapshot of the graph: find the
+        gradient ops, the seed ops, the exclusive and inclusive ops, and
+        build the topological order. The graph is not modified.
+
+        Args:
+          index: a `GraphIndex` of the current graph, or None to take a new
+            snapshot.
+
+        Return:
+          A tuple of (a list of seed `tf.Operation`, a set of forward
+          `tf.Operation` reachable from them), or None if the model has
+          already been updated with LMS or has no starting operation.
+        """
+        # take a snapshot of the graph for the analysis passes
+        if index is None:
+            index = self._snapshot()
+        self._index = index
+        self._grad_flags = None
+        self._non_grad_flags = None
+        self._bw_order_flags = None
+        self._no_bw_order_flags = None
+        self._order_times = None
+        self._pressure = None
+
+        self._cost_model = cost_model.CostModel(self._index,
+                                                self._dim_bindings)
+
+        with self._stats.phase('gradient_ops'):
+            self._build_gradient_ops()
+        with self._stats.phase('seed_ops'):
+            self._reach = reachability.ReachabilityIndex(self._index)
+            seed_ops = self._get_seed_ops()
+        if not seed_ops:
+            # e.g. every forward tensor read by the backward phase is
+            # already swapped in by LMS
+            self._log_event('no_seed_ops', 0, 'No starting operations were '
+                            'found. LMS will not process the model.')
+            return None
 
-            # get next ops before the graph is changed
-            next_ops = set()
-            for t in src_op.outputs:
-                frontier_ops = set(util.get_consuming_ops(t))
-                next_ops |= frontier_ops - self._grad_ops
+        if self._events.enabled(1):
+            self._log_event('seed_ops', 1, "Starting ops: {ops}",
+                            ops=[(op.name, op.type) for op in seed_ops])
 
+        reachable_ops = set(self._index.forward_walk_ops(seed_ops))
+
+        for op in reachable_ops:
+            if 'lms/swap' in op.name or 'lms/recompute' in op.name:
+                self._log_event('already_updated', 0, 'This model has '
+                                'already been updated with LMS swap '
+                                'operations. LMS will not re-process it.')
+                return None
+        with self._stats.phase('scope_filtering'):
+            # exclusive ops
+            self._excl_ops = self._filter_scopes_and_types(
+                reachable_ops, self._excl_scopes, self._excl_types)
+            # inclusive ops
+            self._incl_ops = self._filter_scopes_and_types(
+                reachable_ops, self._incl_scopes, self._incl_types)
+
+        reachable_ops -= self._grad_ops
+
+        # build a topological sort
+        with self._stats.phase('topos_build'):
+            self._topo_sort = topos.TOPOS(seed_ops, self._grad_ops,
+                                          index=self._index)
+            self._topo_sort.build()
+        if self._events.enabled(1):
+            for i in range(0, self._topo_sort.size):
+                self._log_event('topo_order', 1, "[{order}]: {ops}", order=i,
+                                ops=[op.name
+                                     for op in self._topo_sort.get_ops(i)])
+        return seed_ops, reachable_ops
+
+    def _build_plan(self, src_ops):
+        """Plan the swapping of the tensors that are reachable from
+        `src_ops`.
+
+        The graph is not modified.
+
+        Args:
+          src_ops: a list of `tf.Operation`
+
+        Return:
+          A `SwapPlan`.
+        """
+        self._planned_swaps = []
+        self._planned_recomputes = []
+        self._planned_kept = []
+        self._swapped_ts = set()
+        self._incpu_count = 0
+        self._incpu_bytes = 0
+        self._recompute_count = 0
+        self._do_action(src_ops)
+        return plan.SwapPlan(self._planned_swaps, self._planned_recomputes,
+                             self._planned_kept)
+
+    def _do_action(self, src_ops):
+        """Plan swapin and swapout ops for ops that are reachable from
+        `src_ops`.
+
+        Args:
+          src_ops: a list of `tf.Operation`
+        """
+        # next ops are read from the snapshot of the original graph,
+        # going through forward ops only
+        walker = self._index.forward_traversal().walk(
+            self._index.op_ids(src_ops), allowed=self._get_non_grad_flags())
+        for op_id in walker:
             # do action for src_op
-            self._insert_swap_nodes(src_op)
+            self._insert_swap_nodes(self._index.op(op_id))
             if self._swapped_max_tensors():
                 return
 
-            for op in next_ops:
-                if op in closed_set:
-                    continue
-                if op not in open_set.queue:
-                    open_set.put(op)
-
-            closed_set.add(src_op)
-
-    def _fuse_swapin_ops(self, src_op, swapout_op, bw_frontier_ops, ts0):
+    def _fuse_swapin_ops(self, src_op, bw_frontier_ops):
         """Fuse all swapin ops that swaps in the same tensor.
 
-        This method does an in-place modification to the graph.
+        The graph is not modified.
 
         Args:
           src_op: a `tf.Operation`.
-          swapout_op: a `tf.Operation`.
           bw_frontier_ops: a set of `tf.Operation`.
-          ts0: a `tf.Tensor`.
 
         Return:
-          A set of `tf.Operation` that cannot be fused.
+          A tuple of (a set of `tf.Operation` that cannot be fused, a
+          `SwapIn` for the fused ops or None).
         """
         fuse_bw_frontier_ops = {
             op for op in bw_frontier_ops
             if self._topo_sort.get_order(op) > 0}
         if len(fuse_bw_frontier_ops) >= 2:
-            with tf.device(self._cpu_device):
-                swap_in = tf.identity(ts0, name="lms/swapin")
-
-            # Connect: swap_out -> swap_in
-            self._connect_ops(swapout_op, swap_in.op)
-            self._excl_ops.add(swap_in.op)
-
-            # reuse swap_in tensors
-            for op in fuse_bw_frontier_ops:
-                # Connect: swap_in -> dest
-                input_idx = ge.sgv(
-                    op, graph=self._graph).input_index(ts0)
-                self._connect_ops(swap_in.op, op, remap_inputs=True,
-                                  idx=input_idx)
-
-                self._log_info(
-                    "{} (order {}) reuses tensor {}".format(
-                        op.name,
-                        self._topo_sort.get_order(op),
-                        ts0.name),
-                    1)
+            if self._events.enabled(1):
+                for op in fuse_bw_frontier_ops:
+                    self._log_event(
+                        'fused_swapin', 1, "{op.name} (order {order}) reuses "
+                        "tensor swapped out by {src_op.name}", op=op,
+                        order=self._topo_sort.get_order(op), src_op=src_op)
 
             # control dependency -> swap_in
             min_order = self._topo_sort.size + 1
@@ -444,10 +1068,10 @@ class LMS(object):
                 if order < min_order:
                     min_order = order
                     earliest_op = op
-            if earliest_op:
-                self._add_control_dependency(src_op, earliest_op, swap_in.op)
-            bw_frontier_ops -= fuse_bw_frontier_ops
-        return bw_frontier_ops
+            swapin = self._plan_swapin(src_op, fuse_bw_frontier_ops,
+                                       earliest_op)
+            return bw_frontier_ops - fuse_bw_frontier_ops, swapin
+        return bw_frontier_ops, None
 
     def _get_branch_ops(self, within_ops, threshold=0):
         """Get ops whose order compared to the minimum order
@@ -472,14 +1096,15 @@ class LMS(object):
         return branch_ops
 
     def _insert_swap_nodes(self, src_op):
-        """Insert swapin and swapout ops for the given operation into the graph.
+        """Plan swapin and swapout ops for the output tensors of the given
+        operation, adding them to the plan being built by `_build_plan`.
 
-        This method does an in-place modification to the graph.
+        The graph is not modified.
 
         Args:
           src_op: a `tf.Operation`
         """
-        self._log_info("Operation: {}".format(src_op), 2)
+        self._log_event('operation', 2, "Operation: {op}", op=src_op)
 
         # bypass excluded ops
         if src_op in self._excl_ops:
@@ -494,11 +1119,20 @@ class LMS(object):
             if self._swapped_max_tensors():
                 return
 
-            frontier_ops = set(util.get_consuming_ops(t))
-            self._log_info("my frontier ops: {}".format(frontier_ops), 2)
+            if t in self._swapped_ts:
+                continue
+
+            if (self._budget_ts is not None and
+                    self._index.ts_id(t) not in self._budget_ts):
+                continue
+
+            frontier_ops = set(self._index.consuming_ops(t))
+            self._log_event('frontier_ops', 2, "my frontier ops: {ops}",
+                            ops=frontier_ops)
 
             bw_frontier_ops = frontier_ops & self._grad_ops
-            self._log_info("my bw frontier ops: {}".format(bw_frontier_ops), 2)
+            self._log_event('bw_frontier_ops', 2, "my bw frontier ops: {ops}",
+                            ops=bw_frontier_ops)
 
             # swap branch ops if they are far enough (depending on threshold)
             if self._swap_branches:
@@ -511,44 +1145,273 @@ class LMS(object):
             # These bw ops can be removed by Tensorflow compiler
             bw_frontier_ops = {op
                                for op in bw_frontier_ops
-                               if set(self._get_forward_walk_ops(op, inclusive=False))}
+                               if self._reach.has_descendants(
+                                   self._index.op_id(op))}
 
             if not bw_frontier_ops:
                 continue
 
-            self._log_info("Operation: {}, order {}, type {}".format(
-                src_op.name, self._topo_sort.get_order(src_op),
-                src_op.type), 1)
-
-            # create swap_out node only if there exists a real dest. operation
-            swapout_op = None
-            for op in bw_frontier_ops:
-                if self._topo_sort.get_order(op) >= 0:
-                    swapout_op = self._add_swapout(src_op, t)
-                    self._incpu_count = self._incpu_count + 1
-                    break
-
-            # create swap_in nodes
-            if self._fuse_swapins and swapout_op:
-                bw_frontier_ops = self._fuse_swapin_ops(
-                    src_op, swapout_op, bw_frontier_ops, t)
-            for dest_op in bw_frontier_ops:
-                if self._topo_sort.get_order(dest_op) < 0:
-                    if src_op in self._grad_ops:
-                        continue
-                    else:
-                        new_src_ops = self._find_new_src_op(dest_op)
-                        for op in new_src_ops:
-                            self._insert_swap_nodes(op)
-                else:
-                    # swap_in op
-                    swapin_op = self._add_swapin(swapout_op, dest_op, t)
-                    # control dependency -> swap_in
-                    self._add_control_dependency(src_op, dest_op, swapin_op)
+            if self._events.enabled(1):
+                self._log_event('swap_candidate', 1, "Operation: {op.name}, "
+                                "order {order}, type {op.type}", op=src_op,
+                                order=self._topo_sort.get_order(src_op))
+
+            if self._remat is not None:
+                decision, op_ids = self._remat.decide(
+                    self._index.ts_id(t),
+                    lambda i: self._index.tensor(i) in self._swapped_ts)
+                if decision == remat.KEEP:
+                    self._log_event('kept', 1, "Tensor {ts.name} will be "
+                                    "kept on the device", ts=t)
+                    self._planned_kept.append(t.name)
+                    continue
+                if decision == remat.RECOMPUTE:
+                    self._plan_recompute(src_op, t, bw_frontier_ops, op_ids)
+                    continue
+
+            # swap out only if there exists a real dest. operation
+            swapped = any(self._topo_sort.get_order(op) >= 0
+                          for op in bw_frontier_ops)
+            if swapped:
+                self._swapped_ts.add(t)
+                self._incpu_count = self._incpu_count + 1
+                self._incpu_bytes += max(self._cost_model.bytes_of(t), 0)
+
+            # plan swap_in nodes
+            swapins = []
+            if self._fuse_swapins and swapped:
+                bw_frontier_ops, swapin = self._fuse_swapin_ops(
+                    src_op, bw_frontier_ops)
+                if swapin:
+                    swapins.append(swapin)
+            for dest_op in self._resolve_consumers(src_op, bw_frontier_ops):
+                swapins.append(self._plan_swapin(src_op, {dest_op}, dest_op))
+            if swapped:
+                self._planned_swaps.append(plan.TensorSwap(
+                    t.name, src_op.name, self._cost_model.bytes_of(t),
+                    sorted(swapins, key=lambda swapin: swapin.consumers)))
+
+    def _resolve_consumers(self, src_op, dest_ops):
+        """Return the backward consumers of a tensor that have an order.
+
+        A consumer without order may read the tensor as soon as it is
+        produced, so the tensor is not moved for it. Instead, the output
+        tensors of the operations found by `_find_new_src_op` are planned,
+        unless `src_op` is a backward operation.
+
+        Args:
+          src_op: a `tf.Operation` that produces the tensor.
+          dest_ops: an iterable of `tf.Operation` consuming the tensor.
+
+        Return:
+          A list of `tf.Operation`, in the order of `dest_ops`.
+        """
+        ordered_ops = []
+        for dest_op in dest_ops:
+            if self._topo_sort.get_order(dest_op) >= 0:
+                ordered_ops.append(dest_op)
+            elif src_op not in self._grad_ops:
+                for op in self._find_new_src_op(dest_op):
+                    self._insert_swap_nodes(op)
+        return ordered_ops
+
+    def _plan_swapin(self, src_op, dest_ops, bw_op):
+        """Plan a swapin op of a tensor generated by `src_op`.
+
+        Args:
+          src_op: a `tf.Operation`.
+          dest_ops: a set of `tf.Operation` consuming the swapin op.
+          bw_op: the `tf.Operation` of `dest_ops` that runs first.
+
+        Return:
+          A `SwapIn`.
+        """
+        ctrld_op, ctrld_order = self._plan_control_dependency(src_op, bw_op)
+        return plan.SwapIn(sorted(op.name for op in dest_ops),
+                           ctrld_op.name if ctrld_op else None,
+                           ctrld_order)
+
+    def _plan_recompute(self, src_op, ts0, bw_frontier_ops, op_ids):
+        """Plan the recomputation of a tensor for its backward consumers.
+
+        Args:
+          src_op: a `tf.Operation` that produces the tensor `ts0`.
+          ts0: a `tf.Tensor`.
+          bw_frontier_ops: a set of `tf.Operation` consuming `ts0`.
+          op_ids: the ids of the operations computing `ts0`, see
+            `RematPlanner.decide`.
+        """
+        op_names = [op.name for op in self._index.ops(op_ids)]
+        dest_ops = sorted(bw_frontier_ops, key=lambda op: op.name)
+        dest_ops = self._resolve_consumers(src_op, dest_ops)
+        for dest_op in dest_ops:
+            ctrld_op, ctrld_order = self._plan_control_dependency(src_op,
+                                                                  dest_op)
+            self._planned_recomputes.append(plan.Recompute(
+                ts0.name, src_op.name, self._cost_model.bytes_of(ts0),
+                dest_op.name, op_names,
+                ctrld_op.name if ctrld_op else None, ctrld_order))
+        # recompute only if there exists a real dest. operation
+        if dest_ops:
+            self._remat.mark_recomputed(self._index.ts_id(ts0))
+            self._recompute_count += 1
+
+    def _apply_plan(self, swap_plan):
+        """Edit the graph from a plan.
+
+        The swap and recompute operations are added to the graph first, and
+        the inputs of the existing operations are rewired in a single pass
+        at the end.
+
+        This method does an in-place modification to the graph.
+
+        Args:
+          swap_plan: a `SwapPlan`.
+
+        Return:
+          A list of the added `tf.Operation`.
+        """
+        num_ops = len(self._graph.get_operations())
+        get_op = self._graph.get_operation_by_name
+        for swap in swap_plan.swaps:
+            ts0 = self._graph.get_tensor_by_name(swap.tensor)
+            swapout_op = self._add_swapout(ts0)
+            self._swapout_ops[ts0] = swapout_op
+            for swapin in swap.swapins:
+                swapin_op = self._add_swapin(
+                    swapout_op, [get_op(name) for name in swapin.consumers],
+                    ts0)
+                # control dependency -> swap_in
+                if swapin.trigger:
+                    self._rewirer.add_control_input(swapin_op,
+                                                    get_op(swapin.trigger))
+
+        # recomputed ops may read swapped tensors
+        for recompute in swap_plan.recomputes:
+            self._add_recompute(
+                self._graph.get_tensor_by_name(recompute.tensor),
+                get_op(recompute.consumer),
+                [get_op(name) for name in recompute.ops],
+                get_op(recompute.trigger) if recompute.trigger else None)
+
+        # operations are listed in the order they were added to the graph
+        added_ops = self._graph.get_operations()[num_ops:]
+        self._rewirer.add_ops(added_ops)
+        num_edits = self._rewirer.apply()
+        self._stats.graph_edits += num_edits
+        self._stats.added_ops += len(added_ops)
+        self._log_event('rewired', 1, "Rewired {count} inputs and control "
+                        "inputs", count=num_edits)
+        return added_ops
+
+    def _apply_cached_plan(self, key):
+        """Apply the plan cached for a key if its operations and tensors
+        match the graph, see `_plan_matches_graph`.
+
+        This method does an in-place modification to the graph.
+
+        Args:
+          key: a key of the plan cache.
 
-    def _add_swapout(self, src_op, ts0):
-        """Add a swapout operation to the graph to swap out the output tensor `ts0`
-        of the operation `src_op`.
+        Return:
+          A set of added ops, or None if no usable plan is cached.
+        """
+        swap_plan = self._plan_cache.get(key)
+        if swap_plan is None:
+            return None
+        if not self._plan_matches_graph(swap_plan):
+            self._log_event('cached_plan_mismatch', 0, "The cached plan "
+                            "does not match the operations of the graph, it "
+                            "will not be used.")
+            return None
+        self._log_event('cached_plan', 0, "Applying the cached plan "
+                        "{swap_plan}", swap_plan=swap_plan)
+
+        self._cost_model = cost_model.CostModel(self._index,
+                                                self._dim_bindings)
+        self._topo_sort = None
+        self._swap_plan = swap_plan
+        self._swapped_ts = {self._graph.get_tensor_by_name(name)
+                            for name in swap_plan.swapped_tensors}
+        self._incpu_count = len(swap_plan.swaps)
+        self._incpu_bytes = swap_plan.total_bytes
+        self._recompute_count = len({recompute.tensor
+                                     for recompute in swap_plan.recomputes})
+        return set(self._apply_plan(swap_plan))
+
+    def _plan_matches_graph(self, swap_plan):
+        """Return True if all of the operations and tensors named in a plan
+        exist in the graph and are connected like in the graph the plan was
+        made for: a swapped or recomputed tensor is produced by its source
+        operation and read by its consumers.
+
+        Plans are cached under the structure of the graph, which ignores
+        the names of the operations, so that two graphs with the same key
+        may give a name to different operations, e.g. if Keras layers are
+        created in another order.
+
+        Args:
+          swap_plan: a `SwapPlan`.
+        """
+        get_op = self._graph.get_operation_by_name
+        get_ts = self._graph.get_tensor_by_name
+
+        def reads(op_name, ts):
+            return any(t is ts for t in get_op(op_name).inputs)
+
+        try:
+            for swap in swap_plan.swaps:
+                ts = get_ts(swap.tensor)
+                if ts.op is not get_op(swap.src_op):
+                    return False
+                for swapin in swap.swapins:
+                    if not all(reads(name, ts) for name in swapin.consumers):
+                        return False
+                    if swapin.trigger:
+                        get_op(swapin.trigger)
+            for recompute in swap_plan.recomputes:
+                ts = get_ts(recompute.tensor)
+                ops = [get_op(name) for name in recompute.ops]
+                if (ts.op is not get_op(recompute.src_op) or
+                        not any(op is ts.op for op in ops) or
+                        not reads(recompute.consumer, ts)):
+                    return False
+                if recompute.trigger:
+                    get_op(recompute.trigger)
+        except (KeyError, ValueError):
+            return False
+        return True
+
+    def _get_cache_params(self):
+        """Return a dict of the parameters of LMS that change its plan.
+        """
+        dim_bindings = self._dim_bindings
+        if isinstance(dim_bindings, dict):
+            dim_bindings = sorted(dim_bindings.items())
+        return {'optimizer_scopes': sorted(self._optimizer_scopes),
+                'starting_scope': self._starting_scope,
+                'starting_op_names': (sorted(self._starting_op_names)
+                                      if self._starting_op_names else None),
+                'excl_scopes': sorted(self._excl_scopes),
+                'incl_scopes': sorted(self._incl_scopes),
+                'excl_types': sorted(self._excl_types),
+                'incl_types': sorted(self._incl_types),
+                'lb': self._lb,
+                'ub': self._ub,
+                # a negative n_tensors swaps all tensors
+                'n_tensors': max(self._n_tensors, 0),
+                'fuse_swapins': self._fuse_swapins,
+                'ctrld_strategy': self._ctrld_strategy.name,
+                'swap_branches': self._swap_branches,
+                'branch_threshold': self._branch_threshold,
+                'dim_bindings': dim_bindings,
+                'memory_budget_bytes': self._memory_budget_bytes,
+                'recompute': self._recompute,
+                'host_bandwidth': self._host_bandwidth,
+                'device_bandwidth': self._device_bandwidth}
+
+    def _add_swapout(self, ts0):
+        """Add a swapout operation to the graph to swap out the tensor `ts0`.
 
         This method does an in-place modification to the graph.
 
@@ -563,32 +1426,30 @@ class LMS(object):
         ```
 
         Args:
-          src_op: a `tf.Operation` that produces the tensor `ts0`.
-          ts0: a output `tf.Tensor` of `src_op` being swapped out.
+          ts0: a `tf.Tensor` being swapped out.
 
         Return:
           A `tf.Operation` newly added to the graph.
         """
         with tf.device(self._cpu_device):
             swap_out = tf.identity(ts0, name="lms/swapout")
-
-        # Connect: src-node -> swap-out
-        src_svg = ge.sgv(src_op, graph=self._graph)
-        src_out_idx = src_svg.output_index(ts0)
-        self._connect_ops(src_op, swap_out.op, remap_outputs=True,
-                          idx=src_out_idx)
         self._excl_ops.add(swap_out.op)
-        self._log_info("Tensor {} will be placed on {}".format(
-            ts0.name, self._cpu_device), 1)
+        if self._events.enabled(1):
+            self._log_event('swapout_added', 1, "Tensor {ts.name} ({nbytes} "
+                            "bytes) will be placed on {device}", ts=ts0,
+                            nbytes=self._cost_model.bytes_of(ts0),
+                            device=self._cpu_device)
 
         return swap_out.op
 
-    def _add_swapin(self, swapout_op, dest_op, ts0):
+    def _add_swapin(self, swapout_op, dest_ops, ts0):
         """Add a swapin operation to the graph. The swapin ops reads
-        the output tensor of `swapout_op` and passes it to `dest_op`,
-        replacing the input tensor `ts0` of `dest_op`.
+        the output tensor of `swapout_op` and passes it to `dest_ops`,
+        replacing their input tensor `ts0`.
 
-        This method does an in-place modification to the graph.
+        This method does an in-place modification to the graph. The inputs
+        of `dest_ops` are replaced when the edits of the rewirer are
+        applied.
 
         Example: the graph before and after this method invoked.
         ```
@@ -602,66 +1463,160 @@ class LMS(object):
 
         Args:
           swapout_op: a `tf.Operation` that swapped out the tensor `ts0`.
-          dest_op: a `tf.Operation` that will consume the output tensor of `swapout_op`.
-          ts0: a `tf.Tensor` being the original input tensor of `dest_op`.
+          dest_ops: a list of `tf.Operation` that will consume the output
+            tensor of `swapout_op`.
+          ts0: a `tf.Tensor` being the original input tensor of `dest_ops`.
 
         Return:
           A `tf.Operation` newly added to the graph.
         """
-        with tf.device(self._cpu_device):
-            swap_in = tf.identity(ts0, name="lms/swapin")
-
         # Connect: swap_out -> swap_in
-        self._connect_ops(swapout_op, swap_in.op)
+        with tf.device(self._cpu_device):
+            swap_in = tf.identity(swapout_op.outputs[0], name="lms/swapin")
 
         # Connect: swap_in -> dest
-        dest_svg = ge.sgv(dest_op, graph=self._graph)
-        input_idx = dest_svg.input_index(ts0)
-        self._connect_ops(swap_in.op, dest_op, remap_inputs=True, idx=input_idx)
+        self._rewirer.reroute(ts0, swap_in, dest_ops)
+        if self._events.enabled(1):
+            for dest_op in dest_ops:
+                self._log_event('swapin_added', 1, "Consuming op "
+                                "{op.name} (order {order}) swaps in "
+                                "{ts.name}", op=dest_op,
+                                order=self._get_order(dest_op), ts=ts0)
         self._excl_ops.add(swap_in.op)
 
-        self._log_info("Consuming op {} (order {}) swaps in {}".format(
-            dest_op.name, self._topo_sort.get_order(dest_op),
-            ts0.name), 1)
-
         return swap_in.op
 
-    def _add_control_dependency(self, fw_op, bw_op, swapin_op):
-        """Find and add a control dependency to the graph.
+    def _add_recompute(self, ts0, dest_op, ops, ctrld_op):
+        """Add a copy of the operations computing the tensor `ts0` to the
+        graph, and pass the copy of `ts0` to `dest_op` instead of `ts0`.
+        The inputs of the copied operations that have been swapped out are
+        swapped in again.
 
-        This method does an in-place modification to the graph.
+        This method does an in-place modification to the graph. The input
+        of `dest_op` and the control inputs are changed when the edits of
+        the rewirer are applied.
+
+        Example: the graph before and after this method invoked.
+        ```
+        Before
+          |ts1| -> (swapout_op)
+          |ts1| -> (op) -> |ts0| -> (dest_op)
+
+        After:
+          |ts1| -> (swapout_op) -> (swapin_op) -> (op_copy) -> (dest_op)
+          |ts1| -> (op) -> |ts0|
+        ```
+
+        Args:
+          ts0: a `tf.Tensor` being the original input tensor of `dest_op`.
+          dest_op: a `tf.Operation` that will consume the copy of `ts0`.
+          ops: a list of `tf.Operation` computing `ts0`, producers first.
+          ctrld_op: the control dependency `tf.Operation` of the copy, or
+            None.
+
+        Return:
+          A list of `tf.Operation` newly added to the graph.
+        """
+        swapin_ops = []
+        replacements = {}
+        for op in ops:
+            for t in op.inputs:
+                if t in self._swapout_ops and t not in replacements:
+                    # Connect: swap_out -> swap_in
+                    with tf.device(self._cpu_device):
+                        swap_in = tf.identity(
+                            self._swapout_ops[t].outputs[0],
+                            name="lms/swapin")
+                    self._excl_ops.add(swap_in.op)
+                    swapin_ops.append(swap_in.op)
+                    replacements[t] = swap_in
+
+        copied_ops, copied_ts = rewire.copy_ops(
+            self._graph, ops, replacements, "lms/recompute")
+        self._excl_ops.update(copied_ops)
+
+        # Connect: copy of ts0 -> dest
+        self._rewirer.reroute(ts0, copied_ts[ts0], [dest_op])
+
+        # control dependency -> the first operations of the copy
+        if ctrld_op:
+            inside = set(ops)
+            first_ops = [copy for op, copy in zip(ops, copied_ops)
+                         if not any(t.op in inside for t in op.inputs)]
+            for op in swapin_ops + first_ops:
+                self._rewirer.add_control_input(op, ctrld_op)
+
+        if self._events.enabled(1):
+            self._log_event('recompute_added', 1, "Consuming op {op.name} "
+                            "(order {order}) recomputes {ts.name} with "
+                            "{count} ops", op=dest_op,
+                            order=self._get_order(dest_op), ts=ts0,
+                            count=len(copied_ops))
+        return swapin_ops + copied_ops
+
+    def _plan_control_dependency(self, fw_op, bw_op):
+        """Find a control dependency operation for the swapin op of a tensor
+        generated by `fw_op` and consumed by `bw_op`, with the lower-bound,
+        upper-bound and strategy of this object.
+
+        The graph is not modified.
 
         Args:
           fw_op: a `tf.Operation`.
           bw_op: a `tf.Operation`.
-          swapin_op: a `tf.Operation`.
+
+        Return:
+          A tuple of (`tf.Operation`, its order), or (None, -1) if no
+          operation was found.
+        """
+        ctrld_op, ctrld_order = self._find_control_dependency(
+            fw_op, bw_op, self._lb, self._ub, self._ctrld_strategy)
+        if ctrld_op:
+            if (self._ctrld_strategy is CTRLD_Strategy.MEMORY_PRESSURE and
+                    fw_op not in self._grad_ops):
+                self._add_pressure(fw_op, bw_op, ctrld_order)
+            self._log_event('control_dependency', 1, "Control dependency op "
+                            "{op.name},  order: {order}", op=ctrld_op,
+                            order=ctrld_order)
+        else:
+            self._log_event('no_control_dependency', 1, "No control "
+                            "dependency op needed for swap in of op "
+                            "{op.name}.", op=fw_op)
+
+        return ctrld_op, ctrld_order
+
+    def _find_control_dependency(self, fw_op, bw_op, lb, ub, ctrld_strategy):
+        """Find a control dependency operation for the swapin op of a tensor
+        generated by `fw_op` and consumed by `bw_op`.
+
+        The graph is not modified.
+
+        Args:
+          fw_op: a `tf.Operation`.
+          bw_op: a `tf.Operation`.
+          lb: lower-bound value.
+          ub: upper-bound value.
+          ctrld_strategy: a `CTRLD_Strategy`.
+
+        Return:
+          A tuple of (`tf.Operation`, its order), or (None, -1) if no
+          operation was found.
         """
         # if lb is out of range, reset it to make sure
         # that a control dependency op will be found
-        lb = self._lb
         if (self._topo_sort.get_order(bw_op) - lb <=
                 self._topo_sort.get_order(fw_op)):
             lb = 1
         if fw_op in self._grad_ops:
-            re = self._do_direct_order(fw_op, bw_op, lb, self._ub)
-        elif self._ctrld_strategy is CTRLD_Strategy.CHAIN_RULE:
-            re = self._do_chain_rule(fw_op, bw_op, lb, self._ub)
-        elif self._ctrld_strategy is CTRLD_Strategy.DIRECT_ORDER:
-            re = self._do_direct_order(fw_op, bw_op, lb, self._ub)
-        else:
-            re = self._do_chain_rule(fw_op, bw_op, lb, self._ub)
-
-        ctrld_op = re[0]
-        ctrld_order = re[1]
-        if ctrld_op:
-            ge.add_control_inputs(swapin_op, ctrld_op)
-            self._log_info(
-                "Control dependency op {},  order: {}".format(
-                    ctrld_op.name, ctrld_order), 1)
+            return self._do_direct_order(fw_op, bw_op, lb, ub)
+        elif ctrld_strategy is CTRLD_Strategy.DIRECT_ORDER:
+            return self._do_direct_order(fw_op, bw_op, lb, ub)
+        elif ctrld_strategy is CTRLD_Strategy.TIME_MODEL:
+            return self._do_time_model(fw_op, bw_op, lb, ub)
+        elif ctrld_strategy is CTRLD_Strategy.MEMORY_PRESSURE:
+            return self._do_memory_pressure(fw_op, bw_op, lb, ub)
         else:
-            self._log_info(
-                "No control dependency op needed for swap in of op {}.".format(
-                    fw_op.name), 1)
+            return self._do_chain_rule(fw_op, bw_op, lb, ub)
 
     def _find_new_src_op(self, original_op):
         """Find a set of new operations to swap out their output tensors.
@@ -681,37 +1636,14 @@ class LMS(object):
           A set of `tf.Operation`.
         """
         src_ops = set()
-        open_set = Queue.Queue()
-        closed_set = set()
-
-        open_set.put(original_op)
-
-        while not open_set.empty():
-            src_op = open_set.get()
-
+        traversal = self._index.forward_traversal()
+        has_order = self._get_bw_order_flags()
+        # go through ops without order only
+        for op_id in traversal.walk([self._index.op_id(original_op)],
+                                    allowed=self._no_bw_order_flags):
             # do action for src_op
-            next_ops = set()
-
-            frontier_ops = set()
-            for t in src_op.outputs:
-                frontier_ops |= set(util.get_consuming_ops(t))
-            has_order_ops = {
-                op
-                for op in frontier_ops
-                if (self._topo_sort.get_order(op) >
-                    self._topo_sort.bw_starting_order)
-            }
-            if has_order_ops:
-                src_ops.add(src_op)
-
-            next_ops = frontier_ops - has_order_ops
-            for op in next_ops:
-                if op in closed_set:
-                    continue
-                if op not in open_set.queue:
-                    open_set.put(op)
-
-            closed_set.add(src_op)
+            if any(has_order[i] for i in traversal.neighbors(op_id)):
+                src_ops.add(self._index.op(op_id))
         return src_ops
 
     def _do_chain_rule(self, fw_op, bw_op, lower_b, upper_b):
@@ -744,29 +1676,23 @@ class LMS(object):
         if (bw_order - lower_b) < self._topo_sort.bw_starting_order:
             return self._do_direct_order(fw_op, bw_op, lower_b, upper_b)
 
-        open_set1 = Queue.Queue()
-        open_set2 = Queue.Queue()
-        closed_set = set()
-
-        open_set1.put(fw_op)
-
+        traversal = self._index.forward_traversal()
+        is_grad = self._get_grad_flags()
         result_ops = set()
-        while not open_set1.empty():
+        # go down level by level through forward ops
+        for level in traversal.levels([self._index.op_id(fw_op)],
+                                      allowed=self._get_non_grad_flags()):
             # stop if reaching the upperbound
             if upper_b == 0 or (lower_b > upper_b):
                 break
 
-            src_op = open_set1.get()
-
-            # do action for src_op
-            total_consumming_ops = set()
-            for t in src_op.outputs:
-                consumming_ops = set(util.get_consuming_ops(t))
-                total_consumming_ops |= consumming_ops
-
             if lower_b <= 0:
                 # inside the range
-                consumming_ops_bw = total_consumming_ops & self._grad_ops
+                consumming_ops_bw = {
+                    self._index.op(i)
+                    for src_id in level
+                    for i in traversal.neighbors(src_id)
+                    if is_grad[i]}
                 # check validation
                 consumming_ops_bw = {
                     op
@@ -781,22 +1707,11 @@ class LMS(object):
                     for op in consumming_ops_bw
                     if "/cond/" not in op.name}
                 result_ops |= consumming_ops_bw
+            if result_ops:
+                break
             # go to the next level
-            next_ops = total_consumming_ops - self._grad_ops
-            for op in next_ops:
-                if op in closed_set:
-                    continue
-                if op not in open_set2.queue:
-                    open_set2.put(op)
-
-            closed_set.add(src_op)
-            if open_set1.empty():
-                if result_ops:
-                    break
-                lower_b = lower_b - 1
-                upper_b = upper_b - 1
-                while not open_set2.empty():
-                    open_set1.put(open_set2.get())
+            lower_b = lower_b - 1
+            upper_b = upper_b - 1
         if result_ops:
             ctrld_op = next(iter(result_ops))
             return (ctrld_op, self._topo_sort.get_order(ctrld_op))
@@ -831,16 +1746,10 @@ class LMS(object):
         range_ub = src_order - lower_b
         range_lb = max([src_order - upper_b, fw_order]) + 1
 
+        src_id = self._index.op_id(src_op)
         ctrld_order = -1
         for i in reversed(range(range_lb, range_ub)):
-            candidates = self._topo_sort.get_ops(i)
-            # on the chain rule path
-            candidates = {op
-                          for op in candidates
-                          if src_op in set(self._get_forward_walk_ops(op))}
-            candidates = {op
-                          for op in candidates
-                          if "/cond/" not in op.name}
+            candidates = self._get_ctrld_candidates(i, src_id)
             if candidates:
                 result_ops |= candidates
                 ctrld_order = i
@@ -852,50 +1761,353 @@ class LMS(object):
         else:
             return (None, -1)
 
-    def _log_info(self, message, level=0):
-        """Log debug information.
+    def _do_time_model(self, fw_op, bw_op, lower_b, upper_b):
+        """Find a control dependency operation using the estimated transfer
+        time of the swapped tensor and the estimated computation time of
+        the orders.
+
+        The swap-in starts after the control dependency operation and
+        overlaps with the computation of the orders until `bw_op`. The latest
+        operation whose following orders hide the transfer is chosen, or the
+        earliest one if none does.
 
         Args:
-          message: a formatted string.
-          level: an `integer`.
+          fw_op: a `tf.Operation` that has a tensor swapped out.
+          bw_op: a `tf.Operation` that consumes a tensor swapped in.
+          lower_b: an `integer`. The distance in the topological order
+            between `bw_op` and a candidate for control dependency ops
+            must be greater than `lower_b`.
+          upper_b: an `integer`. The distance in the topological order
+            between `bw_op` and a candidate for control dependency ops
+            must be smaller than `upper_b`
+
+        Return:
+          A tuple of (`tf.Operation`, an `integer`). The first item is
+          the control dependency operation that triggers swapping in the input
+          tensor of `bw_op`. The second item is the order of the control
+          dependency operation in the topological order.
         """
-        if level == 0 or (self._debug and self._debug_level >= level):
-            # Use tf.logging.info instead of print, since print
-            # is not thread safe, which can break tests.
-            tf.logging.info("[LMS][{}] {}".format(level, message))
+        fw_order = self._topo_sort.get_order(fw_op)
+        bw_order = self._topo_sort.get_order(bw_op)
+        range_ub = bw_order - lower_b
+        range_lb = max([bw_order - upper_b, fw_order]) + 1
+        if range_lb >= range_ub:
+            return (None, -1)
 
-    def _print_configuration(self):
-        """Print configuration information about LMS.
+        bw_id = self._index.op_id(bw_op)
+        transfer = (self._cost_model.total_bytes(
+            self._get_swapped_ids(fw_op, bw_op)) /
+            float(self._host_bandwidth))
+
+        # the latest order i where the orders in (i, bw_order) hide the
+        # transfer, i.e. cum[bw_order] - cum[i + 1] >= transfer
+        cum = self._get_order_times()
+        latest = int(np.searchsorted(cum, cum[bw_order] - transfer,
+                                     side='right')) - 2
+        for i in reversed(range(range_lb, min(latest, range_ub - 1) + 1)):
+            candidates = self._get_ctrld_candidates(i, bw_id)
+            if candidates:
+                return (next(iter(candidates)), i)
+        # the transfer cannot be hidden, start it as early as possible
+        for i in range(max(latest + 1, range_lb), range_ub):
+            candidates = self._get_ctrld_candidates(i, bw_id)
+            if candidates:
+                return (next(iter(candidates)), i)
+        return (None, -1)
+
+    def _do_memory_pressure(self, fw_op, bw_op, lower_b, upper_b):
+        """Find a control dependency operation using the predicted device
+        memory at every order.
+
+        The swapped tensors are first predicted to be swapped in as late as
+        possible, see `_get_pressure`. The swap-in of the tensor consumed by
+        `bw_op` is then moved earlier only over orders where the device
+        memory stays under the cap, so that it does not add to the peaks of
+        the backward phase. The earliest such operation is chosen, to hide
+        the transfer, or the latest one if the tensor fits nowhere else.
+
+        Args:
+          fw_op: a `tf.Operation` that has a tensor swapped out.
+          bw_op: a `tf.Operation` that consumes a tensor swapped in.
+          lower_b: an `integer`. The distance in the topological order
+            between `bw_op` and a candidate for control dependency ops
+            must be greater than `lower_b`.
+          upper_b: an `integer`. The distance in the topological order
+            between `bw_op` and a candidate for control dependency ops
+            must be smaller than `upper_b`
+
+        Return:
+          A tuple of (`tf.Operation`, an `integer`). The first item is
+          the control dependency operation that triggers swapping in the input
+          tensor of `bw_op`. The second item is the order of the control
+          dependency operation in the topological order.
         """
-        if self._n_tensors == 0:
-            self._log_info("n_tensors: all tensors")
-        else:
-            self._log_info("n_tensors: {}".format(self._n_tensors))
-        self._log_info("lb: {}".format(self._lb))
+        fw_order = self._topo_sort.get_order(fw_op)
+        bw_order = self._topo_sort.get_order(bw_op)
+        range_ub = bw_order - lower_b
+        range_lb = max([bw_order - upper_b, fw_order]) + 1
+        if range_lb >= range_ub:
+            return (None, -1)
 
-    def _connect_ops(self, src_op, dest_op, remap_inputs=False,
-                     remap_outputs=False, idx=None, disconnect_first=False):
-        """A wrapper of `tensorflow.contrib.graph_editor.connect`.
+        bw_id = self._index.op_id(bw_op)
+        size = self._cost_model.total_bytes(
+            self._get_swapped_ids(fw_op, bw_op))
+        profile, cap = self._get_pressure()
+        # item k is the peak memory in the orders (range_lb + k, range_ub),
+        # where the tensor would be added by a swap-in after order
+        # range_lb + k
+        window = profile[range_lb + 1:range_ub]
+        peaks = np.append(np.maximum.accumulate(window[::-1])[::-1], 0)
+        fits = np.flatnonzero(peaks + size <= cap)
+        first_fit = range_lb + int(fits[0]) if fits.size else range_ub
+        for i in range(first_fit, range_ub):
+            candidates = self._get_ctrld_candidates(i, bw_id)
+            if candidates:
+                return (next(iter(candidates)), i)
+        # the tensor does not fit, swap it in as late as possible
+        for i in reversed(range(range_lb, first_fit)):
+            candidates = self._get_ctrld_candidates(i, bw_id)
+            if candidates:
+                return (next(iter(candidates)), i)
+        return (None, -1)
 
-        This method does an in-place modification to the graph.
+    def _get_pressure(self):
+        """Return the predicted device memory at every order and the memory
+        cap used by the `memory_pressure` strategy.
+
+        The memory is simulated with the tensors selected for the memory
+        budget swapped, or with every swap candidate swapped if there is no
+        budget, each one swapped in `lb` orders before its first backward
+        consumer. The cap is the memory budget, or the predicted peak if
+        there is no budget.
+
+        Return:
+          A tuple of (a NumPy array of bytes indexed by order, an integer).
+        """
+        if self._pressure is None:
+            if self._budget_ts is not None:
+                swapped = sorted(self._budget_ts)
+            else:
+                orders = self._topo_sort.orders
+                fw_ids = np.flatnonzero(
+                    (orders >= 0) &
+                    ~np.asarray(self._get_grad_flags(), dtype=bool))
+                swapped = self._get_swap_candidates(
+                    set(self._index.ops(fw_ids.tolist())))
+            profile = self._get_simulator().profile(swapped)
+            if self._memory_budget_bytes is not None:
+                cap = self._memory_budget_bytes
+            else:
+                cap = int(profile.max()) if profile.size else 0
+            self._pressure = (profile, cap)
+        return self._pressure
+
+    def _add_pressure(self, fw_op, bw_op, ctrld_order):
+        """Account for a swap-in triggered after `ctrld_order` in the
+        predicted device memory of the `memory_pressure` strategy.
 
         Args:
-          src_op: a `tf.Operation`.
-          dest_op: a `tf.Operation`.
-          remap_inputs: remap the input of `dest_op` or not.
-          remap_outputs: remap the output of `src_op` or not.
-          idx: index of input or output tensor.
-          disconnect_first: True means the current outputs of sgv0 are
-            disconnected.
-        """
-        src_sgv = ge.sgv(src_op, graph=self._graph)
-        dest_sgv = ge.sgv(dest_op, graph=self._graph)
-        if remap_outputs:
-            src_sgv = src_sgv.remap_outputs([idx])
-        if remap_inputs:
-            dest_sgv = dest_sgv.remap_inputs([idx])
-
-        ge.connect(src_sgv, dest_sgv, disconnect_first)
+          fw_op: a `tf.Operation` that has a tensor swapped out.
+          bw_op: a `tf.Operation` that consumes a tensor swapped in.
+          ctrld_order: the order of the control dependency operation.
+        """
+        profile, _ = self._get_pressure()
+        bw_order = self._topo_sort.get_order(bw_op)
+        lb = self._lb
+        if bw_order - lb <= self._topo_sort.get_order(fw_op):
+            lb = 1
+        # the tensor was predicted on the device from bw_order - lb
+        profile[ctrld_order + 1:max(bw_order - lb, 0)] += (
+            self._cost_model.total_bytes(
+                self._get_swapped_ids(fw_op, bw_op)))
+
+    def _get_swapped_ids(self, fw_op, bw_op):
+        """Return the ids of the tensors produced by `fw_op` and consumed by
+        `bw_op`, i.e. the tensors swapped in for `bw_op`.
+
+        Args:
+          fw_op: a `tf.Operation`.
+          bw_op: a `tf.Operation`.
+
+        Return:
+          A sorted list of integers.
+        """
+        ts_ids = set(self._index.inputs(self._index.op_id(bw_op)).tolist())
+        return sorted(ts_ids.intersection(
+            self._index.outputs(self._index.op_id(fw_op)).tolist()))
+
+    def _get_ctrld_candidates(self, order, bw_id):
+        """Return the operations of an order that can be control dependency
+        operations for the swapin op of `bw_op`, i.e. operations on the chain
+        rule path to `bw_op` that are not in a conditional branch.
+
+        Args:
+          order: an integer.
+          bw_id: the id of a `tf.Operation`.
+
+        Return:
+          A set of `tf.Operation`.
+        """
+        return {op
+                for op in self._topo_sort.get_ops(order)
+                if (self._reach.reaches(self._index.op_id(op), bw_id) and
+                    "/cond/" not in op.name)}
+
+    def _get_order_times(self):
+        """Return the cumulative computation time of the orders: item `k` is
+        the time of the orders before `k`.
+
+        The computation time of an operation is estimated by the bytes it
+        reads and writes at `device_bandwidth`.
+
+        Return:
+          A NumPy array of floats.
+        """
+        if self._order_times is None:
+            orders = self._topo_sort.orders
+            ordered = np.flatnonzero(orders >= 0)
+            times = np.bincount(
+                orders[ordered],
+                weights=self._cost_model.io_bytes()[ordered],
+                minlength=self._topo_sort.size) / float(self._device_bandwidth)
+            self._order_times = np.concatenate(([0.0], np.cumsum(times)))
+        return self._order_times
+
+    def _get_swap_candidates(self, fw_ops):
+        """Return the ids of the tensors that can be swapped, i.e. tensors
+        generated by forward operations and consumed by ordered backward
+        operations with outgoing operations.
+
+        Args:
+          fw_ops: a set of `tf.Operation` in the forward phase.
+
+        Return:
+          A list of integers.
+        """
+        orders = self._topo_sort.orders
+        grad_flags = self._get_grad_flags()
+        candidates = []
+        for op in fw_ops:
+            if op in self._excl_ops:
+                continue
+            if self._incl_ops and op not in self._incl_ops:
+                continue
+            if not self._index.contains(op):
+                continue
+            for ts_id in self._index.outputs(self._index.op_id(op)).tolist():
+                for cons_id in self._index.consumers(ts_id).tolist():
+                    if (grad_flags[cons_id] and orders[cons_id] >= 0 and
+                            self._reach.has_descendants(cons_id)):
+                        candidates.append(ts_id)
+                        break
+        return sorted(candidates)
+
+    def _select_swaps_for_budget(self, fw_ops):
+        """Select the tensors to swap to fit in the memory budget.
+
+        Args:
+          fw_ops: a set of `tf.Operation` in the forward phase.
+
+        Return:
+          A set of tensor ids.
+        """
+        sim = self._get_simulator()
+        n_unknown = int((self._cost_model.sizes < 0).sum())
+        if n_unknown:
+            self._log_event('unknown_sizes', 0, "{count} tensors have an "
+                            "unknown size and are not simulated, see "
+                            "dim_bindings", count=n_unknown)
+        selected, peak = sim.select_swaps(self._memory_budget_bytes,
+                                          self._get_swap_candidates(fw_ops))
+        self._log_event('budget_selection', 0, "Predicted peak memory: "
+                        "{peak} bytes without swapping, {swapped_peak} bytes "
+                        "with {count} tensors swapped, budget {budget} "
+                        "bytes", peak=sim.peak(), swapped_peak=peak,
+                        count=len(selected),
+                        budget=self._memory_budget_bytes)
+        if peak > self._memory_budget_bytes:
+            self._log_event('over_budget', 0, "The predicted peak memory "
+                            "exceeds the memory budget even after swapping")
+        return set(selected)
+
+    def _get_grad_flags(self):
+        """Return a list of booleans marking gradient ops by their ids
+        in the graph index.
+        """
+        if self._grad_flags is None:
+            self._grad_flags = self._index.mask(self._grad_ops).tolist()
+        return self._grad_flags
+
+    def _get_non_grad_flags(self):
+        """Return a list of booleans marking non-gradient ops by their ids
+        in the graph index.
+        """
+        if self._non_grad_flags is None:
+            self._non_grad_flags = [not flag
+                                    for flag in self._get_grad_flags()]
+        return self._non_grad_flags
+
+    def _get_bw_order_flags(self):
+        """Return a list of booleans marking ops whose order is after the
+        starting order of the backward phase, by their ids in the graph index.
+        """
+        if self._bw_order_flags is None:
+            bw_starting_order = self._topo_sort.bw_starting_order
+            self._bw_order_flags = [
+                self._topo_sort.get_order(op) > bw_starting_order
+                for op in self._index.ops(range(self._index.size))]
+            self._no_bw_order_flags = [not flag
+                                       for flag in self._bw_order_flags]
+        return self._bw_order_flags
+
+    def _get_order(self, op):
+        """Return the topological order of an operation, or -1 if the
+        topological order has not been built, e.g. for a cached plan.
+        """
+        if self._topo_sort is None:
+            return -1
+        return self._topo_sort.get_order(op)
+
+    def _log_event(self, name, level, template, **fields):
+        """Log an event. The message is only formatted by the sinks that
+        take the level of the event.
+
+        Args:
+          name: the name of the event.
+          level: an `integer`, 0 for the events always logged.
+          template: a format string of the message, referring to the fields
+            by name.
+          fields: the values of the event, e.g. operations and tensors.
+        """
+        self._events.emit(name, level, template, **fields)
+
+    def _print_configuration(self):
+        """Print configuration information about LMS.
+        """
+        if self._n_tensors < 0:
+            self._log_event('configuration', 0, "n_tensors: all tensors",
+                            n_tensors=self._n_tensors)
+        else:
+            self._log_event('configuration', 0, "n_tensors: {n_tensors}",
+                            n_tensors=self._n_tensors)
+        self._log_event('configuration', 0, "lb: {lb}", lb=self._lb)
+        if self._ctrld_strategy is CTRLD_Strategy.TIME_MODEL:
+            self._log_event('configuration', 0, "host_bandwidth: "
+                            "{host_bandwidth}, device_bandwidth: "
+                            "{device_bandwidth}",
+                            host_bandwidth=self._host_bandwidth,
+                            device_bandwidth=self._device_bandwidth)
+        if self._recompute:
+            self._log_event('configuration', 0, "recompute: {recompute}",
+                            recompute=self._recompute)
+        if self._memory_budget_bytes is not None:
+            self._log_event('configuration', 0, "memory_budget_bytes: "
+                            "{memory_budget_bytes}",
+                            memory_budget_bytes=self._memory_budget_bytes)
+        if self._dim_bindings is not None:
+            self._log_event('configuration', 0, "dim_bindings: "
+                            "{dim_bindings}",
+                            dim_bindings=self._dim_bindings)
 
     def _swapped_max_tensors(self):
         """Check whether we swapped enough tensors or not.
@@ -0,0 +1,201 @@
+# (C) Copyright IBM Corp. 2018. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Swap plan
+"""
+from collections import namedtuple
+
+# A swapin op feeding the operations named in `consumers`, more than one if
+# swapins are fused. `trigger` is the name of its control dependency
+# operation, None if it has none, and `trigger_order` the order of it.
+SwapIn = namedtuple('SwapIn', ['consumers', 'trigger', 'trigger_order'])
+
+# A tensor swapped out after the operation `src_op`, and swapped in by
+# `swapins`. `nbytes` is the byte size of the tensor, -1 if it is unknown.
+TensorSwap = namedtuple('TensorSwap', ['tensor', 'src_op', 'nbytes',
+                                       'swapins'])
+
+# A tensor recomputed for the operation `consumer` by a copy of the
+# operations `ops`, producers first, triggered like a swapin.
+Recompute = namedtuple('Recompute', ['tensor', 'src_op', 'nbytes',
+                                     'consumer', 'ops', 'trigger',
+                                     'trigger_order'])
+
+
+class SwapPlan(object):
+    """SwapPlan class is an immutable description of the edits of LMS.
+
+    Operations and tensors are referred to by name, so that a plan can be
+    inspected, compared, serialized and applied to any graph with the same
+    names, without analyzing the graph again.
+    """
+    def __init__(self, swaps=(), recomputes=(), kept=()):
+        """Create a SwapPlan object.
+
+        Args:
+          swaps: a sequence of `TensorSwap`.
+          recomputes: a sequence of `Recompute`.
+          kept: a sequence of the names of the tensors that LMS decided to
+            keep on the device rather than swap or recompute. They are not
+            edited.
+        """
+        self._swaps = tuple(
+            swap._replace(swapins=tuple(
+                swapin._replace(consumers=tuple(swapin.consumers))
+                for swapin in swap.swapins))
+            for swap in swaps)
+        self._recomputes = tuple(
+            recompute._replace(ops=tuple(recompute.ops))
+            for recompute in recomputes)
+        self._kept = tuple(kept)
+
+    @property
+    def swaps(self):
+        """A tuple of `TensorSwap`, in the order they are applied.
+        """
+        return self._swaps
+
+    @property
+    def recomputes(self):
+        """A tuple of `Recompute`, in the order they are applied.
+        """
+        return self._recomputes
+
+    @property
+    def kept(self):
+        """A tuple of the names of the tensors kept on the device.
+        """
+        return self._kept
+
+    @property
+    def swapped_tensors(self):
+        """A list of the names of the swapped tensors.
+        """
+        return [swap.tensor for swap in self._swaps]
+
+    @property
+    def total_bytes(self):
+        """The total byte size of the swapped tensors whose sizes are known.
+        """
+        return sum(swap.nbytes for swap in self._swaps if swap.nbytes > 0)
+
+    @property
+    def transfer_bytes(self):
+        """The bytes moved between the device and the host in one step:
+        every swapped tensor of known size is transferred once by its
+        swap-out and once by each of its swap-ins.
+        """
+        return sum(swap.nbytes * (1 + len(swap.swapins))
+                   for swap in self._swaps if swap.nbytes > 0)
+
+    def to_dict(self):
+        """Return the plan as a dict of lists, dicts, strings and integers,
+        e.g. to be serialized in JSON.
+        """
+        return {
+            'swaps': [{'tensor': swap.tensor,
+                       'src_op': swap.src_op,
+                       'nbytes': swap.nbytes,
+                       'swapins': [swapin._asdict()
+                                   for swapin in swap.swapins]}
+                      for swap in self._swaps],
+            'recomputes': [recompute._asdict()
+                           for recompute in self._recomputes],
+            'kept': list(self._kept)}
+
+    @classmethod
+    def from_dict(cls, value):
+        """Create a SwapPlan object from the result of `to_dict`.
+
+        Args:
+          value: a dict.
+
+        Return:
+          A `SwapPlan`.
+        """
+        swaps = [TensorSwap(swap['tensor'], swap['src_op'], swap['nbytes'],
+                            [SwapIn(**swapin) for swapin in swap['swapins']])
+                 for swap in value.get('swaps', [])]
+        recomputes = [Recompute(**recompute)
+                      for recompute in value.get('recomputes', [])]
+        return cls(swaps, recomputes, value.get('kept', []))
+
+    def __len__(self):
+        return len(self._swaps) + len(self._recomputes)
+
+    def __eq__(self, other):
+        return (isinstance(other, SwapPlan) and
+                self._swaps == other._swaps and
+                self._recomputes == other._recomputes and
+                self._kept == other._kept)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((self._swaps, self._recomputes, self._kept))
+
+    def __repr__(self):
+        return 'SwapPlan({} swaps, {} recomputes, {} bytes)'.format(
+            len(self._swaps), len(self._recomputes), self.total_bytes)
+
+
+class PlanPrediction(object):
+    """PlanPrediction class holds a plan and the predictions of its effect,
+    computed without modifying the graph.
+    """
+    def __init__(self, swap_plan, peak_bytes, baseline_peak_bytes,
+                 transfer_bytes, trigger_distances):
+        """Create a PlanPrediction object.
+
+        Args:
+          swap_plan: a `SwapPlan`.
+          peak_bytes: the predicted peak device memory with the plan.
+          baseline_peak_bytes: the predicted peak device memory without the
+            plan.
+          transfer_bytes: the bytes moved between the device and the host
+            in one step: every swapped tensor of known size is transferred
+            once by its swap-out and once by each of its swap-ins.
+          trigger_distances: a dict mapping the name of a swapped or
+            recomputed tensor to a list of the distances in the topological
+            order between the control dependency operation and the first
+            consumer, one for each swap-in or recompute, None for the ones
+            without a control dependency operation.
+        """
+        self.swap_plan = swap_plan
+        self.peak_bytes = peak_bytes
+        self.baseline_peak_bytes = baseline_peak_bytes
+        self.transfer_bytes = transfer_bytes
+        self.trigger_distances = trigger_distances
+
+    @property
+    def saved_bytes(self):
+        """The predicted reduction of the peak device memory.
+        """
+        return self.baseline_peak_bytes - self.peak_bytes
+
+    def to_dict(self):
+        """Return the prediction as a dict, e.g. to be serialized in JSON.
+        """
+        return {'plan': self.swap_plan.to_dict(),
+                'peak_bytes': self.peak_bytes,
+                'baseline_peak_bytes': self.baseline_peak_bytes,
+                'transfer_bytes': self.transfer_bytes,
+                'trigger_distances': self.trigger_distances}
+
+    def __repr__(self):
+        return ('PlanPrediction({}, peak_bytes={}, baseline_peak_bytes={}, '
+                'transfer_bytes={})'.format(
+                    self.swap_plan, self.peak_bytes,
+                    self.baseline_peak_bytes, self.transfer_bytes))
@@ -0,0 +1,160 @@
+# (C) Copyright IBM Corp. 2018. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Plan cache
+"""
+import hashlib
+import json
+import os
+import tempfile
+
+from tensorflow_large_model_support import fingerprint
+from tensorflow_large_model_support import plan
+
+# suffix of the plan files in a cache directory
+_SUFFIX = '.json'
+
+
+def graph_key(index, params):
+    """Return a key of a graph and of the parameters of LMS.
+
+    The key hashes the structural fingerprint of the graph, see
+    `fingerprint.graph_fingerprint`, with the static shapes, and the
+    parameters.
+
+    Args:
+      index: a `GraphIndex` of the graph.
+      params: a dict of the parameters of LMS. Its values must have a
+        deterministic `repr`.
+
+    Return:
+      A hexadecimal string.
+    """
+    digest = hashlib.sha256()
+    digest.update(fingerprint.graph_fingerprint(index).encode('ascii'))
+    digest.update(repr(sorted(params.items())).encode('utf-8'))
+    return digest.hexdigest()
+
+
+class PlanCache(object):
+    """PlanCache class stores `SwapPlan` objects in a local directory, one
+    JSON file per key.
+
+    The least recently used plans are evicted when the files of the cache
+    take more than `max_bytes`. A plan is used when it is read or written,
+    as recorded by the modification time of its file.
+    """
+    def __init__(self, directory, max_bytes=64 * 1024 * 1024):
+        """Create a PlanCache object.
+
+        Args:
+          directory: the cache directory. It is created if it does not
+            exist.
+          max_bytes: the maximum total size of the plan files.
+        """
+        if max_bytes <= 0:
+            raise ValueError('The maximum size of the plan cache must be '
+                             'positive.')
+        self._directory = directory
+        self._max_bytes = max_bytes
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    @property
+    def directory(self):
+        """The cache directory.
+        """
+        return self._directory
+
+    def get(self, key):
+        """Return the plan stored for a key, or None if there is none.
+
+        A file that cannot be read as a plan is removed.
+
+        Args:
+          key: a string returned by `graph_key`.
+
+        Return:
+          A `SwapPlan` or None.
+        """
+        path = self._path(key)
+        try:
+            with open(path) as f:
+                swap_plan = plan.SwapPlan.from_dict(json.load(f))
+        except (IOError, OSError):
+            return None
+        except (ValueError, KeyError, TypeError):
+            self._remove(path)
+            return None
+        self._touch(path)
+        return swap_plan
+
+    def put(self, key, swap_plan):
+        """Store a plan for a key, then evict the least recently used plans
+        over the size cap.
+
+        The file is written to a temporary file and renamed, so that
+        concurrent readers never see a partial plan.
+
+        Args:
+          key: a string returned by `graph_key`.
+          swap_plan: a `SwapPlan`.
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=self._directory,
+                                        suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(swap_plan.to_dict(), f)
+            os.rename(tmp_path, self._path(key))
+        except Exception:
+            self._remove(tmp_path)
+            raise
+        self._evict()
+
+    def _evict(self):
+        """Remove the least recently used plan files until the total size
+        is at most `max_bytes`. The most recent plan is always kept.
+        """
+        entries = []
+        for name in os.listdir(self._directory):
+            if not name.endswith(_SUFFIX):
+                continue
+            path = os.path.join(self._directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries[:-1]:
+            if total <= self._max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    def _path(self, key):
+        return os.path.join(self._directory, key + _SUFFIX)
+
+    def _touch(self, path):
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,268 @@
+# (C) Copyright IBM Corp. 2018. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Reachability
+"""
+from collections import OrderedDict
+import heapq
+
+import numpy as np
+
+from tensorflow_large_model_support import levelsort
+
+# a level below every level, used to grow a cone completely
+_ALL_LEVELS = -2
+
+
+class _Cone(object):
+    """The set of ancestors of a target node, discovered lazily in
+    decreasing order of levels.
+    """
+    __slots__ = ('found', 'heap')
+
+    def __init__(self, size, target, level):
+        self.found = bytearray(size)
+        self.found[target] = 1
+        self.heap = [(-level, target)]
+
+
+class ReachabilityIndex(object):
+    """ReachabilityIndex class answers "does operation `u` reach operation
+    `v`" queries over the data edges of a `GraphIndex`.
+
+    Every operation has a topological level, i.e. the length of the longest
+    path reaching it. Since levels strictly increase along edges, `u` cannot
+    reach `v` if the level of `u` is not smaller than the level of `v`, which
+    answers most negative queries in O(1). Operations on or after a cycle,
+    e.g. in a while loop, have no level and are not pruned.
+
+    The other queries are answered by the ancestor cone of `v`, a bitmap of
+    the ancestors of `v` that is grown backward from `v` only down to the
+    level of `u`. Later queries on the same target with a higher level are
+    answered in O(1). Cones are kept in an LRU cache holding at most
+    `max_cones` cones, so the memory is bounded by `max_cones` bytes per
+    operation.
+    """
+    def __init__(self, index, within=None, max_cones=32):
+        """Create a ReachabilityIndex object.
+
+        Args:
+          index: a `GraphIndex`.
+          within: a boolean NumPy array. If given, only paths going through
+            operations marked in it are considered.
+          max_cones: the maximum number of ancestor cones kept in memory.
+        """
+        self._index = index
+        self._size = index.size
+        self._succ_ptr = index.succ_ptr.tolist()
+        self._pred_ptr = index.pred_ptr.tolist()
+        self._pred = index.pred.tolist()
+        self._within = None if within is None else within.tolist()
+        self._max_cones = max_cones
+        self._cones = OrderedDict()
+
+        if within is None:
+            levels = levelsort.kahn_levels(index.succ_ptr, index.succ)
+        else:
+            # drop the edges leaving or entering ops that are not within
+            rows = np.repeat(np.arange(self._size), np.diff(index.succ_ptr))
+            keep = within[rows] & within[index.succ]
+            levels = levelsort.kahn_levels(*levelsort.csr_from_edges(
+                self._size, rows[keep], index.succ[keep]))
+        self._levels = levels.tolist()
+
+    @property
+    def levels(self):
+        """The list of topological levels of the operations, or -1 for the
+        operations on or after a cycle.
+        """
+        return self._levels
+
+    def has_descendants(self, op_id):
+        """Return True if an operation has at least one consuming operation.
+
+        Args:
+          op_id: an integer.
+        """
+        return self._succ_ptr[op_id + 1] > self._succ_ptr[op_id]
+
+    def reaches(self, src_id, dst_id):
+        """Return True if there is a path from `src_id` to `dst_id`.
+
+        An operation reaches itself.
+
+        Args:
+          src_id: an integer.
+          dst_id: an integer.
+        """
+        if src_id == dst_id:
+            return True
+        if self._within is not None and not (self._within[src_id] and
+                                             self._within[dst_id]):
+            return False
+        src_level = self._levels[src_id]
+        if self._levels[dst_id] >= 0:
+            # no ancestor of dst_id is on a cycle, so levels can be used
+            if src_level < 0 or src_level >= self._levels[dst_id]:
+                return False
+        else:
+            src_level = _ALL_LEVELS
+        cone = self._get_cone(dst_id)
+        self._grow(cone, src_level)
+        return bool(cone.found[src_id])
+
+    def ancestors(self, op_id):
+        """Return the ids of all operations reaching `op_id`, excluding
+        `op_id` itself.
+
+        The result is not cached.
+
+        Args:
+          op_id: an integer.
+
+        Return:
+          A NumPy array of integers.
+        """
+        if self._within is not None and not self._within[op_id]:
+            return np.zeros(0, dtype=np.int64)
+        cone = _Cone(self._size, op_id, self._levels[op_id])
+        self._grow(cone, _ALL_LEVELS)
+        found = np.frombuffer(bytes(cone.found), dtype=np.uint8).astype(bool)
+        found[op_id] = False
+        return np.flatnonzero(found)
+
+    def source_coverage(self, targets):
+        """Return the targets that are not reached by the other targets,
+        with the number of the other targets each of them reaches.
+
+        A target reaching another target also reaches all the targets the
+        latter reaches, so the targets reaching the most targets are among
+        the returned ones. They are counted in a few sweeps over the
+        operations in topological order instead of one search per target:
+        a first sweep flags the operations reached by a target, and the
+        next sweeps propagate bitsets of the sources they are reached by,
+        64 sources at a time. Operations on a cycle are merged into their
+        strongly connected component, so targets on a common cycle reach
+        each other and are returned together.
+
+        Args:
+          targets: a list of op ids.
+
+        Return:
+          A dict mapping op ids of targets to integers.
+        """
+        size = self._size
+        pred_ptr = self._pred_ptr
+        pred = self._pred
+        if self._within is None:
+            within = np.ones(size, dtype=bool)
+        else:
+            within = np.asarray(self._within, dtype=bool)
+        levels = np.asarray(self._levels, dtype=np.int64)
+
+        # components in topological order, an acyclic operation being its
+        # own component. Operations on or after a cycle have no level and
+        # come after all the others.
+        acyclic = np.flatnonzero(within & (levels >= 0))
+        order, _ = levelsort.group_by_level(levels, acyclic)
+        components = [[i] for i in order.tolist()]
+        cyclic = np.flatnonzero(within & (levels < 0))
+        if cyclic.size:
+            components.extend(levelsort.strongly_connected_components(
+                self._index.pred_ptr, self._index.pred, cyclic))
+        # every operation is represented by the first one of its component
+        rep = [-1] * size
+        for component in components:
+            for i in component:
+                rep[i] = component[0]
+
+        n_targets = [0] * size
+        for i in targets:
+            if rep[i] >= 0:
+                n_targets[rep[i]] += 1
+
+        def predecessors(component):
+            """Yield the representatives of the components with an edge to
+            `component`.
+            """
+            c = component[0]
+            for i in component:
+                for j in pred[pred_ptr[i]:pred_ptr[i + 1]]:
+                    r = rep[j]
+                    if r >= 0 and r != c:
+                        yield r
+
+        # sources are the components with targets not reached by a target
+        reached = [False] * size
+        for component in components:
+            c = component[0]
+            for r in predecessors(component):
+                if reached[r] or n_targets[r]:
+                    reached[c] = True
+                    break
+        sources = [component[0] for component in components
+                   if n_targets[component[0]] and not reached[component[0]]]
+
+        coverage = {}
+        target_reps = [rep[i] for i in targets if rep[i] >= 0]
+        for start in range(0, len(sources), 64):
+            block = sources[start:start + 64]
+            source_bits = [0] * size
+            for k, c in enumerate(block):
+                source_bits[c] = 1 << k
+            bits = [0] * size
+            for component in components:
+                value = 0
+                for r in predecessors(component):
+                    value |= bits[r] | source_bits[r]
+                bits[component[0]] = value
+            target_bits = np.asarray([bits[r] for r in target_reps],
+                                     dtype=np.uint64)
+            for k, c in enumerate(block):
+                # the targets of the other components reached by the
+                # source, and the other targets of its own component
+                count = np.count_nonzero(
+                    (target_bits >> np.uint64(k)) & np.uint64(1))
+                coverage[c] = int(count) + n_targets[c] - 1
+        return {i: coverage[rep[i]] for i in targets
+                if rep[i] >= 0 and rep[i] in coverage}
+
+    def _get_cone(self, op_id):
+        """Return the cached ancestor cone of an operation.
+        """
+        cone = self._cones.pop(op_id, None)
+        if cone is None:
+            cone = _Cone(self._size, op_id, self._levels[op_id])
+            while len(self._cones) >= self._max_cones:
+                self._cones.popitem(last=False)
+        self._cones[op_id] = cone
+        return cone
+
+    def _grow(self, cone, level):
+        """Discover all ancestors of the cone whose level is at least
+        `level`.
+        """
+        found = cone.found
+        heap = cone.heap
+        pred_ptr = self._pred_ptr
+        pred = self._pred
+        within = self._within
+        levels = self._levels
+        while heap and -heap[0][0] > level:
+            _, i = heapq.heappop(heap)
+            for j in pred[pred_ptr[i]:pred_ptr[i + 1]]:
+                if found[j] or (within is not None and not within[j]):
+                    continue
+                found[j] = 1
+                heapq.heappush(heap, (-levels[j], j))
@@ -0,0 +1,185 @@
+# (C) Copyright IBM Corp. 2018. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Rematerialization
+"""
+from tensorflow_large_model_support import traversal
+
+# decisions of the planner
+SWAP = 'swap'
+RECOMPUTE = 'recompute'
+KEEP = 'keep'
+
+
+class RematPlanner(object):
+    """RematPlanner class decides, for every tensor LMS would swap, whether
+    it is swapped, recomputed in the backward phase, or kept on the device.
+
+    A tensor is recomputed by a subgraph of elementwise operations, see
+    `cost_model.ELEMENTWISE_TYPES`, whose inputs are available in the
+    backward phase: either swapped tensors, which are swapped in again for
+    the subgraph, or tensors that stay on the device until the first
+    backward consumer of the recomputed tensor. The subgraph has at most
+    `max_depth` levels.
+
+    Swapping a tensor transfers it twice at `host_bandwidth`. Recomputing
+    it moves the tensors of the subgraph at `device_bandwidth`, plus the
+    swap-in of its swapped inputs. The cheaper one is chosen. Tensors of at
+    most `keep_bytes` are kept on the device, since their transfers cost
+    more in latency than they save.
+
+    Decisions must be requested in the order of the forward walk of LMS, so
+    that the inputs of a tensor are decided before it.
+    """
+    def __init__(self, index, cost_model, orders, grad_flags,
+                 host_bandwidth=12e9, device_bandwidth=900e9, max_depth=3,
+                 keep_bytes=65536):
+        """Create a RematPlanner object.
+
+        Args:
+          index: a `GraphIndex`.
+          cost_model: a `CostModel` of `index`.
+          orders: a sequence of the order of every op id, -1 for the ops
+            without an order, e.g. `TOPOS.orders`.
+          grad_flags: a sequence of booleans marking the gradient ops.
+          host_bandwidth: the host-device bandwidth in bytes per second.
+          device_bandwidth: the device memory bandwidth in bytes per second.
+          max_depth: the maximum number of levels of a recompute subgraph.
+          keep_bytes: tensors of at most this size are kept on the device.
+        """
+        self._index = index
+        self._cost_model = cost_model
+        self._orders = traversal.as_list(orders)
+        self._grad_flags = list(grad_flags)
+        self._host_bandwidth = float(host_bandwidth)
+        self._device_bandwidth = float(device_bandwidth)
+        self._max_depth = max_depth
+        self._keep_bytes = keep_bytes
+        # ids of the tensors decided to be recomputed. Their original
+        # tensors are not consumed in the backward phase anymore.
+        self._recomputed = set()
+
+    def decide(self, ts_id, is_swapped):
+        """Decide how a tensor is made available to its backward consumers.
+
+        Args:
+          ts_id: a tensor id.
+          is_swapped: a function returning True if the tensor with the given
+            id has been swapped out.
+
+        Return:
+          A tuple of (`SWAP`, `RECOMPUTE` or `KEEP`, a list of op ids). The
+          op ids are the recompute subgraph, producers first, for
+          `RECOMPUTE`, and empty otherwise. A tensor is only recomputed for
+          the next decisions once it is marked with `mark_recomputed`.
+        """
+        size = self._cost_model.tensor_bytes(ts_id)
+        if 0 <= size <= self._keep_bytes:
+            return KEEP, []
+        if size > 0:
+            op_ids = self._recompute_ops(ts_id, self._first_bw(ts_id),
+                                         is_swapped, 1)
+            if op_ids is not None:
+                recompute_time = self.recompute_time(op_ids, is_swapped)
+                if (recompute_time is not None and
+                        recompute_time < self.swap_time(ts_id)):
+                    return RECOMPUTE, op_ids
+        return SWAP, []
+
+    def mark_recomputed(self, ts_id):
+        """Mark a tensor as recomputed, once its recomputation is planned
+        for a backward consumer. Its original tensor is then not available
+        to the recompute subgraphs of the next decisions.
+
+        Args:
+          ts_id: a tensor id decided to be recomputed.
+        """
+        self._recomputed.add(ts_id)
+
+    def swap_time(self, ts_id):
+        """Return the time to swap a tensor out and in, in seconds.
+
+        Args:
+          ts_id: a tensor id of known size.
+        """
+        return 2 * self._cost_model.tensor_bytes(ts_id) / self._host_bandwidth
+
+    def recompute_time(self, op_ids, is_swapped):
+        """Return the time to recompute a subgraph, in seconds, or None if
+        an operation has no cost.
+
+        Args:
+          op_ids: a list of op ids.
+          is_swapped: see `decide`.
+        """
+        total = 0.0
+        inside = set(op_ids)
+        for op_id in op_ids:
+            op_time = self._cost_model.op_time(op_id, self._device_bandwidth)
+            if op_time is None:
+                return None
+            total += op_time
+            for in_id in self._index.inputs(op_id).tolist():
+                if (is_swapped(in_id) and
+                        self._index.producer(in_id) not in inside):
+                    total += (self._cost_model.tensor_bytes(in_id) /
+                              self._host_bandwidth)
+        return total
+
+    def _recompute_ops(self, ts_id, first_bw, is_swapped, depth):
+        """Return the ids of the operations recomputing a tensor, producers
+        first, or None if it cannot be recomputed within `max_depth` levels.
+        """
+        op_id = self._index.producer(ts_id)
+        if (depth > self._max_depth or self._grad_flags[op_id] or
+                self._orders[op_id] < 0 or
+                self._cost_model.op_time(op_id, self._device_bandwidth)
+                is None):
+            return None
+        op_ids = []
+        for in_id in self._index.inputs(op_id).tolist():
+            if self._is_available(in_id, first_bw, is_swapped):
+                continue
+            in_ops = self._recompute_ops(in_id, first_bw, is_swapped,
+                                         depth + 1)
+            if in_ops is None:
+                return None
+            op_ids.extend(i for i in in_ops if i not in op_ids)
+        op_ids.append(op_id)
+        return op_ids
+
+    def _is_available(self, ts_id, first_bw, is_swapped):
+        """Return True if a tensor can be read at order `first_bw`.
+        """
+        if is_swapped(ts_id):
+            return True
+        if ts_id in self._recomputed:
+            return False
+        # tensors produced outside of the topological order, e.g. variables
+        # and constants, are not freed by the forward phase
+        producer_order = self._orders[self._index.producer(ts_id)]
+        if producer_order < 0:
+            return True
+        last_use = max([producer_order] +
+                       [self._orders[i]
+                        for i in self._index.consumers(ts_id).tolist()])
+        return last_use >= first_bw
+
+    def _first_bw(self, ts_id):
+        """Return the order of the first backward consumer of a tensor.
+        """
+        orders = [self._orders[i]
+                  for i in self._index.consumers(ts_id).tolist()
+                  if self._grad_flags[i] and self._orders[i] >= 0]
+        return min(orders) if orders else len(self._orders)
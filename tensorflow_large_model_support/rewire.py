@@ -0,0 +1,238 @@
+# (C) Copyright IBM Corp. 2018. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Graph rewiring
+"""
+from collections import namedtuple
+from collections import OrderedDict
+
+# Entries of the journal of a Rewirer. `InputEdit` replaced the input
+# `old_ts` at `index` of `op` by `new_ts`, `ControlEdit` added the control
+# input `ctrl_op` to `op`, and `AddedOp` added `op` to the graph.
+InputEdit = namedtuple('InputEdit', ['op', 'index', 'old_ts', 'new_ts'])
+ControlEdit = namedtuple('ControlEdit', ['op', 'ctrl_op'])
+AddedOp = namedtuple('AddedOp', ['op'])
+
+
+class Rewirer(object):
+    """Rewirer class collects edits of the inputs of operations and applies
+    them in a single pass.
+
+    An edit replaces an input tensor of an operation, or adds a control
+    input to an operation. Edits are applied directly on the operations,
+    the way `tensorflow.contrib.graph_editor` does it, but without building
+    a subgraph view for every edit. Since nothing changes before `apply`
+    is called, the edits can be collected while reading the original
+    inputs of the operations.
+
+    Applied edits and the operations added along with them are recorded in
+    a journal, so that `revert` can restore the original wiring.
+    """
+    def __init__(self):
+        """Create a Rewirer object.
+        """
+        # the new input tensors of operations by input index
+        self._inputs = OrderedDict()
+        # the control inputs added to operations
+        self._control_inputs = OrderedDict()
+        # the applied edits, in order
+        self._journal = []
+
+    @property
+    def journal(self):
+        """A tuple of the applied `InputEdit`, `ControlEdit` and `AddedOp`
+        entries, in the order they were applied.
+        """
+        return tuple(self._journal)
+
+    @property
+    def num_edits(self):
+        """The number of edits that have not been applied.
+        """
+        return (sum(len(inputs) for inputs in self._inputs.values()) +
+                sum(len(ops) for ops in self._control_inputs.values()))
+
+    def update_input(self, op, index, ts):
+        """Replace an input tensor of an operation.
+
+        Args:
+          op: a `tf.Operation`.
+          index: the index of the input in `op.inputs`.
+          ts: the new input `tf.Tensor`.
+        """
+        inputs = self._inputs.setdefault(op, OrderedDict())
+        if index in inputs and inputs[index] is not ts:
+            raise ValueError('Input {} of operation {} is replaced by both '
+                             '{} and {}.'.format(index, op.name,
+                                                 inputs[index].name,
+                                                 ts.name))
+        inputs[index] = ts
+
+    def reroute(self, old_ts, new_ts, consumers):
+        """Replace every input `old_ts` of the operations `consumers` by
+        `new_ts`.
+
+        Args:
+          old_ts: a `tf.Tensor`.
+          new_ts: a `tf.Tensor`.
+          consumers: a list of `tf.Operation`.
+        """
+        for op in consumers:
+            for index, ts in enumerate(op.inputs):
+                if ts is old_ts:
+                    self.update_input(op, index, new_ts)
+
+    def add_ops(self, ops):
+        """Record operations added to the graph, so that `revert` returns
+        them.
+
+        Args:
+          ops: a list of `tf.Operation`.
+        """
+        self._journal.extend(AddedOp(op) for op in ops)
+
+    def add_control_input(self, op, ctrl_op):
+        """Add a control input to an operation.
+
+        Args:
+          op: a `tf.Operation`.
+          ctrl_op: a `tf.Operation` that must run before `op`.
+        """
+        ops = self._control_inputs.setdefault(op, [])
+        if ctrl_op not in ops:
+            ops.append(ctrl_op)
+
+    def apply(self):
+        """Apply the collected edits to the graph, then verify them.
+
+        This method does an in-place modification to the graph.
+
+        Return:
+          The number of applied edits.
+        """
+        num_edits = self.num_edits
+        for op, inputs in self._inputs.items():
+            op_inputs = list(op.inputs)
+            for index, ts in inputs.items():
+                self._journal.append(
+                    InputEdit(op, index, op_inputs[index], ts))
+                op._update_input(index, ts)
+        for op, ctrl_ops in self._control_inputs.items():
+            existing = set(op.control_inputs)
+            new_ops = [c for c in ctrl_ops if c not in existing]
+            if new_ops:
+                self._journal.extend(ControlEdit(op, c) for c in new_ops)
+                op._add_control_inputs(new_ops)
+        self.verify()
+        self._inputs = OrderedDict()
+        self._control_inputs = OrderedDict()
+        return num_edits
+
+    def revert(self):
+        """Undo the applied edits, latest first, and clear the journal.
+
+        TensorFlow cannot remove operations from a graph. The added
+        operations are left disconnected from the original operations, so
+        that they are not run unless they are fetched, and returned so that
+        the caller can ignore them.
+
+        This method does an in-place modification to the graph.
+
+        Return:
+          A list of the added `tf.Operation`.
+
+        Raise:
+          ValueError: if an input was changed after it was edited.
+        """
+        added_ops = [entry.op for entry in self._journal
+                     if isinstance(entry, AddedOp)]
+        added = set(added_ops)
+        removed_controls = OrderedDict()
+        for entry in reversed(self._journal):
+            if isinstance(entry, InputEdit):
+                if entry.op.inputs[entry.index] is not entry.new_ts:
+                    raise ValueError('Input {} of operation {} has been '
+                                     'changed since it was edited.'.format(
+                                         entry.index, entry.op.name))
+                entry.op._update_input(entry.index, entry.old_ts)
+            elif isinstance(entry, ControlEdit) and entry.op not in added:
+                removed_controls.setdefault(entry.op, set()).add(
+                    entry.ctrl_op)
+        # control inputs can only be removed all at once
+        for op, ctrl_ops in removed_controls.items():
+            remaining = [c for c in op.control_inputs if c not in ctrl_ops]
+            op._remove_all_control_inputs()
+            if remaining:
+                op._add_control_inputs(remaining)
+        self._journal = []
+        return added_ops
+
+    def verify(self):
+        """Check that the collected edits are in the graph.
+
+        Raise:
+          ValueError: if an input or a control input is missing.
+        """
+        for op, inputs in self._inputs.items():
+            op_inputs = op.inputs
+            for index, ts in inputs.items():
+                if op_inputs[index] is not ts:
+                    raise ValueError('Input {} of operation {} is {} instead '
+                                     'of {}.'.format(index, op.name,
+                                                     op_inputs[index].name,
+                                                     ts.name))
+        for op, ctrl_ops in self._control_inputs.items():
+            existing = set(op.control_inputs)
+            for ctrl_op in ctrl_ops:
+                if ctrl_op not in existing:
+                    raise ValueError('Operation {} has no control input '
+                                     '{}.'.format(op.name, ctrl_op.name))
+
+
+def copy_ops(graph, ops, replacements, scope):
+    """Add copies of operations to a graph.
+
+    The copies keep the types, attributes and devices of the operations.
+    A copy reads the copies of the tensors produced by `ops`, the tensors
+    in `replacements`, or the original tensors otherwise. The same holds for
+    the control inputs.
+
+    Args:
+      graph: a `tf.Graph`.
+      ops: a list of `tf.Operation`, producers first.
+      replacements: a dict mapping input `tf.Tensor` to the `tf.Tensor`
+        read by the copies instead.
+      scope: the name scope of the copies.
+
+    Return:
+      A tuple of (a list of the copied `tf.Operation`, in the order of
+      `ops`, a dict mapping the output `tf.Tensor` of `ops` to their
+      copies).
+    """
+    tensors = dict(replacements)
+    copies = {}
+    copied_ops = []
+    for op in ops:
+        inputs = [tensors.get(ts, ts) for ts in op.inputs]
+        control_inputs = [copies.get(c, c) for c in op.control_inputs]
+        with graph.device(op.device):
+            with graph.control_dependencies(control_inputs):
+                copy = graph.create_op(
+                    op.type, inputs, [ts.dtype for ts in op.outputs],
+                    name='{}/{}'.format(scope, op.name),
+                    attrs=dict(op.node_def.attr), op_def=op.op_def)
+        copies[op] = copy
+        copied_ops.append(copy)
+        tensors.update(zip(op.outputs, copy.outputs))
+    return copied_ops, {ts: tensors[ts] for op in ops for ts in op.outputs}
@@ -0,0 +1,207 @@
+# (C) Copyright IBM Corp. 2018. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Offline graph rewriter
+
+The `tflms-rewrite` command runs LMS once on an exported model, so that
+training jobs import a graph that already has its swap operations and skip
+the analysis. Only the graph is edited, so no GPU is needed.
+
+Invocation examples:
+  tflms-rewrite model.meta model_lms.meta --optimizer-scope gradients
+  tflms-rewrite model.pb model_lms.pb --optimizer-scope training/gradients \
+      --budget 12000000000 --dim-binding 64
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import tensorflow as tf
+from google.protobuf import text_format
+
+from tensorflow_large_model_support import fingerprint
+from tensorflow_large_model_support import lms
+
+
+def _is_meta_graph(path):
+    """Return True if a path names a MetaGraphDef file.
+    """
+    return '.meta' in os.path.basename(path)
+
+
+def _is_text(path):
+    """Return True if a path names a file in the protobuf text format.
+    """
+    return path.endswith('txt')
+
+
+def read_graph(path):
+    """Read a MetaGraphDef or a GraphDef file and import its graph.
+
+    Files whose name contains `.meta` hold a MetaGraphDef, and other files
+    a GraphDef. Files whose name ends with `txt` are in the text format.
+
+    Args:
+      path: a file path.
+
+    Return:
+      A tuple of (a `tf.Graph`, the `MetaGraphDef` or None).
+    """
+    meta_graph_def = tf.MetaGraphDef() if _is_meta_graph(path) else None
+    proto = meta_graph_def if meta_graph_def is not None else tf.GraphDef()
+    mode = 'r' if _is_text(path) else 'rb'
+    with tf.gfile.GFile(path, mode) as f:
+        if _is_text(path):
+            text_format.Merge(f.read(), proto)
+        else:
+            proto.ParseFromString(f.read())
+    graph_def = (meta_graph_def.graph_def if meta_graph_def is not None
+                 else proto)
+    graph = tf.Graph()
+    with graph.as_default():
+        tf.import_graph_def(graph_def, name='')
+    return graph, meta_graph_def
+
+
+def write_graph(graph, meta_graph_def, path):
+    """Write a graph as a MetaGraphDef or a GraphDef file, see
+    `read_graph`.
+
+    Args:
+      graph: a `tf.Graph`.
+      meta_graph_def: the `MetaGraphDef` the graph was read from, or None.
+        Its graph is replaced and its other fields, e.g. the collections
+        and the saver, are kept.
+      path: a file path.
+    """
+    graph_def = graph.as_graph_def(add_shapes=True)
+    if _is_meta_graph(path):
+        proto = tf.MetaGraphDef()
+        if meta_graph_def is not None:
+            proto.CopyFrom(meta_graph_def)
+        proto.graph_def.CopyFrom(graph_def)
+    else:
+        proto = graph_def
+    if _is_text(path):
+        with tf.gfile.GFile(path, 'w') as f:
+            f.write(text_format.MessageToString(proto))
+    else:
+        with tf.gfile.GFile(path, 'wb') as f:
+            f.write(proto.SerializeToString())
+
+
+def rewrite(input_path, output_path, report_path, optimizer_scopes,
+            **kwargs):
+    """Rewrite a graph file with LMS and write a JSON report of the plan.
+
+    Args:
+      input_path: the path of the MetaGraphDef or GraphDef to rewrite.
+      output_path: the path of the rewritten graph.
+      report_path: the path of the JSON report.
+      optimizer_scopes: a set of scopes for the optimizers/solvers.
+      kwargs: the keyword arguments of `LMS`.
+
+    Return:
+      The report, a dict.
+    """
+    start_time = time.time()
+    graph, meta_graph_def = read_graph(input_path)
+    input_fingerprint = fingerprint.graph_fingerprint(graph)
+    lms_obj = lms.LMS(optimizer_scopes, graph=graph, **kwargs)
+    with graph.as_default():
+        added_ops = lms_obj.run()
+    write_graph(graph, meta_graph_def, output_path)
+
+    swap_plan = lms_obj.swap_plan
+    report = {'input': input_path,
+              'output': output_path,
+              'input_fingerprint': input_fingerprint,
+              'parameters': dict(kwargs,
+                                 optimizer_scopes=sorted(optimizer_scopes)),
+              'added_ops': len(added_ops) if added_ops else 0,
+              'swapped_tensors': len(swap_plan.swaps) if swap_plan else 0,
+              'swapped_bytes': swap_plan.total_bytes if swap_plan else 0,
+              'recomputes': len(swap_plan.recomputes) if swap_plan else 0,
+              'plan': swap_plan.to_dict() if swap_plan else None,
+              'stats': lms_obj.stats.to_dict()}
+    if swap_plan is not None:
+        report['predicted_peak_bytes'] = int(lms_obj.simulate().peak)
+    report['elapsed_seconds'] = time.time() - start_time
+    with tf.gfile.GFile(report_path, 'w') as f:
+        f.write(json.dumps(report, indent=2, sort_keys=True))
+    return report
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(
+        prog='tflms-rewrite',
+        description='Rewrite a MetaGraphDef or GraphDef file with '
+                    'TensorFlow Large Model Support.')
+    parser.add_argument('input', help='the MetaGraphDef (*.meta) or '
+                        'GraphDef file to rewrite, in the text format if '
+                        'its name ends with "txt"')
+    parser.add_argument('output', help='the rewritten file, whose format '
+                        'is chosen by its name like the input')
+    parser.add_argument('--optimizer-scope', dest='optimizer_scopes',
+                        action='append', required=True,
+                        help='a scope of the optimizers/solvers, may be '
+                             'repeated')
+    parser.add_argument('--report', help='the JSON report of the plan. '
+                        'Default the output path followed by ".lms.json"')
+    parser.add_argument('--starting-scope')
+    parser.add_argument('--starting-op-name', dest='starting_op_names',
+                        action='append')
+    parser.add_argument('--budget', type=int, dest='memory_budget_bytes',
+                        help='the device memory budget in bytes')
+    parser.add_argument('--lb', type=int, default=1)
+    parser.add_argument('--ub', type=int, default=10000)
+    parser.add_argument('--n-tensors', type=int, default=-1)
+    parser.add_argument('--fuse-swapins', action='store_true')
+    parser.add_argument('--ctrld-strategy', default='chain_rule',
+                        choices=sorted(lms.CTRLD_STRATEGIES))
+    parser.add_argument('--swap-branches', action='store_true')
+    parser.add_argument('--branch-threshold', type=int, default=0)
+    parser.add_argument('--recompute', action='store_true')
+    parser.add_argument('--dim-binding', type=int, dest='dim_bindings',
+                        help='the size of the unknown dimensions, e.g. the '
+                             'batch size')
+    parser.add_argument('--cpu-device', default='/cpu:0')
+    parser.add_argument('--debug', action='store_true')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Entry point of `tflms-rewrite`.
+    """
+    args = _parse_args(argv)
+    tf.logging.set_verbosity(tf.logging.INFO)
+    kwargs = vars(args)
+    input_path = kwargs.pop('input')
+    output_path = kwargs.pop('output')
+    report_path = kwargs.pop('report') or output_path + '.lms.json'
+    optimizer_scopes = set(kwargs.pop('optimizer_scopes'))
+    report = rewrite(input_path, output_path, report_path, optimizer_scopes,
+                     **kwargs)
+    print('{} tensors swapped ({} bytes), {} recomputes, report written to '
+          '{}'.format(report['swapped_tensors'], report['swapped_bytes'],
+                      report['recomputes'], report_path))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,131 @@
+# (C) Copyright IBM Corp. 2018. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Name scope index
+"""
+import bisect
+import re
+
+import numpy as np
+
+# characters with a special meaning in regular expressions
+_REGEX_CHARS = frozenset('.^$*+?{}[]\\|()')
+
+
+def _is_literal(pattern):
+    """Return True if a pattern has no special regular expression
+    characters, i.e. it only matches itself.
+    """
+    return not _REGEX_CHARS.intersection(pattern)
+
+
+class ScopeIndex(object):
+    """ScopeIndex class looks up operations by name prefix, name scope,
+    name and type.
+
+    The names are kept sorted, which is a flattened prefix trie: the names
+    starting with a prefix are contiguous and found by binary search. The
+    types are kept in an inverted index. A lookup then costs the size of its
+    result instead of a scan of the graph.
+
+    Scopes and names are regular expressions in the LMS parameters, e.g. in
+    `ge.filter_ops_from_regex`. Patterns with special regular expression
+    characters are matched by a scan of the names.
+    """
+    def __init__(self, ops):
+        """Create a ScopeIndex object.
+
+        Args:
+          ops: a list of `tf.Operation`, indexed by op id.
+        """
+        names = [op.name for op in ops]
+        order = sorted(range(len(names)), key=names.__getitem__)
+        self._names = [names[i] for i in order]
+        self._ids = np.asarray(order, dtype=np.int64)
+        self._types = {}
+        for i, op in enumerate(ops):
+            self._types.setdefault(op.type, []).append(i)
+
+    def prefix_ops(self, prefix):
+        """Return the ids of the operations whose name matches the regular
+        expression `^prefix`.
+
+        Args:
+          prefix: a string.
+
+        Return:
+          A NumPy array of integers.
+        """
+        if not _is_literal(prefix):
+            return self._scan('^{}'.format(prefix))
+        start = bisect.bisect_left(self._names, prefix)
+        end = start
+        n = len(self._names)
+        while end < n and self._names[end].startswith(prefix):
+            end += 1
+        return self._ids[start:end]
+
+    def scope_ops(self, scope):
+        """Return the ids of the operations in a name scope, like
+        `ge.get_name_scope_ops`: the operation named `scope` and the
+        operations whose name starts with `scope/`.
+
+        Args:
+          scope: a string.
+
+        Return:
+          A NumPy array of integers.
+        """
+        if scope and scope[-1] == '/':
+            scope = scope[:-1]
+        if not _is_literal(scope):
+            return self._scan('^{}(/.*)?$'.format(scope))
+        return np.concatenate([self.name_ops(scope),
+                               self.prefix_ops(scope + '/')])
+
+    def name_ops(self, name):
+        """Return the ids of the operations whose name matches the regular
+        expression `^name$`.
+
+        Args:
+          name: a string.
+
+        Return:
+          A NumPy array of integers.
+        """
+        if not _is_literal(name):
+            return self._scan('^{}$'.format(name))
+        i = bisect.bisect_left(self._names, name)
+        if i < len(self._names) and self._names[i] == name:
+            return self._ids[i:i + 1]
+        return self._ids[:0]
+
+    def type_ops(self, op_type):
+        """Return the ids of the operations with a type.
+
+        Args:
+          op_type: a string.
+
+        Return:
+          A NumPy array of integers.
+        """
+        return np.asarray(self._types.get(op_type, ()), dtype=np.int64)
+
+    def _scan(self, regex):
+        """Return the ids of the operations whose name matches a regular
+        expression, in name order.
+        """
+        regex_obj = re.compile(regex)
+        return self._ids[[i for i, name in enumerate(self._names)
+                          if regex_obj.search(name)]]
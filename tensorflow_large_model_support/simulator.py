@@ -0,0 +1,307 @@
+# (C) Copyright IBM Corp. 2018. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Memory simulator
+"""
+import numpy as np
+
+
+def _segment_reduce(ufunc, values, ptr, initial):
+    """Reduce the segments `values[ptr[i]:ptr[i+1]]` with `ufunc`.
+
+    Empty segments get `initial`.
+    """
+    n_segments = len(ptr) - 1
+    result = np.full(n_segments, initial, dtype=np.int64)
+    non_empty = np.flatnonzero(ptr[1:] > ptr[:-1])
+    if non_empty.size:
+        result[non_empty] = ufunc.reduceat(values, ptr[non_empty])
+    return result
+
+
+def _interval_sum(n_orders, starts, ends, sizes):
+    """Return the sum of `sizes` over the half-open intervals
+    [`starts`, `ends`) at every order.
+    """
+    delta = np.zeros(n_orders + 1, dtype=np.int64)
+    np.add.at(delta, starts, sizes)
+    np.add.at(delta, ends, -sizes)
+    return np.cumsum(delta)[:-1]
+
+
+def _split_plan(plan):
+    """Return the swapped tensor ids and the swap-in orders of a swap plan.
+    """
+    if isinstance(plan, dict):
+        return (np.asarray(list(plan.keys()), dtype=np.int64),
+                np.asarray(list(plan.values()), dtype=np.int64))
+    return np.asarray(list(plan), dtype=np.int64), None
+
+
+class MemoryProfile(object):
+    """MemoryProfile class holds the result of a simulation.
+    """
+    def __init__(self, device, host, live_at_peak):
+        """Create a MemoryProfile object.
+
+        Args:
+          device: a NumPy array of the device bytes at every order.
+          host: a NumPy array of the host bytes at every order.
+          live_at_peak: a NumPy array of the ids of the tensors on the
+            device at the order of the peak.
+        """
+        self.device = device
+        self.host = host
+        self.live_at_peak = live_at_peak
+
+    @property
+    def peak(self):
+        """The peak device memory in bytes.
+        """
+        return int(self.device.max()) if self.device.size else 0
+
+    @property
+    def peak_order(self):
+        """The first order at which the device memory peaks, -1 if there is
+        no order.
+        """
+        return int(np.argmax(self.device)) if self.device.size else -1
+
+    @property
+    def host_peak(self):
+        """The peak host memory in bytes.
+        """
+        return int(self.host.max()) if self.host.size else 0
+
+
+class MemorySimulator(object):
+    """MemorySimulator class predicts the memory used by the tensors of a
+    graph at every order of its topological order, on the device and on the
+    host.
+
+    A tensor is allocated on the device by its producing operation and
+    freed after its last consuming operation. Operations without an order
+    are ignored. A swapped tensor is swapped out after its last forward
+    consumer, which frees the device copy and allocates a host copy, and
+    is swapped in before its first backward consumer, which reallocates the
+    device copy and frees the host copy. By default, a tensor is swapped in
+    `lb` orders before its first backward consumer.
+
+    The live intervals of all tensors are kept as NumPy arrays, and a
+    simulation sums them with difference arrays, so that it costs
+    O(tensors + orders).
+    """
+    def __init__(self, index, orders, sizes, grad_flags, lb=1):
+        """Create a MemorySimulator object.
+
+        Args:
+          index: a `GraphIndex`.
+          orders: a NumPy array of the order of every op id, -1 for the ops
+            without an order, e.g. `TOPOS.orders`.
+          sizes: a NumPy array of the byte size of every tensor id. Unknown
+            sizes, i.e. negative values, are counted as 0.
+          grad_flags: a NumPy array of booleans marking the gradient ops.
+          lb: lower-bound value of LMS, the number of orders a tensor is
+            swapped in before its first backward consumer.
+        """
+        orders = np.asarray(orders, dtype=np.int64)
+        grad_flags = np.asarray(grad_flags, dtype=bool)
+        self._n_orders = int(orders.max()) + 1 if orders.size else 0
+        self._sizes = np.maximum(np.asarray(sizes, dtype=np.int64), 0)
+
+        # consumers are stored tensor by tensor, so the live intervals are
+        # segment reductions over them
+        ts_order = orders[index.ts_producer]
+        cons_order = orders[index.ts_cons_ops]
+        cons_grad = grad_flags[index.ts_cons_ops]
+        ptr = index.ts_cons_ptr
+        self._start = ts_order
+        self._end = np.maximum(ts_order, _segment_reduce(
+            np.maximum, cons_order, ptr, -1))
+        self._last_fw = np.maximum(ts_order, _segment_reduce(
+            np.maximum, np.where(cons_grad, -1, cons_order), ptr, -1))
+        self._first_bw = _segment_reduce(
+            np.minimum,
+            np.where(cons_grad & (cons_order >= 0), cons_order,
+                     self._n_orders),
+            ptr, self._n_orders)
+        self._lb = lb
+        self._live = ts_order >= 0
+
+    @property
+    def n_orders(self):
+        """The number of orders.
+        """
+        return self._n_orders
+
+    def swap_interval(self, ts_ids, swapin_orders=None):
+        """Return the range of orders in which swapped tensors are off the
+        device.
+
+        Args:
+          ts_ids: a sequence of tensor ids.
+          swapin_orders: a sequence of orders at which the tensors are
+            swapped in, one for each item in `ts_ids`. By default, a tensor
+            is swapped in `lb` orders before its first backward consumer.
+
+        Return:
+          A tuple of (start, end) NumPy arrays. Tensor `ts_ids[i]` is off
+          the device in the orders [`start[i]`, `end[i]`).
+        """
+        ts_ids = np.asarray(ts_ids, dtype=np.int64)
+        start = self._last_fw[ts_ids] + 1
+        if swapin_orders is None:
+            swapin = self._first_bw[ts_ids] - self._lb
+        else:
+            swapin = np.asarray(swapin_orders, dtype=np.int64)
+        # a tensor is on the device again by its first backward consumer
+        end = np.minimum(np.minimum(swapin, self._first_bw[ts_ids]),
+                         self._end[ts_ids] + 1)
+        return start, np.maximum(end, start)
+
+    def swappable(self, ts_ids):
+        """Return the tensors of `ts_ids` whose swapping frees device memory
+        for at least one order.
+
+        Args:
+          ts_ids: a sequence of tensor ids.
+
+        Return:
+          A NumPy array of tensor ids.
+        """
+        ts_ids = np.asarray(ts_ids, dtype=np.int64)
+        start, end = self.swap_interval(ts_ids)
+        return ts_ids[self._live[ts_ids] & (end > start)]
+
+    def simulate(self, plan=()):
+        """Simulate a swap plan.
+
+        Args:
+          plan: a sequence of swapped tensor ids, or a dict mapping a
+            swapped tensor id to the order at which it is swapped in.
+
+        Return:
+          A `MemoryProfile`.
+        """
+        swapped, swapin_orders = _split_plan(plan)
+        live = np.flatnonzero(self._live)
+        sizes = self._sizes[live]
+        device = _interval_sum(self._n_orders, self._start[live],
+                               self._end[live] + 1, sizes)
+
+        swap_start, swap_end = self.swap_interval(swapped, swapin_orders)
+        keep = self._live[swapped]
+        swapped = swapped[keep]
+        swap_start = swap_start[keep]
+        swap_end = swap_end[keep]
+        swap_sizes = self._sizes[swapped]
+        host = _interval_sum(self._n_orders, swap_start, swap_end,
+                             swap_sizes)
+        device -= host
+
+        peak_order = int(np.argmax(device)) if device.size else -1
+        on_device = (self._live & (self._start <= peak_order) &
+                     (self._end >= peak_order))
+        off_device = swapped[(swap_start <= peak_order) &
+                             (swap_end > peak_order)]
+        on_device[off_device] = False
+        return MemoryProfile(device, host, np.flatnonzero(on_device))
+
+    def swap_stall(self, plan, bandwidth, time_per_order):
+        """Predict the time the computation waits for swap-ins.
+
+        A swap-in transfers its tensor at `bandwidth` and overlaps with the
+        computation of the orders between the swap-in and the first backward
+        consumer, each taking `time_per_order`. The part of the transfer
+        that is not overlapped stalls the computation.
+
+        Args:
+          plan: a swap plan, see `simulate`.
+          bandwidth: the host-device bandwidth in bytes per second.
+          time_per_order: the computation time of one order in seconds.
+
+        Return:
+          A float, the stall in seconds.
+        """
+        swapped, swapin_orders = _split_plan(plan)
+        start, end = self.swap_interval(swapped, swapin_orders)
+        # tensors that never leave the device are not waited for
+        moved = self._live[swapped] & (end > start)
+        transfer = self._sizes[swapped[moved]] / float(bandwidth)
+        overlap = (self._first_bw[swapped[moved]] - end[moved]) * (
+            time_per_order)
+        return float(np.maximum(transfer - overlap, 0).sum())
+
+    def profile(self, swapped=()):
+        """Return the device memory at every order.
+
+        Args:
+          swapped: a swap plan, see `simulate`.
+
+        Return:
+          A NumPy array of bytes, indexed by order.
+        """
+        return self.simulate(swapped).device
+
+    def peak(self, swapped=()):
+        """Return the peak device memory in bytes.
+
+        Args:
+          swapped: a swap plan, see `simulate`.
+        """
+        return self.simulate(swapped).peak
+
+    def select_swaps(self, budget, candidates):
+        """Select tensors to swap so that the peak device memory is not
+        greater than `budget`, moving as few bytes as possible.
+
+        The selection is greedy. While the peak is over budget, among the
+        candidates freeing memory at the order of the peak, the smallest
+        tensor that alone removes the excess is swapped, or the largest one
+        if none does.
+
+        Args:
+          budget: an integer, the device memory budget in bytes.
+          candidates: a sequence of tensor ids that may be swapped.
+
+        Return:
+          A tuple of (a list of tensor ids to swap, the predicted peak).
+        """
+        profile = self.profile()
+        remaining = self.swappable(candidates)
+        remaining = remaining[self._sizes[remaining] > 0]
+        free_start, free_end = self.swap_interval(remaining)
+        selected = []
+        while profile.size:
+            peak_order = int(np.argmax(profile))
+            excess = int(profile[peak_order]) - budget
+            if excess <= 0:
+                break
+            covering = np.flatnonzero((free_start <= peak_order) &
+                                      (free_end > peak_order))
+            if not covering.size:
+                break
+            sizes = self._sizes[remaining[covering]]
+            enough = covering[sizes >= excess]
+            if enough.size:
+                i = int(enough[np.argmin(self._sizes[remaining[enough]])])
+            else:
+                i = int(covering[np.argmax(sizes)])
+            ts_id = int(remaining[i])
+            selected.append(ts_id)
+            profile[free_start[i]:free_end[i]] -= self._sizes[ts_id]
+            # the tensor can not be selected again
+            free_end[i] = free_start[i]
+        peak = int(profile.max()) if profile.size else 0
+        return selected, peak
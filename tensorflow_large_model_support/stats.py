@@ -0,0 +1,147 @@
+# (C) Copyright IBM Corp. 2018. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Run statistics
+"""
+from collections import OrderedDict
+from contextlib import contextmanager
+import time
+
+try:
+    import tracemalloc
+except ImportError:  # Python 2
+    tracemalloc = None
+
+
+class RunStats(object):
+    """RunStats class records the cost of a run of LMS and the size of its
+    edits, e.g. to track the overhead of LMS across model versions.
+
+    The phases are timed in the order they run:
+      - plan_cache: the lookup and the application of a cached plan.
+      - gradient_ops: the discovery of the operations of the backward phase.
+      - seed_ops: the discovery of the starting operations.
+      - scope_filtering: the inclusive and exclusive scopes and types.
+      - topos_build: the topological sort.
+      - planning: the search of the tensors to swap, see `_build_plan`.
+      - applying: the edits of the graph.
+      - validation: the check of the edited graph.
+    """
+    def __init__(self, trace_memory=False):
+        """Create a RunStats object.
+
+        Args:
+          trace_memory: if True, the peak memory allocated by Python during
+            the run is traced with `tracemalloc`, which slows the run down.
+        """
+        self.phase_seconds = OrderedDict()
+        self.total_seconds = 0.0
+        # calls of `tensorflow.contrib.graph_editor`
+        self.graph_editor_calls = 0
+        # replaced inputs and added control inputs
+        self.graph_edits = 0
+        self.added_ops = 0
+        # operations visited by the traversals of the graph index
+        self.traversal_visits = 0
+        # None if memory is not traced
+        self.peak_python_bytes = None
+        self.swapouts = 0
+        self.swapins = 0
+        self.fused_swapins = 0
+        self.recomputes = 0
+        # tensors kept on the device instead of swapped or recomputed
+        self.kept = 0
+        self.bytes_moved = 0
+        self._trace_memory = trace_memory and tracemalloc is not None
+        self._started_tracing = False
+        self._base_bytes = 0
+        self._start_time = None
+
+    def start(self):
+        """Start the clock of the run and the memory tracing.
+        """
+        self._start_time = time.time()
+        if self._trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracing = True
+            if hasattr(tracemalloc, 'reset_peak'):
+                tracemalloc.reset_peak()
+            self._base_bytes = tracemalloc.get_traced_memory()[0]
+
+    def stop(self):
+        """Stop the clock of the run and the memory tracing.
+        """
+        if self._start_time is not None:
+            self.total_seconds = time.time() - self._start_time
+            self._start_time = None
+        if self._trace_memory and tracemalloc.is_tracing():
+            peak = tracemalloc.get_traced_memory()[1]
+            self.peak_python_bytes = max(peak - self._base_bytes, 0)
+            if self._started_tracing:
+                tracemalloc.stop()
+                self._started_tracing = False
+
+    @contextmanager
+    def phase(self, name):
+        """Time a phase. The time of a phase run several times is summed.
+
+        Args:
+          name: the name of the phase.
+        """
+        start_time = time.time()
+        try:
+            yield
+        finally:
+            self.phase_seconds[name] = (self.phase_seconds.get(name, 0.0) +
+                                        time.time() - start_time)
+
+    def record_plan(self, swap_plan):
+        """Record the size of a plan.
+
+        Args:
+          swap_plan: a `SwapPlan`.
+        """
+        swapins = [swapin for swap in swap_plan.swaps
+                   for swapin in swap.swapins]
+        self.swapouts = len(swap_plan.swaps)
+        self.swapins = len(swapins)
+        self.fused_swapins = sum(1 for swapin in swapins
+                                 if len(swapin.consumers) > 1)
+        self.recomputes = len(swap_plan.recomputes)
+        self.kept = len(swap_plan.kept)
+        self.bytes_moved = swap_plan.transfer_bytes
+
+    def to_dict(self):
+        """Return the statistics as a dict, e.g. to be serialized in JSON.
+        """
+        return {'phase_seconds': dict(self.phase_seconds),
+                'total_seconds': self.total_seconds,
+                'graph_editor_calls': self.graph_editor_calls,
+                'graph_edits': self.graph_edits,
+                'added_ops': self.added_ops,
+                'traversal_visits': self.traversal_visits,
+                'peak_python_bytes': self.peak_python_bytes,
+                'swapouts': self.swapouts,
+                'swapins': self.swapins,
+                'fused_swapins': self.fused_swapins,
+                'recomputes': self.recomputes,
+                'kept': self.kept,
+                'bytes_moved': self.bytes_moved}
+
+    def __repr__(self):
+        return ('RunStats({:.3f} s, {} swapouts, {} swapins, {} recomputes, '
+                '{} bytes moved)'.format(self.total_seconds, self.swapouts,
+                                         self.swapins, self.recomputes,
+                                         self.bytes_moved))
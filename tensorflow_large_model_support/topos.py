@@ -15,136 +15,131 @@
 
 """TOPOS
 """
-from six.moves import queue as Queue
-import toposort
+import numpy as np
 
-import tensorflow.contrib.graph_editor as ge
-from tensorflow.contrib.graph_editor import util
+from tensorflow_large_model_support import graph_index
+from tensorflow_large_model_support import levelsort
 
 
 class TOPOS(object):
     """TOPOS class builds a topological order from the computational graph.
+
+    The order is computed on the integer op ids of a `GraphIndex`. Ops of
+    the same order are stored contiguously in an array, so that the order
+    of an op and the ops of an order are array lookups.
     """
-    def __init__(self, seed_ops, grad_ops):
+    def __init__(self, seed_ops, grad_ops, index=None):
         """Create a TOPOS object.
 
         Args:
           seed_ops: a list of `tf.Operation`.
           grad_ops: a set of `tf.Operation`.
+          index: a `GraphIndex` of the graph. If it is not given, it is built
+            from the graph of `seed_ops`.
         """
         self._seed_ops = seed_ops
         self._grad_ops = grad_ops
-
-        self._topo_sort = {}
-        self._orders = {}
+        self._index = index
+
+        # order of each op id, -1 if the op has no order
+        self._orders = []
+        # op ids sorted by order, the ops of order i are
+        # self._order_ops[self._order_ptr[i]:self._order_ptr[i+1]]
+        self._order_ops = []
+        self._order_ptr = [0]
         self._bw_starting_order = -1
 
     def build(self):
         """Build a topological order
         """
-        topo_sort = list(toposort.toposort(self._build_dependency_dict()))
-        for i in range(0, len(topo_sort)):
-            self._topo_sort[i] = topo_sort[i]
+        index = self._index_of_graph()
+        src, dst, nodes = self._build_dependencies()
+        levels = levelsort.kahn_levels(
+            *levelsort.csr_from_edges(index.size, src, dst))
+        if nodes.size and levels[nodes].min() < 0:
+            raise ValueError('The graph has circular dependencies among '
+                             'the operations to be ordered.')
+
+        is_grad = index.mask(self._grad_ops)
+        keep = np.zeros(index.size, dtype=bool)
+        keep[nodes] = True
 
         # if a bw op has the same order with a fw op,
         # then remove the bw op
-        self._clean_bw_ops()
+        n_levels = int(levels[nodes].max()) + 1 if nodes.size else 0
+        has_fw = np.bincount(levels[keep & ~is_grad],
+                             minlength=n_levels) > 0
+        keep &= ~(is_grad & has_fw[np.maximum(levels, 0)])
 
         # if there are non-bw ops in the bw phase,
-        # then remove them, and do reordering
-        self._clean_update_ops()
-        self._reindex()
-
-        # build a dict of (op, order)
-        self._build_order_dict()
+        # then remove them, e.g. ops in the update phase
+        grad_ids = index.op_ids(self._grad_ops)
+        keep[index.forward_walk(grad_ids, inclusive=False)] = False
+
+        # remove orders with no op left and reindex
+        kept = np.flatnonzero(keep)
+        non_empty = np.bincount(levels[kept], minlength=n_levels) > 0
+        new_levels = np.cumsum(non_empty) - 1
+        orders = np.full(index.size, -1, dtype=np.int64)
+        orders[kept] = new_levels[levels[kept]]
+
+        order_ops, order_ptr = levelsort.group_by_level(orders, kept)
+        self._orders = orders.tolist()
+        self._order_ops = order_ops.tolist()
+        self._order_ptr = order_ptr.tolist()
 
         # starting order of the backward phase
-        for i in range(0, len(self._topo_sort)):
-            ops = self._topo_sort[i]
-            if (ops & self._grad_ops):
-                self._bw_starting_order = i
-                break
-
-    def _build_dependency_dict(self):
-        """Build a dictionary of dependencies among nodes.
-        """
-        open_set = Queue.Queue()
-        closed_set = set()
-
-        dep_dict = {}
-        for op in self._seed_ops:
-            open_set.put(op)
-
-        reachable_ops = set(ge.get_walks_intersection_ops(
-            list(self._seed_ops), list(self._grad_ops)))
-
-        # traversal in the fw phase
-        while not open_set.empty():
-            src_op = open_set.get()
-
-            # do action for src_op
-            dep_ops = set(src_op.control_inputs)
-            for t in src_op.inputs:
-                dep_ops |= set(util.get_generating_ops(t))
-                dep_ops &= reachable_ops
-            dep_dict[src_op] = dep_ops
+        grad_orders = orders[kept[is_grad[kept]]]
+        if grad_orders.size:
+            self._bw_starting_order = int(grad_orders.min())
 
-            next_ops = set()
-            for t in src_op.outputs:
-                next_ops |= set(util.get_consuming_ops(t))
-            for op in next_ops:
-                if op in closed_set:
-                    continue
-                if op not in open_set.queue:
-                    open_set.put(op)
+    def _index_of_graph(self):
+        """Return the `GraphIndex`, building it if it was not given.
+        """
+        if self._index is None:
+            self._index = graph_index.GraphIndex(
+                next(iter(self._seed_ops)).graph)
+        return self._index
 
-            closed_set.add(src_op)
+    def _build_dependencies(self):
+        """Build the dependencies among the ops reachable from the seed ops.
 
-        return dep_dict
+        An op depends on the producers of its inputs and on its control
+        inputs. If the op has inputs, only the dependencies that are on a
+        path from the seed ops to the gradient ops are kept.
 
-    def _build_order_dict(self):
-        """Build a dictionary to quickly find an order of an ops.
-        """
-        for order, dep_ops in self._topo_sort.items():
-            for op in dep_ops:
-                self._orders[op] = order
-
-    def _clean_bw_ops(self):
-        """There are some bw ops that
-             - have no incoming bw ops except its fw op, or
-             - have no outgoing ops.
-        Execution order of these ops may depend on Tensorflow runtime.
-        """
-        for i in range(0, len(self._topo_sort)):
-            dep_ops = self._topo_sort[i]
-            fw_dep_ops = dep_ops - self._grad_ops
-            if fw_dep_ops:
-                self._topo_sort[i] = fw_dep_ops
-            else:
-                self._topo_sort[i] = dep_ops
-
-    def _clean_update_ops(self):
-        """Remove ops that are in the update phase.
-        """
-        update_ops = set(ge.get_forward_walk_ops(
-            list(self._grad_ops), inclusive=False))
-        for i in range(0, len(self._topo_sort)):
-            ops = self._topo_sort[i]
-            # remove ops that are not bw or fw op
-            # e.g ops in the update phase
-            self._topo_sort[i] = ops - update_ops
-
-    def _reindex(self):
-        """Remove orders with empty set and _reindex.
+        Return:
+          A tuple of (src, dst, nodes) NumPy arrays of op ids. Op `dst[k]`
+          depends on op `src[k]`, and `nodes` are the ops to be ordered.
         """
-        topo_sort = {}
-        index = 0
-        for i in range(0, len(self._topo_sort)):
-            ops = self._topo_sort[i]
-            if ops:
-                topo_sort[index] = ops
-                index += 1
-        self._topo_sort = topo_sort
+        index = self._index_of_graph()
+        size = index.size
+        reachable = index.mask(index.walks_intersection_ops(
+            list(self._seed_ops), list(self._grad_ops)))
+        in_walk = np.zeros(size, dtype=bool)
+        in_walk[index.forward_walk(index.op_ids(self._seed_ops))] = True
+        has_inputs = np.diff(index.op_in_ptr) > 0
+
+        # data dependencies
+        data_dst = np.repeat(np.arange(size), np.diff(index.op_in_ptr))
+        data_src = index.ts_producer[index.op_in_ts]
+        data_keep = in_walk[data_dst] & reachable[data_src]
+
+        # control dependencies
+        ctrl_dst = np.repeat(np.arange(size), np.diff(index.ctrl_in_ptr))
+        ctrl_src = index.ctrl_in
+        ctrl_keep = in_walk[ctrl_dst] & (reachable[ctrl_src] |
+                                         ~has_inputs[ctrl_dst])
+
+        src = np.concatenate([data_src[data_keep], ctrl_src[ctrl_keep]])
+        dst = np.concatenate([data_dst[data_keep], ctrl_dst[ctrl_keep]])
+        # an op never depends on itself
+        not_self = src != dst
+        src = src[not_self]
+        dst = dst[not_self]
+
+        in_walk[src] = True
+        return src, dst, np.flatnonzero(in_walk)
 
     def get_order(self, op):
         """Return the order of an operation.
@@ -155,10 +150,9 @@ class TOPOS(object):
         Return:
           An integer.
         """
-        if op in self._orders:
-            return self._orders[op]
-        else:
+        if not self._orders or not self._index.contains(op):
             return -1
+        return self._orders[self._index.op_id(op)]
 
     def get_ops(self, order):
         """Return a set of ops with the same order.
@@ -169,13 +163,22 @@ class TOPOS(object):
         Return:
           A set of `tf.Operation`
         """
-        return self._topo_sort[order]
+        return set(self._index.ops(
+            self._order_ops[self._order_ptr[order]:
+                            self._order_ptr[order + 1]]))
+
+    @property
+    def orders(self):
+        """A NumPy array of the order of every op id of the graph index, -1
+        for the ops without an order.
+        """
+        return np.asarray(self._orders, dtype=np.int64)
 
     @property
     def size(self):
         """The number of orders in the topological order.
         """
-        return len(self._topo_sort)
+        return len(self._order_ptr) - 1
 
     @property
     def bw_starting_order(self):
@@ -0,0 +1,124 @@
+# (C) Copyright IBM Corp. 2018. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Traversal
+"""
+
+
+def as_list(values):
+    """Return a sequence, e.g. a NumPy array, as a Python list.
+
+    The graph passes read their arrays one item at a time, for which Python
+    lists are faster than NumPy arrays.
+
+    Args:
+      values: a NumPy array or a sequence.
+
+    Return:
+      A list.
+    """
+    return values.tolist() if hasattr(values, 'tolist') else list(values)
+
+
+class Traversal(object):
+    """Traversal class does breadth-first traversals over an adjacency in
+    the compressed sparse row (CSR) format.
+
+    Nodes are integer ids. The visited set of a traversal is a bitmap, so
+    that a membership check costs O(1), and the frontier of a level is a
+    plain list, so that no lock is taken while walking. A traversal visits
+    every node at most once, hence a walk costs O(V + E).
+
+    Traversals are generators and several of them can be in progress at the
+    same time, e.g. a traversal started while another one is suspended.
+    """
+    def __init__(self, ptr, idx):
+        """Create a Traversal object.
+
+        Args:
+          ptr: a sequence of integers. The neighbors of node `i` are
+            `idx[ptr[i]:ptr[i+1]]`.
+          idx: a sequence of integers.
+        """
+        self._ptr = as_list(ptr)
+        self._idx = as_list(idx)
+        self._size = len(self._ptr) - 1
+        self._visits = 0
+
+    @property
+    def size(self):
+        """The number of nodes.
+        """
+        return self._size
+
+    @property
+    def visits(self):
+        """The total number of nodes visited by the traversals so far.
+        """
+        return self._visits
+
+    def neighbors(self, i):
+        """Return the list of neighbors of node `i`.
+        """
+        return self._idx[self._ptr[i]:self._ptr[i + 1]]
+
+    def levels(self, sources, allowed=None):
+        """Traverse level by level from `sources`.
+
+        Args:
+          sources: an iterable of node ids. They form the first level,
+            regardless of `allowed`.
+          allowed: a sequence of booleans indexed by node id. If given, a
+            node that is not allowed is never entered.
+
+        Return:
+          A generator of lists of node ids, one list per level. The next
+          level is computed only when it is requested, so that a caller can
+          stop early.
+        """
+        visited = bytearray(self._size)
+        ptr = self._ptr
+        idx = self._idx
+        level = []
+        for i in sources:
+            if not visited[i]:
+                visited[i] = 1
+                level.append(i)
+        while level:
+            self._visits += len(level)
+            yield level
+            next_level = []
+            for i in level:
+                for j in idx[ptr[i]:ptr[i + 1]]:
+                    if visited[j]:
+                        continue
+                    if allowed is not None and not allowed[j]:
+                        continue
+                    visited[j] = 1
+                    next_level.append(j)
+            level = next_level
+
+    def walk(self, sources, allowed=None):
+        """Traverse from `sources` in breadth-first order.
+
+        Args:
+          sources: an iterable of node ids.
+          allowed: a sequence of booleans indexed by node id, see `levels`.
+
+        Return:
+          A generator of node ids.
+        """
+        for level in self.levels(sources, allowed):
+            for i in level:
+                yield i
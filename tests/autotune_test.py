@@ -0,0 +1,82 @@
+# (C) Copyright IBM Corp. 2018. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Tests for the LMS autotune module."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from tensorflow_large_model_support import autotune
+from tensorflow_large_model_support import cost_model
+from tensorflow_large_model_support import graph_index
+from tensorflow_large_model_support import simulator
+from tensorflow_large_model_support import topos
+import fake_graph
+import unittest
+
+
+class AutotuneTest(unittest.TestCase):
+
+    def _results(self, points):
+        return [autotune.TuningResult({'id': i}, peak, stall, 1)
+                for i, (peak, stall) in enumerate(points)]
+
+    def test_pareto_front(self):
+        results = self._results([(100, 5.0), (80, 6.0), (120, 1.0),
+                                 (100, 7.0), (130, 1.0), (90, 6.0)])
+        front = autotune.pareto_front(results)
+        self.assertEqual([r.config['id'] for r in front], [1, 0, 2])
+        self.assertEqual(autotune.pareto_front([]), [])
+
+    def test_choose(self):
+        front = autotune.pareto_front(self._results([(80, 6.0), (100, 5.0),
+                                                     (120, 1.0)]))
+        self.assertEqual(autotune.choose(front).peak, 80)
+        self.assertEqual(autotune.choose(front, budget=110).peak, 100)
+        self.assertEqual(autotune.choose(front, budget=500).peak, 120)
+        # nothing fits
+        self.assertEqual(autotune.choose(front, budget=10).peak, 80)
+        self.assertIsNone(autotune.choose([]))
+
+    def test_evaluate(self):
+        # f0 -> f1 -> g1 -> g0, f0 -> g0
+        graph = fake_graph.FakeGraph()
+        f0 = graph.add_op('f0', shape=(10,))
+        f1 = graph.add_op('f1', inputs=[f0])
+        g1 = graph.add_op('g1', inputs=[f1])
+        g0 = graph.add_op('g0', inputs=[g1, f0])
+        index = graph_index.GraphIndex(graph)
+        topo = topos.TOPOS([f0], {g1, g0}, index=index)
+        topo.build()
+        sim = simulator.MemorySimulator(
+            index, topo.orders, cost_model.CostModel(index).sizes,
+            index.mask({g1, g0}))
+        # f0:0 is off the device in order 2 if it is swapped in at order 3,
+        # and the transfer is not overlapped. It never leaves the device if
+        # it is swapped in at order 2.
+        tasks = [({'n': 0}, {}), ({'n': 1}, {0: 3}), ({'n': 1}, {0: 2})]
+        for processes in (0, 2):
+            results = autotune.evaluate(sim, tasks, bandwidth=20.0,
+                                        time_per_order=1.0,
+                                        processes=processes)
+            self.assertEqual([(r.peak, r.stall, r.n_swapped)
+                              for r in results],
+                             [(72, 0.0, 0), (72, 2.0, 1), (72, 0.0, 1)])
+            # the simulator is not kept by the calling process
+            self.assertIsNone(autotune._worker_simulator)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+# (C) Copyright IBM Corp. 2018. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Tests for the LMS cost_model module."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from tensorflow_large_model_support import cost_model
+from tensorflow_large_model_support import graph_index
+import fake_graph
+import unittest
+
+
+class CostModelTest(unittest.TestCase):
+
+    def setUp(self):
+        graph = fake_graph.FakeGraph()
+        self.a = graph.add_op('a', shape=(None, 3))
+        self.b = graph.add_op('b', shape=(4, 5), dtype=fake_graph.FLOAT16)
+        self.c = graph.add_op('c', shape=())
+        self.d = graph.add_op('d', shape=None, dtype=fake_graph.INT64)
+        self.e = graph.add_op('e', shape=(None, 7, None), n_outputs=2)
+        self.index = graph_index.GraphIndex(graph)
+
+    def test_sizes(self):
+        model = cost_model.CostModel(self.index)
+        self.assertEqual(model.sizes.tolist(), [-1, 40, 4, -1, -1, -1])
+        self.assertEqual(model.tensor_bytes(1), 40)
+        self.assertEqual(model.bytes_of(self.c.outputs[0]), 4)
+        self.assertEqual(model.op_bytes(self.index.op_id(self.e)), 0)
+
+    def test_dim_bindings(self):
+        model = cost_model.CostModel(self.index, dim_bindings=2)
+        self.assertEqual(model.sizes.tolist(), [24, 40, 4, -1, 112, 112])
+        model = cost_model.CostModel(self.index, dim_bindings={0: 8})
+        self.assertEqual(model.sizes.tolist(), [96, 40, 4, -1, -1, -1])
+        model = cost_model.CostModel(self.index,
+                                     dim_bindings={0: 8, 2: 10})
+        self.assertEqual(model.sizes.tolist(), [96, 40, 4, -1, 2240, 2240])
+        self.assertEqual(model.op_bytes(self.index.op_id(self.e)), 4480)
+        self.assertRaisesRegex(ValueError, 'non-negative',
+                               cost_model.CostModel, self.index, {0: -1})
+
+    def test_total_and_rank(self):
+        model = cost_model.CostModel(self.index, dim_bindings={0: 8})
+        self.assertEqual(model.total_bytes([0, 1, 3]), 136)
+        self.assertEqual(model.rank([3, 2, 1, 0, 4]).tolist(),
+                         [0, 1, 2, 3, 4])
+
+    def test_op_time(self):
+        graph = fake_graph.FakeGraph()
+        x = graph.add_op('x', shape=(4,))
+        relu = graph.add_op('relu', inputs=[x], op_type='Relu', shape=(4,))
+        conv = graph.add_op('conv', inputs=[relu], op_type='Conv2D')
+        cast = graph.add_op('cast', inputs=[conv], op_type='Cast',
+                            shape=None)
+        index = graph_index.GraphIndex(graph)
+        model = cost_model.CostModel(index)
+        self.assertEqual(model.op_time(index.op_id(relu), 8.0), 4.0)
+        self.assertIsNone(model.op_time(index.op_id(conv), 8.0))
+        self.assertIsNone(model.op_time(index.op_id(cast), 8.0))
+        # the unknown size of cast:0 is not counted
+        self.assertEqual(model.io_bytes().tolist(), [16, 32, 32, 16])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+# (C) Copyright IBM Corp. 2018. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Tests for the LMS events module."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from tensorflow_large_model_support import events
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+import mock
+
+
+class _Op(object):
+
+    def __init__(self, name):
+        self.name = name
+
+
+class _Unprintable(object):
+    """A field that fails the test if it is formatted."""
+
+    def __str__(self):
+        raise AssertionError('the field was formatted')
+
+    __repr__ = __str__
+
+
+class EventsTest(unittest.TestCase):
+
+    def test_message(self):
+        event = events.Event('swapin_added', 1,
+                             'Consuming op {op.name} swaps in {ts}',
+                             {'op': _Op('g0'), 'ts': 'f0:0'}, timestamp=1.5)
+        self.assertEqual(event.message(), 'Consuming op g0 swaps in f0:0')
+        self.assertEqual(event.to_dict(),
+                         {'event': 'swapin_added', 'level': 1, 'time': 1.5,
+                          'op': 'g0', 'ts': 'f0:0'})
+
+    def test_to_dict(self):
+        stats = mock.Mock()
+        stats.to_dict.return_value = {'swapouts': 2}
+        event = events.Event('fields', 0, '', {
+            'ops': {_Op('b'), _Op('a')},
+            'orders': [(_Op('a'), 1)],
+            'count': 3,
+            'ratio': 0.5,
+            'flag': True,
+            'none': None,
+            'stats': stats,
+            'other': object})
+        value = event.to_dict()
+        self.assertEqual(value['ops'], ['a', 'b'])
+        self.assertEqual(value['orders'], [['a', 1]])
+        self.assertEqual(value['count'], 3)
+        self.assertEqual(value['ratio'], 0.5)
+        self.assertIs(value['flag'], True)
+        self.assertIsNone(value['none'])
+        self.assertEqual(value['stats'], {'swapouts': 2})
+        self.assertEqual(value['other'], str(object))
+        json.dumps(value)
+
+    def test_levels(self):
+        info = events.MemorySink(level=0)
+        debug = events.MemorySink(level=2)
+        log = events.EventLog([info])
+        self.assertTrue(log.enabled(0))
+        self.assertFalse(log.enabled(1))
+        # nothing is created or formatted for the levels no sink takes
+        with mock.patch.object(events, 'Event') as event:
+            log.emit('operation', 2, 'Operation: {op}', op=_Unprintable())
+            self.assertFalse(event.called)
+
+        log.add_sink(debug)
+        self.assertTrue(log.enabled(2))
+        self.assertEqual(log.sinks, (info, debug))
+        log.emit('editing', 0, 'Editing model for LMS')
+        log.emit('operation', 2, 'Operation: {op}', op=_Unprintable())
+        self.assertEqual(info.names(), ['editing'])
+        self.assertEqual(debug.names(), ['editing', 'operation'])
+
+        log.remove_sink(debug)
+        self.assertFalse(log.enabled(1))
+        log.remove_sink(info)
+        self.assertFalse(log.enabled(0))
+
+    @mock.patch('tensorflow.logging.info')
+    def test_logging_sink(self, info):
+        log = events.EventLog([events.LoggingSink(level=1)])
+        log.emit('added_ops', 0, 'Added {count} ops into the model',
+                 count=3)
+        log.emit('rewired', 1, 'Rewired {count} inputs', count=2)
+        log.emit('operation', 2, 'Operation: {op}', op=_Unprintable())
+        self.assertEqual(info.call_args_list,
+                         [mock.call('[LMS][0] Added 3 ops into the model'),
+                          mock.call('[LMS][1] Rewired 2 inputs')])
+
+    def test_json_lines_sink(self):
+        f = io.StringIO()
+        sink = events.JSONLinesSink(f)
+        log = events.EventLog([sink])
+        log.emit('swapout_added', 1, '{ts} ({nbytes} bytes)',
+                 ts=_Op('f0:0'), nbytes=40)
+        log.emit('reverted', 0, 'disconnected {count} ops', count=2)
+        sink.close()
+        lines = [json.loads(line) for line in f.getvalue().splitlines()]
+        self.assertEqual([line['event'] for line in lines],
+                         ['swapout_added', 'reverted'])
+        self.assertEqual(lines[0]['ts'], 'f0:0')
+        self.assertEqual(lines[0]['nbytes'], 40)
+        self.assertEqual(lines[1]['level'], 0)
+
+        # events are appended to a file
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp_dir, 'events.jsonl')
+            for count in (1, 2):
+                sink = events.JSONLinesSink(path)
+                sink.write(events.Event('reverted', 0, '',
+                                        {'count': count}))
+                sink.close()
+            with open(path) as f:
+                self.assertEqual([json.loads(line)['count'] for line in f],
+                                 [1, 2])
+        finally:
+            shutil.rmtree(tmp_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
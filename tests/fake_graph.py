@@ -0,0 +1,186 @@
+# (C) Copyright IBM Corp. 2018. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Lightweight stand-ins for `tf.Graph`, `tf.Operation` and `tf.Tensor`
+used by the unit tests of the graph analysis passes."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import contextlib
+
+
+class FakeDType(object):
+
+    def __init__(self, name, size):
+        self.name = name
+        self.size = size
+
+    def __repr__(self):
+        return self.name
+
+
+FLOAT32 = FakeDType('float32', 4)
+FLOAT16 = FakeDType('float16', 2)
+INT64 = FakeDType('int64', 8)
+
+
+class FakeShape(object):
+
+    def __init__(self, dims):
+        self._dims = dims
+
+    @property
+    def ndims(self):
+        return None if self._dims is None else len(self._dims)
+
+    def as_list(self):
+        if self._dims is None:
+            raise ValueError('as_list() is not defined on an unknown shape.')
+        return list(self._dims)
+
+
+class FakeTensor(object):
+
+    def __init__(self, op, value_index, dtype, shape):
+        self.op = op
+        self.value_index = value_index
+        self.dtype = dtype
+        self._shape = shape
+        self.name = '%s:%d' % (op.name, value_index)
+
+    @property
+    def graph(self):
+        return self.op.graph
+
+    def get_shape(self):
+        return FakeShape(self._shape)
+
+    def consumers(self):
+        return [op for op in self.op.graph.get_operations()
+                if self in op.inputs]
+
+    def __repr__(self):
+        return self.name
+
+
+class FakeOp(object):
+
+    def __init__(self, graph, name, op_type, inputs, control_inputs,
+                 n_outputs, dtype, shape):
+        self.graph = graph
+        self.name = name
+        self.type = op_type
+        self.device = ''
+        self.inputs = list(inputs)
+        self.control_inputs = list(control_inputs)
+        self.outputs = [FakeTensor(self, i, dtype, shape)
+                        for i in range(n_outputs)]
+        self.node_def = FakeNodeDef()
+        self.op_def = None
+
+    def _update_input(self, index, tensor):
+        self.inputs[index] = tensor
+
+    def _add_control_inputs(self, ops):
+        self.control_inputs.extend(ops)
+
+    def _remove_all_control_inputs(self):
+        self.control_inputs = []
+
+    def __repr__(self):
+        return self.name
+
+
+class FakeNodeDef(object):
+
+    def __init__(self):
+        self.attr = {}
+
+
+class FakeGraph(object):
+
+    def __init__(self):
+        self._ops = []
+        self._device = ''
+        self._control_inputs = []
+        self._collections = {}
+
+    def get_operations(self):
+        return list(self._ops)
+
+    def add_to_collection(self, name, value):
+        self._collections.setdefault(name, []).append(value)
+
+    def get_collection(self, name):
+        return list(self._collections.get(name, []))
+
+    def add_op(self, name, inputs=(), control_inputs=(), op_type='Fake',
+               n_outputs=1, dtype=FLOAT32, shape=(2, 2)):
+        """Add an operation. `inputs` may contain operations, in which case
+        their first output tensor is used."""
+        inputs = [t.outputs[0] if isinstance(t, FakeOp) else t
+                  for t in inputs]
+        op = FakeOp(self, name, op_type, inputs, control_inputs,
+                    n_outputs, dtype, shape)
+        self._ops.append(op)
+        return op
+
+    def get_operation_by_name(self, name):
+        for op in self._ops:
+            if op.name == name:
+                return op
+        raise KeyError(name)
+
+    def get_tensor_by_name(self, name):
+        op_name, _, idx = name.rpartition(':')
+        return self.get_operation_by_name(op_name).outputs[int(idx)]
+
+    @contextlib.contextmanager
+    def device(self, device):
+        old_device, self._device = self._device, device
+        yield
+        self._device = old_device
+
+    @contextlib.contextmanager
+    def control_dependencies(self, control_inputs):
+        old_inputs = self._control_inputs
+        self._control_inputs = old_inputs + list(control_inputs)
+        yield
+        self._control_inputs = old_inputs
+
+    def create_op(self, op_type, inputs, dtypes, name=None, attrs=None,
+                  op_def=None):
+        """A replacement of `tf.Graph.create_op` for ops with outputs of
+        the same dtype."""
+        op = self.add_op(name, inputs=inputs,
+                         control_inputs=self._control_inputs,
+                         op_type=op_type, n_outputs=len(dtypes),
+                         dtype=dtypes[0] if dtypes else FLOAT32)
+        op.device = self._device
+        op.node_def.attr = dict(attrs or {})
+        op.op_def = op_def
+        return op
+
+    def chain(self, prefix, length, first_inputs=(), op_type='Fake'):
+        """Add a chain of `length` operations and return them."""
+        ops = []
+        inputs = first_inputs
+        for i in range(length):
+            op = self.add_op('%s%d' % (prefix, i), inputs=inputs,
+                             op_type=op_type)
+            ops.append(op)
+            inputs = [op]
+        return ops
@@ -0,0 +1,176 @@
+# (C) Copyright IBM Corp. 2018. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Tests for the LMS fingerprint module."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from tensorflow_large_model_support import fingerprint
+from tensorflow_large_model_support import graph_index
+import fake_graph
+import mock
+import unittest
+
+
+def _model(suffix='', batch=8, summary=False, reverse=False):
+    """x -> f1 -> f2 -> gradients/g2 -> gradients/g1, v -> f1, plus an
+    unrelated branch u -> w."""
+    graph = fake_graph.FakeGraph()
+
+    def add_forward():
+        x = graph.add_op('x' + suffix, shape=(batch, 4))
+        v = graph.add_op('v' + suffix, op_type='VariableV2', shape=(4, 4))
+        f1 = graph.add_op('f1' + suffix, inputs=[x, v], op_type='MatMul',
+                          shape=(batch, 4))
+        f2 = graph.add_op('f2' + suffix, inputs=[f1], op_type='Relu',
+                          shape=(batch, 4))
+        return x, f1, f2
+
+    def add_unrelated():
+        u = graph.add_op('u' + suffix)
+        graph.add_op('w' + suffix, inputs=[u], op_type='Neg')
+
+    if reverse:
+        add_unrelated()
+    x, f1, f2 = add_forward()
+    if not reverse:
+        add_unrelated()
+    g2 = graph.add_op('gradients/g2' + suffix, inputs=[f2, f1],
+                      op_type='ReluGrad', shape=(batch, 4))
+    graph.add_op('gradients/g1' + suffix, inputs=[g2, x],
+                 control_inputs=[f2], op_type='MatMul', shape=(4, 4))
+    if summary:
+        graph.add_op('loss', inputs=[f2], op_type='ScalarSummary')
+    return graph
+
+
+class GraphFingerprintTest(unittest.TestCase):
+
+    def test_names_and_order(self):
+        value = fingerprint.graph_fingerprint(_model())
+        self.assertEqual(value, fingerprint.graph_fingerprint(_model()))
+        self.assertEqual(value, fingerprint.graph_fingerprint(
+            _model(suffix='_1', reverse=True)))
+        self.assertEqual(value, fingerprint.graph_fingerprint(
+            _model(summary=True)))
+        self.assertEqual(value, fingerprint.graph_fingerprint(
+            graph_index.GraphIndex(_model())))
+
+    def test_structure(self):
+        value = fingerprint.graph_fingerprint(_model())
+        graph = _model()
+        graph.get_operations()[3].type = 'Sigmoid'
+        self.assertNotEqual(value, fingerprint.graph_fingerprint(graph))
+        # an input index is swapped
+        graph = _model()
+        g2 = graph.get_operations()[6]
+        g2.inputs.reverse()
+        self.assertNotEqual(value, fingerprint.graph_fingerprint(graph))
+        graph = _model()
+        graph.get_operations()[2].device = '/gpu:0'
+        self.assertNotEqual(value, fingerprint.graph_fingerprint(graph))
+        graph = _model()
+        graph.get_operations()[7].control_inputs = []
+        self.assertNotEqual(value, fingerprint.graph_fingerprint(graph))
+
+    def test_shapes(self):
+        self.assertNotEqual(fingerprint.graph_fingerprint(_model()),
+                            fingerprint.graph_fingerprint(_model(batch=16)))
+        self.assertEqual(
+            fingerprint.graph_fingerprint(_model(), shapes=False),
+            fingerprint.graph_fingerprint(_model(batch=16), shapes=False))
+
+    def test_subgraph(self):
+        graph = _model()
+        x = graph.get_operations()[0]
+        value = fingerprint.graph_fingerprint(graph, [x], {'gradients'})
+        self.assertNotEqual(value, fingerprint.graph_fingerprint(graph))
+        # the unrelated branch is not hashed
+        graph = _model()
+        graph.get_operations()[5].type = 'Abs'
+        self.assertEqual(value, fingerprint.graph_fingerprint(
+            graph, [graph.get_operations()[0]], {'gradients'}))
+        graph = _model(suffix='_1')
+        self.assertEqual(value, fingerprint.graph_fingerprint(
+            graph, [graph.get_operations()[0]], {'gradients'}))
+
+    def test_cycle(self):
+        graph = fake_graph.FakeGraph()
+        enter = graph.add_op('enter', op_type='Enter')
+        merge = graph.add_op('merge', inputs=[enter], op_type='Merge')
+        next_iteration = graph.add_op('next', inputs=[merge],
+                                      op_type='NextIteration')
+        merge.inputs.append(next_iteration.outputs[0])
+        value = fingerprint.graph_fingerprint(graph)
+        next_iteration.type = 'Identity'
+        self.assertNotEqual(value, fingerprint.graph_fingerprint(graph))
+
+
+def _node(name, op, inputs=(), shapes=None):
+    node = mock.Mock()
+    node.name = name
+    node.op = op
+    node.device = ''
+    node.input = list(inputs)
+    node.attr = {}
+    if shapes is not None:
+        shape_protos = []
+        for dims in shapes:
+            shape = mock.Mock(unknown_rank=dims is None)
+            shape.dim = [mock.Mock(size=d) for d in dims or ()]
+            shape_protos.append(shape)
+        node.attr['_output_shapes'] = mock.Mock()
+        node.attr['_output_shapes'].list.shape = shape_protos
+    return node
+
+
+class GraphDefFingerprintTest(unittest.TestCase):
+
+    def _graph_def(self, prefix='', batch=8):
+        graph_def = mock.Mock()
+        graph_def.node = [
+            _node(prefix + 'x', 'Placeholder', shapes=[(batch, 4)]),
+            _node(prefix + 'f', 'Split', [prefix + 'x'],
+                  shapes=[(batch, 2), (batch, 2)]),
+            _node(prefix + 'gradients/g', 'Sub',
+                  [prefix + 'f:1', prefix + 'f', '^' + prefix + 'x'],
+                  shapes=[None])]
+        return graph_def
+
+    def test_graph_def_fingerprint(self):
+        value = fingerprint.graph_def_fingerprint(self._graph_def())
+        self.assertEqual(value, fingerprint.graph_def_fingerprint(
+            self._graph_def('a/')))
+        self.assertNotEqual(value, fingerprint.graph_def_fingerprint(
+            self._graph_def(batch=16)))
+        self.assertEqual(
+            fingerprint.graph_def_fingerprint(self._graph_def(),
+                                              shapes=False),
+            fingerprint.graph_def_fingerprint(self._graph_def(batch=16),
+                                              shapes=False))
+        graph_def = self._graph_def()
+        graph_def.node[2].input[:2] = ['f', 'f:1']
+        self.assertNotEqual(value,
+                            fingerprint.graph_def_fingerprint(graph_def))
+        self.assertEqual(
+            fingerprint.graph_def_fingerprint(self._graph_def(), ['f'],
+                                              {'gradients'}),
+            fingerprint.graph_def_fingerprint(self._graph_def('a/'),
+                                              ['a/f'], {'a/gradients'}))
+
+
+if __name__ == '__main__':
+    unittest.main()
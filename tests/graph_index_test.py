@@ -0,0 +1,90 @@
+# (C) Copyright IBM Corp. 2018. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Tests for the LMS graph_index module."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from six import assertCountEqual
+from tensorflow_large_model_support import graph_index
+import fake_graph
+import unittest
+
+
+class GraphIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        # a -> b -> d
+        # a -> c -> d, c has two outputs, d consumes c:0 twice
+        self.graph = fake_graph.FakeGraph()
+        g = self.graph
+        self.a = g.add_op('a', shape=(None, 3))
+        self.b = g.add_op('b', inputs=[self.a], dtype=fake_graph.FLOAT16)
+        self.c = g.add_op('c', inputs=[self.a], n_outputs=2, shape=None)
+        self.d = g.add_op('d', inputs=[self.b, self.c.outputs[0],
+                                       self.c.outputs[0]],
+                          control_inputs=[self.a])
+        self.index = graph_index.GraphIndex(self.graph)
+
+    def test_ids(self):
+        index = self.index
+        self.assertEqual(index.size, 4)
+        self.assertEqual(index.num_tensors, 5)
+        for i, op in enumerate(self.graph.get_operations()):
+            self.assertEqual(index.op_id(op), i)
+            self.assertIs(index.op(i), op)
+        self.assertEqual(list(index.outputs(index.op_id(self.c))), [2, 3])
+        self.assertIs(index.tensor(3), self.c.outputs[1])
+        self.assertEqual(index.producer(3), index.op_id(self.c))
+        self.assertTrue(index.contains(self.a))
+        self.assertFalse(index.contains('z'))
+        self.assertEqual(list(index.op_ids([self.d, 'z', self.a])), [3, 0])
+
+    def test_adjacency(self):
+        index = self.index
+        self.assertEqual(list(index.inputs(3)), [1, 2, 2])
+        self.assertEqual(list(index.consumers(2)), [3])
+        self.assertEqual(list(index.consumers(0)), [1, 2])
+        self.assertEqual(list(index.consumers(3)), [])
+        self.assertEqual(list(index.successors(0)), [1, 2])
+        self.assertEqual(list(index.predecessors(3)), [1, 2])
+        self.assertEqual(list(index.control_inputs(3)), [0])
+        self.assertEqual(index.consuming_ops(self.a.outputs[0]),
+                         [self.b, self.c])
+
+    def test_dtype_and_shape(self):
+        index = self.index
+        self.assertEqual(list(index.ts_dtype_size), [4, 2, 4, 4, 4])
+        self.assertIs(index.dtype(1), fake_graph.FLOAT16)
+        self.assertEqual(index.shape(0), (None, 3))
+        self.assertEqual(index.shape(1), (2, 2))
+        self.assertIsNone(index.shape(2))
+
+    def test_walks(self):
+        index = self.index
+        self.assertEqual(index.forward_walk([0]), [0, 1, 2, 3])
+        self.assertEqual(index.forward_walk([0], inclusive=False), [1, 2, 3])
+        within = index.mask([self.a, self.c, self.d])
+        self.assertEqual(index.forward_walk([0], within=within), [0, 2, 3])
+        self.assertEqual(index.backward_walk([1]), [1, 0])
+        self.assertEqual(index.forward_walk_ops(self.b), [self.b, self.d])
+        assertCountEqual(self, index.walks_intersection_ops([self.b],
+                                                            [self.d]),
+                         [self.b, self.d])
+
+
+if __name__ == '__main__':
+    unittest.main()
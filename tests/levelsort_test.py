@@ -0,0 +1,70 @@
+# (C) Copyright IBM Corp. 2018. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Tests for the LMS levelsort module."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from tensorflow_large_model_support import levelsort
+import numpy as np
+import unittest
+
+
+class LevelSortTest(unittest.TestCase):
+
+    def test_csr_from_edges(self):
+        ptr, idx = levelsort.csr_from_edges(4, [2, 0, 2, 0], [3, 1, 0, 2])
+        self.assertEqual(ptr.tolist(), [0, 2, 2, 4, 4])
+        self.assertEqual(idx.tolist(), [1, 2, 3, 0])
+
+    def test_kahn_levels(self):
+        # 0 -> 1 -> 3, 0 -> 3, 2 -> 3, 4 is isolated
+        ptr, idx = levelsort.csr_from_edges(5, [0, 1, 0, 2], [1, 3, 3, 3])
+        self.assertEqual(levelsort.kahn_levels(ptr, idx).tolist(),
+                         [0, 1, 0, 2, 0])
+
+    def test_kahn_levels_cycle(self):
+        # 0 -> 1 -> 2 -> 1, 2 -> 3
+        ptr, idx = levelsort.csr_from_edges(4, [0, 1, 2, 2], [1, 2, 1, 3])
+        self.assertEqual(levelsort.kahn_levels(ptr, idx).tolist(),
+                         [0, -1, -1, -1])
+
+    def test_group_by_level(self):
+        levels = levelsort.kahn_levels(*levelsort.csr_from_edges(
+            5, [0, 1, 0, 2], [1, 3, 3, 3]))
+        order, level_ptr = levelsort.group_by_level(levels, [4, 3, 1, 0])
+        self.assertEqual(order.tolist(), [0, 4, 1, 3])
+        self.assertEqual(level_ptr.tolist(), [0, 2, 3, 4])
+        order, level_ptr = levelsort.group_by_level(levels, [])
+        self.assertEqual(order.tolist(), [])
+        self.assertEqual(level_ptr.tolist(), [0])
+
+    def test_strongly_connected_components(self):
+        # 0 -> 1 -> 2 -> 1, 2 -> 3 -> 4 -> 3, 5 -> 0
+        ptr, idx = levelsort.csr_from_edges(
+            6, [0, 1, 2, 2, 3, 4, 5], [1, 2, 1, 3, 4, 3, 0])
+        components = levelsort.strongly_connected_components(
+            ptr, idx, np.arange(6))
+        self.assertEqual([sorted(c) for c in components],
+                         [[3, 4], [1, 2], [0], [5]])
+        # only the edges among the nodes are followed
+        components = levelsort.strongly_connected_components(
+            ptr, idx, np.array([2, 3, 4]))
+        self.assertEqual([sorted(c) for c in components], [[3, 4], [2]])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -21,56 +21,59 @@ from __future__ import print_function
 
 from six import assertCountEqual
 import tensorflow_large_model_support as lms
+from tensorflow_large_model_support import cost_model
+from tensorflow_large_model_support import graph_index
+from tensorflow_large_model_support import reachability
+from tensorflow_large_model_support import topos
+import fake_graph
+import shutil
+import tempfile
 import unittest
 import mock
 
 
+class _Named(str):
+    """A string standing for a `tf.Tensor` or a `tf.Operation` named by
+    it."""
+
+    @property
+    def name(self):
+        return str(self)
+
+
 class LMSTest(unittest.TestCase):
 
-    @mock.patch('tensorflow_large_model_support.lms.LMS._connect_ops')
-    @mock.patch('tensorflow.contrib.graph_editor.sgv')
     @mock.patch('tensorflow.identity')
-    def test_add_swapout(self, identity, sgv, connect_ops):
+    def test_add_swapout(self, identity):
         graph = mock.Mock()
         lms_modifier = lms.LMS(graph=graph,
                                optimizer_scopes={'s1'})
-        src_op = mock.Mock()
+        lms_modifier._cost_model = mock.Mock()
+        lms_modifier._rewirer = mock.Mock()
         ts0 = mock.Mock()
         swap_out = mock.Mock()
-        sgv_ret = mock.Mock()
-        sgv_ret.output_index.return_value = 123
-        sgv.return_value = sgv_ret
         identity.return_value = swap_out
-        ret = lms_modifier._add_swapout(src_op, ts0)
+        ret = lms_modifier._add_swapout(ts0)
         identity.assert_called_once_with(ts0, name='lms/swapout')
-        sgv.assert_called_once_with(src_op, graph=graph)
-        connect_ops.assert_called_once_with(src_op, swap_out.op,
-                                            remap_outputs=True, idx=123)
+        self.assertFalse(lms_modifier._rewirer.method_calls)
         self.assertEqual(ret, swap_out.op)
         self.assertEqual(lms_modifier._excl_ops, {swap_out.op})
 
-    @mock.patch('tensorflow_large_model_support.lms.LMS._connect_ops')
-    @mock.patch('tensorflow.contrib.graph_editor.sgv')
     @mock.patch('tensorflow.identity')
-    def test_add_swapin(self, identity, sgv, connect_ops):
+    def test_add_swapin(self, identity):
         graph = mock.Mock()
         lms_modifier = lms.LMS({'s1'}, graph=graph)
         lms_modifier._topo_sort = mock.Mock()
+        lms_modifier._rewirer = mock.Mock()
         dest_op = mock.Mock()
-        swapout_op = mock.Mock()
+        swapout_op = mock.Mock(outputs=['swapout:0'])
         ts0 = mock.Mock()
         swapin = mock.Mock()
-        sgv_ret = mock.Mock()
-        sgv_ret.input_index.return_value = 123
-        sgv.return_value = sgv_ret
         identity.return_value = swapin
-        ret = lms_modifier._add_swapin(swapout_op, dest_op, ts0)
-        identity.assert_called_once_with(ts0, name='lms/swapin')
-        sgv.assert_called_once_with(dest_op, graph=graph)
-        connect_calls = [mock.call(swapout_op, swapin.op),
-                         mock.call(swapin.op, dest_op,
-                                   remap_inputs=True, idx=123)]
-        connect_ops.assert_has_calls(connect_calls)
+        ret = lms_modifier._add_swapin(swapout_op, [dest_op], ts0)
+        identity.assert_called_once_with('swapout:0', name='lms/swapin')
+        lms_modifier._rewirer.reroute.assert_called_once_with(
+            ts0, swapin, [dest_op])
         self.assertEqual(ret, swapin.op)
         self.assertEqual(lms_modifier._excl_ops, {swapin.op})
 
@@ -85,57 +88,55 @@ class LMSTest(unittest.TestCase):
         ret = lms_test._get_branch_ops(within_ops, threshold)
         self.assertEqual(ret, {'f5', 'f6'})
 
-    @mock.patch('tensorflow.contrib.graph_editor.sgv')
-    @mock.patch('tensorflow_large_model_support.lms.LMS._connect_ops')
-    @mock.patch('tensorflow_large_model_support.lms.LMS._add_control_dependency')
-    @mock.patch('tensorflow.identity')
-    def test_fuse_swapin_ops(self, identity, ctrl_dep, connect, sgv):
+    @mock.patch('tensorflow_large_model_support.lms.LMS._plan_swapin')
+    def test_fuse_swapin_ops(self, plan_swapin):
         lms_test = lms.LMS({'s1'}, graph=mock.Mock(), lb=5, ub=500)
         lms_test._topo_sort = mock.Mock()
         # Mock get_order to return the "order" value from the mock op
         lms_test._topo_sort.get_order = lambda x: x.order
         lms_test._topo_sort.size = 200
-        swap_in = mock.Mock(name='swapin_ts', op=mock.Mock(name='swapin_op'))
-        identity.return_value = swap_in
-        sgv.return_value.input_index.return_value = 123
         src_op = mock.Mock(name='src_op')
-        swapout_op = mock.Mock(name='swapout_op')
         bw_fr_ops = [mock.Mock(name='op1', order=15),
                      mock.Mock(name='op2', order=-1),
                      mock.Mock(name='op3', order=10),
                      mock.Mock(name='op4-earliest', order=5),
                      mock.Mock(name='op5', order=8),
                      mock.Mock(name='op6', order=-2)]
-        ts0 = mock.Mock(name='ts0')
         earliest_op = bw_fr_ops[3]
 
-        ret = lms_test._fuse_swapin_ops(src_op, swapout_op, set(bw_fr_ops),
-                                        ts0)
-        self.assertEqual(ret, {bw_fr_ops[1], bw_fr_ops[5]})
-        connect_calls = [mock.call(swapout_op, swap_in.op),
-                         mock.call(swap_in.op, bw_fr_ops[0], remap_inputs=True,
-                                   idx=123),
-                         mock.call(swap_in.op, bw_fr_ops[2], remap_inputs=True,
-                                   idx=123),
-                         mock.call(swap_in.op, bw_fr_ops[3], remap_inputs=True,
-                                   idx=123),
-                         mock.call(swap_in.op, bw_fr_ops[4], remap_inputs=True,
-                                   idx=123)]
-        connect.assert_has_calls(connect_calls, any_order=True)
-        self.assertEqual(lms_test._excl_ops, {swap_in.op})
-        ctrl_dep.assert_called_once_with(src_op, earliest_op, swap_in.op)
+        ret = lms_test._fuse_swapin_ops(src_op, set(bw_fr_ops))
+        self.assertEqual(ret, ({bw_fr_ops[1], bw_fr_ops[5]},
+                               plan_swapin.return_value))
+        plan_swapin.assert_called_once_with(
+            src_op, {bw_fr_ops[0], bw_fr_ops[2], bw_fr_ops[3], bw_fr_ops[4]},
+            earliest_op)
+
+        # nothing to fuse
+        plan_swapin.reset_mock()
+        ret = lms_test._fuse_swapin_ops(src_op, set(bw_fr_ops[:2]))
+        self.assertEqual(ret, (set(bw_fr_ops[:2]), None))
+        self.assertFalse(plan_swapin.called)
 
     @mock.patch('tensorflow_large_model_support.lms.LMS._find_new_src_op')
     @mock.patch('tensorflow_large_model_support.lms.LMS._fuse_swapin_ops')
-    @mock.patch('tensorflow_large_model_support.lms.LMS._add_control_dependency')
-    @mock.patch('tensorflow_large_model_support.lms.LMS._add_swapin')
-    @mock.patch('tensorflow_large_model_support.lms.LMS._add_swapout')
-    @mock.patch('tensorflow_large_model_support.lms.LMS._get_forward_walk_ops')
-    @mock.patch('tensorflow.contrib.graph_editor.util.get_consuming_ops')
-    def test_insert_swap_nodes(self, consuming_ops, fwd_walk_ops, swapout,
-                               swapin, ctrldep, fuse_swapins, find_new_src):
+    @mock.patch('tensorflow_large_model_support.lms.LMS._plan_swapin')
+    def test_insert_swap_nodes(self, plan_swapin, fuse_swapins, find_new_src):
         graph = mock.Mock()
+        index = mock.Mock()
+        index.op_id.side_effect = lambda x: x
+        consuming_ops = index.consuming_ops
+        reach = mock.Mock()
+        fwd_walk_ops = reach.has_descendants
+        cost = mock.Mock()
+        cost.bytes_of.side_effect = lambda x: {'a': 64, 'z': -1}.get(x, 4)
+        # a swapin for each consumer
+        plan_swapin.side_effect = (
+            lambda src_op, dest_ops, bw_op: lms.plan.SwapIn(
+                sorted(dest_ops), 'ctrld_' + bw_op, 1))
         lms_test = lms.LMS({'s1'}, graph=graph, fuse_swapins=False)
+        lms_test._index = index
+        lms_test._reach = reach
+        lms_test._cost_model = cost
         # Test op is excluded.
         # _insert_swap_nodes should return before accessing methods on
         # src_op which would blow up the test
@@ -157,62 +158,53 @@ class LMSTest(unittest.TestCase):
         lms_test._incl_ops = {inc_op}
         lms_test._grad_ops = {'b', 'c'}
         consuming_ops.return_value = {'b'}
-        fwd_walk_ops.return_value = {}
+        fwd_walk_ops.return_value = False
         lms_test._insert_swap_nodes(inc_op)
         consuming_ops.assert_called_once_with('a')
-        fwd_walk_ops.assert_called_once_with('b', inclusive=False)
+        fwd_walk_ops.assert_called_once_with('b')
         lms_test._incl_ops = {}
         consuming_ops.reset_mock()
         fwd_walk_ops.reset_mock()
 
-        # Test creating swap out and swap in nodes
+        # Test planning swap out and swap in nodes
         src_op = mock.Mock()
-        src_op.outputs = ['a', 'z']
+        src_op.name = 'src'
+        src_op.outputs = [_Named('a'), _Named('z')]
         lms_test._grad_ops = {'b', 'c', 'g1', 'g2'}
         consuming_ops.side_effect = [{'b', 'f2', 'g2'}, {'c', 'g1', 'f3'}]
-        swapout.side_effect = ['swapout_op1', 'swapout_op2']
-
-        swap_in_node_map = {'b': 'swapin_op1',
-                            'g2': 'swapin_op2',
-                            'c': 'swapin_op3',
-                            'g1': 'swapin_op4'}
-
-        def swap_in_fake(source_op, destination_op, tensor):
-            return swap_in_node_map[destination_op]
-
-        swapin.side_effect = swap_in_fake
-        fwd_walk_ops.return_value = {'d'}
+        fwd_walk_ops.return_value = True
         lms_test._topo_sort = mock.Mock()
         lms_test._topo_sort.get_order.side_effect = lambda x: 0
         lms_test._insert_swap_nodes(src_op)
         consuming_ops.assert_has_calls([mock.call('a'), mock.call('z')])
-        fwd_calls = [mock.call('b', inclusive=False),
-                     mock.call('g2', inclusive=False)]
+        fwd_calls = [mock.call('b'), mock.call('g2')]
         fwd_walk_ops.assert_has_calls(fwd_calls, any_order=True)
-        swapout_calls = [mock.call(src_op, 'a'),
-                         mock.call(src_op, 'z')]
-        swapout.assert_has_calls(swapout_calls)
-        swapin_calls = [mock.call('swapout_op1', 'b', 'a'),
-                        mock.call('swapout_op1', 'g2', 'a'),
-                        mock.call('swapout_op2', 'c', 'z'),
-                        mock.call('swapout_op2', 'g1', 'z')]
-        swapin.assert_has_calls(swapin_calls, any_order=True)
-        ctrldep_calls = [mock.call(src_op, 'b', 'swapin_op1'),
-                         mock.call(src_op, 'g2', 'swapin_op2'),
-                         mock.call(src_op, 'c', 'swapin_op3'),
-                         mock.call(src_op, 'g1', 'swapin_op4')]
-        ctrldep.assert_has_calls(ctrldep_calls, any_order=True)
+        self.assertEqual(lms_test._planned_swaps, [
+            lms.plan.TensorSwap('a', 'src', 64, [
+                lms.plan.SwapIn(['b'], 'ctrld_b', 1),
+                lms.plan.SwapIn(['g2'], 'ctrld_g2', 1)]),
+            lms.plan.TensorSwap('z', 'src', -1, [
+                lms.plan.SwapIn(['c'], 'ctrld_c', 1),
+                lms.plan.SwapIn(['g1'], 'ctrld_g1', 1)])])
+        plan_swapin.assert_has_calls([mock.call(src_op, {'b'}, 'b'),
+                                      mock.call(src_op, {'g2'}, 'g2'),
+                                      mock.call(src_op, {'c'}, 'c'),
+                                      mock.call(src_op, {'g1'}, 'g1')],
+                                     any_order=True)
+        # only the known size is accounted
+        self.assertEqual(lms_test._incpu_bytes, 64)
         self.assertEqual(lms_test._incpu_count, 2)
+        self.assertEqual(lms_test._swapped_ts, {'a', 'z'})
 
         # Test calling _find_new_src_op
+        plan_swapin.reset_mock()
         lms_test = lms.LMS({'s1'}, graph=graph, fuse_swapins=False)
-        src_op = mock.Mock()
-        src_op.outputs = ['a', 'z']
+        lms_test._index = index
+        lms_test._reach = reach
+        lms_test._cost_model = cost
         lms_test._grad_ops = {'b', 'c', 'g1', 'g2'}
         consuming_ops.side_effect = [{'b', 'f2', 'g2'}, {'c', 'g1', 'f3'}]
-        swapout.side_effect = ['swapout_op1', 'swapout_op2']
-        swapin.side_effect = ['swapin_op1', 'swapin_op4']
-        fwd_walk_ops.return_value = {'d'}
+        fwd_walk_ops.return_value = True
         lms_test._topo_sort = mock.Mock()
 
         op_orders = {'b': 1, 'g2': -1, 'c': -1, 'g1': 1}
@@ -225,126 +217,137 @@ class LMSTest(unittest.TestCase):
         lms_test._excl_ops = {'z1', 'z2'}
         lms_test._insert_swap_nodes(src_op)
         consuming_ops.assert_has_calls([mock.call('a'), mock.call('z')])
-        fwd_calls = [mock.call('b', inclusive=False),
-                     mock.call('g2', inclusive=False)]
+        fwd_calls = [mock.call('b'), mock.call('g2')]
         fwd_walk_ops.assert_has_calls(fwd_calls, any_order=True)
-        swapout_calls = [mock.call(src_op, 'a'),
-                         mock.call(src_op, 'z')]
-        swapout.assert_has_calls(swapout_calls)
-        swapin_calls = [mock.call('swapout_op1', 'b', 'a'),
-                        mock.call('swapout_op2', 'g1', 'z')]
-        swapin.assert_has_calls(swapin_calls, any_order=True)
-        ctrldep_calls = [mock.call(src_op, 'b', 'swapin_op1'),
-                         mock.call(src_op, 'g1', 'swapin_op4')]
-        ctrldep.assert_has_calls(ctrldep_calls, any_order=True)
+        self.assertEqual(lms_test._planned_swaps, [
+            lms.plan.TensorSwap('a', 'src', 64, [
+                lms.plan.SwapIn(['b'], 'ctrld_b', 1)]),
+            lms.plan.TensorSwap('z', 'src', -1, [
+                lms.plan.SwapIn(['g1'], 'ctrld_g1', 1)])])
         find_new_src.assert_has_calls([mock.call('g2'),
                                        mock.call('c')], any_order=True)
         self.assertEqual(lms_test._incpu_count, 2)
 
         # Test calling fuse_swapins
         consuming_ops.reset_mock()
-        swapout.reset_mock()
-        swapin.reset_mock()
         fwd_walk_ops.reset_mock()
         graph = mock.Mock()
         lms_test = lms.LMS({'s1'}, graph=graph, fuse_swapins=True)
+        lms_test._index = index
+        lms_test._reach = reach
+        lms_test._cost_model = cost
         lms_test._topo_sort = mock.Mock()
         lms_test._topo_sort.get_order.side_effect = lambda x: 0
         lms_test._grad_ops = {'b', 'c', 'g1', 'g2'}
         consuming_ops.side_effect = [{'b', 'f2', 'g2'}, {'c', 'g1', 'f3'}]
-        swapout.side_effect = ['swapout_op1', 'swapout_op2']
-        swapin.side_effect = ['swapin_op1', 'swapin_op2', 'swapin_op3',
-                              'swapin_op4']
-        fwd_walk_ops.return_value = {'d'}
-        fuse_swapins.return_value = ['fuse1', 'fuse2']
+        fwd_walk_ops.return_value = True
+        fused = lms.plan.SwapIn(['b', 'g2'], 'ctrld_b', 1)
+        fuse_swapins.side_effect = [(set(), fused), ({'c'}, None)]
         lms_test._insert_swap_nodes(src_op)
-        fuse_calls = [mock.call(src_op, "swapout_op1", {'b', 'g2'}, 'a'),
-                      mock.call(src_op, "swapout_op2", {'c', 'g1'}, 'z')]
+        fuse_calls = [mock.call(src_op, {'b', 'g2'}),
+                      mock.call(src_op, {'c', 'g1'})]
         fuse_swapins.assert_has_calls(fuse_calls)
+        self.assertEqual(lms_test._planned_swaps, [
+            lms.plan.TensorSwap('a', 'src', 64, [fused]),
+            lms.plan.TensorSwap('z', 'src', -1, [
+                lms.plan.SwapIn(['c'], 'ctrld_c', 1)])])
 
         # Test stop swapping out once max number of tensors to swap is hit
         consuming_ops.reset_mock()
         lms_test = lms.LMS({'s1'}, graph=graph, fuse_swapins=False)
+        lms_test._index = index
         lms_test._n_tensors = 10
         lms_test._incpu_count = 10
         lms_test._insert_swap_nodes(src_op)
         self.assertFalse(consuming_ops.called)
 
-    @mock.patch('tensorflow.contrib.graph_editor.util.get_consuming_ops')
-    def test_find_new_src_op(self, get_cons):
+        # Test a tensor is not swapped twice when its op is revisited
+        consuming_ops.reset_mock()
+        lms_test = lms.LMS({'s1'}, graph=graph, fuse_swapins=False)
+        lms_test._index = index
+        lms_test._reach = reach
+        lms_test._cost_model = cost
+        lms_test._topo_sort = mock.Mock()
+        lms_test._topo_sort.get_order.side_effect = lambda x: 0
+        lms_test._grad_ops = {'b', 'c', 'g1', 'g2'}
+        consuming_ops.side_effect = None
+        consuming_ops.return_value = {'b'}
+        lms_test._insert_swap_nodes(src_op)
+        lms_test._insert_swap_nodes(src_op)
+        self.assertEqual(len(lms_test._planned_swaps), 2)
+        self.assertEqual(lms_test._incpu_count, 2)
+
+    @mock.patch('tensorflow_large_model_support.lms.LMS._add_recompute')
+    @mock.patch('tensorflow_large_model_support.lms.LMS._add_swapin')
+    @mock.patch('tensorflow_large_model_support.lms.LMS._add_swapout')
+    def test_apply_plan(self, swapout, swapin, recompute):
+        graph = fake_graph.FakeGraph()
+        f0 = graph.add_op('f0')
+        f1 = graph.add_op('f1', inputs=[f0], op_type='Relu')
+        g1 = graph.add_op('g1', inputs=[f1])
+        g0 = graph.add_op('g0', inputs=[g1, f0])
+        h0 = graph.add_op('h0', inputs=[g1, f0])
+        swap_plan = lms.plan.SwapPlan(
+            [lms.plan.TensorSwap('f0:0', 'f0', 16, [
+                lms.plan.SwapIn(['g0', 'h0'], 'g1', 1),
+                lms.plan.SwapIn(['f1'], None, -1)])],
+            [lms.plan.Recompute('f1:0', 'f1', 16, 'g1', ['f1'], 'f0', 0)])
+        swapout.return_value = 'swapout_op'
+        swapin.side_effect = ['swapin_op1', 'swapin_op2']
+        lms_test = lms.LMS({'s1'}, graph=graph)
+        lms_test._rewirer = mock.Mock()
+        lms_test._rewirer.apply.return_value = 3
+        lms_test._apply_plan(swap_plan)
+        swapout.assert_called_once_with(f0.outputs[0])
+        self.assertEqual(swapin.call_args_list,
+                         [mock.call('swapout_op', [g0, h0], f0.outputs[0]),
+                          mock.call('swapout_op', [f1], f0.outputs[0])])
+        lms_test._rewirer.add_control_input.assert_called_once_with(
+            'swapin_op1', g1)
+        recompute.assert_called_once_with(f1.outputs[0], g1, [f1], f0)
+        self.assertTrue(lms_test._rewirer.apply.called)
+        self.assertEqual(lms_test.stats.graph_edits, 3)
+        self.assertEqual(lms_test._swapout_ops, {f0.outputs[0]: 'swapout_op'})
+
+    def test_find_new_src_op(self):
+        graph = fake_graph.FakeGraph()
+        original_op = graph.add_op('original_op')
+        frontier1 = graph.add_op('fwd1', inputs=[original_op])
+        frontier2 = graph.add_op('fwd2', inputs=[original_op])
+        graph.add_op('op_w_order', inputs=[frontier2])
+        orders = {'op_w_order': 45}
         ts = mock.Mock()
+        ts.bw_starting_order = 5
+        ts.get_order.side_effect = lambda x: orders.get(x.name, -1)
         lms_test = lms.LMS({'s1'})
+        lms_test._index = graph_index.GraphIndex(graph)
         lms_test._topo_sort = ts
-        ts.bw_starting_order = 5
-        ts.get_order.side_effect = lambda x: x.order
-        get_cons.side_effect = lambda x: x.consumers
-
-        op_w_order = mock.Mock(name='op_w_order', order=45, outputs=[])
-        frontier1 = mock.Mock(name='fwd1', order=-1, outputs=[])
-        frontier2_out = mock.Mock(name='fwd2_out', consumers=[op_w_order])
-        frontier2 = mock.Mock(name='fwd2', order=-1, outputs=[frontier2_out])
-        orig_src_out = mock.Mock(name='orig_out', consumers=[frontier1,
-                                                             frontier2])
-        original_op = mock.Mock(name='original_op', outputs=[orig_src_out])
         new_src_ops = lms_test._find_new_src_op(original_op)
         self.assertEqual(new_src_ops, {frontier2})
 
-    @mock.patch('tensorflow.contrib.graph_editor.connect')
-    @mock.patch('tensorflow.contrib.graph_editor.sgv')
-    def test_connect_ops(self, sgv, connect):
-        graph = mock.Mock()
-        lms_test = lms.LMS({'s1'}, graph=graph)
-        src_op = mock.Mock()
-        dest_op = mock.Mock()
-        dcf = mock.Mock()
-        sgv.side_effect = ['a', 'b']
-        lms_test._connect_ops(src_op, dest_op, remap_inputs=False,
-                              remap_outputs=False, disconnect_first=dcf)
-        sgv_calls = [mock.call(src_op, graph=graph),
-                     mock.call(dest_op, graph=graph)]
-        sgv.assert_has_calls(sgv_calls)
-        connect.assert_called_once_with('a', 'b', dcf)
-
-        # Test remaps
-        connect.reset_mock()
-        sgv.reset_mock()
-        src_sgv = mock.Mock()
-        dest_sgv = mock.Mock()
-        sgv.side_effect = [src_sgv, dest_sgv]
-        lms_test._connect_ops(src_op, dest_op, remap_inputs=True,
-                              remap_outputs=True, idx=2, disconnect_first=dcf)
-        src_sgv.remap_outputs.assert_called_once_with([2])
-        dest_sgv.remap_inputs.assert_called_once_with([2])
-        connect.assert_called_once_with(src_sgv.remap_outputs.return_value,
-                                        dest_sgv.remap_inputs.return_value,
-                                        dcf)
-
-    @mock.patch('tensorflow.contrib.graph_editor.get_name_scope_ops')
-    def test_filter_scopes_and_types(self, get_name_scope_ops):
-        op1 = mock.Mock(type='a')
-        op2 = mock.Mock(type='b')
-        op3 = mock.Mock(type='a')
-        op4 = mock.Mock(type='d')
-        op5 = mock.Mock(type='c')
-
-        within_ops = {op1, op2, op3, op4, op5}
+    def test_filter_scopes_and_types(self):
+        graph = fake_graph.FakeGraph()
+        op1 = graph.add_op('op1', op_type='a')
+        op2 = graph.add_op('op2', op_type='b')
+        op3 = graph.add_op('op3', op_type='a')
+        op4 = graph.add_op('s1/op4', op_type='d')
+        op5 = graph.add_op('op5', op_type='c')
+        op6 = graph.add_op('s2/op6', op_type='b')
+        # not within the ops
+        graph.add_op('s1/op7', op_type='a')
+
+        within_ops = {op1, op2, op3, op4, op5, op6}
         lms_test = lms.LMS({'s1'})
-        get_name_scope_ops.return_value = [op4]
-        ret = lms_test._filter_scopes_and_types(within_ops, {'s1', 's2'},
+        lms_test._index = graph_index.GraphIndex(graph)
+        ret = lms_test._filter_scopes_and_types(within_ops, {'s1', 's2/'},
                                                 {'a', 'c'})
-        get_name_scope_ops.assert_has_calls([mock.call(within_ops, 's1'),
-                                             mock.call(within_ops, 's2')],
-                                            any_order=True)
-        assertCountEqual(self, ret, {op1, op3, op4, op5})
+        assertCountEqual(self, ret, {op1, op3, op4, op5, op6})
 
         # Test no ops found for scope (test more than 1 scope)
-        get_name_scope_ops.reset_mock()
-        get_name_scope_ops.return_value = None
-        get_name_scope_ops.side_effect = [[op4], []]
         self.assertRaisesRegex(ValueError,
                                'No operations were found with scope',
                                lms_test._filter_scopes_and_types,
-                               within_ops, {'s1', 's2'}, {})
+                               within_ops, {'s1', 's3'}, {})
         # Test no ops found for type (test more than 1 type)
         self.assertRaisesRegex(ValueError,
                                'No operations were found with types: ',
@@ -356,71 +359,44 @@ class LMSTest(unittest.TestCase):
         ret = lms_test._filter_scopes_and_types(within_ops, {}, input_types)
         assertCountEqual(self, ret, {op1, op3, op5})
 
-    @mock.patch('tensorflow.contrib.graph_editor.make_list_of_op')
-    @mock.patch('tensorflow.contrib.graph_editor.filter_ops_from_regex')
-    def test_build_gradient_ops(self, filter_ops, make_list):
-        graph = mock.Mock()
-        filter_ops.side_effect = [['a', 'b', 'c'], ['d']]
+    def test_build_gradient_ops(self):
+        graph = fake_graph.FakeGraph()
+        ops = [graph.add_op(name) for name in
+               ('f', 's1/a', 's1/b', 's1_1/c', 's2/d')]
         lms_test = lms.LMS({'s1', 's2'}, graph=graph)
+        lms_test._index = graph_index.GraphIndex(graph)
         lms_test._build_gradient_ops()
-        self.assertEqual(lms_test._grad_ops, {'a', 'b', 'c', 'd'})
-        self.assertEqual(2, make_list.call_count)
-        self.assertEqual(2, filter_ops.call_count)
-
-        # Test ops found for 's1' but not 's2'
-        filter_ops.reset_mock()
-        make_list.reset_mock()
-
-        def filter_fake(x, y):
-            if 's1' in y:
-                return ['a', 'b', 'c']
-            return set()
-        filter_ops.side_effect = filter_fake
-        lms_test = lms.LMS({'s1', 's2'}, graph=graph)
-        self.assertRaisesRegex(ValueError, 'optimizer scope s2',
-                               lms_test._build_gradient_ops)
+        # scopes are prefixes of the names
+        self.assertEqual(lms_test._grad_ops, set(ops[1:]))
 
-    @mock.patch('tensorflow.contrib.graph_editor.get_forward_walk_ops')
-    def test_get_forward_walk_ops(self, fwd_walk):
-        lms_test = lms.LMS({'s1'})
-        ops_dict = {mock.sentinel.op1: [mock.sentinel.op1, mock.sentinel.op10],
-                    mock.sentinel.op2: [mock.sentinel.op2, mock.sentinel.op20],
-                    mock.sentinel.op3: [mock.sentinel.op3, mock.sentinel.op30]}
-        lms_test._ops_dict = ops_dict
-
-        # Test op in ops_dict
-        ret = lms_test._get_forward_walk_ops(mock.sentinel.op1)
-        self.assertEqual(ret, [mock.sentinel.op1, mock.sentinel.op10])
-        # Test inclusive=False
-        ret = lms_test._get_forward_walk_ops(mock.sentinel.op1,
-                                             inclusive=False)
-        self.assertEqual(ret, [mock.sentinel.op10])
-
-        # Test op not in ops_dict
-        fwd_walk.return_value = [mock.sentinel.op, mock.sentinel.ret]
-        ret = lms_test._get_forward_walk_ops(mock.sentinel.op)
-        self.assertEqual(ret, [mock.sentinel.op, mock.sentinel.ret])
-        # Test inclusive=False
-        lms_test._ops_dict = ops_dict
-        fwd_walk.return_value = [mock.sentinel.op, mock.sentinel.ret]
-        ret = lms_test._get_forward_walk_ops(mock.sentinel.op,
-                                             inclusive=False)
-        self.assertEqual(ret, [mock.sentinel.ret])
+        # Test ops found for 's1' but not 's3'
+        lms_test = lms.LMS({'s1', 's3'}, graph=graph)
+        lms_test._index = graph_index.GraphIndex(graph)
+        lms_test._build_gradient_ops()
+        self.assertEqual(lms_test._grad_ops, set(ops[1:4]))
+        lms_test = lms.LMS({'s3'}, graph=graph)
+        lms_test._index = graph_index.GraphIndex(graph)
+        self.assertRaisesRegex(ValueError, 'optimizer scopes',
+                               lms_test._build_gradient_ops)
 
+    @mock.patch('tensorflow_large_model_support.cost_model.CostModel')
+    @mock.patch('tensorflow_large_model_support.reachability.ReachabilityIndex')
+    @mock.patch('tensorflow_large_model_support.graph_index.GraphIndex')
     @mock.patch('tensorflow_large_model_support.lms.LMS._do_action')
     @mock.patch('tensorflow_large_model_support.topos.TOPOS.build')
     @mock.patch('tensorflow_large_model_support.lms.LMS._filter_scopes_and_types')
     @mock.patch('tensorflow.contrib.graph_editor.get_forward_walk_ops')
-    @mock.patch('tensorflow_large_model_support.lms.LMS._get_forward_walk_ops')
     @mock.patch('tensorflow_large_model_support.lms.LMS._get_seed_ops')
     @mock.patch('tensorflow_large_model_support.lms.LMS._build_gradient_ops')
-    def test_run(self, grad, seed, fwd_walk, tf_fwd_walk, filter, build, action):
+    def test_run(self, grad, seed, tf_fwd_walk, filter, build,
+                 action, index, reach, cost):
         # Test mainline through
+        fwd_walk = index.return_value.forward_walk_ops
         seed_ops = [mock.Mock() for x in range(5)]
         grad_ops = [mock.MagicMock() for x in range(6)]
         fwd_walk.return_value = [mock.MagicMock() for x in range(3)] + grad_ops
         seed.return_value = seed_ops
-        lms_test = lms.LMS({'s1'}, graph=mock.Mock())
+        lms_test = lms.LMS({'s1'}, graph=mock.MagicMock())
 
         def fake_build_gradient_ops():
             lms_test._grad_ops = set(grad_ops)
@@ -428,18 +404,23 @@ class LMSTest(unittest.TestCase):
         grad.side_effect = fake_build_gradient_ops
         lms_test.topos = mock.Mock()
         lms_test.run()
+        index.assert_called_once_with(lms_test._graph)
+        reach.assert_called_once_with(index.return_value)
+        cost.assert_called_once_with(index.return_value, None)
+        self.assertIs(lms_test.cost_model, cost.return_value)
         self.assertTrue(grad.called)
         self.assertTrue(seed.called)
-        self.assertTrue(fwd_walk.call_count, len(seed_ops))
+        fwd_walk.assert_called_once_with(seed_ops)
         reachable = set(fwd_walk.return_value) - set(grad_ops)
         filter.assert_has_calls([mock.call(reachable, mock.ANY, mock.ANY),
                                  mock.call(reachable, mock.ANY, mock.ANY)])
         self.assertTrue(build.called)
         action.assert_called_once_with(seed_ops)
+        self.assertEqual(lms_test.swap_plan, lms.plan.SwapPlan())
 
         # Test passing a graph in run and verify it overwrites a graph passed
         # on the constructor
-        new_graph = mock.Mock()
+        new_graph = mock.MagicMock()
         lms_test.run(graph=new_graph)
         self.assertEqual(lms_test._graph, new_graph)
 
@@ -453,161 +434,213 @@ class LMSTest(unittest.TestCase):
         lms_test.run(new_graph)
         self.assertFalse(grad.called)
 
+        # Test a model fitting in the memory budget
+        action.reset_mock()
+        lms_test = lms.LMS({'s1'}, memory_budget_bytes=100)
+        with mock.patch.object(lms_test, '_select_swaps_for_budget',
+                               return_value=set()) as select:
+            lms_test.run(new_graph)
+        self.assertTrue(select.called)
+        self.assertFalse(action.called)
+        lms_test = lms.LMS({'s1'}, memory_budget_bytes=100)
+        with mock.patch.object(lms_test, '_select_swaps_for_budget',
+                               return_value={3}):
+            lms_test.run(new_graph)
+        self.assertTrue(action.called)
+        self.assertEqual(lms_test._budget_ts, {3})
+
         # Test n_tensors = -1
         action.reset_mock()
         lms_test = lms.LMS({'s1'}, n_tensors=-1)
         lms_test.run(new_graph)
         self.assertTrue(action.called)
-        # n_tensors gets set to when passed as -1
-        self.assertEqual(lms_test._n_tensors, 0)
+        # n_tensors is left unchanged, so that LMS can be run again
+        self.assertEqual(lms_test._n_tensors, -1)
+        action.reset_mock()
+        lms_test.run(new_graph)
+        self.assertTrue(action.called)
+
+    @mock.patch('tensorflow_large_model_support.cost_model.CostModel')
+    @mock.patch('tensorflow_large_model_support.plan_cache.graph_key')
+    @mock.patch('tensorflow_large_model_support.graph_index.GraphIndex')
+    @mock.patch('tensorflow.contrib.graph_editor.get_forward_walk_ops')
+    @mock.patch('tensorflow_large_model_support.lms.LMS._apply_plan')
+    @mock.patch('tensorflow_large_model_support.lms.LMS._build_plan')
+    @mock.patch('tensorflow_large_model_support.lms.LMS._analyze')
+    def test_run_with_plan_cache(self, analyze, build_plan, apply_plan,
+                                 fwd_walk, index, graph_key, cost):
+        swap_plan = lms.plan.SwapPlan(
+            [lms.plan.TensorSwap('f0:0', 'f0', 40,
+                                 [lms.plan.SwapIn(['g0'], 'g1', 4)])],
+            [lms.plan.Recompute('r:0', 'r', 16, 'g1', ['r'], 'g2', 3)])
+        graph = fake_graph.FakeGraph()
+        f0 = graph.add_op('f0')
+        r = graph.add_op('r', inputs=[f0])
+        g2 = graph.add_op('g2')
+        g1 = graph.add_op('g1', inputs=[g2, r])
+        graph.add_op('g0', inputs=[g1, f0])
+        index.return_value.size = 2
+        graph_key.return_value = 'key'
+        analyze.return_value = ([], set())
+        build_plan.return_value = swap_plan
+        apply_plan.return_value = ['swapout']
+        fwd_walk.return_value = []
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+
+        # the plan is stored on a miss
+        lms_test = lms.LMS({'s1'}, graph=graph, plan_cache_dir=directory)
+        lms_test.run()
+        analyze.assert_called_once_with(index.return_value)
+        graph_key.assert_called_once_with(
+            index.return_value, lms_test._get_cache_params())
+        apply_plan.assert_called_once_with(swap_plan)
+        self.assertEqual(lms_test._plan_cache.get('key'), swap_plan)
+
+        # the plan is applied without analysis on a hit
+        analyze.reset_mock()
+        apply_plan.reset_mock()
+        lms_test = lms.LMS({'s1'}, graph=graph, plan_cache_dir=directory)
+        self.assertEqual(lms_test.run(), {'swapout'})
+        self.assertFalse(analyze.called)
+        apply_plan.assert_called_once_with(swap_plan)
+        self.assertEqual(lms_test.swap_plan, swap_plan)
+        self.assertEqual(lms_test._incpu_count, 1)
+        self.assertEqual(lms_test._incpu_bytes, 40)
+        self.assertEqual(lms_test._recompute_count, 1)
+
+        # a plan is not applied if an operation of the plan is missing
+        self.assertTrue(lms_test._plan_matches_graph(swap_plan))
+        with mock.patch.object(graph, 'get_operation_by_name',
+                               side_effect=KeyError('g2')):
+            self.assertFalse(lms_test._plan_matches_graph(swap_plan))
+
+        # or if the operations named in the plan have other roles, e.g.
+        # in a graph with the same structure named in another order
+        mismatches = [
+            # g0 does not read r:0
+            [lms.plan.TensorSwap('r:0', 'r', 40,
+                                 [lms.plan.SwapIn(['g0'], 'g1', 4)])],
+            # f0:0 is not produced by r
+            [lms.plan.TensorSwap('f0:0', 'r', 40,
+                                 [lms.plan.SwapIn(['g0'], 'g1', 4)])]]
+        for swaps in mismatches:
+            self.assertFalse(lms_test._plan_matches_graph(
+                lms.plan.SwapPlan(swaps)))
+        self.assertFalse(lms_test._plan_matches_graph(lms.plan.SwapPlan(
+            recomputes=[lms.plan.Recompute('r:0', 'r', 16, 'g0', ['r'],
+                                           'g2', 3)])))
+        # the graph is then analyzed again
+        graph.get_operation_by_name('g0')._update_input(1, r.outputs[0])
+        analyze.reset_mock()
+        apply_plan.reset_mock()
+        lms_test = lms.LMS({'s1'}, graph=graph, plan_cache_dir=directory)
+        lms_test.run()
+        self.assertTrue(analyze.called)
+        apply_plan.assert_called_once_with(swap_plan)
 
     @mock.patch('tensorflow_large_model_support.lms.LMS._insert_swap_nodes')
-    @mock.patch('tensorflow.contrib.graph_editor.util.get_consuming_ops')
-    def test_do_action(self, get_cons, swap):
+    def test_do_action(self, swap):
+        graph = fake_graph.FakeGraph()
+        src_ops = [graph.add_op('src%s' % x, n_outputs=2) for x in range(2)]
+        dup_op = graph.add_op('dup', inputs=[src_ops[0].outputs[0],
+                                             src_ops[0].outputs[1]])
+        level1_ops = [dup_op]
+        for ts, n_ops in [(src_ops[0].outputs[0], 3),
+                          (src_ops[0].outputs[1], 2),
+                          (src_ops[1].outputs[0], 2),
+                          (src_ops[1].outputs[1], 3)]:
+            for x in range(n_ops):
+                level1_ops.append(graph.add_op('next', inputs=[ts]))
+        # Consuming ops of the first level are all gradient ops
+        grad_op1 = graph.add_op('grad', inputs=level1_ops)
         lms_test = lms.LMS({'s1'})
-        src_ops = [mock.Mock() for x in range(2)]
-        grad_op1 = mock.Mock()
+        lms_test._index = graph_index.GraphIndex(graph)
         lms_test._grad_ops = {grad_op1}
-        for op in src_ops:
-            op.outputs = ['o' for x in range(2)]
-        dup_op = mock.Mock()
-        get_cons_side_effect = [[mock.Mock() for x in range(3)] + [dup_op],
-                                [mock.Mock() for x in range(2)] + [dup_op],
-                                [mock.Mock() for x in range(2)],
-                                [mock.Mock() for x in range(3)]]
-        # Set outputs of first level consuming ops
-        for op_list in get_cons_side_effect:
-            for op in op_list:
-                op.outputs = ['a']
-        for x in range(11):
-            get_cons_side_effect.append([grad_op1])
-
-        get_cons.side_effect = get_cons_side_effect
-        # Now add gradient ops for the remaining calls to get_consuming_ops
-        # Set all consuming ops to have a gradient as
         lms_test._do_action(src_ops)
         # There should be 13 calls to _insert_swap_nodes.  The original 2
-        # nodes, the 10 from the side_effect ranges above and ONE call on the
+        # nodes, the 10 from the ranges above and ONE call on the
         # dup_op
         self.assertEqual(swap.call_count, 13)
-
-        self.assertEqual(get_cons.call_count, 15)
+        self.assertNotIn(mock.call(grad_op1), swap.call_args_list)
+        self.assertEqual(swap.call_args_list[:2],
+                         [mock.call(src_ops[0]), mock.call(src_ops[1])])
 
         # Test when NOT swapping all possible tensors
         swap.reset_mock()
-        get_cons.reset_mock()
         lms_test = lms.LMS(optimizer_scopes={'s1'}, n_tensors=7)
+        lms_test._index = graph_index.GraphIndex(graph)
 
         def fake_swap(op):
             lms_test._incpu_count += len(op.outputs)
 
         swap.side_effect = fake_swap
         lms_test._grad_ops = {grad_op1}
-        get_cons.side_effect = get_cons_side_effect
         lms_test._do_action(src_ops)
 
         # There should only be 5 calls to insert swap nodes.  The first
         # seed ops will swap 2 tensors each, and 3 other ops will each swap 1
         self.assertEqual(swap.call_count, 5)
 
-    @mock.patch('tensorflow.contrib.graph_editor.filter_ops_from_regex')
-    @mock.patch('tensorflow.contrib.graph_editor.make_list_of_op')
-    @mock.patch('tensorflow.contrib.graph_editor.get_forward_walk_ops')
-    @mock.patch('tensorflow.contrib.graph_editor.util.get_consuming_ops')
-    def test_get_seed_ops(self, get_consuming, get_fwd_walk, make_list,
-                          filter_ops):
-        graph = mock.Mock()
-        filter_ops.return_value = [mock.Mock()]
+    def test_get_seed_ops(self):
+        graph = fake_graph.FakeGraph()
+        sc_ops = [graph.add_op('sc/x'), graph.add_op('sc/y')]
+        a, b, ab = graph.add_op('a'), graph.add_op('b'), graph.add_op('ab')
+        index = graph_index.GraphIndex(graph)
 
-        filter_ops.return_value = [mock.Mock()]
         # Test with starting scope
         lms_test = lms.LMS({'s1'}, graph=graph, starting_scope='sc')
-        ret = lms_test._get_seed_ops()
-        filter_ops.assert_called_once_with(make_list.return_value, "^sc")
-        make_list.assert_called_once_with(graph)
-        self.assertEqual(ret, filter_ops.return_value)
+        lms_test._index = index
+        assertCountEqual(self, lms_test._get_seed_ops(), sc_ops)
 
         # Test with starting op names
-        filter_ops.reset_mock()
-        make_list.reset_mock()
-        name_ops = [mock.Mock(name='op1'), mock.Mock(name='op2')]
-        filter_ops.side_effect = [[name_ops[0]], [name_ops[1]]]
         lms_test = lms.LMS({'s1'}, graph=graph, starting_op_names={'a', 'b'})
-        ret = lms_test._get_seed_ops()
-        filter_ops.assert_has_calls([mock.call(make_list.return_value, "^a$"),
-                                     mock.call(make_list.return_value, "^b$")],
-                                    any_order=True)
-        make_list.assert_called_once_with(graph)
-        assertCountEqual(self, ret, name_ops)
-
-        # Test building seed ops with graph traversal
-        # setup graph operations and their outputs
-        graph_ops = [mock.Mock() for x in range(6)]
-        for op in graph_ops:
-            op.outputs = ['mock_output']
-        graph.get_operations.return_value = graph_ops
+        lms_test._index = index
+        assertCountEqual(self, lms_test._get_seed_ops(), [a, b])
 
         # Test when both starting scope and starting op names are passed
-        filter_ops.reset_mock()
-        make_list.reset_mock()
-        name_ops = [mock.Mock(name='op1'), mock.Mock(name='op2'),
-                    mock.Mock(name='op3')]
-        filter_ops.side_effect = [[name_ops[0]], [name_ops[1]], [name_ops[2]]]
         lms_test = lms.LMS({'s1'}, graph=graph, starting_op_names={'a', 'b'},
                            starting_scope='sc')
-        ret = lms_test._get_seed_ops()
-        filter_ops.assert_has_calls([mock.call(make_list.return_value, "^a$"),
-                                     mock.call(make_list.return_value, "^b$"),
-                                     mock.call(make_list.return_value, "^sc")],
-                                    any_order=True)
-        make_list.assert_called_once_with(graph)
-        assertCountEqual(self, ret, name_ops)
+        lms_test._index = index
+        assertCountEqual(self, lms_test._get_seed_ops(), sc_ops + [a, b])
+
+        # Test names given as regular expressions
+        lms_test = lms.LMS({'s1'}, graph=graph, starting_op_names={'a.?'})
+        lms_test._index = index
+        assertCountEqual(self, lms_test._get_seed_ops(), [a, ab])
 
         # Test no ops for scope
-        filter_ops.side_effect = [[]]
-        lms_test = lms.LMS({'s1'}, graph=graph, starting_scope='sc')
-        self.assertRaisesRegex(ValueError, 'starting scope sc',
+        lms_test = lms.LMS({'s1'}, graph=graph, starting_scope='sd')
+        lms_test._index = index
+        self.assertRaisesRegex(ValueError, 'starting scope sd',
                                lms_test._get_seed_ops)
 
         # Test no ops for names
-        # make filter_ops return an op for op 'b' but not op 'a'
-        filter_ops.side_effect = lambda x, y: {"^b$": ['abc']}.get(y, [])
-        lms_test = lms.LMS({'s1'}, graph=graph, starting_op_names={'a', 'b'})
+        lms_test = lms.LMS({'s1'}, graph=graph, starting_op_names={'c', 'b'})
+        lms_test._index = index
         self.assertRaisesRegex(ValueError, 'No starting operation was found '
-                               'with name a', lms_test._get_seed_ops)
-
-        # Consuming ops for the graph operations, make most of them have a
-        # gradient op consuming.
-        grad_ops = {mock.sentinel.gradient1, mock.sentinel.gradient2}
-        non_grad_ops = graph_ops
-        get_consuming.side_effect = [[mock.sentinel.gradient1],
-                                     [mock.sentinel.gradient1],
-                                     [mock.sentinel.gradient2],
-                                     ['nothing'],
-                                     [mock.sentinel.gradient2],
-                                     ['nothing2']]
-        get_fwd_walk.side_effect = [[],
-                                    [graph_ops[0], graph_ops[2], graph_ops[4]],
-                                    [graph_ops[0], graph_ops[1], graph_ops[4]],
-                                    [graph_ops[1], graph_ops[2]]]
+                               'with name c', lms_test._get_seed_ops)
+
+        # Test building seed ops with graph traversal.
+        # f0 -> f1 -> f2 -> f3 and f4 -> f1, every op has a gradient op
+        # consuming it except f3. f0 and f4 cover most of the forward ops.
+        graph = fake_graph.FakeGraph()
+        fw_ops = graph.chain('f', 4)
+        fw_ops.append(graph.add_op('f4'))
+        fw_ops[1].inputs.append(fw_ops[4].outputs[0])
+        grad_ops = {graph.add_op('g%d' % x, inputs=[fw_ops[x]])
+                    for x in (0, 1, 2, 4)}
+        # a gradient op does not connect the forward ops
+        graph.add_op('f5', inputs=[next(iter(grad_ops))])
         lms_test = lms.LMS({'s1'}, graph=graph)
+        lms_test._index = graph_index.GraphIndex(graph)
         lms_test._grad_ops = grad_ops
         ret = lms_test._get_seed_ops()
-        self.assertEqual(get_consuming.call_count, 6)
-        walk_calls = [mock.call(graph_ops[0], within_ops=non_grad_ops, inclusive=False),
-                      mock.call(graph_ops[1], within_ops=non_grad_ops, inclusive=False),
-                      mock.call(graph_ops[2], within_ops=non_grad_ops, inclusive=False),
-                      mock.call(graph_ops[4], within_ops=non_grad_ops, inclusive=False)]
-        get_fwd_walk.assert_has_calls(walk_calls, any_order=True)
-        # There will be two seed ops. However, since sets are used in
-        # _get_seed_ops and we are mocking get_forward_walk_ops, we can't
-        # check for specific mock operations.
-        self.assertEqual(len(ret), 2)
-
-    @mock.patch('tensorflow.contrib.graph_editor.add_control_inputs')
+        assertCountEqual(self, ret, [fw_ops[0], fw_ops[4]])
+
     @mock.patch('tensorflow_large_model_support.lms.LMS._do_direct_order')
     @mock.patch('tensorflow_large_model_support.lms.LMS._do_chain_rule')
-    def test_add_control_dependency(self, do_chain, do_direct, add_ctrl_input):
+    def test_plan_control_dependency(self, do_chain, do_direct):
         # Test when lb is reset and chain rule
         lms_test = lms.LMS({'s1'}, ctrld_strategy="chain_rule", lb=10, ub=20)
 
@@ -615,51 +648,43 @@ class LMSTest(unittest.TestCase):
         lms_test._topo_sort.get_order.side_effect = [24, 15]
         fw_op = mock.sentinel.fw_op
         bw_op = mock.sentinel.orig_bw_op
-        swapin_op = mock.Mock()
         do_chain.return_value = [mock.sentinel.ctl_op, 123]
-        lms_test._add_control_dependency(fw_op, bw_op, swapin_op)
+        ret = lms_test._plan_control_dependency(fw_op, bw_op)
         do_chain.assert_called_once_with(fw_op, bw_op, 1, 20)
-        add_ctrl_input.assert_called_once_with(swapin_op,
-                                               mock.sentinel.ctl_op)
+        self.assertEqual(ret[0], mock.sentinel.ctl_op)
 
         # Test chain rule
         lms_test._topo_sort.get_order.side_effect = [26, 15]
         do_chain.reset_mock()
-        add_ctrl_input.reset_mock()
-        lms_test._add_control_dependency(fw_op, bw_op, swapin_op)
+        ret = lms_test._plan_control_dependency(fw_op, bw_op)
         do_chain.assert_called_once_with(fw_op, bw_op,
                                          10, 20)
-        add_ctrl_input.assert_called_once_with(swapin_op,
-                                               mock.sentinel.ctl_op)
+        self.assertEqual(ret[0], mock.sentinel.ctl_op)
 
         # Test with direct_order
         do_chain.reset_mock()
-        add_ctrl_input.reset_mock()
         lms_test = lms.LMS({'s1'}, ctrld_strategy="direct_order", lb=10, ub=20)
 
         lms_test._topo_sort = mock.Mock()
         lms_test._topo_sort.get_order.side_effect = [26, 15]
         do_chain.return_value = None
         do_direct.return_value = [mock.sentinel.ctl_op, 567]
-        lms_test._add_control_dependency(fw_op, bw_op, swapin_op)
-        add_ctrl_input.assert_called_once_with(swapin_op,
-                                               mock.sentinel.ctl_op)
+        ret = lms_test._plan_control_dependency(fw_op, bw_op)
+        self.assertEqual(ret[0], mock.sentinel.ctl_op)
         do_direct.assert_called_once_with(fw_op, mock.sentinel.orig_bw_op,
                                           10, 20)
 
         # Test direct order when fw_op is a gradient op
         do_direct.reset_mock()
         do_chain.reset_mock()
-        add_ctrl_input.reset_mock()
         lms_test = lms.LMS({'s1'}, ctrld_strategy="chain_rule", lb=10, ub=20)
         lms_test._grad_ops = {fw_op}
         lms_test._topo_sort = mock.Mock()
         lms_test._topo_sort.get_order.side_effect = [26, 15]
         do_chain.return_value = None
         do_direct.return_value = [mock.sentinel.ctl_op, 567]
-        lms_test._add_control_dependency(fw_op, bw_op, swapin_op)
-        add_ctrl_input.assert_called_once_with(swapin_op,
-                                               mock.sentinel.ctl_op)
+        ret = lms_test._plan_control_dependency(fw_op, bw_op)
+        self.assertEqual(ret[0], mock.sentinel.ctl_op)
         # Note we expect _do_direct_order to be called even though the
         # control dependency strategy was set to "chain_rule" because fw_op is
         # a gradient op.
@@ -670,16 +695,14 @@ class LMSTest(unittest.TestCase):
         # Test direct order when fw_op is a gradient op
         do_direct.reset_mock()
         do_chain.reset_mock()
-        add_ctrl_input.reset_mock()
         lms_test = lms.LMS({'s1'}, ctrld_strategy="chain_rule", lb=10, ub=20)
         lms_test._grad_ops = {fw_op}
         lms_test._topo_sort = mock.Mock()
         lms_test._topo_sort.get_order.side_effect = [26, 15]
         do_chain.return_value = None
         do_direct.return_value = [mock.sentinel.ctl_op, 567]
-        lms_test._add_control_dependency(fw_op, bw_op, swapin_op)
-        add_ctrl_input.assert_called_once_with(swapin_op,
-                                               mock.sentinel.ctl_op)
+        ret = lms_test._plan_control_dependency(fw_op, bw_op)
+        self.assertEqual(ret[0], mock.sentinel.ctl_op)
         # Note we expect _do_direct_order to be called even though the
         # control dependency strategy was set to "chain_rule" because fw_op is
         # a gradient op.
@@ -687,9 +710,8 @@ class LMSTest(unittest.TestCase):
                                           10, 20)
         self.assertEqual(do_chain.call_count, 0)
 
-    @mock.patch('tensorflow.contrib.graph_editor.util.get_consuming_ops')
     @mock.patch('tensorflow_large_model_support.lms.LMS._do_direct_order')
-    def test_do_chain_rule(self, direct_order, cons_ops):
+    def test_do_chain_rule(self, direct_order):
         lms_test = lms.LMS({'s1'})
         lms_test._topo_sort = mock.Mock()
 
@@ -703,38 +725,35 @@ class LMSTest(unittest.TestCase):
         direct_order.assert_called_once_with(fwd_op, bw_op, 4, 10)
 
         # Test going through one layer
+        graph = fake_graph.FakeGraph()
+        fwd_op = graph.add_op('fwdop', n_outputs=2)
+        layer1 = [graph.add_op('l1a', inputs=[fwd_op]),
+                  graph.add_op('l1b', inputs=[fwd_op])]
+        layer2 = [graph.add_op('l2a', inputs=[layer1[0]]),
+                  graph.add_op('l2b', inputs=[layer1[0]]),
+                  graph.add_op('l2c', inputs=[layer1[1]])]
+        grad_op = graph.add_op('gradop_name', inputs=[layer2[0]])
+        # a gradient op consumed in the forward range is not a candidate
+        early_grad_op = graph.add_op('early_grad', inputs=[layer1[1]])
+        bw_op = graph.add_op('bwop', inputs=[grad_op])
+        orders = {'fwdop': 5, 'gradop_name': 7, 'early_grad': 4, 'bwop': 50}
+        lms_test._index = graph_index.GraphIndex(graph)
         lms_test._topo_sort = mock.Mock()
-        # Mock get_order to return the "order" value from the mock op
-        lms_test._topo_sort.get_order = lambda x: x.order
-        # Mock get_consuming_ops to return the mock outputs' consumers
-        cons_ops.side_effect = lambda x: x.consumers
-        grad_op = mock.Mock(name='grad', order=7)
-        grad_op.name = 'gradop_name'
-        lms_test._grad_ops = {grad_op}
-        layer2 = [mock.Mock(name='l2a',
-                            outputs=[mock.Mock(name='secondToLast',
-                                               outputs=['a'],
-                                               consumers=[grad_op])]),
-                  mock.Mock(name='l2b', outputs=[])]
-        layer2[0].name = 'l2a_name'
-        layer2[1].name = 'l2b_name'
-        layer2b = mock.Mock(outputs=[])
-        layer1 = [mock.Mock(name='l1a', outputs=[mock.Mock(consumers=layer2)]),
-                  mock.Mock(name='l1b',
-                            outputs=[mock.Mock(consumers=[layer2b])])]
-        fwd_op = mock.Mock(name='fwdop', order=5,
-                           outputs=[mock.Mock(name='fwdop_out1',
-                                              consumers=layer1),
-                                    mock.Mock(name='fwdop_out2',
-                                              consumers=[], outputs=[])])
-        bw_op = mock.Mock(name='bwop', order=50)
+        lms_test._topo_sort.get_order = lambda x: orders.get(x.name, 6)
+        lms_test._grad_ops = {grad_op, early_grad_op, bw_op}
         lms_test._topo_sort.bw_starting_order = 1
         ret = lms_test._do_chain_rule(fwd_op, bw_op, 1, 10)
         self.assertEqual(ret, (grad_op, 7))
 
-    @mock.patch('tensorflow.contrib.graph_editor.get_forward_walk_ops')
-    def test_do_direct_order(self, get_fwd_walk):
+        # Test reaching the upperbound
+        ret = lms_test._do_chain_rule(fwd_op, bw_op, 1, 2)
+        self.assertEqual(ret, (None, -1))
+
+    def test_do_direct_order(self):
         lms_test = lms.LMS({'s1'})
+        lms_test._index = mock.Mock()
+        lms_test._index.op_id.side_effect = lambda x: x
+        lms_test._reach = mock.Mock()
         lms_test._topo_sort = mock.Mock()
         # Mock get_order to return the "order" value from the mock op
         lms_test._topo_sort.get_order.side_effect = lambda x: x.order
@@ -746,11 +765,498 @@ class LMSTest(unittest.TestCase):
         lms_test._topo_sort.get_ops = get_ops
         fw_op = mock.Mock(name='fwd_op', order=5)
         src_op = mock.Mock(name='src_op', order=50)
-        get_fwd_walk.side_effect = lambda x: ({'a', src_op}
-                                              if x is expected_ret
-                                              else {'b', 'c'})
+        lms_test._reach.reaches.side_effect = (
+            lambda x, y: x is expected_ret and y is src_op)
         ret = lms_test._do_direct_order(fw_op, src_op, 3, 100)
         self.assertEqual(ret, (expected_ret, 44))
 
+    def test_do_time_model(self):
+        # The bytes read and written by the orders are f0: 40, f1: 120,
+        # f2: 100, g2: 36, g1: 112, g0: 72, so with a device bandwidth of
+        # one byte per second, they are also their computation times.
+        lms_test, fw_ops = self._budget_lms(ctrld_strategy='time_model',
+                                            device_bandwidth=1.0)
+        ops = {op.name: op for op in lms_test._graph.get_operations()}
+        self.assertEqual(lms_test._get_order_times().tolist(),
+                         [0, 40, 160, 260, 296, 408, 480])
+        f0, g0 = ops['f0'], ops['g0']
+        # the 40 bytes of f0:0 are hidden by g1
+        lms_test._host_bandwidth = 1.0
+        self.assertEqual(lms_test._find_control_dependency(
+            f0, g0, 1, 10000, lms.lms.CTRLD_Strategy.TIME_MODEL),
+            (ops['g2'], 3))
+        # by f2 and g1
+        lms_test._host_bandwidth = 40 / 140.0
+        self.assertEqual(lms_test._do_time_model(f0, g0, 1, 10000),
+                         (ops['f2'], 2))
+        # the transfer cannot be hidden, it starts as early as possible
+        lms_test._host_bandwidth = 0.1
+        self.assertEqual(lms_test._do_time_model(f0, g0, 1, 10000),
+                         (ops['f1'], 1))
+        # within the upper bound
+        self.assertEqual(lms_test._do_time_model(f0, g0, 1, 3),
+                         (ops['g2'], 3))
+        self.assertEqual(lms_test._do_time_model(f0, g0, 1, 2),
+                         (None, -1))
+
+    def test_do_memory_pressure(self):
+        # With every tensor swapped in as late as possible, the predicted
+        # memory is [40, 120, 100, 36, 112, 72] and the cap is 120 bytes.
+        lms_test, fw_ops = self._budget_lms(
+            ctrld_strategy='memory_pressure')
+        ops = {op.name: op for op in lms_test._graph.get_operations()}
+        f0, g0 = ops['f0'], ops['g0']
+        self.assertEqual(lms_test._get_pressure()[0].tolist(),
+                         [40, 120, 100, 36, 112, 72])
+        self.assertEqual(lms_test._get_pressure()[1], 120)
+        # the 40 bytes of f0:0 do not fit at order 2, so they are swapped
+        # in after it
+        self.assertEqual(lms_test._find_control_dependency(
+            f0, g0, 1, 10000, lms.lms.CTRLD_Strategy.MEMORY_PRESSURE),
+            (ops['f2'], 2))
+        # within the upper bound
+        self.assertEqual(lms_test._do_memory_pressure(f0, g0, 1, 3),
+                         (ops['g2'], 3))
+        # a larger budget
+        lms_test._pressure = None
+        lms_test._memory_budget_bytes = 150
+        self.assertEqual(lms_test._do_memory_pressure(f0, g0, 1, 10000),
+                         (ops['f1'], 1))
+        # the tensor fits nowhere, it is swapped in as late as possible
+        lms_test._pressure = None
+        lms_test._memory_budget_bytes = 30
+        self.assertEqual(lms_test._do_memory_pressure(f0, g0, 1, 10000),
+                         (ops['g2'], 3))
+
+        # the swap-in is added to the predicted memory
+        lms_test._pressure = None
+        lms_test._memory_budget_bytes = 160
+        self.assertEqual(lms_test._plan_control_dependency(f0, g0),
+                         (ops['f1'], 1))
+        self.assertEqual(lms_test._get_pressure()[0].tolist(),
+                         [40, 120, 140, 76, 152, 72])
+
+    def _budget_lms(self, **kwargs):
+        # f0 -> f1 -> f2 -> g2 -> g1 -> g0 -> apply, f0 -> g0, f1 -> g1
+        # The orders are f0: 0, f1: 1, f2: 2, g2: 3, g1: 4, g0: 5 and the
+        # predicted peak is 156 bytes, see simulator_test.
+        graph = fake_graph.FakeGraph()
+        f0 = graph.add_op('f0', shape=(10,))
+        f1 = graph.add_op('f1', inputs=[f0], shape=(20,))
+        f2 = graph.add_op('f2', inputs=[f1], shape=(5,))
+        g2 = graph.add_op('g2', inputs=[f2], shape=(4,))
+        g1 = graph.add_op('g1', inputs=[g2, f1], shape=(4,))
+        g0 = graph.add_op('g0', inputs=[g1, f0], shape=(4,))
+        graph.add_op('apply', inputs=[g0])
+        lms_test = lms.LMS({'s1'}, graph=graph, lb=0, **kwargs)
+        lms_test._index = graph_index.GraphIndex(graph)
+        lms_test._grad_ops = {g2, g1, g0}
+        lms_test._reach = reachability.ReachabilityIndex(lms_test._index)
+        lms_test._topo_sort = topos.TOPOS([f0], lms_test._grad_ops,
+                                          index=lms_test._index)
+        lms_test._topo_sort.build()
+        lms_test._cost_model = cost_model.CostModel(lms_test._index)
+        return lms_test, [f0, f1, f2]
+
+    def test_select_swaps_for_budget(self):
+        lms_test, fw_ops = self._budget_lms(memory_budget_bytes=150)
+        self.assertEqual(lms_test._get_swap_candidates(set(fw_ops)),
+                         [0, 1, 2])
+        self.assertEqual(lms_test._select_swaps_for_budget(set(fw_ops)),
+                         {0})
+
+        # excluded ops are not candidates
+        lms_test._excl_ops = {fw_ops[0]}
+        self.assertEqual(lms_test._get_swap_candidates(set(fw_ops)), [1, 2])
+        self.assertEqual(lms_test._select_swaps_for_budget(set(fw_ops)),
+                         {1})
+
+        # the model fits
+        lms_test, fw_ops = self._budget_lms(memory_budget_bytes=200)
+        self.assertEqual(lms_test._select_swaps_for_budget(set(fw_ops)),
+                         set())
+
+    def test_build_plan_with_budget(self):
+        lms_test, fw_ops = self._budget_lms(memory_budget_bytes=150)
+        lms_test._budget_ts = {0}
+        swap_plan = lms_test._build_plan(fw_ops[:1])
+        self.assertEqual(swap_plan.swaps, (
+            lms.plan.TensorSwap('f0:0', 'f0', 40, (
+                lms.plan.SwapIn(('g0',), 'g1', 4),)),))
+        self.assertEqual(swap_plan.recomputes, ())
+        self.assertEqual(lms_test._incpu_bytes, 40)
+
+    def test_plan(self):
+        lms_test, fw_ops = self._budget_lms(memory_budget_bytes=150)
+        lms_test._analyze = mock.Mock(return_value=([fw_ops[0]],
+                                                    set(fw_ops)))
+        n_ops = len(lms_test._graph.get_operations())
+        prediction = lms_test.plan()
+        self.assertEqual(prediction.swap_plan.swapped_tensors, ['f0:0'])
+        self.assertEqual(prediction.baseline_peak_bytes, 156)
+        # f0 and f1 are on the device at order 1
+        self.assertEqual(prediction.peak_bytes, 120)
+        self.assertEqual(prediction.saved_bytes, 36)
+        # f0 is swapped out and in once
+        self.assertEqual(prediction.transfer_bytes, 80)
+        # g1 (order 4) triggers the swap-in for g0 (order 5)
+        self.assertEqual(prediction.trigger_distances, {'f0:0': [1]})
+        self.assertEqual(len(lms_test._graph.get_operations()), n_ops)
+        self.assertIsNone(lms_test.swap_plan)
+        self.assertEqual(lms_test.stats.swapouts, 1)
+        self.assertEqual(lms_test.stats.swapins, 1)
+        self.assertEqual(lms_test.stats.bytes_moved, 80)
+        self.assertIn('planning', lms_test.stats.phase_seconds)
+
+        # the model fits
+        lms_test._memory_budget_bytes = 200
+        prediction = lms_test.plan()
+        self.assertEqual(prediction.swap_plan, lms.plan.SwapPlan())
+        self.assertEqual(prediction.peak_bytes, 156)
+
+        # LMS is disabled or the model has already been edited
+        self.assertIsNone(lms.LMS({'s1'}, n_tensors=0).plan(mock.Mock()))
+        lms_test._analyze.return_value = None
+        self.assertIsNone(lms_test.plan())
+        self.assertRaises(ValueError, lms.LMS({'s1'}).plan)
+
+    @mock.patch('tensorflow.logging.info')
+    def test_events(self, info):
+        sink = lms.lms.events.MemorySink()
+        lms_test, fw_ops = self._budget_lms(memory_budget_bytes=150,
+                                            event_sinks=[sink])
+        self.assertEqual(lms_test.events.sinks[1:], (sink,))
+        lms_test._analyze = mock.Mock(return_value=([fw_ops[0]],
+                                                    set(fw_ops)))
+        lms_test.plan()
+        names = sink.names()
+        self.assertIn('budget_selection', names)
+        self.assertIn('swap_candidate', names)
+        self.assertEqual(names[-2:], ['planned', 'prediction'])
+        event = sink.events[names.index('budget_selection')]
+        self.assertEqual(event.fields['count'], 1)
+        self.assertEqual(event.fields['budget'], 150)
+        # debug is off, only the events of level 0 are logged
+        logged = [args[0] for args, _ in info.call_args_list]
+        self.assertTrue(logged)
+        self.assertTrue(all(m.startswith('[LMS][0] ') for m in logged))
+
+        # the debug events are logged with debug=True
+        info.reset_mock()
+        lms_test, fw_ops = self._budget_lms(memory_budget_bytes=150,
+                                            debug=True, debug_level=2)
+        lms_test._analyze = mock.Mock(return_value=([fw_ops[0]],
+                                                    set(fw_ops)))
+        lms_test.plan()
+        logged = [args[0] for args, _ in info.call_args_list]
+        self.assertTrue(any(m.startswith('[LMS][2] Operation: ')
+                            for m in logged))
+
+    @mock.patch('tensorflow.device')
+    @mock.patch('tensorflow.identity')
+    def test_revert(self, identity, device):
+        lms_test, fw_ops = self._budget_lms(memory_budget_bytes=150)
+        graph = lms_test._graph
+        identity.side_effect = lambda ts, name: graph.add_op(
+            name, inputs=[ts]).outputs[0]
+        f0, f1 = fw_ops[:2]
+        g1 = graph.get_operation_by_name('g1')
+        g0 = graph.get_operation_by_name('g0')
+        lms_test._budget_ts = {0}
+        swap_plan = lms_test._build_plan(fw_ops[:1])
+        added_ops = lms_test._apply_plan(swap_plan)
+        lms_test._swap_plan = swap_plan
+        swapout, swapin = added_ops
+        self.assertEqual(g0.inputs, [g1.outputs[0], swapin.outputs[0]])
+        self.assertEqual(swapin.control_inputs, [g1])
+
+        self.assertEqual(lms_test.revert(), {swapout, swapin})
+        self.assertEqual(g0.inputs, [g1.outputs[0], f0.outputs[0]])
+        self.assertIsNone(lms_test.swap_plan)
+        self.assertEqual(lms_test._incpu_count, 0)
+        self.assertEqual(lms_test._rewirer.journal, ())
+        # the disconnected ops are left out of the next analysis
+        index = lms_test._snapshot()
+        self.assertEqual(index.size, len(graph.get_operations()) - 2)
+        self.assertEqual(set(index.consuming_ops(f0.outputs[0])), {f1, g0})
+        self.assertEqual(set(graph.get_collection(lms.lms.REVERTED_OPS)),
+                         {swapout, swapin})
+
+    def _gradient_graph(self):
+        # the graph of _budget_lms, with the backward phase in the
+        # gradients scope
+        graph = fake_graph.FakeGraph()
+        f0 = graph.add_op('f0', shape=(10,))
+        f1 = graph.add_op('f1', inputs=[f0], shape=(20,))
+        f2 = graph.add_op('f2', inputs=[f1], shape=(5,))
+        g2 = graph.add_op('gradients/g2', inputs=[f2], shape=(4,))
+        g1 = graph.add_op('gradients/g1', inputs=[g2, f1], shape=(4,))
+        g0 = graph.add_op('gradients/g0', inputs=[g1, f0], shape=(4,))
+        graph.add_op('gradients/apply', inputs=[g0])
+        return graph
+
+    @mock.patch('tensorflow.contrib.graph_editor.get_forward_walk_ops')
+    @mock.patch('tensorflow.device')
+    @mock.patch('tensorflow.identity')
+    def test_run_revert_run(self, identity, device, fwd_walk):
+        graph = self._gradient_graph()
+        identity.side_effect = lambda ts, name: graph.add_op(
+            name, inputs=[ts]).outputs[0]
+        fwd_walk.side_effect = lambda op: graph_index.GraphIndex(
+            graph).forward_walk_ops(op)
+        lms_test = lms.LMS({'gradients'}, graph=graph, lb=0)
+        n_ops = len(graph.get_operations())
+        self.assertEqual(len(lms_test.run()), 6)
+        self.assertEqual(len(graph.get_operations()), n_ops + 6)
+        g0 = graph.get_operation_by_name('gradients/g0')
+        f0 = graph.get_operation_by_name('f0')
+        self.assertIsNot(g0.inputs[1], f0.outputs[0])
+
+        lms_test.revert()
+        self.assertIs(g0.inputs[1], f0.outputs[0])
+        # the same object plans and edits the graph again
+        self.assertEqual(len(lms_test.run()), 6)
+        self.assertEqual(len(graph.get_operations()), n_ops + 12)
+        self.assertIsNot(g0.inputs[1], f0.outputs[0])
+        self.assertEqual(lms_test._n_tensors, -1)
+
+    @mock.patch('tensorflow.contrib.graph_editor.get_forward_walk_ops')
+    @mock.patch('tensorflow.device')
+    @mock.patch('tensorflow.identity')
+    def test_run_fitting_budget(self, identity, device, fwd_walk):
+        graph = self._gradient_graph()
+        identity.side_effect = lambda ts, name: graph.add_op(
+            name, inputs=[ts]).outputs[0]
+        fwd_walk.side_effect = lambda op: graph_index.GraphIndex(
+            graph).forward_walk_ops(op)
+        lms_test = lms.LMS({'gradients'}, graph=graph, lb=0)
+        lms_test.run()
+        self.assertEqual(len(lms_test.swap_plan.swaps), 3)
+        self.assertEqual(lms_test.stats.swapouts, 3)
+        lms_test.revert()
+
+        # the plan of the previous run is not kept
+        lms_test._memory_budget_bytes = 2**30
+        self.assertIsNone(lms_test.run())
+        self.assertEqual(lms_test.swap_plan, lms.plan.SwapPlan())
+        self.assertEqual(lms_test.stats.swapouts, 0)
+        self.assertEqual(lms_test.stats.swapins, 0)
+        self.assertEqual(lms_test.stats.bytes_moved, 0)
+
+        # nor recorded by a run on another graph that fails
+        lms_test._memory_budget_bytes = None
+        lms_test.run()
+        with mock.patch.object(lms_test, '_analyze',
+                               side_effect=ValueError('no scope')):
+            self.assertRaises(ValueError, lms_test.run,
+                              self._gradient_graph())
+        self.assertIsNone(lms_test.swap_plan)
+        self.assertEqual(lms_test.stats.swapouts, 0)
+
+    @mock.patch('tensorflow.contrib.graph_editor.get_forward_walk_ops')
+    @mock.patch('tensorflow.device')
+    @mock.patch('tensorflow.identity')
+    def test_simulate_cached_plan(self, identity, device, fwd_walk):
+        graph = self._gradient_graph()
+        identity.side_effect = lambda ts, name: graph.add_op(
+            name, inputs=[ts]).outputs[0]
+        fwd_walk.side_effect = lambda op: graph_index.GraphIndex(
+            graph).forward_walk_ops(op)
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        lms_test = lms.LMS({'gradients'}, graph=graph, lb=1,
+                           plan_cache_dir=directory)
+        with self.assertRaises(ValueError):
+            lms_test.simulate()
+        lms_test.run()
+        profile = lms_test.simulate()
+        lms_test.revert()
+
+        # the graph edited from the cached plan is not analyzed by run
+        lms_test = lms.LMS({'gradients'}, graph=graph, lb=1,
+                           plan_cache_dir=directory)
+        with mock.patch.object(lms_test, '_analyze') as analyze:
+            lms_test.run()
+            self.assertFalse(analyze.called)
+        self.assertIsNone(lms_test._topo_sort)
+        cached_profile = lms_test.simulate()
+        self.assertEqual(cached_profile.peak, profile.peak)
+        self.assertEqual(cached_profile.host_peak, profile.host_peak)
+
+    @mock.patch('tensorflow.contrib.graph_editor.get_forward_walk_ops')
+    @mock.patch('tensorflow.device')
+    @mock.patch('tensorflow.identity')
+    def test_plan_after_run(self, identity, device, fwd_walk):
+        graph = self._gradient_graph()
+        identity.side_effect = lambda ts, name: graph.add_op(
+            name, inputs=[ts]).outputs[0]
+        fwd_walk.side_effect = lambda op: graph_index.GraphIndex(
+            graph).forward_walk_ops(op)
+        lms_test = lms.LMS({'gradients'}, graph=graph, lb=0)
+        before = lms_test.plan()
+        lms_test.run()
+        # the edited model is not planned again
+        self.assertIsNone(lms_test.plan())
+        lms_test.revert()
+        n_ops = len(graph.get_operations())
+        prediction = lms_test.plan()
+        self.assertEqual(prediction.swap_plan, before.swap_plan)
+        self.assertEqual(prediction.peak_bytes, before.peak_bytes)
+        self.assertEqual(len(graph.get_operations()), n_ops)
+        # with other parameters
+        lms_test._n_tensors = 1
+        self.assertEqual(len(lms_test.plan().swap_plan.swaps), 1)
+
+    def test_autotune(self):
+        lms_test, fw_ops = self._budget_lms()
+        lms_test._analyze = mock.Mock(return_value=([fw_ops[0]],
+                                                    set(fw_ops)))
+        self.assertEqual(lms_test._get_swap_order([fw_ops[0]], set(fw_ops)),
+                         [0, 1, 2])
+        front = lms_test.autotune(lb_values=(1, 2), processes=0,
+                                  bandwidth=20.0, time_per_order=1.0)
+        self.assertEqual([(r.peak, r.stall) for r in front],
+                         [(120, 2.0), (152, 1.0), (156, 0.0)])
+        self.assertEqual(front[0].config,
+                         {'lb': 1, 'ub': 10000, 'n_tensors': 1,
+                          'fuse_swapins': False,
+                          'ctrld_strategy': 'chain_rule'})
+        # the configuration with the smallest peak is applied
+        self.assertEqual(lms_test._n_tensors, 1)
+        self.assertIs(lms_test._ctrld_strategy,
+                      lms.lms.CTRLD_Strategy.CHAIN_RULE)
+
+        # the configuration with the smallest stall fitting in the budget
+        lms_test._memory_budget_bytes = 155
+        front = lms_test.autotune(lb_values=(1, 2), processes=0,
+                                  bandwidth=20.0, time_per_order=1.0)
+        self.assertEqual(lms_test._ctrld_strategy,
+                         lms.lms.CTRLD_Strategy.DIRECT_ORDER)
+        self.assertEqual(lms_test._lb, 1)
+
+        # nothing is applied
+        lms_test._lb = 7
+        lms_test.autotune(lb_values=(1,), processes=0, apply=False)
+        self.assertEqual(lms_test._lb, 7)
+        self.assertRaisesRegex(ValueError, 'Unknown control dependency',
+                               lms_test.autotune, ctrld_strategies=('x',))
+
+    def test_simulate(self):
+        lms_test = lms.LMS({'s1'})
+        self.assertRaisesRegex(ValueError, 'run', lms_test.simulate)
+        lms_test, fw_ops = self._budget_lms()
+        self.assertEqual(lms_test.simulate().peak, 156)
+        lms_test._swapped_ts = {fw_ops[0].outputs[0]}
+        profile = lms_test.simulate()
+        self.assertEqual(profile.peak, 120)
+        self.assertEqual(profile.host_peak, 40)
+
+    def _recompute_lms(self, **kwargs):
+        # x -> r -> y -> g2 -> g1 -> g0 -> apply, r -> g1, x -> g0
+        graph = fake_graph.FakeGraph()
+        x = graph.add_op('x', shape=(100,))
+        r = graph.add_op('r', inputs=[x], op_type='Relu', shape=(100,))
+        y = graph.add_op('y', inputs=[r], shape=(100,))
+        g2 = graph.add_op('g2', inputs=[y])
+        g1 = graph.add_op('g1', inputs=[g2, r])
+        g0 = graph.add_op('g0', inputs=[g1, x])
+        graph.add_op('apply', inputs=[g0])
+        lms_test = lms.LMS({'s1'}, graph=graph, recompute=True)
+        lms_test._index = graph_index.GraphIndex(graph)
+        lms_test._grad_ops = {g2, g1, g0}
+        lms_test._reach = reachability.ReachabilityIndex(lms_test._index)
+        lms_test._topo_sort = topos.TOPOS([x], lms_test._grad_ops,
+                                          index=lms_test._index)
+        lms_test._topo_sort.build()
+        lms_test._cost_model = cost_model.CostModel(lms_test._index)
+        lms_test._remat = lms.lms.remat.RematPlanner(
+            lms_test._index, lms_test._cost_model,
+            lms_test._topo_sort.orders, lms_test._get_grad_flags(),
+            **kwargs)
+        return lms_test, x
+
+    def test_build_plan_with_recompute(self):
+        # r is recomputed from the swapped x, x and y are swapped
+        lms_test, x = self._recompute_lms(keep_bytes=0)
+        swap_plan = lms_test._build_plan([x])
+        self.assertEqual(swap_plan.swapped_tensors, ['x:0', 'y:0'])
+        self.assertEqual(swap_plan.recomputes, (
+            lms.plan.Recompute('r:0', 'r', 400, 'g1', ('r',), 'g2', 3),))
+        self.assertEqual(swap_plan.total_bytes, 800)
+        self.assertEqual(lms_test._incpu_count, 2)
+        self.assertEqual(lms_test._recompute_count, 1)
+        self.assertEqual(lms_test._remat._recomputed,
+                         {lms_test._index.ts_id(
+                             lms_test._graph.get_tensor_by_name('r:0'))})
+
+        self.assertEqual(swap_plan.kept, ())
+
+        # small tensors are kept on the device
+        lms_test, x = self._recompute_lms()
+        swap_plan = lms_test._build_plan([x])
+        self.assertEqual(len(swap_plan), 0)
+        self.assertEqual(swap_plan.kept, ('x:0', 'r:0', 'y:0'))
+        lms_test._stats.record_plan(swap_plan)
+        self.assertEqual(lms_test.stats.kept, 3)
+
+    def test_build_plan_with_recompute_unordered_consumer(self):
+        # a consumer of the recomputed r without order is resolved like the
+        # consumers of swapped tensors, from new source operations
+        lms_test, x = self._recompute_lms(keep_bytes=0)
+        g1 = lms_test._graph.get_operation_by_name('g1')
+        get_order = lms_test._topo_sort.get_order
+        with mock.patch.object(
+                lms_test._topo_sort, 'get_order',
+                side_effect=lambda op: -1 if op is g1 else get_order(op)), \
+                mock.patch.object(lms_test, '_find_new_src_op',
+                                  return_value=set()) as find_new_src_op:
+            swap_plan = lms_test._build_plan([x])
+        find_new_src_op.assert_called_once_with(g1)
+        self.assertEqual(swap_plan.recomputes, ())
+        # nothing is recomputed without a consumer with an order
+        self.assertEqual(lms_test._recompute_count, 0)
+        self.assertEqual(lms_test._remat._recomputed, set())
+
+    @mock.patch('tensorflow_large_model_support.rewire.copy_ops')
+    @mock.patch('tensorflow.identity')
+    def test_add_recompute(self, identity, copy_ops):
+        # x -> r1 -> r2 -> g, w -> r1
+        graph = fake_graph.FakeGraph()
+        x = graph.add_op('x')
+        w = graph.add_op('w')
+        r1 = graph.add_op('r1', inputs=[x, w], op_type='Relu')
+        r2 = graph.add_op('r2', inputs=[r1], op_type='Relu')
+        g = graph.add_op('g', inputs=[r2])
+        lms_test = lms.LMS({'s1'}, graph=graph)
+        lms_test._topo_sort = mock.Mock()
+        lms_test._rewirer = mock.Mock()
+        swapout_x = mock.Mock(outputs=['swapout_x:0'])
+        lms_test._swapout_ops = {x.outputs[0]: swapout_x}
+        swap_in = mock.Mock()
+        identity.return_value = swap_in
+        copy_ops.return_value = (['copy_r1', 'copy_r2'],
+                                 {r1.outputs[0]: 'copy_r1:0',
+                                  r2.outputs[0]: 'copy_r2:0'})
+
+        ret = lms_test._add_recompute(r2.outputs[0], g, [r1, r2], 'ctrld')
+        identity.assert_called_once_with('swapout_x:0', name='lms/swapin')
+        copy_ops.assert_called_once_with(graph, [r1, r2],
+                                         {x.outputs[0]: swap_in},
+                                         'lms/recompute')
+        lms_test._rewirer.reroute.assert_called_once_with(
+            r2.outputs[0], 'copy_r2:0', [g])
+        self.assertEqual(lms_test._rewirer.add_control_input.call_args_list,
+                         [mock.call(swap_in.op, 'ctrld'),
+                          mock.call('copy_r1', 'ctrld')])
+        self.assertEqual(ret, [swap_in.op, 'copy_r1', 'copy_r2'])
+        self.assertEqual(lms_test._excl_ops,
+                         {swap_in.op, 'copy_r1', 'copy_r2'})
+
+        # without a control dependency op
+        lms_test._rewirer.reset_mock()
+        copy_ops.return_value = (['copy_r2'], {r2.outputs[0]: 'copy_r2:0'})
+        lms_test._add_recompute(r2.outputs[0], g, [r2], None)
+        self.assertFalse(lms_test._rewirer.add_control_input.called)
+
 if __name__ == '__main__':
     unittest.main()
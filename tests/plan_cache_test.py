@@ -0,0 +1,97 @@
+# (C) Copyright IBM Corp. 2018. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Tests for the LMS plan cache module."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from tensorflow_large_model_support import graph_index
+from tensorflow_large_model_support import plan
+from tensorflow_large_model_support import plan_cache
+import fake_graph
+import os
+import shutil
+import tempfile
+import unittest
+
+
+def _index(prefix='f', shape=(2, 2), device=''):
+    graph = fake_graph.FakeGraph()
+    x = graph.add_op(prefix + 'x', shape=shape)
+    y = graph.add_op(prefix + 'y', inputs=[x], op_type='Relu', shape=shape)
+    graph.add_op(prefix + 'z', inputs=[x, y], control_inputs=[x])
+    for op in graph.get_operations():
+        op.device = device
+    return graph_index.GraphIndex(graph)
+
+
+class GraphKeyTest(unittest.TestCase):
+
+    def test_graph_key(self):
+        key = plan_cache.graph_key(_index(), {'lb': 1})
+        self.assertEqual(key, plan_cache.graph_key(_index(), {'lb': 1}))
+        # names are not part of the key
+        self.assertEqual(key, plan_cache.graph_key(_index('g'), {'lb': 1}))
+        self.assertNotEqual(key, plan_cache.graph_key(_index(), {'lb': 2}))
+        self.assertNotEqual(key, plan_cache.graph_key(_index(shape=(2, 3)),
+                                                      {'lb': 1}))
+        self.assertNotEqual(key, plan_cache.graph_key(
+            _index(device='/gpu:1'), {'lb': 1}))
+
+
+class PlanCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.plan = plan.SwapPlan(
+            [plan.TensorSwap('f0:0', 'f0', 40,
+                             [plan.SwapIn(['g0'], 'g1', 4)])])
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_get_put(self):
+        cache = plan_cache.PlanCache(os.path.join(self.directory, 'plans'))
+        self.assertIsNone(cache.get('k1'))
+        cache.put('k1', self.plan)
+        self.assertEqual(cache.get('k1'), self.plan)
+        self.assertEqual(os.listdir(cache.directory), ['k1.json'])
+
+        # corrupted plans are removed
+        with open(os.path.join(cache.directory, 'k1.json'), 'w') as f:
+            f.write('{"swaps": [{')
+        self.assertIsNone(cache.get('k1'))
+        self.assertEqual(os.listdir(cache.directory), [])
+        self.assertRaises(ValueError, plan_cache.PlanCache, self.directory,
+                          0)
+
+    def test_evict(self):
+        cache = plan_cache.PlanCache(self.directory)
+        cache.put('k1', self.plan)
+        size = os.path.getsize(os.path.join(self.directory, 'k1.json'))
+        cache = plan_cache.PlanCache(self.directory, max_bytes=2 * size)
+        cache.put('k2', self.plan)
+        os.utime(os.path.join(self.directory, 'k1.json'), (100, 100))
+        os.utime(os.path.join(self.directory, 'k2.json'), (200, 200))
+        # reading k1 makes k2 the least recently used plan
+        self.assertIsNotNone(cache.get('k1'))
+        cache.put('k3', self.plan)
+        self.assertEqual(sorted(os.listdir(self.directory)),
+                         ['k1.json', 'k3.json'])
+
+
+if __name__ == '__main__':
+    unittest.main()
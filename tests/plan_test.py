@@ -0,0 +1,91 @@
+# (C) Copyright IBM Corp. 2018. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Tests for the LMS plan module."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from tensorflow_large_model_support import plan
+import json
+import unittest
+
+
+class SwapPlanTest(unittest.TestCase):
+
+    def setUp(self):
+        self.plan = plan.SwapPlan(
+            [plan.TensorSwap('f0:0', 'f0', 40, [
+                plan.SwapIn(['g0', 'h0'], 'g1', 4),
+                plan.SwapIn(['k0'], None, -1)]),
+             plan.TensorSwap('f1:0', 'f1', -1, [])],
+            [plan.Recompute('r:0', 'r', 16, 'g1', ['r'], 'g2', 3)],
+            ['k:0'])
+
+    def test_immutable(self):
+        swap = self.plan.swaps[0]
+        self.assertEqual(swap.swapins[0].consumers, ('g0', 'h0'))
+        self.assertEqual(self.plan.recomputes[0].ops, ('r',))
+        self.assertRaises(AttributeError, setattr, swap, 'nbytes', 0)
+        self.assertEqual(self.plan.kept, ('k:0',))
+        self.assertEqual(hash(self.plan),
+                         hash(plan.SwapPlan(self.plan.swaps,
+                                            self.plan.recomputes,
+                                            self.plan.kept)))
+        # kept tensors are part of the decisions of the plan
+        self.assertNotEqual(plan.SwapPlan(self.plan.swaps,
+                                          self.plan.recomputes), self.plan)
+
+    def test_properties(self):
+        self.assertEqual(len(self.plan), 3)
+        self.assertEqual(self.plan.swapped_tensors, ['f0:0', 'f1:0'])
+        self.assertEqual(self.plan.total_bytes, 40)
+        # swapped out once and in twice
+        self.assertEqual(self.plan.transfer_bytes, 120)
+        self.assertEqual(repr(self.plan),
+                         'SwapPlan(2 swaps, 1 recomputes, 40 bytes)')
+
+    def test_dict(self):
+        value = json.loads(json.dumps(self.plan.to_dict()))
+        self.assertEqual(value['swaps'][0]['swapins'][1],
+                         {'consumers': ['k0'], 'trigger': None,
+                          'trigger_order': -1})
+        self.assertEqual(value['kept'], ['k:0'])
+        self.assertEqual(plan.SwapPlan.from_dict(value), self.plan)
+        self.assertNotEqual(plan.SwapPlan.from_dict({}), self.plan)
+        self.assertEqual(plan.SwapPlan.from_dict({}), plan.SwapPlan())
+
+
+class PlanPredictionTest(unittest.TestCase):
+
+    def test_prediction(self):
+        swap_plan = plan.SwapPlan(
+            [plan.TensorSwap('f0:0', 'f0', 40,
+                             [plan.SwapIn(['g0'], 'g1', 4)])])
+        prediction = plan.PlanPrediction(swap_plan, 120, 156, 80,
+                                         {'f0:0': [1]})
+        self.assertEqual(prediction.saved_bytes, 36)
+        value = json.loads(json.dumps(prediction.to_dict()))
+        self.assertEqual(plan.SwapPlan.from_dict(value['plan']), swap_plan)
+        self.assertEqual(value['trigger_distances'], {'f0:0': [1]})
+        self.assertEqual(value['peak_bytes'], 120)
+        self.assertEqual(
+            repr(prediction),
+            'PlanPrediction(SwapPlan(1 swaps, 0 recomputes, 40 bytes), '
+            'peak_bytes=120, baseline_peak_bytes=156, transfer_bytes=80)')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,158 @@
+# (C) Copyright IBM Corp. 2018. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Tests for the LMS reachability module."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from tensorflow_large_model_support import graph_index
+from tensorflow_large_model_support import reachability
+import fake_graph
+import unittest
+
+
+class ReachabilityIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        # a -> b -> c -> d
+        # a -> e -> d, f is disconnected
+        self.graph = fake_graph.FakeGraph()
+        g = self.graph
+        self.a, self.b, self.c = g.chain('', 3)
+        self.e = g.add_op('e', inputs=[self.a])
+        self.d = g.add_op('d', inputs=[self.c, self.e])
+        self.f = g.add_op('f')
+        self.index = graph_index.GraphIndex(self.graph)
+
+    def _id(self, op):
+        return self.index.op_id(op)
+
+    def test_levels(self):
+        reach = reachability.ReachabilityIndex(self.index)
+        levels = [reach.levels[self._id(op)]
+                  for op in (self.a, self.b, self.c, self.e, self.d, self.f)]
+        self.assertEqual(levels, [0, 1, 2, 1, 3, 0])
+
+    def test_reaches(self):
+        reach = reachability.ReachabilityIndex(self.index)
+        a, b, c, d, e, f = [self._id(op) for op in (
+            self.a, self.b, self.c, self.d, self.e, self.f)]
+        self.assertTrue(reach.reaches(a, a))
+        self.assertTrue(reach.reaches(a, d))
+        self.assertTrue(reach.reaches(e, d))
+        self.assertTrue(reach.reaches(b, c))
+        self.assertFalse(reach.reaches(d, a))
+        self.assertFalse(reach.reaches(e, c))
+        self.assertFalse(reach.reaches(b, e))
+        self.assertFalse(reach.reaches(f, d))
+
+    def test_cone_cache(self):
+        reach = reachability.ReachabilityIndex(self.index, max_cones=1)
+        a, c, d = [self._id(op) for op in (self.a, self.c, self.d)]
+        # pruned by levels, no cone is built
+        self.assertFalse(reach.reaches(d, a))
+        self.assertEqual(len(reach._cones), 0)
+        self.assertTrue(reach.reaches(c, d))
+        self.assertEqual(list(reach._cones), [d])
+        # the cone of d is reused and grown further
+        self.assertTrue(reach.reaches(a, d))
+        self.assertEqual(list(reach._cones), [d])
+        # the least recently used cone is evicted
+        self.assertTrue(reach.reaches(a, c))
+        self.assertEqual(list(reach._cones), [c])
+
+    def test_within(self):
+        within = self.index.mask([self.a, self.b, self.d])
+        reach = reachability.ReachabilityIndex(self.index, within=within)
+        a, b, c, d = [self._id(op) for op in (self.a, self.b, self.c, self.d)]
+        self.assertTrue(reach.reaches(a, b))
+        self.assertFalse(reach.reaches(a, d))
+        self.assertFalse(reach.reaches(c, d))
+        self.assertEqual(list(reach.ancestors(b)), [a])
+        self.assertEqual(list(reach.ancestors(d)), [])
+
+    def test_ancestors(self):
+        reach = reachability.ReachabilityIndex(self.index)
+        ancestors = [self.index.op(i) for i in reach.ancestors(self._id(self.d))]
+        self.assertEqual(ancestors, [self.a, self.b, self.c, self.e])
+        self.assertEqual(list(reach.ancestors(self._id(self.a))), [])
+
+    def test_has_descendants(self):
+        reach = reachability.ReachabilityIndex(self.index)
+        self.assertTrue(reach.has_descendants(self._id(self.a)))
+        self.assertFalse(reach.has_descendants(self._id(self.d)))
+        self.assertFalse(reach.has_descendants(self._id(self.f)))
+
+    def test_cycle(self):
+        # x -> y -> z -> y, z -> w
+        graph = fake_graph.FakeGraph()
+        x, y, z = graph.chain('', 3)
+        y.inputs.append(z.outputs[0])
+        w = graph.add_op('w', inputs=[z])
+        index = graph_index.GraphIndex(graph)
+        reach = reachability.ReachabilityIndex(index)
+        x, y, z, w = index.op_ids([x, y, z, w])
+        self.assertEqual(reach.levels, [0, -1, -1, -1])
+        self.assertTrue(reach.reaches(x, w))
+        self.assertTrue(reach.reaches(z, y))
+        self.assertTrue(reach.reaches(y, z))
+        self.assertFalse(reach.reaches(w, y))
+        self.assertFalse(reach.reaches(y, x))
+
+    def test_source_coverage(self):
+        reach = reachability.ReachabilityIndex(self.index)
+        a, b, c, d, e, f = [self._id(op) for op in (
+            self.a, self.b, self.c, self.d, self.e, self.f)]
+        # b and e are reached by a, f reaches no other target
+        self.assertEqual(reach.source_coverage([b, e, a, d, f]),
+                         {a: 3, f: 0})
+        self.assertEqual(reach.source_coverage([b, e, d]), {b: 1, e: 1})
+        within = self.index.mask([self.a, self.b, self.c, self.d])
+        reach = reachability.ReachabilityIndex(self.index, within=within)
+        # e is not within
+        self.assertEqual(reach.source_coverage([b, e, d]), {b: 1})
+
+    def test_source_coverage_cycle(self):
+        # x -> y -> z -> y, z -> w
+        graph = fake_graph.FakeGraph()
+        x, y, z = graph.chain('', 3)
+        y.inputs.append(z.outputs[0])
+        w = graph.add_op('w', inputs=[z])
+        index = graph_index.GraphIndex(graph)
+        reach = reachability.ReachabilityIndex(index)
+        x, y, z, w = index.op_ids([x, y, z, w])
+        # y and z reach each other
+        self.assertEqual(reach.source_coverage([y, z, w]), {y: 2, z: 2})
+        self.assertEqual(reach.source_coverage([x, z, w]), {x: 2})
+
+    def test_source_coverage_blocks(self):
+        # 100 sources s_i -> t_i, and s_0 -> t_j for every j
+        graph = fake_graph.FakeGraph()
+        sources = [graph.add_op('s{}'.format(i)) for i in range(100)]
+        targets = [graph.add_op('t{}'.format(i),
+                                inputs=[sources[i], sources[0]])
+                   for i in range(100)]
+        index = graph_index.GraphIndex(graph)
+        reach = reachability.ReachabilityIndex(index)
+        coverage = reach.source_coverage(
+            index.op_ids(sources + targets).tolist())
+        self.assertEqual(len(coverage), 100)
+        self.assertEqual(coverage[index.op_id(sources[0])], 100)
+        self.assertEqual(coverage[index.op_id(sources[99])], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
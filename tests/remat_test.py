@@ -0,0 +1,95 @@
+# (C) Copyright IBM Corp. 2018. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Tests for the LMS remat module."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from tensorflow_large_model_support import cost_model
+from tensorflow_large_model_support import graph_index
+from tensorflow_large_model_support import remat
+import fake_graph
+import unittest
+
+
+class RematPlannerTest(unittest.TestCase):
+
+    def setUp(self):
+        # x -> r1 -> r2 -> g2 -> g1 -> g0, x -> g1, r1 and r2 are ReLUs
+        # The orders are the op ids, g2, g1 and g0 are gradient ops.
+        graph = fake_graph.FakeGraph()
+        x = graph.add_op('x', shape=(100,))
+        r1 = graph.add_op('r1', inputs=[x], op_type='Relu', shape=(100,))
+        r2 = graph.add_op('r2', inputs=[r1], op_type='Relu', shape=(100,))
+        g2 = graph.add_op('g2', inputs=[r2])
+        g1 = graph.add_op('g1', inputs=[g2, x])
+        graph.add_op('g0', inputs=[g1])
+        self.index = graph_index.GraphIndex(graph)
+        self.model = cost_model.CostModel(self.index)
+        self.orders = list(range(6))
+        self.grad_flags = [False] * 3 + [True] * 3
+
+    def _planner(self, **kwargs):
+        return remat.RematPlanner(self.index, self.model, self.orders,
+                                  self.grad_flags, keep_bytes=0, **kwargs)
+
+    def test_recompute(self):
+        planner = self._planner()
+        # x stays on the device until g1, so that r1 and r2 are recomputed
+        self.assertEqual(planner.decide(2, lambda i: False),
+                         (remat.RECOMPUTE, [1, 2]))
+        # until it is marked, the original tensor is available
+        self.assertEqual(planner._recomputed, set())
+        planner.mark_recomputed(2)
+        self.assertEqual(planner._recomputed, {2})
+        self.assertEqual(planner.recompute_time([1, 2], lambda i: False),
+                         1600 / 900e9)
+        self.assertEqual(planner.swap_time(2), 800 / 12e9)
+
+    def test_recompute_from_swapped(self):
+        planner = self._planner()
+        # r1 is swapped in again
+        self.assertEqual(planner.decide(2, lambda i: i == 1),
+                         (remat.RECOMPUTE, [2]))
+        self.assertEqual(planner.recompute_time([2], lambda i: i == 1),
+                         800 / 900e9 + 400 / 12e9)
+
+    def test_swap(self):
+        # x is not produced by an elementwise op
+        self.assertEqual(self._planner().decide(0, lambda i: False),
+                         (remat.SWAP, []))
+        # r1 is more than one level away from x
+        planner = self._planner(max_depth=1)
+        self.assertEqual(planner.decide(2, lambda i: False),
+                         (remat.SWAP, []))
+        # recomputing is slower than swapping
+        planner = self._planner(device_bandwidth=1e9)
+        self.assertEqual(planner.decide(2, lambda i: False),
+                         (remat.SWAP, []))
+        # the original tensor of a recomputed input is not available
+        planner = self._planner()
+        planner.mark_recomputed(0)
+        self.assertEqual(planner.decide(2, lambda i: False),
+                         (remat.SWAP, []))
+
+    def test_keep(self):
+        planner = remat.RematPlanner(self.index, self.model, self.orders,
+                                     self.grad_flags, keep_bytes=400)
+        self.assertEqual(planner.decide(2, lambda i: False), (remat.KEEP, []))
+
+
+if __name__ == '__main__':
+    unittest.main()
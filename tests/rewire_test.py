@@ -0,0 +1,128 @@
+# (C) Copyright IBM Corp. 2018. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Tests for the LMS rewire module."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from tensorflow_large_model_support import rewire
+import fake_graph
+import unittest
+
+
+class RewirerTest(unittest.TestCase):
+
+    def setUp(self):
+        # x -> a, x -> b (twice), y
+        self.graph = fake_graph.FakeGraph()
+        self.x = self.graph.add_op('x')
+        self.a = self.graph.add_op('a', inputs=[self.x])
+        self.b = self.graph.add_op('b', inputs=[self.x, self.x])
+        self.y = self.graph.add_op('y')
+
+    def test_apply(self):
+        rewirer = rewire.Rewirer()
+        x0 = self.x.outputs[0]
+        y0 = self.y.outputs[0]
+        rewirer.reroute(x0, y0, [self.b])
+        rewirer.add_control_input(self.a, self.y)
+        rewirer.add_control_input(self.a, self.y)
+        # nothing changes before the edits are applied
+        self.assertEqual(self.b.inputs, [x0, x0])
+        self.assertEqual(rewirer.num_edits, 3)
+        self.assertEqual(rewirer.apply(), 3)
+        self.assertEqual(self.a.inputs, [x0])
+        self.assertEqual(self.b.inputs, [y0, y0])
+        self.assertEqual(self.a.control_inputs, [self.y])
+        self.assertEqual(rewirer.num_edits, 0)
+
+    def test_errors(self):
+        rewirer = rewire.Rewirer()
+        rewirer.update_input(self.a, 0, self.y.outputs[0])
+        rewirer.update_input(self.a, 0, self.y.outputs[0])
+        self.assertRaisesRegex(ValueError, 'replaced by both',
+                               rewirer.update_input, self.a, 0,
+                               self.b.outputs[0])
+        # an edit lost by the graph
+        self.a._update_input = lambda index, tensor: None
+        self.assertRaisesRegex(ValueError, 'Input 0 of operation a',
+                               rewirer.apply)
+        rewirer = rewire.Rewirer()
+        rewirer.add_control_input(self.a, self.y)
+        self.a._add_control_inputs = lambda ops: None
+        self.assertRaisesRegex(ValueError, 'no control input y',
+                               rewirer.apply)
+
+    def test_revert(self):
+        c = self.graph.add_op('c')
+        self.a.control_inputs.append(c)
+        swap = self.graph.add_op('swap', inputs=[self.x])
+        x0 = self.x.outputs[0]
+        swap0 = swap.outputs[0]
+        rewirer = rewire.Rewirer()
+        rewirer.add_ops([swap])
+        rewirer.reroute(x0, swap0, [self.a, self.b])
+        rewirer.add_control_input(self.a, self.y)
+        rewirer.add_control_input(swap, self.y)
+        rewirer.apply()
+        self.assertEqual(rewirer.journal, (
+            rewire.AddedOp(swap),
+            rewire.InputEdit(self.a, 0, x0, swap0),
+            rewire.InputEdit(self.b, 0, x0, swap0),
+            rewire.InputEdit(self.b, 1, x0, swap0),
+            rewire.ControlEdit(self.a, self.y),
+            rewire.ControlEdit(swap, self.y)))
+
+        self.assertEqual(rewirer.revert(), [swap])
+        self.assertEqual(self.a.inputs, [x0])
+        self.assertEqual(self.b.inputs, [x0, x0])
+        self.assertEqual(self.a.control_inputs, [c])
+        self.assertEqual(rewirer.journal, ())
+
+        # an input changed after the edit is not overwritten
+        rewirer.update_input(self.a, 0, swap0)
+        rewirer.apply()
+        self.a.inputs[0] = self.y.outputs[0]
+        self.assertRaisesRegex(ValueError, 'has been changed',
+                               rewirer.revert)
+
+    def test_copy_ops(self):
+        # x -> r1 -> r2, c -> r2
+        c = self.graph.add_op('c')
+        r1 = self.graph.add_op('r1', inputs=[self.x], op_type='Relu')
+        r2 = self.graph.add_op('r2', inputs=[r1], control_inputs=[c, r1],
+                               op_type='Relu')
+        r2.device = '/gpu:0'
+        r2.node_def.attr = {'T': 'float'}
+        y0 = self.y.outputs[0]
+        copied_ops, copied_ts = rewire.copy_ops(
+            self.graph, [r1, r2], {self.x.outputs[0]: y0}, 'lms/recompute')
+        copy_r1, copy_r2 = copied_ops
+        self.assertEqual(copy_r1.name, 'lms/recompute/r1')
+        self.assertEqual(copy_r1.inputs, [y0])
+        self.assertEqual(copy_r2.inputs, [copy_r1.outputs[0]])
+        self.assertEqual(copy_r2.control_inputs, [c, copy_r1])
+        self.assertEqual(copy_r2.type, 'Relu')
+        self.assertEqual(copy_r2.device, '/gpu:0')
+        self.assertEqual(copy_r2.node_def.attr, {'T': 'float'})
+        self.assertEqual(copied_ts, {r1.outputs[0]: copy_r1.outputs[0],
+                                     r2.outputs[0]: copy_r2.outputs[0]})
+        # the original ops are unchanged
+        self.assertEqual(r2.inputs, [r1.outputs[0]])
+
+
+if __name__ == '__main__':
+    unittest.main()
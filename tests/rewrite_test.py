@@ -0,0 +1,103 @@
+# (C) Copyright IBM Corp. 2018. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Tests for the LMS rewrite module."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from tensorflow_large_model_support import plan
+from tensorflow_large_model_support import rewrite
+import json
+import mock
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class RewriteTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def test_parse_args(self):
+        args = rewrite._parse_args(['in.meta', 'out.meta',
+                                    '--optimizer-scope', 'a/gradients',
+                                    '--optimizer-scope', 'b/gradients',
+                                    '--budget', '1000', '--lb', '3',
+                                    '--ctrld-strategy', 'time_model'])
+        self.assertEqual(args.optimizer_scopes, ['a/gradients',
+                                                 'b/gradients'])
+        self.assertEqual(args.memory_budget_bytes, 1000)
+        self.assertEqual(args.lb, 3)
+        self.assertEqual(args.ctrld_strategy, 'time_model')
+        self.assertRaises(SystemExit, rewrite._parse_args,
+                          ['in.meta', 'out.meta'])
+
+    def test_formats(self):
+        self.assertTrue(rewrite._is_meta_graph('/a/model.meta'))
+        self.assertTrue(rewrite._is_meta_graph('model.meta.txt'))
+        self.assertFalse(rewrite._is_meta_graph('/a.meta/model.pb'))
+        self.assertTrue(rewrite._is_text('model.pbtxt'))
+        self.assertFalse(rewrite._is_text('model.pb'))
+
+    @mock.patch('tensorflow.gfile', create=True)
+    @mock.patch('tensorflow_large_model_support.fingerprint.'
+                'graph_fingerprint')
+    @mock.patch('tensorflow_large_model_support.lms.LMS')
+    @mock.patch('tensorflow_large_model_support.rewrite.write_graph')
+    @mock.patch('tensorflow_large_model_support.rewrite.read_graph')
+    def test_main(self, read_graph, write_graph, lms_class, graph_fingerprint,
+                  gfile):
+        gfile.GFile.side_effect = open
+        graph = mock.MagicMock()
+        read_graph.return_value = (graph, 'meta_graph_def')
+        graph_fingerprint.return_value = 'abc'
+        lms_obj = lms_class.return_value
+        lms_obj.run.return_value = {'swapout', 'swapin'}
+        lms_obj.swap_plan = plan.SwapPlan(
+            [plan.TensorSwap('f0:0', 'f0', 40,
+                             [plan.SwapIn(['g0'], 'g1', 4)])])
+        lms_obj.simulate.return_value.peak = 120
+        lms_obj.stats.to_dict.return_value = {'total_seconds': 1.5}
+        output = os.path.join(self.directory, 'out.meta')
+
+        self.assertEqual(rewrite.main(['in.meta', output,
+                                       '--optimizer-scope', 'gradients',
+                                       '--budget', '100']), 0)
+        read_graph.assert_called_once_with('in.meta')
+        self.assertEqual(lms_class.call_args[0], ({'gradients'},))
+        self.assertIs(lms_class.call_args[1]['graph'], graph)
+        self.assertEqual(lms_class.call_args[1]['memory_budget_bytes'], 100)
+        self.assertTrue(graph.as_default.called)
+        write_graph.assert_called_once_with(graph, 'meta_graph_def', output)
+        with open(output + '.lms.json') as f:
+            report = json.load(f)
+        self.assertEqual(report['input_fingerprint'], 'abc')
+        self.assertEqual(report['added_ops'], 2)
+        self.assertEqual(report['swapped_tensors'], 1)
+        self.assertEqual(report['swapped_bytes'], 40)
+        self.assertEqual(report['predicted_peak_bytes'], 120)
+        self.assertEqual(report['stats'], {'total_seconds': 1.5})
+        self.assertEqual(report['parameters']['optimizer_scopes'],
+                         ['gradients'])
+        self.assertEqual(plan.SwapPlan.from_dict(report['plan']),
+                         lms_obj.swap_plan)
+
+
+if __name__ == '__main__':
+    unittest.main()
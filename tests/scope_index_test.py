@@ -0,0 +1,75 @@
+# (C) Copyright IBM Corp. 2018. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Tests for the LMS scope_index module."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from tensorflow_large_model_support import graph_index
+import fake_graph
+import unittest
+
+
+class ScopeIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.graph = fake_graph.FakeGraph()
+        names = ['gradients/a', 'x', 'gradients', 'gradients_1/b',
+                 'gradients/c/d', 'grad', 'y.z']
+        for name in names:
+            self.graph.add_op(name, op_type='Relu' if 'c' in name else 'Fake')
+        self.index = graph_index.GraphIndex(self.graph)
+        self.scopes = self.index.scope_index()
+        self.assertIs(self.scopes, self.index.scope_index())
+
+    def _names(self, op_ids):
+        return sorted(op.name for op in self.index.ops(op_ids))
+
+    def test_prefix_ops(self):
+        self.assertEqual(self._names(self.scopes.prefix_ops('gradients')),
+                         ['gradients', 'gradients/a', 'gradients/c/d',
+                          'gradients_1/b'])
+        self.assertEqual(self._names(self.scopes.prefix_ops('gradients/c')),
+                         ['gradients/c/d'])
+        self.assertEqual(self._names(self.scopes.prefix_ops('z')), [])
+        # regular expressions are matched by a scan
+        self.assertEqual(self._names(self.scopes.prefix_ops('gr.d$')),
+                         ['grad'])
+
+    def test_scope_ops(self):
+        self.assertEqual(self._names(self.scopes.scope_ops('gradients')),
+                         ['gradients', 'gradients/a', 'gradients/c/d'])
+        self.assertEqual(self._names(self.scopes.scope_ops('gradients/')),
+                         ['gradients', 'gradients/a', 'gradients/c/d'])
+        self.assertEqual(self._names(self.scopes.scope_ops('gradients/c')),
+                         ['gradients/c/d'])
+        self.assertEqual(self._names(self.scopes.scope_ops('gradients_.')),
+                         ['gradients_1/b'])
+
+    def test_name_ops(self):
+        self.assertEqual(self._names(self.scopes.name_ops('grad')), ['grad'])
+        self.assertEqual(self._names(self.scopes.name_ops('gra')), [])
+        self.assertEqual(self._names(self.scopes.name_ops('y.z')), ['y.z'])
+        self.assertEqual(self._names(self.scopes.name_ops('[xy]')), ['x'])
+
+    def test_type_ops(self):
+        self.assertEqual(self._names(self.scopes.type_ops('Relu')),
+                         ['gradients/c/d'])
+        self.assertEqual(self._names(self.scopes.type_ops('Conv2D')), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
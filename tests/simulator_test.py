@@ -0,0 +1,112 @@
+# (C) Copyright IBM Corp. 2018. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Tests for the LMS simulator module."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from tensorflow_large_model_support import cost_model
+from tensorflow_large_model_support import graph_index
+from tensorflow_large_model_support import simulator
+from tensorflow_large_model_support import topos
+import fake_graph
+import unittest
+
+
+class MemorySimulatorTest(unittest.TestCase):
+
+    def setUp(self):
+        # f0 -> f1 -> f2 -> g2 -> g1 -> g0, f0 -> g0, f1 -> g1
+        # The orders are f0: 0, f1: 1, f2: 2, g2: 3, g1: 4, g0: 5
+        graph = fake_graph.FakeGraph()
+        f0 = graph.add_op('f0', shape=(10,))
+        f1 = graph.add_op('f1', inputs=[f0], shape=(20,))
+        f2 = graph.add_op('f2', inputs=[f1], shape=(5,))
+        g2 = graph.add_op('g2', inputs=[f2], shape=(4,))
+        g1 = graph.add_op('g1', inputs=[g2, f1], shape=(4,))
+        g0 = graph.add_op('g0', inputs=[g1, f0], shape=(4,))
+        self.index = graph_index.GraphIndex(graph)
+        grad_ops = {g2, g1, g0}
+        self.topo = topos.TOPOS([f0], grad_ops, index=self.index)
+        self.topo.build()
+        self.sizes = cost_model.CostModel(self.index).sizes
+        self.grad_flags = self.index.mask(grad_ops)
+
+    def _simulator(self, lb):
+        return simulator.MemorySimulator(self.index, self.topo.orders,
+                                         self.sizes, self.grad_flags, lb=lb)
+
+    def test_profile(self):
+        sim = self._simulator(lb=1)
+        self.assertEqual(sim.n_orders, 6)
+        self.assertEqual(sim.profile().tolist(),
+                         [40, 120, 140, 156, 152, 72])
+        self.assertEqual(sim.peak(), 156)
+        # f0:0 is off the device in orders 2 and 3, the other tensors are
+        # consumed by a backward op too early to be swapped
+        self.assertEqual(sim.swappable(range(6)).tolist(), [0])
+        self.assertEqual(sim.profile([0]).tolist(),
+                         [40, 120, 100, 116, 152, 72])
+        sim = self._simulator(lb=0)
+        self.assertEqual(sim.swappable(range(6)).tolist(), [0, 1])
+        self.assertEqual(sim.peak([0, 1]), 120)
+
+    def test_simulate(self):
+        sim = self._simulator(lb=1)
+        profile = sim.simulate()
+        self.assertEqual(profile.peak, 156)
+        self.assertEqual(profile.peak_order, 3)
+        self.assertEqual(profile.host_peak, 0)
+        self.assertEqual(profile.live_at_peak.tolist(), [0, 1, 2, 3])
+
+        # f0:0 is swapped out after f1 and swapped in before g1
+        profile = sim.simulate([0])
+        self.assertEqual(profile.device.tolist(),
+                         [40, 120, 100, 116, 152, 72])
+        self.assertEqual(profile.host.tolist(), [0, 0, 40, 40, 0, 0])
+        self.assertEqual(profile.host_peak, 40)
+        self.assertEqual(profile.peak_order, 4)
+        self.assertEqual(profile.live_at_peak.tolist(), [0, 1, 3, 4])
+
+        # a swap plan with a given swap-in order
+        profile = sim.simulate({0: 3})
+        self.assertEqual(profile.device.tolist(),
+                         [40, 120, 100, 156, 152, 72])
+        self.assertEqual(profile.host.tolist(), [0, 0, 40, 0, 0, 0])
+        self.assertEqual(profile.live_at_peak.tolist(), [0, 1, 2, 3])
+        # a tensor is never swapped in after its first backward consumer
+        profile = sim.simulate({0: 9})
+        self.assertEqual(profile.host.tolist(), [0, 0, 40, 40, 40, 0])
+
+    def test_unknown_sizes(self):
+        self.sizes[1] = -1
+        sim = self._simulator(lb=1)
+        self.assertEqual(sim.profile().tolist(), [40, 40, 60, 76, 72, 72])
+
+    def test_select_swaps(self):
+        sim = self._simulator(lb=0)
+        # the model fits
+        self.assertEqual(sim.select_swaps(200, range(6)), ([], 156))
+        # the smallest tensor removing the excess is swapped
+        self.assertEqual(sim.select_swaps(150, range(6)), ([0], 120))
+        # no tensor removes the excess, the largest one is swapped first
+        self.assertEqual(sim.select_swaps(60, range(6)), ([1, 0], 120))
+        # only candidates are swapped
+        self.assertEqual(sim.select_swaps(150, [1]), ([1], 152))
+
+
+if __name__ == '__main__':
+    unittest.main()
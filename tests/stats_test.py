@@ -0,0 +1,80 @@
+# (C) Copyright IBM Corp. 2018. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Tests for the LMS stats module."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from tensorflow_large_model_support import plan
+from tensorflow_large_model_support import stats
+import json
+import mock
+import unittest
+
+
+class RunStatsTest(unittest.TestCase):
+
+    @mock.patch('tensorflow_large_model_support.stats.time')
+    def test_phases(self, time):
+        time.time.side_effect = [10.0, 10.5, 11.0, 12.0, 12.5, 13.0, 14.0,
+                                 16.0]
+        run_stats = stats.RunStats()
+        run_stats.start()
+        with run_stats.phase('gradient_ops'):
+            pass
+        with run_stats.phase('planning'):
+            pass
+        self.assertRaises(ValueError, self._fail_in_phase, run_stats)
+        run_stats.stop()
+        self.assertEqual(list(run_stats.phase_seconds.items()),
+                         [('gradient_ops', 0.5), ('planning', 1.5)])
+        self.assertEqual(run_stats.total_seconds, 6.0)
+
+    def _fail_in_phase(self, run_stats):
+        with run_stats.phase('planning'):
+            raise ValueError()
+
+    def test_record_plan(self):
+        run_stats = stats.RunStats()
+        run_stats.record_plan(plan.SwapPlan(
+            [plan.TensorSwap('f0:0', 'f0', 40, [
+                plan.SwapIn(['g0', 'h0'], 'g1', 4),
+                plan.SwapIn(['k0'], None, -1)])],
+            [plan.Recompute('r:0', 'r', 16, 'g1', ['r'], 'g2', 3)],
+            ['k:0', 'k:1']))
+        self.assertEqual(run_stats.swapouts, 1)
+        self.assertEqual(run_stats.swapins, 2)
+        self.assertEqual(run_stats.fused_swapins, 1)
+        self.assertEqual(run_stats.recomputes, 1)
+        self.assertEqual(run_stats.kept, 2)
+        self.assertEqual(run_stats.bytes_moved, 120)
+        value = json.loads(json.dumps(run_stats.to_dict()))
+        self.assertEqual(value['swapins'], 2)
+        self.assertIsNone(value['peak_python_bytes'])
+
+    @unittest.skipIf(stats.tracemalloc is None, 'tracemalloc is missing')
+    def test_trace_memory(self):
+        run_stats = stats.RunStats(trace_memory=True)
+        run_stats.start()
+        data = [bytearray(1024) for _ in range(100)]
+        run_stats.stop()
+        self.assertGreaterEqual(run_stats.peak_python_bytes, 100 * 1024)
+        self.assertFalse(stats.tracemalloc.is_tracing())
+        del data
+
+
+if __name__ == '__main__':
+    unittest.main()
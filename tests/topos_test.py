@@ -20,162 +20,109 @@ from __future__ import division
 from __future__ import print_function
 
 import tensorflow_large_model_support as lms
+from tensorflow_large_model_support import graph_index
 from tensorflow_large_model_support import topos
+import fake_graph
 import unittest
-import mock
+
+
+def _dependency_dict(topo_test, index):
+    """Return the dependencies of TOPOS as a dict of op to set of ops."""
+    src, dst, nodes = topo_test._build_dependencies()
+    dep_dict = {op: set() for op in index.ops(nodes)}
+    for i, j in zip(src.tolist(), dst.tolist()):
+        dep_dict[index.op(j)].add(index.op(i))
+    return dep_dict
 
 
 class TOPOSTest(unittest.TestCase):
 
-    @mock.patch('toposort.toposort')
-    @mock.patch('tensorflow_large_model_support.topos.TOPOS._build_order_dict')
-    @mock.patch('tensorflow_large_model_support.topos.TOPOS._reindex')
-    @mock.patch('tensorflow_large_model_support.topos.TOPOS._clean_update_ops')
-    @mock.patch('tensorflow_large_model_support.topos.TOPOS._clean_bw_ops')
-    @mock.patch('tensorflow_large_model_support.topos.TOPOS._build_dependency_dict')
-    def test_build(self, build_dep, clean_bw, clean_update, reindex, build_order, tps):
-        grad_ops = {6, 7}
-        topsosort_return = [{1, 2, 3}, {4, 5}, {6, 7, 8, 9}, {10, 11, 12, 13}]
-        tps.return_value = iter(topsosort_return)
-        topo_test = topos.TOPOS({}, grad_ops)
+    def setUp(self):
+        # f0 -> f1 -> f2 -> g2 -> g1 -> g0 -> u
+        # f1 -> g1, f0 -> g0, f0 -> gx
+        # gx is a bw op with no incoming bw op and u is an update op
+        self.graph = fake_graph.FakeGraph()
+        g = self.graph
+        self.f0, self.f1, self.f2 = g.chain('f', 3)
+        self.gx = g.add_op('gx', inputs=[self.f0])
+        self.g2 = g.add_op('g2', inputs=[self.f2])
+        self.g1 = g.add_op('g1', inputs=[self.g2, self.f1])
+        self.g0 = g.add_op('g0', inputs=[self.g1, self.f0])
+        self.u = g.add_op('u', inputs=[self.g0])
+        self.grad_ops = {self.gx, self.g2, self.g1, self.g0}
+        self.index = graph_index.GraphIndex(self.graph)
+
+    def test_build(self):
+        topo_test = topos.TOPOS([self.f0], self.grad_ops, index=self.index)
         topo_test.build()
-        # tps.assert_called_once_with(build_dep.return_value)
-        self.assertTrue(clean_bw.called)
-        self.assertTrue(clean_update.called)
-        self.assertTrue(reindex.called)
-        self.assertTrue(build_order.called)
-        self.assertEqual(topo_test._bw_starting_order, 2)
-
-    @mock.patch('tensorflow.contrib.graph_editor.util.get_consuming_ops')
-    @mock.patch('tensorflow.contrib.graph_editor.util.get_generating_ops')
-    @mock.patch('tensorflow.contrib.graph_editor.get_walks_intersection_ops')
-    def test_build_dependency_dict(self, intersec, get_gen, get_cons):
-        ops = [mock.Mock(name=('op%s' % x),
-                         control_inputs=set(),
-                         inputs=set(),
-                         outputs=set())
-               for x in range(5)]
-        tensors = [mock.Mock(name=('ts%s' % x),
-                             consuming_ops=set(),
-                             generating_ops=set())
-                   for x in range(4)]
-        # Build mock graph
+        self.assertEqual(topo_test.size, 6)
+        expected = [self.f0, self.f1, self.f2, self.g2, self.g1, self.g0]
+        for order, op in enumerate(expected):
+            self.assertEqual(topo_test.get_order(op), order)
+            self.assertEqual(topo_test.get_ops(order), {op})
+        # the bw op having the same order with a fw op is removed
+        self.assertEqual(topo_test.get_order(self.gx), -1)
+        # the update op is removed and its order is dropped
+        self.assertEqual(topo_test.get_order(self.u), -1)
+        self.assertEqual(topo_test.get_order('unknown'), -1)
+        self.assertEqual(topo_test.bw_starting_order, 3)
+
+    def test_build_without_index(self):
+        topo_test = topos.TOPOS([self.f0], self.grad_ops)
+        self.assertEqual(topo_test.get_order(self.f0), -1)
+        topo_test.build()
+        self.assertEqual(topo_test.get_order(self.g0), 5)
+
+    def test_build_cycle(self):
+        # f1 and f2 depend on each other
+        self.f1.inputs.append(self.f2.outputs[0])
+        index = graph_index.GraphIndex(self.graph)
+        topo_test = topos.TOPOS([self.f0], self.grad_ops, index=index)
+        self.assertRaisesRegex(ValueError, 'circular dependencies',
+                               topo_test.build)
+
+    def test_build_dependencies(self):
+        # Build fake graph
+        graph = fake_graph.FakeGraph()
+        ops = [graph.add_op('op0', n_outputs=2)]
+        ops.append(graph.add_op('op1', inputs=[ops[0].outputs[0]]))
+        ops.append(graph.add_op('op2', inputs=[ops[0].outputs[0]]))
+        ops.append(graph.add_op('op3', inputs=[ops[0].outputs[1]]))
+        ops.append(graph.add_op('op4', inputs=[ops[1], ops[2]]))
+        grad_op = graph.add_op('grad', inputs=[ops[3], ops[4]])
+        # an op that does not reach the gradient ops
+        graph.add_op('dead_end', inputs=[ops[4]], control_inputs=[ops[0]])
+        # an op that is not reachable from the seed ops
+        other = graph.add_op('other')
+        ops[1].control_inputs = [other]
         seed_ops = {ops[0]}
-        ops[0].outputs = {tensors[0], tensors[1]}
-        tensors[0].consuming_ops = [ops[1], ops[2]]
-        tensors[0].generating_ops = [ops[0]]
-        tensors[1].consuming_ops = [ops[3]]
-        tensors[1].generating_ops = [ops[0]]
-
-        ops[1].inputs = {tensors[0]}
-        ops[1].outputs = {tensors[2]}
-        ops[2].inputs = {tensors[0]}
-        ops[2].outputs = {tensors[3]}
-        tensors[2].generating_ops = [ops[1]]
-        tensors[3].generating_ops = [ops[2]]
-        tensors[2].consuming_ops = [ops[4]]
-        tensors[3].consuming_ops = [ops[4]]
-        ops[3].inputs = {tensors[1]}
-
-        ops[4].inputs = {tensors[2], tensors[3]}
-
-        grad_ops = {}
-
-        get_cons.side_effect = lambda x: x.consuming_ops
-        get_gen.side_effect = lambda x: x.generating_ops
-        intersec.return_value = ops
-        topo_test = topos.TOPOS(seed_ops, grad_ops)
-        ret = topo_test._build_dependency_dict()
+        grad_ops = {grad_op}
+
+        index = graph_index.GraphIndex(graph)
+        topo_test = topos.TOPOS(seed_ops, grad_ops, index=index)
+        ret = _dependency_dict(topo_test, index)
         expected_dict = {ops[0]: set(),
                          ops[1]: {ops[0]},
                          ops[2]: {ops[0]},
                          ops[3]: {ops[0]},
-                         ops[4]: {ops[1], ops[2]}}
+                         ops[4]: {ops[1], ops[2]},
+                         grad_op: {ops[3], ops[4]},
+                         graph.get_operations()[6]: {ops[0], ops[4]}}
         self.assertDictEqual(expected_dict, ret)
 
-    def test_build_order_dict(self):
-        grad_ops = {'g1', 'g2'}
-        topo_test = topos.TOPOS({}, grad_ops)
-        topo_test._topo_sort = {0: {'a', 'b'},
-                                1: {'c', 'd'},
-                                2: {'e', 'f'},
-                                3: {'g1', 'g2'}}
-        topo_test._build_order_dict()
-        expected_val = {'a': 0, 'b': 0,
-                        'c': 1, 'd': 1,
-                        'e': 2, 'f': 2,
-                        'g1': 3, 'g2': 3}
-        self.assertDictEqual(expected_val, topo_test._orders)
-
-    def test_clean_bw_ops(self):
-        grad_ops = {'g1', 'g2'}
-        topo_test = topos.TOPOS({}, grad_ops)
-        topo_test._topo_sort = {0: {'a', 'b'},
-                                1: {'c', 'd', 'g1'},
-                                2: {'e', 'f', 'g1', 'g2'},
-                                3: {'g1', 'g2'}}
-        topo_test._clean_bw_ops()
-        expected_val = {0: {'a', 'b'},
-                        1: {'c', 'd'},
-                        2: {'e', 'f'},
-                        3: {'g1', 'g2'}}
-        self.assertDictEqual(topo_test._topo_sort, expected_val)
-
-    @mock.patch('tensorflow.contrib.graph_editor.get_forward_walk_ops')
-    def test_clean_update_ops(self, fwd_walk):
-        grad_ops = {'g1', 'g2'}
-        topo_test = topos.TOPOS({}, grad_ops)
-        topo_test._topo_sort = {0: {'a', 'b'},
-                                1: {'c', 'd', 'g1'},
-                                2: {'e', 'f', 'g1', 'g2'},
-                                3: {'g1', 'g2'}}
-        fwd_walk.side_effect = lambda x, inclusive=False: {'b', 'c', 'f'}
-        topo_test._clean_update_ops()
-        expected = {0: {'a'},
-                    1: {'d', 'g1'},
-                    2: {'e', 'g1', 'g2'},
-                    3: {'g1', 'g2'}}
-        self.assertDictEqual(expected, topo_test._topo_sort)
-
-    def test_reindex(self):
-        topo_test = topos.TOPOS({}, {})
-        topo_test._topo_sort = {0: {'a', 'b'},
-                                1: {},
-                                2: {'e', 'f', 'g1', 'g2'},
-                                3: {},
-                                4: {'a'}}
-        topo_test._reindex()
-        expected = {0: {'a', 'b'},
-                    1: {'e', 'f', 'g1', 'g2'},
-                    2: {'a'}}
-        self.assertDictEqual(expected, topo_test._topo_sort)
-
-    def test_get_order(self):
-        topo_test = topos.TOPOS({}, {})
-        topo_test._orders = {'a': 0, 'b': 0,
-                             'c': 1, 'd': 1,
-                             'e': 2, 'f': 2,
-                             'g1': 3, 'g2': 3}
-        self.assertEqual(topo_test.get_order('a'), 0)
-        self.assertEqual(topo_test.get_order('f'), 2)
-        self.assertEqual(topo_test.get_order('g1'), 3)
-        self.assertEqual(topo_test.get_order('asdf'), -1)
-
-    def test_get_ops(self):
-        topo_test = topos.TOPOS({}, {})
-        topo_test._topo_sort = {0: {'a', 'b'},
-                                1: {'c', 'd', 'g1'},
-                                2: {'e', 'f', 'g1', 'g2'},
-                                3: {'g1', 'g2'}}
-        ret = topo_test.get_ops(2)
-        self.assertEqual(ret, {'e', 'f', 'g1', 'g2'})
+        # control inputs of an op without inputs are always kept
+        ops[0].control_inputs = [other]
+        index = graph_index.GraphIndex(graph)
+        topo_test = topos.TOPOS(seed_ops, grad_ops, index=index)
+        ret = _dependency_dict(topo_test, index)
+        expected_dict[ops[0]] = {other}
+        expected_dict[other] = set()
+        self.assertDictEqual(expected_dict, ret)
 
     def test_size(self):
         topo_test = topos.TOPOS({}, {})
-        topo_test._topo_sort = {0: {'a', 'b'},
-                                1: {'c', 'd', 'g1'},
-                                2: {'e', 'f', 'g1', 'g2'},
-                                3: {'g1', 'g2'}}
+        self.assertEqual(topo_test.size, 0)
+        topo_test._order_ptr = [0, 2, 5, 9, 11]
         self.assertEqual(topo_test.size, 4)
 
     def test_bw_starting_order(self):
@@ -0,0 +1,68 @@
+# (C) Copyright IBM Corp. 2018. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Tests for the LMS traversal module."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from tensorflow_large_model_support import traversal
+import numpy as np
+import unittest
+
+
+class TraversalTest(unittest.TestCase):
+
+    def setUp(self):
+        # 0 -> 1, 0 -> 2, 1 -> 3, 2 -> 3, 3 -> 4, 2 -> 4
+        ptr = [0, 2, 3, 5, 6, 6]
+        idx = [1, 2, 3, 3, 4, 4]
+        self.walker = traversal.Traversal(ptr, idx)
+
+    def test_as_list(self):
+        values = traversal.as_list(np.array([3, 1], dtype=np.int32))
+        self.assertEqual(values, [3, 1])
+        self.assertIs(type(values[0]), int)
+        self.assertEqual(traversal.as_list((3, 1)), [3, 1])
+
+    def test_levels(self):
+        self.assertEqual(list(self.walker.levels([0])),
+                         [[0], [1, 2], [3, 4]])
+        self.assertEqual(list(self.walker.levels([2, 1, 2])),
+                         [[2, 1], [3, 4]])
+        self.assertEqual(self.walker.visits, 9)
+
+    def test_allowed(self):
+        allowed = [True, True, False, True, True]
+        self.assertEqual(list(self.walker.levels([0], allowed)),
+                         [[0], [1], [3], [4]])
+        # sources are visited even if they are not allowed
+        self.assertEqual(list(self.walker.walk([2], allowed)), [2, 3, 4])
+
+    def test_early_stop_and_nesting(self):
+        outer = self.walker.walk([0])
+        self.assertEqual(next(outer), 0)
+        # a nested traversal does not disturb a suspended one
+        self.assertEqual(list(self.walker.walk([1])), [1, 3, 4])
+        self.assertEqual(list(outer), [1, 2, 3, 4])
+
+    def test_neighbors(self):
+        self.assertEqual(self.walker.neighbors(2), [3, 4])
+        self.assertEqual(self.walker.neighbors(4), [])
+        self.assertEqual(self.walker.size, 5)
+
+
+if __name__ == '__main__':
+    unittest.main()